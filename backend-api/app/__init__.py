@@ -17,3 +17,19 @@ r = redis.Redis.from_url(app.config['REDIS_URL'])
 # Register blueprints
 from app.routes import admin_bp
 app.register_blueprint(admin_bp)
+
+# Register CLI commands
+from app.commands import (
+    flag_overdue_command,
+    import_books_command,
+    migrate_copies_command,
+    release_loans_command,
+)
+app.cli.add_command(import_books_command)
+app.cli.add_command(release_loans_command)
+app.cli.add_command(flag_overdue_command)
+app.cli.add_command(migrate_copies_command)
+
+# Opt-in sampling profiler
+from app.helpers.profiler import init_profiler
+init_profiler(app)
@@ -0,0 +1,155 @@
+"""
+Command line jobs of the backend API, run with `flask --app app <command>`.
+"""
+
+import os
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from app import mongo, r
+from app.helpers.book_import import (
+    detect_format,
+    ensure_import_index,
+    load_checkpoint,
+    read_rows,
+    save_checkpoint,
+    write_reject,
+)
+from app.helpers.db_indexes import ensure_indexes
+from app.helpers.inventory import merge_duplicate_books, migrate_copies
+from app.services import (
+    flag_overdue_loans_service,
+    import_books_service,
+    release_expired_loans_service,
+)
+
+
+@click.command("import-books")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--format",
+    "file_format",
+    type=click.Choice(["csv", "jsonl"]),
+    help="Format of the file, guessed from its extension if not provided.",
+)
+@click.option("--chunk-size", default=1000, show_default=True, type=int)
+@click.option("--checkpoint", "checkpoint_path", help="Defaults to PATH.checkpoint.")
+@click.option("--rejects", "rejects_path", help="Defaults to PATH.rejects.jsonl.")
+@click.option(
+    "--restart", is_flag=True, help="Ignore the checkpoint of an earlier run."
+)
+@with_appcontext
+def import_books_command(
+    path, file_format, chunk_size, checkpoint_path, rejects_path, restart
+):
+    """Import the books of a CSV or JSON lines file into the catalogue."""
+    file_format = file_format or detect_format(path)
+    checkpoint_path = checkpoint_path or f"{path}.checkpoint"
+    rejects_path = rejects_path or f"{path}.rejects.jsonl"
+
+    checkpoint = None if restart else load_checkpoint(checkpoint_path)
+    if checkpoint:
+        click.echo(f"Resuming after line {checkpoint['line']}.")
+    done = checkpoint["totals"] if checkpoint else {}
+
+    ensure_import_index(mongo)
+    with open(path, encoding="utf-8-sig", newline="") as import_file, open(
+        rejects_path, "a" if checkpoint else "w", encoding="utf-8"
+    ) as reject_file:
+        if checkpoint:
+            # Drop the rejects written after the checkpoint, they are read again
+            reject_file.truncate(checkpoint["rejects_offset"])
+            rows = (
+                (line_number, row)
+                for line_number, row in read_rows(import_file, file_format)
+                if line_number > checkpoint["line"]
+            )
+        else:
+            rows = read_rows(import_file, file_format)
+
+        def on_reject(line_number, row, errors):
+            write_reject(reject_file, line_number, row, errors)
+
+        def on_chunk(line_number, totals):
+            reject_file.flush()
+            totals = {key: done.get(key, 0) + value for key, value in totals.items()}
+            save_checkpoint(
+                checkpoint_path,
+                {
+                    "line": line_number,
+                    "totals": totals,
+                    "rejects_offset": reject_file.tell(),
+                },
+            )
+            click.echo(
+                f"Line {line_number}: {totals['processed']} processed, "
+                f"{totals['inserted']} inserted, {totals['duplicates']} duplicates, "
+                f"{totals['rejected']} rejected."
+            )
+
+        totals = import_books_service(
+            mongo, r, rows, chunk_size, on_reject=on_reject, on_chunk=on_chunk
+        )
+
+    # The file is fully imported, a new run starts over
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    totals = {key: done.get(key, 0) + value for key, value in totals.items()}
+    click.echo(
+        f"Imported {totals['inserted']} of {totals['processed']} books "
+        f"({totals['duplicates']} duplicates, {totals['rejected']} rejected)."
+    )
+    if totals["rejected"]:
+        click.echo(f"Rejected rows were written to {rejects_path}.")
+
+
+def release_expired_loans():
+    """Release the expired loans with the configured grace period and batch size."""
+    return release_expired_loans_service(
+        mongo,
+        r,
+        grace_days=current_app.config["LOAN_RELEASE_GRACE_DAYS"],
+        batch_size=current_app.config["LOAN_SWEEP_BATCH_SIZE"],
+    )
+
+
+@click.command("release-loans")
+@with_appcontext
+def release_loans_command():
+    """Release the loans past their due date and grace period."""
+    ensure_indexes(mongo)
+    released = release_expired_loans()
+    click.echo(f"Released {released} expired loans.")
+
+
+def flag_overdue_loans():
+    """Flag the newly overdue loans with the configured batch size."""
+    return flag_overdue_loans_service(
+        mongo, batch_size=current_app.config["LOAN_SWEEP_BATCH_SIZE"]
+    )
+
+
+@click.command("flag-overdue")
+@with_appcontext
+def flag_overdue_command():
+    """Flag the open loans that became overdue since the previous run."""
+    ensure_indexes(mongo)
+    flagged = flag_overdue_loans()
+    click.echo(f"Flagged {flagged} overdue loans.")
+
+
+@click.command("migrate-copies")
+@click.option(
+    "--merge-duplicates",
+    is_flag=True,
+    help="Also fold the books stored once per copy of the same title.",
+)
+@with_appcontext
+def migrate_copies_command(merge_duplicates):
+    """Convert the books stored with an `available` flag to copy counters."""
+    click.echo(f"{migrate_copies(mongo)} books converted to copy counters.")
+    if merge_duplicates:
+        click.echo(f"{merge_duplicate_books(mongo)} duplicate books merged.")
@@ -0,0 +1,167 @@
+"""
+Bucketed hashes of the collections synchronized between the two APIs.
+
+Events are delivered over pub/sub, which drops them when a subscriber is down,
+so the frontend and backend copies of `books` and `users` can drift. Rather
+than diffing full dumps, both sides hash their documents into buckets and only
+compare the hashes. A bucket is identified by a path of hexadecimal digits, and
+splits into up to 16 child buckets with one more digit, Merkle tree style: the
+reconciliation only descends into the buckets whose hashes differ, and only
+transfers the documents of small differing buckets.
+
+The path of a document is its hexadecimal `_id` read from the last digit. The
+leading digits of an ObjectId are its timestamp, shared by most documents, so
+the first levels of a tree keyed on them would each hold a single bucket. The
+trailing digits come from the ObjectId counter and spread the documents evenly,
+so every level splits a bucket 16 ways. A bucket is matched by MongoDB on the
+trailing digits of the `_id`, and only its documents are read and hashed.
+
+Bucket hashes are the XOR of the SHA-1 digests of their documents, so the
+hashes of every child of a bucket are computed in a single pass over it.
+This module is kept identical in both APIs.
+"""
+
+import hashlib
+import json
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import DeleteMany, UpdateOne
+
+from app.helpers.utils import json_serialize
+
+# Fields compared and transferred for each synchronized collection. The
+# available copies of books are owned by the frontend and left out.
+SYNC_FIELDS = {
+    "books": ("title", "author", "publisher", "category", "added_at", "total_copies"),
+    "users": ("email", "first_name", "last_name", "enrollment_date"),
+}
+DATETIME_FIELDS = ("added_at", "enrollment_date")
+
+OBJECT_ID_LENGTH = 24
+
+
+def bucket_path(document_id):
+    """Return the path of the buckets of a document, its `_id` read backwards."""
+    return str(document_id)[::-1]
+
+
+def prefix_query(prefix):
+    """
+    Build the query matching the documents of a bucket.
+
+    :param prefix: Path of the bucket, empty for the whole collection
+    :return: MongoDB query on the trailing digits of the `_id`
+    """
+    if not prefix:
+        return {}
+    return {
+        "$expr": {
+            "$regexMatch": {"input": {"$toString": "$_id"}, "regex": f"{prefix[::-1]}$"}
+        }
+    }
+
+
+def serialize_record(document, fields):
+    """Keep the synchronized fields of a document, in JSON serializable form."""
+    record = {"_id": str(document["_id"])}
+    for field in fields:
+        value = document.get(field)
+        record[field] = (
+            json_serialize(value) if isinstance(value, (datetime, ObjectId)) else value
+        )
+    return record
+
+
+def deserialize_record(record):
+    """Turn a transferred record back into a MongoDB document."""
+    document = dict(record, _id=ObjectId(record["_id"]))
+    for field in DATETIME_FIELDS:
+        if document.get(field):
+            document[field] = datetime.fromisoformat(document[field])
+    return document
+
+
+def record_digest(document, fields):
+    """Return the SHA-1 digest of the synchronized fields of a document."""
+    record = serialize_record(document, fields)
+    payload = json.dumps([record[key] for key in ("_id",) + fields])
+    return int.from_bytes(hashlib.sha1(payload.encode()).digest(), "big")
+
+
+def bucket_hashes(collection, fields, prefix="", batch_size=5000):
+    """
+    Hash the child buckets of a bucket.
+
+    :param collection: MongoDB collection
+    :param fields: Synchronized fields of the collection
+    :param prefix: Path of the bucket to split
+    :param batch_size: Number of documents fetched per round trip
+    :return: Dictionary mapping the path of every non-empty child bucket to
+        its document count and hash
+    """
+    depth = len(prefix) + 1
+    buckets = {}
+    documents = collection.find(
+        prefix_query(prefix),
+        {field: 1 for field in fields},
+        batch_size=batch_size,
+    )
+    for document in documents:
+        bucket = buckets.setdefault(bucket_path(document["_id"])[:depth], [0, 0])
+        bucket[0] += 1
+        bucket[1] ^= record_digest(document, fields)
+    return {
+        child: {"count": count, "hash": f"{digest:040x}"}
+        for child, (count, digest) in buckets.items()
+    }
+
+
+def bucket_records(collection, fields, prefix):
+    """
+    Read the synchronized fields of every document of a bucket.
+
+    :return: List of JSON serializable records in `_id` order
+    """
+    documents = collection.find(
+        prefix_query(prefix), {field: 1 for field in fields}, sort=[("_id", 1)]
+    )
+    return [serialize_record(document, fields) for document in documents]
+
+
+def replace_bucket(collection, fields, prefix, records, on_insert=None):
+    """
+    Make a bucket match the records of the other side with bulk upserts, and
+    delete the documents the other side does not have.
+
+    :param collection: MongoDB collection
+    :param fields: Synchronized fields of the collection
+    :param prefix: Path of the bucket
+    :param records: Every record of the bucket on the other side
+    :param on_insert: Function of a record returning the fields set on the
+        document created for it by the repair only
+    :return: Dictionary of inserted, updated and deleted counts
+    """
+    documents = [deserialize_record(record) for record in records]
+    operations = []
+    for document in documents:
+        update = {}
+        present = [field for field in fields if document.get(field) is not None]
+        if present:
+            update["$set"] = {field: document[field] for field in present}
+        if len(present) < len(fields):
+            update["$unset"] = {field: "" for field in fields if field not in present}
+        if on_insert:
+            update["$setOnInsert"] = on_insert(document)
+        operations.append(UpdateOne({"_id": document["_id"]}, update, upsert=True))
+
+    query = prefix_query(prefix)
+    query.setdefault("_id", {})["$nin"] = [document["_id"] for document in documents]
+    operations.append(DeleteMany(query))
+
+    result = collection.bulk_write(operations, ordered=False)
+    return {
+        "inserted": result.upserted_count,
+        "updated": result.modified_count,
+        "deleted": result.deleted_count,
+    }
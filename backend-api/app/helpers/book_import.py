@@ -0,0 +1,97 @@
+"""
+Reading side of the bulk catalogue import.
+
+Import files are CSV with a header row or JSON lines, and are read one row at
+a time so that memory stays constant whatever the file size. Each row comes
+with its line number, which is what checkpoints record: an interrupted import
+resumes after the last line of the last chunk that was fully inserted.
+"""
+
+import csv
+import json
+import os
+
+from app.services import IMPORT_KEY_FIELDS
+
+IMPORT_INDEX_NAME = "import_dedupe"
+
+
+def detect_format(path):
+    """Guess the format of an import file from its extension."""
+    return "jsonl" if path.endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+def ensure_import_index(mongo):
+    """
+    Create the index used to look up the catalogue books duplicated by an
+    import. An existing index is left untouched.
+
+    :param mongo: MongoDB instance
+    """
+    mongo.db.books.create_index(
+        [(field, 1) for field in IMPORT_KEY_FIELDS], name=IMPORT_INDEX_NAME
+    )
+
+
+def read_rows(lines, file_format):
+    """
+    Parse an import file row by row.
+
+    :param lines: Iterable of text lines, e.g. an open file
+    :param file_format: `csv` or `jsonl`
+    :return: Generator of (line number, row) tuples, where the row is a
+        dictionary, or the raw line when it could not be parsed
+    """
+    if file_format == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError:
+            yield line_number, line.rstrip("\n")
+
+
+def load_checkpoint(path):
+    """
+    Read an import checkpoint.
+
+    :param path: Checkpoint file path
+    :return: Checkpoint dictionary, or None when there is none
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as checkpoint_file:
+        return json.load(checkpoint_file)
+
+
+def save_checkpoint(path, checkpoint):
+    """
+    Atomically replace an import checkpoint.
+
+    :param path: Checkpoint file path
+    :param checkpoint: JSON serializable checkpoint dictionary
+    """
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file)
+    os.replace(temporary_path, path)
+
+
+def write_reject(reject_file, line_number, row, errors):
+    """
+    Append an invalid row and the reasons it was rejected to a reject file.
+
+    :param reject_file: Open text file receiving JSON lines
+    :param line_number: Line of the row in the import file
+    :param row: Row as it was read
+    :param errors: Dictionary of validation errors
+    """
+    reject_file.write(
+        json.dumps({"line": line_number, "row": row, "errors": errors}) + "\n"
+    )
@@ -0,0 +1,41 @@
+"""
+MongoDB indexes of the backend collections.
+
+Open loans are borrow records without a `returned_on` date. The jobs sweeping
+them select open loans by due date through an index on `returned_on` then
+`borrowed_until`: open loans share the same (missing) `returned_on` key, so
+the index walks them in due date order and the sweeps never scan the loans
+returned long ago. Overdue loans carry an `overdue` flag, cleared when they
+are released, and a partial index holding only the flagged loans serves the
+overdue listing.
+"""
+
+OPEN_LOAN = {"returned_on": {"$exists": False}}
+OPEN_LOANS_INDEX_NAME = "open_loans_by_due_date"
+OVERDUE_LOAN = {"overdue": True}
+OVERDUE_LOANS_INDEX_NAME = "overdue_loans_by_due_date"
+
+
+def ensure_indexes(mongo):
+    """
+    Create the backend indexes. Existing indexes are left untouched, unless
+    their keys or filter changed, in which case they are rebuilt.
+
+    :param mongo: MongoDB instance
+    """
+    existing = mongo.db.borrow_records.index_information()
+    for keys, name, options in (
+        ([("returned_on", 1), ("borrowed_until", 1)], OPEN_LOANS_INDEX_NAME, {}),
+        (
+            [("borrowed_until", 1)],
+            OVERDUE_LOANS_INDEX_NAME,
+            {"partialFilterExpression": OVERDUE_LOAN},
+        ),
+    ):
+        if name in existing and (
+            list(existing[name]["key"]) != keys
+            or existing[name].get("partialFilterExpression")
+            != options.get("partialFilterExpression")
+        ):
+            mongo.db.borrow_records.drop_index(name)
+        mongo.db.borrow_records.create_index(keys, name=name, **options)
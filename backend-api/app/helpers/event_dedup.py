@@ -0,0 +1,54 @@
+"""
+Bounded window of the events recently applied by a consumer.
+
+Events are delivered at least once: a publisher may retry, and a replica
+catching up replays the events it may already have received live. Every event
+carries a unique `event_id`, and each consumer process remembers the ids of the
+last `EVENT_DEDUP_SIZE` events it applied, so that recent repeats are skipped
+without a database lookup. The window is an optimization only: it is not shared
+between processes or replicas, and the replay of the event log at startup does
+not go through it. Applying an event is idempotent on its own: inserts are
+guarded by the unique `_id` index, as events carry the `_id` of the document
+they insert, and the resulting `DuplicateKeyError` is treated as an already
+applied event, while released loans only give their copies and loan slots back
+from the replica whose update closed their borrow record.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+
+from bson import ObjectId
+
+EVENT_DEDUP_SIZE = 10_000
+
+
+def new_event_id():
+    """Return a unique event id."""
+    return str(ObjectId())
+
+
+class RecentEvents:
+    """Least recently used set of event ids."""
+
+    def __init__(self, size=EVENT_DEDUP_SIZE):
+        self.size = size
+        self._ids = OrderedDict()
+        self._lock = Lock()
+
+    def __contains__(self, event_id):
+        with self._lock:
+            if event_id not in self._ids:
+                return False
+            self._ids.move_to_end(event_id)
+            return True
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, event_id):
+        """Remember an event id, forgetting the least recently seen one."""
+        with self._lock:
+            self._ids[event_id] = None
+            self._ids.move_to_end(event_id)
+            if len(self._ids) > self.size:
+                self._ids.popitem(last=False)
@@ -0,0 +1,62 @@
+"""
+Replayable log of the events published to the frontend.
+
+Pub/sub messages are only delivered to the subscribers connected at the time,
+so every event published on `frontend_events` is also appended to a capped
+Redis stream. A frontend replica bootstrapped from a catalogue snapshot replays
+the stream from the position recorded in the snapshot to catch up with the
+events published while the snapshot was read and loaded. Published events carry
+their position in the log, which the replica records as it applies them, so
+that a restart only replays the events published while it was down.
+"""
+
+import json
+
+from app.helpers.event_dedup import new_event_id
+from app.helpers.utils import json_serialize
+
+EVENT_CHANNEL = "frontend_events"
+EVENT_LOG_KEY = f"{EVENT_CHANNEL}:log"
+
+# Roughly how many events are kept, i.e. how old a snapshot can get
+EVENT_LOG_MAXLEN = 1_000_000
+
+# Position of an empty log, every event comes after it
+START_POSITION = "0-0"
+
+
+def publish_event(redis, event):
+    """
+    Append an event to the log, then publish it to the frontend, under a new
+    `event_id` the frontend deduplicates deliveries on, and with its
+    `log_position`.
+
+    :param redis: Redis instance
+    :param event: JSON serializable event dictionary
+    """
+    event = {**event, "event_id": new_event_id()}
+    position = redis.xadd(
+        EVENT_LOG_KEY,
+        {"data": json.dumps(event, default=json_serialize)},
+        maxlen=EVENT_LOG_MAXLEN,
+        approximate=True,
+    )
+    position = position.decode() if isinstance(position, bytes) else position
+    redis.publish(
+        EVENT_CHANNEL,
+        json.dumps({**event, "log_position": position}, default=json_serialize),
+    )
+
+
+def event_position(redis):
+    """
+    Return the position of the last logged event.
+
+    :param redis: Redis instance
+    :return: Stream entry id, or `0-0` when nothing was logged yet
+    """
+    entries = redis.xrevrange(EVENT_LOG_KEY, count=1)
+    if not entries:
+        return START_POSITION
+    position = entries[0][0]
+    return position.decode() if isinstance(position, bytes) else position
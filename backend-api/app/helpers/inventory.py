@@ -0,0 +1,160 @@
+"""
+Copy counters of the catalogue books.
+
+A title held in several copies is a single book document with `total_copies`
+and `available_copies` counters, instead of one document per copy. Copies are
+taken on the frontend, which announces each borrow, and the backend applies
+the announced borrows and its own releases as counter deltas. The
+`available_on` date of a book is the earliest due date of its open loans.
+
+Books stored before the counters existed have a single `available` flag, and
+are converted when the API starts, or by `flask migrate-copies`.
+"""
+
+from collections import Counter
+
+from pymongo import UpdateOne
+
+from app.helpers.db_indexes import OPEN_LOAN
+
+# Fields identifying the documents that are copies of the same title
+COPY_KEY_FIELDS = ("title", "author", "publisher")
+
+
+def released_copies(loans):
+    """Count the released loans of each book."""
+    return Counter(loan["book_id"] for loan in loans)
+
+
+def release_operations(released):
+    """
+    Build the updates giving back the copies of released loans.
+
+    The counter never goes above `total_copies`, so that releasing a loan the
+    counter never saw taken, e.g. one borrowed before the copies were
+    migrated, cannot make up copies.
+
+    :param released: Mapping of book id to the number of released copies
+    :return: List of write operations
+    """
+    return [
+        UpdateOne(
+            {"_id": book_id},
+            [
+                {
+                    "$set": {
+                        "available_copies": {
+                            "$min": [
+                                {"$add": ["$available_copies", count]},
+                                "$total_copies",
+                            ]
+                        }
+                    }
+                }
+            ],
+        )
+        for book_id, count in released.items()
+    ]
+
+
+def refresh_due_dates(mongo, book_ids):
+    """
+    Set the `available_on` date of books to the earliest due date of their
+    open loans, or clear it for the books without open loans.
+
+    :param mongo: MongoDB instance
+    :param book_ids: Ids of the books whose loans changed
+    """
+    due_dates = {
+        due["_id"]: due["available_on"]
+        for due in mongo.db.borrow_records.aggregate(
+            [
+                {"$match": {"book_id": {"$in": book_ids}, **OPEN_LOAN}},
+                {
+                    "$group": {
+                        "_id": "$book_id",
+                        "available_on": {"$min": "$borrowed_until"},
+                    }
+                },
+            ]
+        )
+    }
+    if due_dates:
+        mongo.db.books.bulk_write(
+            [
+                UpdateOne({"_id": book_id}, {"$set": {"available_on": available_on}})
+                for book_id, available_on in due_dates.items()
+            ],
+            ordered=False,
+        )
+    mongo.db.books.update_many(
+        {"_id": {"$in": book_ids, "$nin": list(due_dates)}},
+        {"$unset": {"available_on": ""}},
+    )
+
+
+def migrate_copies(mongo):
+    """
+    Convert the books stored with an `available` flag to copy counters.
+
+    :param mongo: MongoDB instance
+    :return: Number of converted books
+    """
+    result = mongo.db.books.update_many(
+        {"total_copies": {"$exists": False}},
+        [
+            {
+                "$set": {
+                    "total_copies": 1,
+                    "available_copies": {
+                        "$cond": [{"$eq": ["$available", False]}, 0, 1]
+                    },
+                }
+            },
+            {"$unset": "available"},
+        ],
+    )
+    return result.modified_count
+
+
+def merge_duplicate_books(mongo):
+    """
+    Fold the documents stored once per copy of the same title into the oldest
+    one, adding up their counters and moving their borrow records over.
+
+    :param mongo: MongoDB instance
+    :return: Number of deleted duplicate documents
+    """
+    groups = mongo.db.books.aggregate(
+        [
+            {"$sort": {"_id": 1}},
+            {
+                "$group": {
+                    "_id": {field: f"${field}" for field in COPY_KEY_FIELDS},
+                    "book_ids": {"$push": "$_id"},
+                    "total_copies": {"$sum": "$total_copies"},
+                    "available_copies": {"$sum": "$available_copies"},
+                }
+            },
+            {"$match": {"book_ids.1": {"$exists": True}}},
+        ],
+        allowDiskUse=True,
+    )
+    merged = 0
+    for group in groups:
+        book_id, *duplicate_ids = group["book_ids"]
+        mongo.db.books.update_one(
+            {"_id": book_id},
+            {
+                "$set": {
+                    "total_copies": group["total_copies"],
+                    "available_copies": group["available_copies"],
+                }
+            },
+        )
+        mongo.db.borrow_records.update_many(
+            {"book_id": {"$in": duplicate_ids}}, {"$set": {"book_id": book_id}}
+        )
+        mongo.db.books.delete_many({"_id": {"$in": duplicate_ids}})
+        merged += len(duplicate_ids)
+    return merged
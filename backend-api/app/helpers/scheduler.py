@@ -0,0 +1,59 @@
+"""
+In-process scheduling of the periodic backend jobs.
+
+Jobs run in daemon threads of the API process. When several backend instances
+run, a Redis lock held for the length of the interval makes sure only one of
+them runs a job in each interval.
+"""
+
+import threading
+import traceback
+
+from redis.exceptions import RedisError
+
+LOCK_PREFIX = "scheduler:lock"
+
+
+def run_exclusively(redis, name, ttl, job):
+    """
+    Run a job unless another instance already ran it within `ttl` seconds.
+
+    :param redis: Redis instance
+    :param name: Name of the job
+    :param ttl: Seconds the job is locked for once started
+    :param job: Callable running the job
+    :return: True when the job ran
+    """
+    try:
+        acquired = redis.set(f"{LOCK_PREFIX}:{name}", 1, nx=True, ex=ttl)
+    except RedisError:
+        return False
+    if not acquired:
+        return False
+    job()
+    return True
+
+
+def schedule(redis, name, interval, job):
+    """
+    Run a job every `interval` seconds in a daemon thread.
+
+    Errors are printed and do not stop the following runs.
+
+    :param redis: Redis instance
+    :param name: Name of the job, also used for its lock
+    :param interval: Seconds between two runs
+    :param job: Callable running the job
+    :return: Event stopping the job when set
+    """
+    stopped = threading.Event()
+
+    def loop():
+        while not stopped.wait(interval):
+            try:
+                run_exclusively(redis, name, max(int(interval), 1), job)
+            except Exception:
+                traceback.print_exc()
+
+    threading.Thread(target=loop, name=name, daemon=True).start()
+    return stopped
@@ -0,0 +1,138 @@
+"""
+Incrementally serialized responses for large listing pages.
+
+Regular listing responses are built as a list of records and serialized in one
+go, which is fine for a page of a few dozen records but not for a client asking
+for tens of thousands. A streamed listing keeps the records as a lazy iterator
+over the MongoDB cursor and writes them out a chunk at a time, either as the
+usual JSON page envelope (`?stream=true`) or as newline delimited JSON
+(`Accept: application/x-ndjson` or `?format=ndjson`). Non-streamed pages are
+limited to `MAX_PAGE_SIZE` records. Exports stream whole collections the same
+way, as NDJSON or CSV.
+"""
+
+import csv
+import io
+from itertools import islice
+
+from flask import Response, current_app, stream_with_context
+
+JSON_MIMETYPE = "application/json"
+NDJSON_MIMETYPE = "application/x-ndjson"
+CSV_MIMETYPE = "text/csv"
+
+
+def stream_format(request):
+    """
+    Tell whether and how the listing should be streamed.
+
+    :param request: Current request
+    :return: `ndjson`, `json`, or None for a regular response
+    """
+    if request.args.get("format") == "ndjson" or (
+        request.accept_mimetypes.best_match([JSON_MIMETYPE, NDJSON_MIMETYPE])
+        == NDJSON_MIMETYPE
+    ):
+        return "ndjson"
+    if request.args.get("stream", "").lower() == "true":
+        return "json"
+    return None
+
+
+def page_size_error(limit, streamed):
+    """
+    Check a page size against the cap on non-streamed listings.
+
+    :param limit: Requested page size
+    :param streamed: Whether the listing will be streamed
+    :return: Error message, or None when the page size is allowed
+    """
+    max_page_size = current_app.config.get("MAX_PAGE_SIZE")
+    if streamed or not max_page_size or limit <= max_page_size:
+        return None
+    return (
+        f"Limit must be at most {max_page_size}. Use stream=true or "
+        f"Accept: {NDJSON_MIMETYPE} for larger pages."
+    )
+
+
+def streamed_page(page_data, output_format, chunk_size=100):
+    """
+    Build a streamed response out of a listing page with lazy records.
+
+    :param page_data: Listing envelope whose `records` is an iterable
+    :param output_format: `json` for the page envelope, `ndjson` for one record
+        per line
+    :param chunk_size: Number of records serialized per written chunk
+    :return: Flask response
+    """
+    dumps = current_app.json.dumps
+    records = iter(page_data["records"])
+    metadata = {key: value for key, value in page_data.items() if key != "records"}
+
+    def batches():
+        while True:
+            batch = list(islice(records, chunk_size))
+            if not batch:
+                return
+            yield batch
+
+    def ndjson_body():
+        for batch in batches():
+            yield "".join(dumps(record) + "\n" for record in batch)
+
+    def json_body():
+        # Open the envelope with the page metadata, then fill in the records
+        yield (dumps(metadata)[:-1] + "," if metadata else "{") + '"records":['
+        separator = ""
+        for batch in batches():
+            yield separator + ",".join(map(dumps, batch))
+            separator = ","
+        yield "]}"
+
+    if output_format == "ndjson":
+        headers = {}
+        if "total_record_count" in metadata:
+            headers["X-Total-Count"] = str(metadata["total_record_count"])
+        return Response(
+            stream_with_context(ndjson_body()),
+            mimetype=NDJSON_MIMETYPE,
+            headers=headers,
+        )
+    return Response(stream_with_context(json_body()), mimetype=JSON_MIMETYPE)
+
+
+def streamed_export(fields, records, output_format, chunk_size=500):
+    """
+    Build a streamed NDJSON or CSV response out of exported records.
+
+    :param fields: Names of the exported fields, used as CSV columns
+    :param records: Iterable of dictionaries with JSON serializable values
+    :param output_format: `ndjson` or `csv`
+    :param chunk_size: Number of records serialized per written chunk
+    :return: Flask response
+    """
+    dumps = current_app.json.dumps
+    records = iter(records)
+
+    def ndjson_body():
+        while batch := list(islice(records, chunk_size)):
+            yield "".join(dumps(record) + "\n" for record in batch)
+
+    def csv_body():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=fields)
+        writer.writeheader()
+        while True:
+            # Hand over what was written so far and reuse the buffer
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            batch = list(islice(records, chunk_size))
+            if not batch:
+                return
+            writer.writerows(batch)
+
+    if output_format == "csv":
+        return Response(stream_with_context(csv_body()), mimetype=CSV_MIMETYPE)
+    return Response(stream_with_context(ndjson_body()), mimetype=NDJSON_MIMETYPE)
@@ -9,7 +9,12 @@ from functools import reduce
 from validator_collection import checkers
 
 from app import mongo
+from app.helpers.event_dedup import RecentEvents
 from bson import ObjectId, errors
+from pymongo.errors import DuplicateKeyError
+
+# Ids of the events applied lately, to skip redeliveries
+recent_events = RecentEvents()
 
 
 def json_serialize(obj):
@@ -48,30 +53,53 @@ def json_deserialize(obj):
 # Handle all backend events
 def handle_events(message):
     """
-    Processes backend events based on recieved message.
+    Processes backend events based on recieved message, skipping the ones this
+    process applied recently.
 
     :param message: A redis broadcast message
     """
 
     data = json.loads(message["data"], object_hook=json_deserialize)
+    event_id = data.pop("event_id", None)
+    if event_id is not None and event_id in recent_events:
+        return
+    apply_event(data)
+    if event_id is not None:
+        recent_events.add(event_id)
+
+
+def apply_event(data):
+    """
+    Apply a backend event to MongoDB. Events whose document was already
+    inserted, i.e. redelivered past the dedup window, are skipped.
+
+    :param data: Deserialized event, without its id
+    """
     if data["event"] == "user_enrolled":
         # Process the event and update MongoDB
         user = data
         del user["event"]
-        mongo.db.users.insert_one(user)
+        try:
+            mongo.db.users.insert_one(user)
+        except DuplicateKeyError:
+            return
         print("user enrolled on backend.")
     elif data["event"] == "book_borrowed":
         # Process the event and update MongoDB
         borrow_record = data
         del borrow_record["event"]
-        mongo.db.borrow_records.insert_one(borrow_record)
+        borrow_record.pop("available_copies", None)
+        try:
+            mongo.db.borrow_records.insert_one(borrow_record)
+        except DuplicateKeyError:
+            return  # The copy was already taken
+
+        # Take the copy, which is due back no earlier than the open loans
         mongo.db.books.update_one(
             {"_id": borrow_record["book_id"]},
             {
-                "$set": {
-                    "available": False,
-                    "available_on": borrow_record["borrowed_until"],
-                }
+                "$inc": {"available_copies": -1},
+                "$min": {"available_on": borrow_record["borrowed_until"]},
             },
         )
         print("Borrow record registered on backend.")
@@ -89,6 +117,33 @@ def stringify_validation_errors(errors_object):
     )
 
 
+def split_list_param(val):
+    """
+    Split a comma separated query parameter into its non-empty items.
+
+    :param val: Raw query parameter value, or None when it was not provided
+    :return: List of stripped items, or None when the parameter is absent
+    """
+    if val is None:
+        return None
+    return [item.strip() for item in val.split(",") if item.strip()]
+
+
+def project_document(document, fields):
+    """
+    Keep only the requested fields of a document, plus its `_id` as a string.
+
+    :param document: MongoDB document
+    :param fields: Names of the fields to keep
+    :return: Dictionary with `_id` and the requested fields
+    """
+    record = {"_id": str(document["_id"])}
+    for field in fields:
+        if field != "_id":
+            record[field] = document[field]
+    return record
+
+
 def is_valid_string(val):
     return checkers.is_string(val) and val.strip()
 
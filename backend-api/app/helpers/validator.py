@@ -1,4 +1,7 @@
+from datetime import datetime
+
 from app.helpers.utils import (
+    is_valid_object_id,
     is_valid_string,
 )
 
@@ -22,6 +25,92 @@ class APIValidator:
             errors["publisher"] = "Publisher is required."
         if "category" not in book_data or not is_valid_string(book_data["category"]):
             errors["category"] = "Category is required."
+        copies = book_data.get("copies")
+        if copies not in (None, "") and not (str(copies).isdigit() and int(copies) > 0):
+            errors["copies"] = "Copies must be a positive number."
+
+        return APIValidator.resolve_errors(errors)
+
+    @staticmethod
+    def validate_fields(fields, allowed_fields):
+        """Validate a sparse fieldset against the fields an endpoint returns"""
+        errors = {}
+
+        if fields is not None:
+            unknown_fields = [
+                field
+                for field in fields
+                if field != "_id" and field not in allowed_fields
+            ]
+            if not fields:
+                errors["fields"] = "At least one field is required."
+            elif unknown_fields:
+                errors["fields"] = (
+                    f"Unknown fields: {', '.join(unknown_fields)}. "
+                    f"Fields must be among {', '.join(allowed_fields)}."
+                )
+
+        return APIValidator.resolve_errors(errors)
+
+    @staticmethod
+    def validate_export(collection, params, collections):
+        """Validate the collection and parameters of an export"""
+        errors = {}
+
+        if collection not in collections:
+            errors["collection"] = (
+                f"Collection must be one of {', '.join(collections)}."
+            )
+        if params.get("format", "ndjson") not in ("ndjson", "csv"):
+            errors["format"] = "Format must be ndjson or csv."
+        if "since" in params:
+            try:
+                datetime.fromisoformat(params["since"])
+            except ValueError:
+                errors["since"] = "Since must be an ISO 8601 date or datetime."
+        if "batch_size" in params and not (
+            params["batch_size"].isdigit() and 1 <= int(params["batch_size"]) <= 10000
+        ):
+            errors["batch_size"] = "Batch size must be a number between 1 and 10000."
+
+        return APIValidator.resolve_errors(errors)
+
+    @staticmethod
+    def validate_sync(collection, prefix, collections):
+        """Validate the collection and bucket prefix of a sync request"""
+        errors = {}
+
+        if collection not in collections:
+            errors["collection"] = (
+                f"Collection must be one of {', '.join(collections)}."
+            )
+        if len(prefix) > 24 or any(char not in "0123456789abcdef" for char in prefix):
+            errors["prefix"] = "Prefix must be at most 24 lowercase hex digits."
+
+        return APIValidator.resolve_errors(errors)
+
+    @staticmethod
+    def validate_sync_records(records, prefix):
+        """Validate the records replacing a bucket"""
+        errors = {}
+
+        if not isinstance(records, list) or not all(
+            isinstance(record, dict)
+            and is_valid_object_id(record.get("_id"))
+            and record["_id"].endswith(prefix[::-1])
+            for record in records
+        ):
+            errors["records"] = "Records must be objects with an _id in the bucket."
+
+        return APIValidator.resolve_errors(errors)
+
+    @staticmethod
+    def validate_return_book(data):
+        """Validate the borrower of a returned book"""
+        errors = {}
+
+        if not isinstance(data, dict) or not is_valid_object_id(data.get("user_id")):
+            errors["user_id"] = "User ID must be a valid ObjectId."
 
         return APIValidator.resolve_errors(errors)
 
@@ -2,21 +2,58 @@
 Controller Module handling all backend api enpoint routing
 """
 
-from flask import Blueprint, jsonify, request
+import codecs
+from datetime import datetime
+from itertools import chain
+
+from flask import Blueprint, current_app, jsonify, request
 
 from app import mongo, r
 from app.services import (
     add_book_service,
+    export_service,
+    import_books_service,
+    list_overdue_loans_service,
     list_unavailable_books_service,
     list_users_service,
     list_users_with_borrowed_books_service,
     remove_book_service,
+    replace_sync_records_service,
+    return_book_service,
+    snapshot_books_service,
+    sync_buckets_service,
+    sync_records_service,
+    UNAVAILABLE_BOOK_FIELDS,
+    USER_FIELDS,
+    EXPORT_FIELDS,
+    SYNC_PUSHED_COLLECTIONS,
+)
+from app.helpers.anti_entropy import SYNC_FIELDS
+from app.helpers.auth import admin_required
+from app.helpers.book_import import ensure_import_index, read_rows
+from app.helpers.event_log import event_position
+from app.helpers.streaming import (
+    page_size_error,
+    stream_format,
+    streamed_export,
+    streamed_page,
+)
+from app.helpers.utils import (
+    is_valid_object_id,
+    split_list_param,
+    stringify_validation_errors,
 )
-from app.helpers.utils import stringify_validation_errors
 from app.helpers.validator import APIValidator
 
 admin_bp = Blueprint("admin_bp", __name__, url_prefix="/admin")
 
+# Import file format of each accepted request body type
+IMPORT_FORMATS = {
+    "text/csv": "csv",
+    "application/x-ndjson": "jsonl",
+    "application/jsonl": "jsonl",
+}
+
 
 @admin_bp.route("/books", methods=["POST"])
 def add_book():
@@ -32,6 +69,38 @@ def add_book():
     return jsonify({"message": "Book added successfully!", "book": book}), 201
 
 
+@admin_bp.route("/books/import", methods=["POST"])
+@admin_required
+def import_books():
+    # The body is read line by line, it can be larger than the available memory
+    file_format = IMPORT_FORMATS.get(request.mimetype)
+    if file_format is None:
+        return (
+            jsonify(
+                {"message": "Content-Type must be text/csv or application/x-ndjson."}
+            ),
+            415,
+        )
+    chunk_size = int(
+        request.args.get(
+            "chunk_size", current_app.config.get("IMPORT_CHUNK_SIZE", 1000)
+        )
+    )
+    max_rejects = current_app.config.get("IMPORT_MAX_REJECTS", 100)
+
+    # Report the first rejected rows, the totals count all of them
+    rejects = []
+
+    def on_reject(line_number, row, errors):
+        if len(rejects) < max_rejects:
+            rejects.append({"line": line_number, "row": row, "errors": errors})
+
+    ensure_import_index(mongo)
+    rows = read_rows(codecs.iterdecode(request.stream, "utf-8-sig"), file_format)
+    totals = import_books_service(mongo, r, rows, chunk_size, on_reject=on_reject)
+    return jsonify({**totals, "rejects": rejects}), 200
+
+
 @admin_bp.route("/books/<book_id>", methods=["DELETE"])
 def remove_book(book_id):
     event = remove_book_service(mongo, r, book_id)
@@ -40,14 +109,57 @@ def remove_book(book_id):
     return jsonify({"message": "Book removed successfully!"}), 200
 
 
+@admin_bp.route("/books/<book_id>/return", methods=["POST"])
+def return_book(book_id):
+    if not is_valid_object_id(book_id):
+        return jsonify({"message": "Book not found"}), 404
+
+    # A book may be lent to several users, the borrower picks the loan to close
+    data = request.get_json(silent=True)
+    errors, is_valid = APIValidator.validate_return_book(data)
+    if not is_valid:
+        return jsonify({"message": stringify_validation_errors(errors)}), 400
+
+    borrow_record, error, code = return_book_service(
+        mongo, r, book_id, data["user_id"]
+    )
+    if error:
+        return jsonify({"message": error}), code
+
+    return jsonify({"message": f"Book returned on {borrow_record['returned_on']}"}), 200
+
+
 @admin_bp.route("/users", methods=["GET"])
 def list_users():
     page = int(request.args.get("page", 1))  # Default to page 1 if not provided
     limit = int(
         request.args.get("limit", 10)
     )  # Default to 10 items per page if not provided
+    fields = split_list_param(request.args.get("fields"))
 
-    users_data = list_users_service(mongo, page=page, limit=limit)
+    # Validate the requested fields
+    errors, is_valid = APIValidator.validate_fields(fields, USER_FIELDS)
+    if not is_valid:
+        return jsonify({"message": stringify_validation_errors(errors)}), 400
+    fields = fields or USER_FIELDS  # Default to every field if not provided
+
+    # Pages beyond the size cap must be streamed
+    output_format = stream_format(request)
+    error = page_size_error(limit, streamed=output_format is not None)
+    if error:
+        return jsonify({"message": error}), 400
+
+    if output_format:
+        users_data = list_users_service(
+            mongo,
+            page=page,
+            limit=limit,
+            fields=fields,
+            batch_size=current_app.config.get("STREAM_BATCH_SIZE", 500),
+        )
+        return streamed_page(users_data, output_format)
+
+    users_data = list_users_service(mongo, page=page, limit=limit, fields=fields)
     return jsonify(users_data), 200
 
 
@@ -62,12 +174,142 @@ def list_borrow_records():
     return jsonify(records_data), 200
 
 
+@admin_bp.route("/borrows/overdue", methods=["GET"])
+def list_overdue_loans():
+    page = int(request.args.get("page", 1))  # Default to page 1 if not provided
+    limit = int(
+        request.args.get("limit", 10)
+    )  # Default to 10 items per page if not provided
+
+    error = page_size_error(limit, streamed=False)
+    if error:
+        return jsonify({"message": error}), 400
+
+    loans_data = list_overdue_loans_service(mongo, page=page, limit=limit)
+    return jsonify(loans_data), 200
+
+
 @admin_bp.route("/books/unavailable", methods=["GET"])
 def list_unavailable_books():
     page = int(request.args.get("page", 1))  # Default to page 1 if not provided
     limit = int(
         request.args.get("limit", 10)
     )  # Default to 10 items per page if not provided
+    fields = split_list_param(request.args.get("fields"))
+
+    # Validate the requested fields
+    errors, is_valid = APIValidator.validate_fields(fields, UNAVAILABLE_BOOK_FIELDS)
+    if not is_valid:
+        return jsonify({"message": stringify_validation_errors(errors)}), 400
+    fields = fields or UNAVAILABLE_BOOK_FIELDS  # Default to every field if not provided
 
-    books_data = list_unavailable_books_service(mongo, page=page, limit=limit)
+    books_data = list_unavailable_books_service(
+        mongo, page=page, limit=limit, fields=fields
+    )
     return jsonify(books_data), 200
+
+
+@admin_bp.route("/export/<collection>", methods=["GET"])
+@admin_required
+def export_collection(collection):
+    params = request.args.to_dict()
+
+    # Validate the collection and export parameters
+    errors, is_valid = APIValidator.validate_export(collection, params, EXPORT_FIELDS)
+    if not is_valid:
+        return jsonify({"message": stringify_validation_errors(errors)}), 400
+
+    output_format = params.get("format", "ndjson")  # Default to NDJSON if not provided
+    since = datetime.fromisoformat(params["since"]) if "since" in params else None
+    batch_size = int(
+        params.get("batch_size", current_app.config.get("EXPORT_BATCH_SIZE", 1000))
+    )
+
+    # Pass this back as `since` for the next incremental export
+    exported_until = datetime.utcnow().isoformat()
+
+    fields, records = export_service(mongo, collection, since, batch_size)
+    response = streamed_export(fields, records, output_format)
+    response.headers["X-Export-Until"] = exported_until
+    return response
+
+
+@admin_bp.route("/snapshot/books", methods=["GET"])
+@admin_required
+def snapshot_books():
+    after = request.args.get("after")  # Last book id of an interrupted snapshot
+    if after is not None and not is_valid_object_id(after):
+        return jsonify({"message": "After must be a valid book id."}), 400
+    batch_size = int(
+        request.args.get(
+            "batch_size", current_app.config.get("SNAPSHOT_BATCH_SIZE", 5000)
+        )
+    )
+
+    # Mark the event position before reading, the events published while the
+    # snapshot is read are replayed on top of it
+    position = event_position(r)
+    marker = {
+        "snapshot": "books",
+        "position": position,
+        "taken_at": datetime.utcnow().isoformat(),
+    }
+
+    books = snapshot_books_service(mongo, after, batch_size)
+    response = streamed_export(
+        None, chain([marker], books), "ndjson", chunk_size=batch_size
+    )
+    response.headers["X-Snapshot-Position"] = position
+    return response
+
+
+@admin_bp.route("/sync/<collection>/buckets", methods=["GET"])
+@admin_required
+def get_sync_buckets(collection):
+    prefix = request.args.get("prefix", "")  # Default to the whole collection
+
+    # Validate the collection and bucket
+    errors, is_valid = APIValidator.validate_sync(collection, prefix, SYNC_FIELDS)
+    if not is_valid:
+        return jsonify({"message": stringify_validation_errors(errors)}), 400
+
+    batch_size = current_app.config.get("SYNC_BATCH_SIZE", 5000)
+    buckets_data = sync_buckets_service(mongo, collection, prefix, batch_size)
+    return jsonify(buckets_data), 200
+
+
+@admin_bp.route("/sync/<collection>/records", methods=["GET"])
+@admin_required
+def get_sync_records(collection):
+    prefix = request.args.get("prefix", "")  # Default to the whole collection
+
+    # Validate the collection and bucket
+    errors, is_valid = APIValidator.validate_sync(collection, prefix, SYNC_FIELDS)
+    if not is_valid:
+        return jsonify({"message": stringify_validation_errors(errors)}), 400
+
+    records_data = sync_records_service(mongo, collection, prefix)
+    return jsonify(records_data), 200
+
+
+@admin_bp.route("/sync/<collection>/records", methods=["PUT"])
+@admin_required
+def replace_sync_records(collection):
+    data = request.get_json()
+    prefix = request.args.get("prefix", "")  # Default to the whole collection
+
+    # Only the collections owned by the frontend are repaired from its copy
+    errors, is_valid = APIValidator.validate_sync(
+        collection, prefix, SYNC_PUSHED_COLLECTIONS
+    )
+    if is_valid:
+        errors, is_valid = APIValidator.validate_sync_records(
+            data.get("records") if isinstance(data, dict) else None, prefix
+        )
+    if not is_valid:
+        return jsonify({"message": stringify_validation_errors(errors)}), 400
+
+    repair_data = replace_sync_records_service(
+        mongo, collection, prefix, data["records"]
+    )
+    return jsonify(repair_data), 200
@@ -1,24 +1,110 @@
 import json
+from datetime import datetime, timedelta
+from itertools import islice
 from bson.objectid import ObjectId
-from app.helpers.utils import json_serialize
+from app.helpers.anti_entropy import (
+    SYNC_FIELDS,
+    bucket_hashes,
+    bucket_records,
+    replace_bucket,
+)
+from app.helpers.db_indexes import OPEN_LOAN, OVERDUE_LOAN
+from app.helpers.event_log import publish_event
+from app.helpers.inventory import refresh_due_dates, release_operations, released_copies
+from app.helpers.utils import json_serialize, project_document
+from app.helpers.validator import APIValidator
 from app.helpers.aggregate_pipelines import users_borrowed
 
+# Fields returned for each record by the listings
+USER_FIELDS = ("email", "first_name", "last_name", "enrollment_date")
+UNAVAILABLE_BOOK_FIELDS = (
+    "title",
+    "author",
+    "publisher",
+    "category",
+    "total_copies",
+    "available_on",
+)
 
-# Dependency injection of services (mongo, redis)
-def add_book_service(mongo, redis, book_data):
-    book = {
+# Fields read from each row of an import, and those identifying duplicates
+IMPORT_FIELDS = ("title", "author", "publisher", "category")
+IMPORT_KEY_FIELDS = ("title", "author", "publisher")
+
+OVERDUE_LOAN_FIELDS = ("user_id", "book_id", "borrowed_on", "borrowed_until")
+
+# Fields of each book of a catalogue snapshot
+SNAPSHOT_FIELDS = (
+    "_id",
+    "title",
+    "author",
+    "publisher",
+    "category",
+    "added_at",
+    "total_copies",
+    "available_copies",
+)
+
+# Id of the `job_state` document of the overdue loans job
+OVERDUE_JOB_ID = "overdue_loans"
+
+# Synchronized collections whose frontend copy is the reference
+SYNC_PUSHED_COLLECTIONS = ("users",)
+
+# Columns written for each record of the exportable collections
+EXPORT_FIELDS = {
+    "users": ("_id", "email", "first_name", "last_name", "enrollment_date"),
+    "books": (
+        "_id",
+        "title",
+        "author",
+        "publisher",
+        "category",
+        "added_at",
+        "total_copies",
+        "available_copies",
+        "available_on",
+    ),
+    "borrow_records": (
+        "_id",
+        "user_id",
+        "book_id",
+        "borrowed_on",
+        "borrowed_until",
+        "returned_on",
+    ),
+}
+
+
+def new_book(book_data):
+    """
+    Build the document of a book being added to the catalogue.
+
+    :param book_data: Validated book data, optionally with a number of
+        `copies`, one by default
+    :return: Book document
+    """
+    copies = int(book_data.get("copies") or 1)
+    return {
         "title": book_data["title"],
         "author": book_data["author"],
         "publisher": book_data["publisher"],
         "category": book_data["category"],
+        "added_at": datetime.utcnow(),
+        "total_copies": copies,
+        "available_copies": copies,
     }
+
+
+# Dependency injection of services (mongo, redis)
+def add_book_service(mongo, redis, book_data):
+    book = new_book(book_data)
     mongo.db.books.insert_one(book)
 
     book_event = book.copy()
     book_event["event"] = "book_added"
     if "_id" in book:
         book["_id"] = str(book["_id"])
-    redis.publish("frontend_events", json.dumps(book_event, default=json_serialize))
+    publish_event(redis, book_event)
     return book
 
 
@@ -28,11 +114,11 @@ def remove_book_service(mongo, redis, book_id):
         return None
 
     book_event = {"event": "book_removed", "_id": book_id}
-    redis.publish("frontend_events", json.dumps(book_event, default=json_serialize))
+    publish_event(redis, book_event)
     return book_event
 
 
-def list_users_service(mongo, page=1, limit=10):
+def list_users_service(mongo, page=1, limit=10, fields=USER_FIELDS, batch_size=None):
     query = {}
     # Calculate how many documents to skip
     skip = (page - 1) * limit
@@ -40,22 +126,18 @@ def list_users_service(mongo, page=1, limit=10):
     # Get the total number of users matching the query (before applying skip/limit)
     count = mongo.db.users.count_documents(query)
 
-    # Retrieve paginated results from the database
-    users = mongo.db.users.find(query, skip=skip, limit=limit)
+    # Retrieve paginated results from the database, fetching only the needed fields
+    projection = {field: 1 for field in fields}
+    options = {"batch_size": batch_size} if batch_size else {}
+    users = mongo.db.users.find(query, projection, skip=skip, limit=limit, **options)
+
+    # Streamed pages are serialized lazily, one cursor batch at a time
+    records = (project_document(user, fields) for user in users)
     return {
         "page_number": page,
         "page_size": limit,
         "total_record_count": count,
-        "records": [
-            {
-                "_id": str(user["_id"]),
-                "email": user["email"],
-                "first_name": user["first_name"],
-                "last_name": user["last_name"],
-                "enrollment_date": user["enrollment_date"],
-            }
-            for user in users
-        ],
+        "records": records if batch_size else list(records),
     }
 
 
@@ -88,8 +170,10 @@ def list_users_with_borrowed_books_service(mongo, page=1, limit=10):
     }
 
 
-def list_unavailable_books_service(mongo, page=1, limit=10):
-    query = {"available": False}
+def list_unavailable_books_service(
+    mongo, page=1, limit=10, fields=UNAVAILABLE_BOOK_FIELDS
+):
+    query = {"available_copies": 0}
 
     # Calculate how many documents to skip
     skip = (page - 1) * limit
@@ -97,21 +181,399 @@ def list_unavailable_books_service(mongo, page=1, limit=10):
     # Get the total number of books matching the query (before applying skip/limit)
     total_count = mongo.db.books.count_documents(query)
 
-    # Retrieve paginated results from the database
-    unavailable_books = mongo.db.books.find(query, skip=skip, limit=limit)
+    # Retrieve paginated results from the database, fetching only the needed fields
+    projection = {field: 1 for field in fields}
+    unavailable_books = mongo.db.books.find(query, projection, skip=skip, limit=limit)
+
+    records = [project_document(book, fields) for book in unavailable_books]
+    for record in records:
+        if "available_on" in record:
+            record["available_on"] = str(record["available_on"])
+
     return {
         "page_number": page,
         "page_size": limit,
         "total_record_count": total_count,
-        "records": [
-            {
-                "_id": str(book["_id"]),
-                "title": book["title"],
-                "author": book["author"],
-                "publisher": book["publisher"],
-                "category": book["category"],
-                "available_on": str(book["available_on"]),
-            }
-            for book in unavailable_books
-        ],
+        "records": records,
+    }
+
+
+def export_service(mongo, collection, since=None, batch_size=1000):
+    """
+    Read a whole collection in `_id` order from a single cursor.
+
+    :param mongo: MongoDB instance
+    :param collection: One of the exportable collections
+    :param since: Only export documents created at or after this datetime
+    :param batch_size: Number of documents fetched per round trip
+    :return: Tuple of the exported fields and a lazy iterator of records
+    """
+    fields = EXPORT_FIELDS[collection]
+
+    # ObjectIds start with their creation time, so the _id index serves `since`
+    query = {"_id": {"$gte": ObjectId.from_datetime(since)}} if since else {}
+    documents = mongo.db[collection].find(
+        query,
+        {field: 1 for field in fields},
+        sort=[("_id", 1)],
+        batch_size=batch_size,
+    )
+
+    records = (
+        {
+            field: (
+                json_serialize(document[field])
+                if isinstance(document.get(field), (datetime, ObjectId))
+                else document.get(field)
+            )
+            for field in fields
+        }
+        for document in documents
+    )
+    return fields, records
+
+
+def snapshot_books_service(mongo, after=None, batch_size=1000):
+    """
+    Read the current state of every book in `_id` order from a single cursor.
+
+    Missing fields are left out rather than written as null, which keeps the
+    snapshot compact.
+
+    :param mongo: MongoDB instance
+    :param after: Only read the books whose id is greater, to resume a snapshot
+    :param batch_size: Number of documents fetched per round trip
+    :return: Lazy iterator of JSON serializable books
+    """
+    query = {"_id": {"$gt": ObjectId(after)}} if after else {}
+    documents = mongo.db.books.find(
+        query,
+        {field: 1 for field in SNAPSHOT_FIELDS},
+        sort=[("_id", 1)],
+        batch_size=batch_size,
+    )
+    return (
+        {
+            field: (
+                json_serialize(value)
+                if isinstance(value, (datetime, ObjectId))
+                else value
+            )
+            for field, value in document.items()
+            if value is not None
+        }
+        for document in documents
+    )
+
+
+def import_books_service(
+    mongo, redis, rows, chunk_size=1000, on_reject=None, on_chunk=None
+):
+    """
+    Validate, deduplicate and insert a stream of books chunk by chunk. Rows
+    may give the number of `copies` of their book, one by default.
+
+    Each chunk is inserted with a single `insert_many` and announced with a
+    single `books_added` event. Books matching the title, author and publisher
+    of a catalogue book, or of an earlier row of the chunk, are skipped, which
+    also makes replaying a chunk after an interruption harmless.
+
+    :param mongo: MongoDB instance
+    :param redis: Redis instance
+    :param rows: Iterable of (line number, row) tuples
+    :param chunk_size: Number of rows per chunk
+    :param on_reject: Called with the line number, row and errors of each
+        invalid row
+    :param on_chunk: Called with the last line number of each completed chunk
+        and the running totals
+    :return: Dictionary of processed, inserted, duplicate and rejected counts
+    """
+    totals = {"processed": 0, "inserted": 0, "duplicates": 0, "rejected": 0}
+    rows = iter(rows)
+
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return totals
+
+        books = {}  # (title, author, publisher) -> book, in row order
+        for line_number, row in chunk:
+            totals["processed"] += 1
+            if isinstance(row, dict):
+                errors, is_valid = APIValidator.validate_add_book(row)
+            else:
+                errors, is_valid = {"row": "Row must be an object."}, False
+            if not is_valid:
+                totals["rejected"] += 1
+                if on_reject:
+                    on_reject(line_number, row, errors)
+                continue
+
+            book = new_book(
+                {field: row[field].strip() for field in IMPORT_FIELDS}
+                | {"copies": row.get("copies")}
+            )
+            key = tuple(book[field] for field in IMPORT_KEY_FIELDS)
+            if key in books:
+                totals["duplicates"] += 1
+            else:
+                books[key] = book
+
+        # Drop the books already in the catalogue
+        if books:
+            existing = mongo.db.books.find(
+                {"$or": [dict(zip(IMPORT_KEY_FIELDS, key)) for key in books]},
+                {field: 1 for field in IMPORT_KEY_FIELDS},
+            )
+            for book in existing:
+                key = tuple(book[field] for field in IMPORT_KEY_FIELDS)
+                if books.pop(key, None) is not None:
+                    totals["duplicates"] += 1
+
+        if books:
+            documents = list(books.values())
+            mongo.db.books.insert_many(documents, ordered=False)
+            totals["inserted"] += len(documents)
+
+            # Announce the whole chunk with one event
+            publish_event(redis, {"event": "books_added", "books": documents})
+
+        if on_chunk:
+            on_chunk(chunk[-1][0], dict(totals))
+
+
+def sync_buckets_service(mongo, collection, prefix="", batch_size=5000):
+    """
+    Hash the child buckets of a bucket of a synchronized collection.
+
+    :param mongo: MongoDB instance
+    :param collection: One of the synchronized collections
+    :param prefix: Path of the bucket, empty for the root
+    :param batch_size: Number of documents fetched per round trip
+    :return: Dictionary with the prefix and the hash of every child bucket
+    """
+    buckets = bucket_hashes(
+        mongo.db[collection], SYNC_FIELDS[collection], prefix, batch_size
+    )
+    return {"prefix": prefix, "buckets": buckets}
+
+
+def sync_records_service(mongo, collection, prefix):
+    """
+    Read the records of a bucket of a synchronized collection.
+
+    :return: Dictionary with the prefix and the records of the bucket
+    """
+    records = bucket_records(mongo.db[collection], SYNC_FIELDS[collection], prefix)
+    return {"prefix": prefix, "records": records}
+
+
+def replace_sync_records_service(mongo, collection, prefix, records):
+    """
+    Repair a bucket of a synchronized collection with the frontend records.
+
+    :return: Dictionary of inserted, updated and deleted counts
+    """
+    return replace_bucket(
+        mongo.db[collection], SYNC_FIELDS[collection], prefix, records
+    )
+
+
+def release_loans(mongo, redis, loans, returned_on):
+    """
+    Close a batch of open loans and give their copies back.
+
+    The borrow records and book counters are updated with one bulk write each,
+    and the frontend is told with a single `books_released` event. A return may
+    race another one, or the loan sweeper, so the loans are closed by an update
+    tagged with an id unique to this call, and only the loans it closed give
+    their copies back and are announced.
+
+    :param mongo: MongoDB instance
+    :param redis: Redis instance
+    :param loans: Borrow records with their `_id`, `user_id` and `book_id`
+    :param returned_on: Return date of the loans
+    :return: Number of loans released by this call
+    """
+    if not loans:
+        return 0
+    loan_ids = [loan["_id"] for loan in loans]
+    release_id = ObjectId()
+
+    mongo.db.borrow_records.update_many(
+        {"_id": {"$in": loan_ids}, **OPEN_LOAN},
+        {
+            "$set": {"returned_on": returned_on, "release_id": release_id},
+            "$unset": {"overdue": ""},
+        },
+    )
+    closed = list(
+        mongo.db.borrow_records.find(
+            {"_id": {"$in": loan_ids}, "release_id": release_id},
+            {"_id": 1, "user_id": 1, "book_id": 1},
+        )
+    )
+    if not closed:
+        return 0
+
+    released = released_copies(closed)
+    mongo.db.books.bulk_write(release_operations(released), ordered=False)
+    refresh_due_dates(mongo, list(released))
+
+    releases = [
+        {
+            "_id": loan["_id"],
+            "user_id": loan.get("user_id"),
+            "book_id": loan["book_id"],
+            "returned_on": returned_on,
+        }
+        for loan in closed
+    ]
+    publish_event(redis, {"event": "books_released", "loans": releases})
+    return len(closed)
+
+
+def return_book_service(mongo, redis, book_id, user_id):
+    """
+    Record the return of a book borrowed by a user.
+
+    :param mongo: MongoDB instance
+    :param redis: Redis instance
+    :param book_id: Returned book's _id
+    :param user_id: Borrower's _id
+    :return: Tuple of the closed borrow record, an error message and a status
+    """
+    if mongo.db.books.find_one({"_id": ObjectId(book_id)}, {"_id": 1}) is None:
+        return None, "Book not found", 404
+
+    loan = mongo.db.borrow_records.find_one(
+        {"book_id": ObjectId(book_id), "user_id": ObjectId(user_id), **OPEN_LOAN},
+        {"_id": 1, "user_id": 1, "book_id": 1},
+    )
+    if loan is None:
+        return None, "Book is not borrowed by this user", 400
+
+    returned_on = datetime.utcnow()
+    if not release_loans(mongo, redis, [loan], returned_on):
+        return None, "Book is not borrowed by this user", 400  # Returned concurrently
+    loan["returned_on"] = returned_on
+    return loan, None, 200
+
+
+def release_expired_loans_service(
+    mongo, redis, now=None, grace_days=14, batch_size=500
+):
+    """
+    Release the open loans whose due date passed more than `grace_days` ago,
+    one batch at a time.
+
+    Loans are selected through the partial index on the due date of open loans,
+    oldest first, and every batch is released with bulk updates and announced
+    with one event.
+
+    :param mongo: MongoDB instance
+    :param redis: Redis instance
+    :param now: Current time, defaults to the current UTC time
+    :param grace_days: Days a book may be kept after its due date
+    :param batch_size: Number of loans released per batch
+    :return: Number of released loans
+    """
+    now = now or datetime.utcnow()
+    query = {"borrowed_until": {"$lt": now - timedelta(days=grace_days)}, **OPEN_LOAN}
+
+    released = 0
+    while True:
+        loans = list(
+            mongo.db.borrow_records.find(
+                query,
+                {"_id": 1, "user_id": 1, "book_id": 1},
+                sort=[("borrowed_until", 1)],
+                limit=batch_size,
+            )
+        )
+        released += release_loans(mongo, redis, loans, now)
+        if len(loans) < batch_size:
+            return released
+
+
+def flag_overdue_loans_service(mongo, now=None, batch_size=500):
+    """
+    Flag the open loans that became overdue since the previous run.
+
+    The due date reached by the previous run is kept in the `job_state`
+    collection, so each run only reads the loans that fell due since then,
+    through the index of open loans by due date, one page at a time.
+
+    :param mongo: MongoDB instance
+    :param now: Current time, defaults to the current UTC time
+    :param batch_size: Number of loans flagged per page
+    :return: Number of flagged loans
+    """
+    now = now or datetime.utcnow()
+    state = mongo.db.job_state.find_one({"_id": OVERDUE_JOB_ID})
+    due = {"$lt": now}
+    if state:
+        due["$gte"] = state["checked_until"]
+    query = {"borrowed_until": due, **OPEN_LOAN, "overdue": {"$ne": True}}
+
+    flagged = 0
+    while True:
+        loans = list(
+            mongo.db.borrow_records.find(
+                query, {"_id": 1}, sort=[("borrowed_until", 1)], limit=batch_size
+            )
+        )
+        if loans:
+            mongo.db.borrow_records.update_many(
+                {"_id": {"$in": [loan["_id"] for loan in loans]}},
+                {"$set": OVERDUE_LOAN},
+            )
+            flagged += len(loans)
+        if len(loans) < batch_size:
+            break
+
+    mongo.db.job_state.update_one(
+        {"_id": OVERDUE_JOB_ID}, {"$set": {"checked_until": now}}, upsert=True
+    )
+    return flagged
+
+
+def list_overdue_loans_service(mongo, page=1, limit=10, now=None):
+    """
+    List the flagged overdue loans, longest overdue first.
+
+    :param mongo: MongoDB instance
+    :param now: Current time, defaults to the current UTC time
+    :return: Listing page of overdue loans with their days overdue
+    """
+    now = now or datetime.utcnow()
+
+    # Calculate how many documents to skip
+    skip = (page - 1) * limit
+
+    # Both the count and the page are served by the partial overdue index
+    total_count = mongo.db.borrow_records.count_documents(OVERDUE_LOAN)
+    loans = mongo.db.borrow_records.find(
+        OVERDUE_LOAN,
+        {field: 1 for field in OVERDUE_LOAN_FIELDS},
+        sort=[("borrowed_until", 1)],
+        skip=skip,
+        limit=limit,
+    )
+
+    records = []
+    for loan in loans:
+        record = project_document(loan, OVERDUE_LOAN_FIELDS)
+        record["user_id"] = str(record["user_id"])
+        record["book_id"] = str(record["book_id"])
+        record["days_overdue"] = (now - loan["borrowed_until"]).days
+        record["borrowed_on"] = str(record["borrowed_on"])
+        record["borrowed_until"] = str(record["borrowed_until"])
+        records.append(record)
+
+    return {
+        "page_number": page,
+        "page_size": limit,
+        "total_record_count": total_count,
+        "records": records,
     }
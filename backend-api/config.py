@@ -3,6 +3,21 @@ import os
 class Config:
     MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/backend_library')
     REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+    PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', 'false').lower() == 'true'
+    PROFILER_SAMPLE_RATE = float(os.getenv('PROFILER_SAMPLE_RATE', 0))
+    PROFILER_INTERVAL = float(os.getenv('PROFILER_INTERVAL', 0.005))
+    MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 100))
+    STREAM_BATCH_SIZE = int(os.getenv('STREAM_BATCH_SIZE', 500))
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 1000))
+    IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', 1000))
+    IMPORT_MAX_REJECTS = int(os.getenv('IMPORT_MAX_REJECTS', 100))
+    SNAPSHOT_BATCH_SIZE = int(os.getenv('SNAPSHOT_BATCH_SIZE', 5000))
+    SYNC_BATCH_SIZE = int(os.getenv('SYNC_BATCH_SIZE', 5000))
+    LOAN_RELEASE_GRACE_DAYS = int(os.getenv('LOAN_RELEASE_GRACE_DAYS', 14))
+    LOAN_SWEEP_INTERVAL = int(os.getenv('LOAN_SWEEP_INTERVAL', 0))
+    LOAN_SWEEP_BATCH_SIZE = int(os.getenv('LOAN_SWEEP_BATCH_SIZE', 500))
+    OVERDUE_SWEEP_INTERVAL = int(os.getenv('OVERDUE_SWEEP_INTERVAL', 0))
 
 class TestingConfig(Config):
     TESTING = True
@@ -1,7 +1,15 @@
-from app import app, r
+from app import app, mongo, r
+from app.commands import flag_overdue_loans, release_expired_loans
+from app.helpers.db_indexes import ensure_indexes
+from app.helpers.inventory import migrate_copies
+from app.helpers.scheduler import schedule
 from app.helpers.utils import handle_events
 
 
+# Convert the books stored before the copy counters existed, whose copies the
+# borrow and release events would otherwise miscount
+migrate_copies(mongo)
+
 # Subscribe to the Redis event channel
 pubsub = r.pubsub()
 pubsub.subscribe(**{"backend_events": handle_events})
@@ -9,5 +17,28 @@ pubsub.subscribe(**{"backend_events": handle_events})
 # Start the listener in a separate thread
 pubsub.run_in_thread(sleep_time=0.001)
 
+# Create the MongoDB indexes backing the loan jobs
+ensure_indexes(mongo)
+
+
+def sweep_loans():
+    with app.app_context():
+        release_expired_loans()
+
+
+# Release the expired loans periodically, unless a cron job runs release-loans
+if app.config["LOAN_SWEEP_INTERVAL"]:
+    schedule(r, "loan_sweeper", app.config["LOAN_SWEEP_INTERVAL"], sweep_loans)
+
+
+def flag_overdue():
+    with app.app_context():
+        flag_overdue_loans()
+
+
+# Flag the overdue loans periodically, unless a cron job runs flag-overdue
+if app.config["OVERDUE_SWEEP_INTERVAL"]:
+    schedule(r, "overdue_flagger", app.config["OVERDUE_SWEEP_INTERVAL"], flag_overdue)
+
 if __name__ == "__main__":
     app.run(debug=True, port=5001)
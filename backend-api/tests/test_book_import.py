@@ -0,0 +1,165 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from app import app
+from app.commands import import_books_command
+from app.helpers.book_import import (
+    detect_format,
+    ensure_import_index,
+    load_checkpoint,
+    read_rows,
+    save_checkpoint,
+    write_reject,
+)
+
+BOOK_ROW = "The Hobbit,J. R. R. Tolkien,Allen & Unwin,Fantasy\n"
+
+
+class TestReadRows(unittest.TestCase):
+    def test_detect_format(self):
+        self.assertEqual(detect_format("books.jsonl"), "jsonl")
+        self.assertEqual(detect_format("books.ndjson"), "jsonl")
+        self.assertEqual(detect_format("books.csv"), "csv")
+
+    def test_read_csv_rows(self):
+        lines = io.StringIO(
+            "title,author,publisher,category\n"
+            + BOOK_ROW
+            + '"Emma\nA Novel",Jane Austen,John Murray,Classics\n'
+        )
+
+        rows = list(read_rows(lines, "csv"))
+
+        # Assert rows are numbered by the last line they span
+        self.assertEqual([line_number for line_number, _ in rows], [2, 4])
+        self.assertEqual(rows[0][1]["title"], "The Hobbit")
+        self.assertEqual(rows[1][1]["title"], "Emma\nA Novel")
+
+    def test_read_jsonl_rows(self):
+        lines = io.StringIO('{"title": "Emma"}\n\nnot json\n')
+
+        rows = list(read_rows(lines, "jsonl"))
+
+        # Assert blank lines are skipped and unparsable lines kept as is
+        self.assertEqual(rows, [(1, {"title": "Emma"}), (3, "not json")])
+
+    def test_ensure_import_index(self):
+        mongo = MagicMock()
+
+        ensure_import_index(mongo)
+
+        mongo.db.books.create_index.assert_called_once_with(
+            [("title", 1), ("author", 1), ("publisher", 1)], name="import_dedupe"
+        )
+
+
+class TestCheckpoints(unittest.TestCase):
+    def test_save_and_load_checkpoint(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "books.csv.checkpoint")
+            self.assertIsNone(load_checkpoint(path))
+
+            save_checkpoint(path, {"line": 1001})
+
+            self.assertEqual(load_checkpoint(path), {"line": 1001})
+            self.assertEqual(os.listdir(directory), ["books.csv.checkpoint"])
+
+    def test_write_reject(self):
+        reject_file = io.StringIO()
+
+        write_reject(reject_file, 3, {"title": ""}, {"title": "Title is required."})
+
+        self.assertEqual(
+            json.loads(reject_file.getvalue()),
+            {
+                "line": 3,
+                "row": {"title": ""},
+                "errors": {"title": "Title is required."},
+            },
+        )
+
+
+@patch("app.commands.r")
+@patch("app.commands.mongo")
+class TestImportBooksCommand(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "books.csv")
+        with open(self.path, "w", encoding="utf-8") as import_file:
+            import_file.write("title,author,publisher,category\n")
+            import_file.write(BOOK_ROW)
+            import_file.write(",Nobody,Nowhere,None\n")
+            import_file.write("Emma,Jane Austen,John Murray,Classics\n")
+        self.runner = app.test_cli_runner()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_import_books(self, mock_mongo, mock_redis):
+        mock_redis.xadd.return_value = b"1726840200000-0"
+        mock_mongo.db.books.find.return_value = []
+
+        result = self.runner.invoke(
+            import_books_command, [self.path, "--chunk-size", "2"]
+        )
+
+        # Assert the valid books were inserted chunk by chunk
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(mock_mongo.db.books.insert_many.call_count, 2)
+        self.assertEqual(mock_redis.publish.call_count, 2)
+        self.assertIn("Line 3: 2 processed, 1 inserted", result.output)
+        self.assertIn(
+            "Imported 2 of 3 books (0 duplicates, 1 rejected).", result.output
+        )
+
+        # Assert the invalid row went to the reject file
+        with open(f"{self.path}.rejects.jsonl", encoding="utf-8") as reject_file:
+            rejects = [json.loads(line) for line in reject_file]
+        self.assertEqual([reject["line"] for reject in rejects], [3])
+
+        # Assert the checkpoint of a completed import is removed
+        self.assertFalse(os.path.exists(f"{self.path}.checkpoint"))
+
+    def test_resume_import(self, mock_mongo, mock_redis):
+        mock_redis.xadd.return_value = b"1726840200000-0"
+        mock_mongo.db.books.find.return_value = []
+        with open(f"{self.path}.rejects.jsonl", "w", encoding="utf-8") as reject_file:
+            reject_file.write('{"line": 3}\n')
+            offset = reject_file.tell()
+            reject_file.write('{"line": 3}\n')
+        save_checkpoint(
+            f"{self.path}.checkpoint",
+            {
+                "line": 3,
+                "rejects_offset": offset,
+                "totals": {
+                    "processed": 2,
+                    "inserted": 1,
+                    "duplicates": 0,
+                    "rejected": 1,
+                },
+            },
+        )
+
+        result = self.runner.invoke(import_books_command, [self.path])
+
+        # Assert only the rows after the checkpoint were imported
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("Resuming after line 3.", result.output)
+        documents = mock_mongo.db.books.insert_many.call_args[0][0]
+        self.assertEqual([book["title"] for book in documents], ["Emma"])
+        self.assertIn(
+            "Imported 2 of 3 books (0 duplicates, 1 rejected).", result.output
+        )
+
+        # Assert the rejects written after the checkpoint were dropped
+        with open(f"{self.path}.rejects.jsonl", encoding="utf-8") as reject_file:
+            self.assertEqual(reject_file.read(), '{"line": 3}\n')
+
+
+if __name__ == "__main__":
+    unittest.main()
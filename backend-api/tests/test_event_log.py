@@ -0,0 +1,64 @@
+import json
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+from app.helpers.event_log import (
+    EVENT_LOG_KEY,
+    EVENT_LOG_MAXLEN,
+    event_position,
+    publish_event,
+)
+from bson.objectid import ObjectId
+
+
+class TestEventLog(unittest.TestCase):
+    def setUp(self):
+        self.redis = MagicMock()
+
+    @patch("app.helpers.event_log.new_event_id", return_value="event-1")
+    def test_publish_event(self, mock_new_event_id):
+        book_id = ObjectId()
+        event = {
+            "event": "book_added",
+            "_id": book_id,
+            "added_at": datetime(2024, 9, 20),
+        }
+
+        self.redis.xadd.return_value = b"1726840200000-3"
+
+        publish_event(self.redis, event)
+
+        # Assert the same event was logged and published, under a new id, and
+        # published with its position in the log
+        logged = {
+            "event": "book_added",
+            "_id": str(book_id),
+            "added_at": "2024-09-20T00:00:00",
+            "event_id": "event-1",
+        }
+        self.redis.xadd.assert_called_once_with(
+            EVENT_LOG_KEY,
+            {"data": json.dumps(logged)},
+            maxlen=EVENT_LOG_MAXLEN,
+            approximate=True,
+        )
+        self.redis.publish.assert_called_once_with(
+            "frontend_events",
+            json.dumps({**logged, "log_position": "1726840200000-3"}),
+        )
+
+    def test_event_position(self):
+        self.redis.xrevrange.return_value = [(b"1726840200000-3", {})]
+
+        self.assertEqual(event_position(self.redis), "1726840200000-3")
+        self.redis.xrevrange.assert_called_once_with(EVENT_LOG_KEY, count=1)
+
+    def test_event_position_of_empty_log(self):
+        self.redis.xrevrange.return_value = []
+
+        self.assertEqual(event_position(self.redis), "0-0")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import mongomock
+from app import app
+from app.commands import migrate_copies_command
+from app.helpers.inventory import (
+    merge_duplicate_books,
+    migrate_copies,
+    refresh_due_dates,
+    release_operations,
+    released_copies,
+)
+from bson import ObjectId
+from pymongo import UpdateOne
+
+
+class TestCopyCounters(unittest.TestCase):
+    def test_release_operations(self):
+        book_id, other_book_id = ObjectId(), ObjectId()
+        released = released_copies(
+            [{"book_id": book_id}, {"book_id": other_book_id}, {"book_id": book_id}]
+        )
+
+        # Assert one capped increment per book
+        self.assertEqual(released, {book_id: 2, other_book_id: 1})
+        self.assertEqual(
+            release_operations({book_id: 2})[0],
+            UpdateOne(
+                {"_id": book_id},
+                [
+                    {
+                        "$set": {
+                            "available_copies": {
+                                "$min": [
+                                    {"$add": ["$available_copies", 2]},
+                                    "$total_copies",
+                                ]
+                            }
+                        }
+                    }
+                ],
+            ),
+        )
+
+    def test_refresh_due_dates(self):
+        mongo = MagicMock()
+        mongo.db = mongomock.MongoClient().db
+        book_id, returned_id = ObjectId(), ObjectId()
+        mongo.db.books.insert_many(
+            [
+                {"_id": book_id, "available_on": datetime(2024, 9, 1)},
+                {"_id": returned_id, "available_on": datetime(2024, 9, 1)},
+            ]
+        )
+        mongo.db.borrow_records.insert_many(
+            [
+                {
+                    "book_id": book_id,
+                    "borrowed_until": datetime(2024, 9, 1),
+                    "returned_on": datetime(2024, 9, 2),
+                },
+                {"book_id": book_id, "borrowed_until": datetime(2024, 9, 20)},
+                {"book_id": book_id, "borrowed_until": datetime(2024, 9, 10)},
+            ]
+        )
+
+        refresh_due_dates(mongo, [book_id, returned_id])
+
+        # Assert the earliest open loan sets the date, which is cleared without
+        # open loans
+        self.assertEqual(
+            mongo.db.books.find_one({"_id": book_id})["available_on"],
+            datetime(2024, 9, 10),
+        )
+        self.assertNotIn("available_on", mongo.db.books.find_one({"_id": returned_id}))
+
+
+class TestMigrateCopies(unittest.TestCase):
+    def test_migrate_copies(self):
+        mongo = MagicMock()
+        mongo.db.books.update_many.return_value.modified_count = 3
+
+        # Assert only the books without counters are converted
+        self.assertEqual(migrate_copies(mongo), 3)
+        query, pipeline = mongo.db.books.update_many.call_args[0]
+        self.assertEqual(query, {"total_copies": {"$exists": False}})
+        self.assertEqual(pipeline[-1], {"$unset": "available"})
+
+    def test_merge_duplicate_books(self):
+        mongo = MagicMock()
+        mongo.db = mongomock.MongoClient().db
+        copies = [
+            {
+                "_id": ObjectId(),
+                "title": "Emma",
+                "author": "Jane Austen",
+                "publisher": "Penguin",
+                "total_copies": 1,
+                "available_copies": available,
+            }
+            for available in (0, 1)
+        ]
+        mongo.db.books.insert_many(copies)
+        mongo.db.borrow_records.insert_one({"book_id": copies[1]["_id"]})
+
+        # Assert the copies were folded into the oldest document
+        self.assertEqual(merge_duplicate_books(mongo), 1)
+        book = mongo.db.books.find_one()
+        self.assertEqual(book["_id"], copies[0]["_id"])
+        self.assertEqual((book["total_copies"], book["available_copies"]), (2, 1))
+        self.assertEqual(
+            mongo.db.borrow_records.find_one()["book_id"], copies[0]["_id"]
+        )
+
+
+@patch("app.commands.merge_duplicate_books", return_value=1)
+@patch("app.commands.migrate_copies", return_value=4)
+class TestMigrateCopiesCommand(unittest.TestCase):
+    def test_migrate_copies_command(self, mock_migrate_copies, mock_merge):
+        result = app.test_cli_runner().invoke(
+            migrate_copies_command, ["--merge-duplicates"]
+        )
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("4 books converted", result.output)
+        self.assertIn("1 duplicate books merged", result.output)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import sys
+import threading
+import unittest
+
+from flask import Flask
+
+from app.helpers.profiler import StackSampler, init_profiler, sampler
+
+
+class TestStackSampler(unittest.TestCase):
+    def test_should_sample_disabled(self):
+        # A zero sample rate never selects a request
+        profiler = StackSampler()
+        self.assertFalse(any(profiler.should_sample() for _ in range(100)))
+
+    def test_should_sample_everything(self):
+        profiler = StackSampler()
+        profiler.sample_rate = 1.0
+        self.assertTrue(all(profiler.should_sample() for _ in range(100)))
+
+    def test_record_collapsed_stack(self):
+        profiler = StackSampler()
+
+        # Record the current stack twice for the same route
+        frame = sys._current_frames()[threading.get_ident()]
+        profiler.record("GET:/admin/users", frame)
+        profiler.record("GET:/admin/users", frame)
+
+        dump = profiler.collapsed()
+        stack, count = dump.rsplit(" ", 1)
+
+        # The stack is rooted at the route and ends at the sampled function
+        self.assertEqual(count, "2")
+        self.assertTrue(stack.startswith("GET:/admin/users;"))
+        self.assertTrue(stack.endswith(f"{__name__}:test_record_collapsed_stack"))
+        self.assertEqual(profiler.summary(), {"GET:/admin/users": 2})
+
+    def test_collapsed_filters_by_route(self):
+        profiler = StackSampler()
+        frame = sys._current_frames()[threading.get_ident()]
+        profiler.record("GET:/admin/users", frame)
+        profiler.record("POST:/admin/books", frame)
+
+        dump = profiler.collapsed("POST:/admin/books")
+
+        self.assertEqual(len(dump.splitlines()), 1)
+        self.assertTrue(dump.startswith("POST:/admin/books;"))
+
+    def test_sampler_thread_stops_when_idle(self):
+        profiler = StackSampler(interval=0.001)
+
+        profiler.start("GET:/admin/users")
+        thread = profiler._thread
+        profiler.stop()
+        thread.join(timeout=1)
+
+        self.assertFalse(thread.is_alive())
+        self.assertIsNone(profiler._thread)
+
+
+class TestProfilerRoutes(unittest.TestCase):
+    def setUp(self):
+        # Create a Flask app with the profiler enabled
+        self.app = Flask(__name__)
+        self.app.config.update(
+            ADMIN_TOKEN="secret", PROFILER_ENABLED=True, PROFILER_SAMPLE_RATE=0.0
+        )
+        init_profiler(self.app)
+
+        @self.app.route("/ping")
+        def ping():
+            return "pong"
+
+        self.client = self.app.test_client()
+        self.app.testing = True
+        self.headers = {"X-Admin-Token": "secret"}
+        sampler.reset()
+
+    def test_profiler_disabled_registers_nothing(self):
+        app = Flask(__name__)
+        init_profiler(app)
+
+        self.assertNotIn("profiler_bp", app.blueprints)
+        self.assertEqual(app.before_request_funcs, {})
+
+    def test_profiler_requires_admin_token(self):
+        response = self.client.get("/admin/profiler")
+        self.assertEqual(response.status_code, 403)
+
+        response = self.client.get(
+            "/admin/profiler", headers={"X-Admin-Token": "wrong"}
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_update_sample_rate(self):
+        response = self.client.put(
+            "/admin/profiler", json={"sample_rate": 0.25}, headers=self.headers
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sampler.sample_rate, 0.25)
+        sampler.sample_rate = 0.0
+
+    def test_update_sample_rate_invalid(self):
+        response = self.client.put(
+            "/admin/profiler", json={"sample_rate": 2}, headers=self.headers
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_forced_profile_header(self):
+        # Force profiling of a single request via header
+        self.client.get("/ping", headers={**self.headers, "X-Profile": "1"})
+
+        # The sampler was attached and released for the request
+        self.assertEqual(sampler._active, {})
+
+        response = self.client.get("/admin/profiler/stacks", headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "text/plain")
+
+    def test_reset_stacks(self):
+        frame = sys._current_frames()[threading.get_ident()]
+        sampler.record("GET:/ping", frame)
+
+        response = self.client.delete("/admin/profiler/stacks", headers=self.headers)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sampler.collapsed(), "")
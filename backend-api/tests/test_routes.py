@@ -1,8 +1,10 @@
+import json
 from datetime import datetime
 import unittest
 from unittest.mock import patch
 from flask import Flask
 from app.routes import admin_bp
+from app.services import UNAVAILABLE_BOOK_FIELDS, USER_FIELDS
 from bson.objectid import ObjectId
 
 
@@ -50,6 +52,80 @@ class TestAddBookRoute(BaseTestCase):
         # Check if service was called correctly
         mock_add_book_service.assert_called_once_with(mock_mongo, mock_redis, book_data)
 
+    @patch("app.routes.add_book_service")
+    def test_add_book_invalid_copies(self, mock_add_book_service):
+        book_data = {
+            "title": "The Great Gatsby",
+            "author": "F. Scott Fitzgerald",
+            "publisher": "Scribner",
+            "category": "Fiction",
+            "copies": 0,
+        }
+
+        # Make a POST request to /admin/books
+        response = self.client.post("/admin/books", json=book_data)
+
+        # Assert the book was rejected
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Copies must be a positive number.", response.json["message"])
+        mock_add_book_service.assert_not_called()
+
+
+class TestImportBooksRoute(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.config["ADMIN_TOKEN"] = "secret"
+        self.headers = {"X-Admin-Token": "secret"}
+
+    @patch("app.routes.ensure_import_index")
+    @patch("app.routes.mongo")
+    @patch("app.routes.r")
+    def test_import_books(self, mock_redis, mock_mongo, mock_ensure_import_index):
+        mock_mongo.db.books.find.return_value = []
+        mock_redis.xadd.return_value = b"1726840200000-0"
+        body = (
+            "title,author,publisher,category\n"
+            "The Hobbit,J. R. R. Tolkien,Allen & Unwin,Fantasy\n"
+            ",Nobody,Nowhere,None\n"
+        )
+
+        # Make a POST request to /admin/books/import
+        response = self.client.post(
+            "/admin/books/import",
+            data=body,
+            content_type="text/csv",
+            headers=self.headers,
+        )
+
+        # Assert the summary and the rejected rows
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["inserted"], 1)
+        self.assertEqual(response.json["rejected"], 1)
+        self.assertEqual(response.json["rejects"][0]["line"], 3)
+        self.assertIn("title", response.json["rejects"][0]["errors"])
+        mock_mongo.db.books.insert_many.assert_called_once()
+        mock_ensure_import_index.assert_called_once_with(mock_mongo)
+
+    @patch("app.routes.import_books_service")
+    def test_import_books_unsupported_type(self, mock_import_books_service):
+        # Make a POST request with a JSON body
+        response = self.client.post(
+            "/admin/books/import", json=[], headers=self.headers
+        )
+
+        # Assert the request was refused
+        self.assertEqual(response.status_code, 415)
+        mock_import_books_service.assert_not_called()
+
+    @patch("app.routes.import_books_service")
+    def test_import_books_without_token(self, mock_import_books_service):
+        response = self.client.post(
+            "/admin/books/import", data="title\n", content_type="text/csv"
+        )
+
+        self.assertEqual(response.status_code, 403)
+        mock_import_books_service.assert_not_called()
+
 
 class TestRemoveBookRoute(BaseTestCase):
     @patch("app.routes.remove_book_service")
@@ -135,7 +211,7 @@ class TestListUsersRoute(BaseTestCase):
 
         # Check if service was called correctly
         mock_list_users_service.assert_called_once_with(
-            mock_mongo, page=page, limit=limit
+            mock_mongo, page=page, limit=limit, fields=USER_FIELDS
         )
 
     @patch("app.routes.list_users_service")
@@ -183,7 +259,50 @@ class TestListUsersRoute(BaseTestCase):
         assert response_data["records"][1]["email"] == "user2@example.com"
 
         # Ensure the service was called with correct skip and limit
-        mock_list_users_service.assert_called_with(mock_mongo, page=page, limit=limit)
+        mock_list_users_service.assert_called_with(
+            mock_mongo, page=page, limit=limit, fields=USER_FIELDS
+        )
+
+
+class TestStreamedUsersRoute(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.config["MAX_PAGE_SIZE"] = 100
+        self.app.config["STREAM_BATCH_SIZE"] = 50
+
+    @patch("app.routes.list_users_service")
+    def test_list_users_over_page_size_cap(self, mock_list_users_service):
+        # Make a GET request to /admin/users for a page beyond the cap
+        response = self.client.get("/admin/users?limit=100000")
+
+        # Assert the request was rejected
+        self.assertEqual(response.status_code, 400)
+        mock_list_users_service.assert_not_called()
+
+    @patch("app.routes.list_users_service")
+    @patch("app.routes.mongo")
+    def test_list_users_streamed_as_ndjson(self, mock_mongo, mock_list_users_service):
+        # Mock a service page with lazy records
+        mock_list_users_service.return_value = {
+            "page_number": 1,
+            "page_size": 100000,
+            "total_record_count": 2,
+            "records": iter([{"email": "a@example.com"}, {"email": "b@example.com"}]),
+        }
+
+        # Make a GET request to /admin/users for NDJSON
+        response = self.client.get(
+            "/admin/users?limit=100000", headers={"Accept": "application/x-ndjson"}
+        )
+
+        # Assert one user per line was streamed from a batched cursor
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        self.assertEqual(len(response.get_data(as_text=True).splitlines()), 2)
+        self.assertEqual(response.headers["X-Total-Count"], "2")
+        mock_list_users_service.assert_called_once_with(
+            mock_mongo, page=1, limit=100000, fields=USER_FIELDS, batch_size=50
+        )
 
 
 class TestListBorrowRecordsRoute(BaseTestCase):
@@ -262,4 +381,333 @@ class TestListUnavailableBooksRoute(BaseTestCase):
         self.assertEqual(response.json["records"][0]["title"], "The Great Gatsby")
 
         # Check if service was called correctly
-        mock_service.assert_called_once_with(mock_mongo, page=page, limit=limit)
+        mock_service.assert_called_once_with(
+            mock_mongo, page=page, limit=limit, fields=UNAVAILABLE_BOOK_FIELDS
+        )
+
+    @patch("app.routes.list_unavailable_books_service")
+    @patch("app.routes.mongo")
+    def test_list_unavailable_books_with_fields(self, mock_mongo, mock_service):
+        mock_service.return_value = {"records": []}
+
+        # Make a GET request to /admin/books/unavailable for two fields
+        response = self.client.get("/admin/books/unavailable?fields=title,available_on")
+
+        # Assert the fieldset was passed to the service
+        self.assertEqual(response.status_code, 200)
+        mock_service.assert_called_once_with(
+            mock_mongo, page=1, limit=10, fields=["title", "available_on"]
+        )
+
+    @patch("app.routes.list_unavailable_books_service")
+    def test_list_unavailable_books_unknown_fields(self, mock_service):
+        # Make a GET request to /admin/books/unavailable for an unknown field
+        response = self.client.get("/admin/books/unavailable?fields=title,isbn")
+
+        # Assert the request was rejected
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Unknown fields: isbn", response.json["message"])
+        mock_service.assert_not_called()
+
+
+class TestExportRoute(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.config["ADMIN_TOKEN"] = "secret"
+        self.headers = {"X-Admin-Token": "secret"}
+
+    @patch("app.routes.export_service")
+    @patch("app.routes.mongo")
+    def test_export_users_ndjson(self, mock_mongo, mock_export_service):
+        # Mock the exported records
+        mock_export_service.return_value = (
+            ("_id", "email"),
+            iter([{"_id": "1", "email": "a@example.com"}]),
+        )
+
+        # Make a GET request to /admin/export/users
+        response = self.client.get(
+            "/admin/export/users?batch_size=200", headers=self.headers
+        )
+
+        # Assert the response
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        self.assertEqual(
+            response.get_data(as_text=True).splitlines(),
+            ['{"_id": "1", "email": "a@example.com"}'],
+        )
+        self.assertIn("X-Export-Until", response.headers)
+
+        # Check if the service was called correctly
+        mock_export_service.assert_called_once_with(mock_mongo, "users", None, 200)
+
+    @patch("app.routes.export_service")
+    @patch("app.routes.mongo")
+    def test_export_borrow_records_csv_since(self, mock_mongo, mock_export_service):
+        mock_export_service.return_value = (
+            ("_id", "returned_on"),
+            iter([{"_id": "1", "returned_on": None}]),
+        )
+
+        response = self.client.get(
+            "/admin/export/borrow_records?format=csv&since=2024-09-20T14:30:00",
+            headers=self.headers,
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "text/csv")
+        self.assertEqual(
+            response.get_data(as_text=True).splitlines(), ["_id,returned_on", "1,"]
+        )
+        mock_export_service.assert_called_once_with(
+            mock_mongo, "borrow_records", datetime(2024, 9, 20, 14, 30), 1000
+        )
+
+    @patch("app.routes.export_service")
+    def test_export_invalid_params(self, mock_export_service):
+        response = self.client.get(
+            "/admin/export/loans?format=xml&since=yesterday", headers=self.headers
+        )
+
+        # Assert every invalid parameter was reported
+        self.assertEqual(response.status_code, 400)
+        for param in ("Collection", "Format", "Since"):
+            self.assertIn(param, response.json["message"])
+        mock_export_service.assert_not_called()
+
+    @patch("app.routes.export_service")
+    def test_export_without_token(self, mock_export_service):
+        response = self.client.get("/admin/export/users")
+
+        # Assert the emails were not exported
+        self.assertEqual(response.status_code, 403)
+        mock_export_service.assert_not_called()
+
+
+class TestSnapshotRoute(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.config["ADMIN_TOKEN"] = "secret"
+        self.headers = {"X-Admin-Token": "secret"}
+
+    @patch("app.routes.snapshot_books_service")
+    @patch("app.routes.event_position")
+    @patch("app.routes.mongo")
+    @patch("app.routes.r")
+    def test_snapshot_books(
+        self,
+        mock_redis,
+        mock_mongo,
+        mock_event_position,
+        mock_snapshot_books_service,
+    ):
+        book_id = str(ObjectId())
+        mock_event_position.return_value = "1726840200000-3"
+        mock_snapshot_books_service.return_value = iter(
+            [{"_id": book_id, "title": "Emma"}]
+        )
+
+        # Make a GET request to /admin/snapshot/books
+        response = self.client.get(
+            "/admin/snapshot/books?batch_size=100", headers=self.headers
+        )
+
+        # Assert the marker comes before the books
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["X-Snapshot-Position"], "1726840200000-3")
+        lines = [json.loads(line) for line in response.data.splitlines()]
+        self.assertEqual(lines[0]["snapshot"], "books")
+        self.assertEqual(lines[0]["position"], "1726840200000-3")
+        self.assertEqual(lines[1:], [{"_id": book_id, "title": "Emma"}])
+        mock_snapshot_books_service.assert_called_once_with(mock_mongo, None, 100)
+
+    @patch("app.routes.snapshot_books_service")
+    def test_snapshot_books_invalid_after(self, mock_snapshot_books_service):
+        # Make a GET request with an invalid book id
+        response = self.client.get(
+            "/admin/snapshot/books?after=nope", headers=self.headers
+        )
+
+        # Assert the request was refused
+        self.assertEqual(response.status_code, 400)
+        mock_snapshot_books_service.assert_not_called()
+
+    @patch("app.routes.snapshot_books_service")
+    def test_snapshot_books_without_token(self, mock_snapshot_books_service):
+        response = self.client.get("/admin/snapshot/books")
+
+        self.assertEqual(response.status_code, 403)
+        mock_snapshot_books_service.assert_not_called()
+
+
+class TestSyncRoutes(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.config["ADMIN_TOKEN"] = "secret"
+        self.headers = {"X-Admin-Token": "secret"}
+
+    @patch("app.routes.sync_buckets_service")
+    @patch("app.routes.mongo")
+    def test_get_sync_buckets(self, mock_mongo, mock_sync_buckets_service):
+        mock_sync_buckets_service.return_value = {"prefix": "1", "buckets": {}}
+
+        # Make a GET request to /admin/sync/books/buckets
+        response = self.client.get(
+            "/admin/sync/books/buckets?prefix=1", headers=self.headers
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, {"prefix": "1", "buckets": {}})
+        mock_sync_buckets_service.assert_called_once_with(
+            mock_mongo, "books", "1", 5000
+        )
+
+    @patch("app.routes.sync_buckets_service")
+    def test_get_sync_buckets_requires_token(self, mock_sync_buckets_service):
+        response = self.client.get("/admin/sync/books/buckets")
+
+        self.assertEqual(response.status_code, 403)
+        mock_sync_buckets_service.assert_not_called()
+
+    @patch("app.routes.sync_records_service")
+    def test_get_sync_records_invalid(self, mock_sync_records_service):
+        # Make GET requests with an unknown collection and an invalid prefix
+        unknown = self.client.get(
+            "/admin/sync/borrow_records/records", headers=self.headers
+        )
+        invalid = self.client.get(
+            "/admin/sync/users/records?prefix=XYZ", headers=self.headers
+        )
+
+        self.assertEqual(unknown.status_code, 400)
+        self.assertEqual(invalid.status_code, 400)
+        mock_sync_records_service.assert_not_called()
+
+    @patch("app.routes.replace_sync_records_service")
+    @patch("app.routes.mongo")
+    def test_replace_sync_records(self, mock_mongo, mock_replace_service):
+        mock_replace_service.return_value = {"inserted": 1, "updated": 0, "deleted": 0}
+        records = [{"_id": "66f000000000000000000001", "email": "ann@example.com"}]
+
+        # Make a PUT request to /admin/sync/users/records
+        response = self.client.put(
+            "/admin/sync/users/records?prefix=10",
+            json={"records": records},
+            headers=self.headers,
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["inserted"], 1)
+        mock_replace_service.assert_called_once_with(
+            mock_mongo, "users", "10", records
+        )
+
+    @patch("app.routes.replace_sync_records_service")
+    def test_replace_sync_records_refused(self, mock_replace_service):
+        # Books are owned by the backend, and records must be in the bucket
+        books = self.client.put(
+            "/admin/sync/books/records", json={"records": []}, headers=self.headers
+        )
+        outside = self.client.put(
+            "/admin/sync/users/records?prefix=10",
+            json={"records": [{"_id": "66f000000000000000000002"}]},
+            headers=self.headers,
+        )
+
+        self.assertEqual(books.status_code, 400)
+        self.assertEqual(outside.status_code, 400)
+        mock_replace_service.assert_not_called()
+
+
+class TestReturnBookRoute(BaseTestCase):
+    @patch("app.routes.return_book_service")
+    @patch("app.routes.mongo")
+    @patch("app.routes.r")
+    def test_return_book(self, mock_redis, mock_mongo, mock_return_book_service):
+        book_id, user_id = str(ObjectId()), str(ObjectId())
+        mock_return_book_service.return_value = (
+            {"returned_on": datetime(2024, 9, 20, 14, 30)},
+            None,
+            200,
+        )
+
+        # Make a POST request to /admin/books/<book_id>/return
+        response = self.client.post(
+            f"/admin/books/{book_id}/return", json={"user_id": user_id}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json["message"], "Book returned on 2024-09-20 14:30:00"
+        )
+        mock_return_book_service.assert_called_once_with(
+            mock_mongo, mock_redis, book_id, user_id
+        )
+
+    @patch("app.routes.return_book_service")
+    def test_return_book_not_borrowed(self, mock_return_book_service):
+        mock_return_book_service.return_value = (
+            None,
+            "Book is not borrowed by this user",
+            400,
+        )
+
+        response = self.client.post(
+            f"/admin/books/{ObjectId()}/return", json={"user_id": str(ObjectId())}
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json["message"], "Book is not borrowed by this user")
+
+    @patch("app.routes.return_book_service")
+    def test_return_book_invalid_id(self, mock_return_book_service):
+        response = self.client.post(
+            "/admin/books/nope/return", json={"user_id": str(ObjectId())}
+        )
+
+        self.assertEqual(response.status_code, 404)
+        mock_return_book_service.assert_not_called()
+
+    @patch("app.routes.return_book_service")
+    def test_return_book_without_borrower(self, mock_return_book_service):
+        # Make POST requests without a body, and with an invalid borrower
+        missing = self.client.post(f"/admin/books/{ObjectId()}/return")
+        invalid = self.client.post(
+            f"/admin/books/{ObjectId()}/return", json={"user_id": "nope"}
+        )
+
+        self.assertEqual(missing.status_code, 400)
+        self.assertEqual(invalid.status_code, 400)
+        self.assertIn("User ID", invalid.json["message"])
+        mock_return_book_service.assert_not_called()
+
+
+class TestListOverdueLoansRoute(BaseTestCase):
+    @patch("app.routes.list_overdue_loans_service")
+    @patch("app.routes.mongo")
+    def test_list_overdue_loans(self, mock_mongo, mock_list_overdue_loans_service):
+        mock_list_overdue_loans_service.return_value = {
+            "page_number": 1,
+            "page_size": 10,
+            "total_record_count": 0,
+            "records": [],
+        }
+
+        # Make a GET request to /admin/borrows/overdue
+        response = self.client.get("/admin/borrows/overdue")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["records"], [])
+        mock_list_overdue_loans_service.assert_called_once_with(
+            mock_mongo, page=1, limit=10
+        )
+
+    @patch("app.routes.list_overdue_loans_service")
+    def test_list_overdue_loans_page_size(self, mock_list_overdue_loans_service):
+        self.app.config["MAX_PAGE_SIZE"] = 100
+
+        response = self.client.get("/admin/borrows/overdue?limit=500")
+
+        self.assertEqual(response.status_code, 400)
+        mock_list_overdue_loans_service.assert_not_called()
@@ -0,0 +1,101 @@
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from app.helpers.db_indexes import (
+    OPEN_LOANS_INDEX_NAME,
+    OVERDUE_LOANS_INDEX_NAME,
+    ensure_indexes,
+)
+from app.helpers.scheduler import run_exclusively, schedule
+from redis.exceptions import ConnectionError
+
+
+class TestRunExclusively(unittest.TestCase):
+    def setUp(self):
+        self.redis = MagicMock()
+        self.job = MagicMock()
+
+    def test_run_exclusively(self):
+        self.redis.set.return_value = True
+
+        self.assertTrue(run_exclusively(self.redis, "sweeper", 60, self.job))
+
+        # Assert the job was locked for the interval before running
+        self.redis.set.assert_called_once_with(
+            "scheduler:lock:sweeper", 1, nx=True, ex=60
+        )
+        self.job.assert_called_once_with()
+
+    def test_run_exclusively_locked(self):
+        self.redis.set.return_value = None
+
+        self.assertFalse(run_exclusively(self.redis, "sweeper", 60, self.job))
+        self.job.assert_not_called()
+
+    def test_run_exclusively_without_redis(self):
+        self.redis.set.side_effect = ConnectionError()
+
+        self.assertFalse(run_exclusively(self.redis, "sweeper", 60, self.job))
+        self.job.assert_not_called()
+
+
+class TestSchedule(unittest.TestCase):
+    def test_schedule(self):
+        redis = MagicMock()
+        redis.set.return_value = True
+        ran = threading.Event()
+
+        def job():
+            ran.set()
+            raise ValueError("Runs again despite errors")
+
+        stopped = schedule(redis, "sweeper", 0.01, job)
+        try:
+            self.assertTrue(ran.wait(1))
+        finally:
+            stopped.set()
+
+
+class TestEnsureIndexes(unittest.TestCase):
+    def test_ensure_indexes(self):
+        mongo = MagicMock()
+
+        ensure_indexes(mongo)
+
+        # Assert open loans are indexed by due date, and overdue loans apart
+        mongo.db.borrow_records.create_index.assert_any_call(
+            [("returned_on", 1), ("borrowed_until", 1)], name=OPEN_LOANS_INDEX_NAME
+        )
+        mongo.db.borrow_records.create_index.assert_any_call(
+            [("borrowed_until", 1)],
+            name=OVERDUE_LOANS_INDEX_NAME,
+            partialFilterExpression={"overdue": True},
+        )
+
+        mongo.db.borrow_records.drop_index.assert_not_called()
+
+    def test_ensure_indexes_rebuilds_changed_indexes(self):
+        mongo = MagicMock()
+        mongo.db.borrow_records.index_information.return_value = {
+            "_id_": {"key": [("_id", 1)]},
+            OPEN_LOANS_INDEX_NAME: {
+                "key": [("borrowed_until", 1)],
+                "partialFilterExpression": {"returned_on": {"$exists": False}},
+            },
+            OVERDUE_LOANS_INDEX_NAME: {
+                "key": [("borrowed_until", 1)],
+                "partialFilterExpression": {"overdue": True},
+            },
+        }
+
+        ensure_indexes(mongo)
+
+        # Assert only the index created with other keys was dropped
+        mongo.db.borrow_records.drop_index.assert_called_once_with(
+            OPEN_LOANS_INDEX_NAME
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,13 +1,26 @@
+import json
 import unittest
 from datetime import datetime
-from unittest.mock import MagicMock, patch
+from unittest.mock import MagicMock, call, patch
 
+import mongomock
+from app.helpers.inventory import release_operations
 from app.services import (
     add_book_service,
+    export_service,
+    import_books_service,
+    release_expired_loans_service,
     remove_book_service,
+    return_book_service,
+    snapshot_books_service,
+    sync_buckets_service,
+    sync_records_service,
     list_users_service,
     list_users_with_borrowed_books_service,
+    list_overdue_loans_service,
+    flag_overdue_loans_service,
     list_unavailable_books_service,
+    release_loans,
 )
 from bson.objectid import ObjectId
 
@@ -17,12 +30,16 @@ class BaseServiceTest(unittest.TestCase):
         # Create mock instances of MongoDB and Redis
         self.mongo = MagicMock()
         self.redis = MagicMock()
+        self.redis.xadd.return_value = b"1726840200000-0"
 
 
 class TestAddBookService(BaseServiceTest):
-    @patch("app.services.json_serialize")
-    @patch("app.services.json.dumps")
-    def test_add_book_service(self, mock_json_dumps, mock_json_serialize):
+    @patch("app.services.datetime")
+    @patch("app.services.publish_event")
+    def test_add_book_service(self, mock_publish_event, mock_datetime):
+        # Mock the time the book is added at
+        mock_datetime.utcnow.return_value = datetime(2024, 9, 20, 14, 30)
+
         # Sample book data
         book_data = {
             "title": "Sample Title",
@@ -34,7 +51,10 @@ class TestAddBookService(BaseServiceTest):
         # Call the service
         result = add_book_service(self.mongo, self.redis, book_data)
 
-        # Assert book is inserted in MongoDB
+        # Assert book is inserted in MongoDB with the time it was added at and
+        # a single copy
+        book_data["added_at"] = datetime(2024, 9, 20, 14, 30)
+        book_data["total_copies"] = book_data["available_copies"] = 1
         self.mongo.db.books.insert_one.assert_called_once_with(book_data)
 
         # Prepare the book event data
@@ -42,19 +62,32 @@ class TestAddBookService(BaseServiceTest):
         book_event["event"] = "book_added"
 
         # Assert event is published to Redis
-        mock_json_dumps.assert_called_once_with(book_event, default=mock_json_serialize)
-        self.redis.publish.assert_called_once_with(
-            "frontend_events", mock_json_dumps.return_value
-        )
+        mock_publish_event.assert_called_once_with(self.redis, book_event)
 
         # Assert return value is the same book data
         self.assertEqual(result, book_data)
 
+    @patch("app.services.publish_event")
+    def test_add_book_service_with_copies(self, mock_publish_event):
+        book_data = {
+            "title": "Sample Title",
+            "author": "Sample Author",
+            "publisher": "Sample Publisher",
+            "category": "Sample Category",
+            "copies": "3",
+        }
+
+        # Call the service
+        result = add_book_service(self.mongo, self.redis, book_data)
+
+        # Assert the copies are held by the single book document
+        self.assertEqual((result["total_copies"], result["available_copies"]), (3, 3))
+        self.assertNotIn("copies", result)
+
 
 class TestRemoveBookService(BaseServiceTest):
-    @patch("app.services.json_serialize")
-    @patch("app.services.json.dumps")
-    def test_remove_book_service_success(self, mock_json_dumps, mock_json_serialize):
+    @patch("app.services.publish_event")
+    def test_remove_book_service_success(self, mock_publish_event):
         # Mock a successful deletion from MongoDB
         self.mongo.db.books.delete_one.return_value.deleted_count = 1
 
@@ -73,10 +106,7 @@ class TestRemoveBookService(BaseServiceTest):
         book_event = {"event": "book_removed", "_id": book_id}
 
         # Assert event is published to Redis
-        mock_json_dumps.assert_called_once_with(book_event, default=mock_json_serialize)
-        self.redis.publish.assert_called_once_with(
-            "frontend_events", mock_json_dumps.return_value
-        )
+        mock_publish_event.assert_called_once_with(self.redis, book_event)
 
         # Assert return value is the book event
         self.assertEqual(result, book_event)
@@ -187,7 +217,47 @@ class TestListUsersService(BaseServiceTest):
         assert result["records"][1]["email"] == "user2@example.com"
 
         # Assert that the right query was made with skip and limit
-        self.mongo.db.users.find.assert_called_with({}, skip=skip, limit=limit)
+        self.mongo.db.users.find.assert_called_with(
+            {},
+            {"email": 1, "first_name": 1, "last_name": 1, "enrollment_date": 1},
+            skip=skip,
+            limit=limit,
+        )
+
+    def test_list_users_service_streamed(self):
+        self.mongo.db.users.find.return_value = iter(
+            [{"_id": ObjectId(), "email": "user@example.com"}]
+        )
+        self.mongo.db.users.count_documents.return_value = 1
+
+        result = list_users_service(
+            self.mongo, limit=100000, fields=["email"], batch_size=500
+        )
+
+        # Assert the cursor was opened with the batch size and read lazily
+        self.mongo.db.users.find.assert_called_once_with(
+            {}, {"email": 1}, skip=0, limit=100000, batch_size=500
+        )
+        self.assertNotIsInstance(result["records"], list)
+        self.assertEqual(next(result["records"])["email"], "user@example.com")
+
+    def test_list_users_service_sparse_fields(self):
+        # Mock the projected documents returned by MongoDB
+        user_id = ObjectId()
+        self.mongo.db.users.find.return_value = [
+            {"_id": user_id, "email": "user@example.com"}
+        ]
+        self.mongo.db.users.count_documents.return_value = 1
+
+        result = list_users_service(self.mongo, fields=["email"])
+
+        # Assert the projection was pushed down to MongoDB
+        self.mongo.db.users.find.assert_called_once_with(
+            {}, {"email": 1}, skip=0, limit=10
+        )
+        self.assertEqual(
+            result["records"], [{"_id": str(user_id), "email": "user@example.com"}]
+        )
 
 
 class TestListUsersWithBorrowedBooksService(BaseServiceTest):
@@ -234,6 +304,7 @@ class TestListUnavailableBooksService(BaseServiceTest):
                 "author": "Author 1",
                 "publisher": "Publisher 1",
                 "category": "Category 1",
+                "total_copies": 1,
                 "available_on": datetime.utcnow(),
             },
             {
@@ -242,6 +313,7 @@ class TestListUnavailableBooksService(BaseServiceTest):
                 "author": "Author 2",
                 "publisher": "Publisher 2",
                 "category": "Category 2",
+                "total_copies": 2,
                 "available_on": datetime.utcnow(),
             },
         ]
@@ -263,6 +335,7 @@ class TestListUnavailableBooksService(BaseServiceTest):
                     "author": book["author"],
                     "publisher": book["publisher"],
                     "category": book["category"],
+                    "total_copies": book["total_copies"],
                     "available_on": str(book["available_on"]),
                 }
                 for book in unavailable_books
@@ -274,5 +347,519 @@ class TestListUnavailableBooksService(BaseServiceTest):
 
         # Assert MongoDB query was called
         self.mongo.db.books.find.assert_called_once_with(
-            {"available": False}, skip=skip, limit=limit
+            {"available_copies": 0},
+            {
+                "title": 1,
+                "author": 1,
+                "publisher": 1,
+                "category": 1,
+                "total_copies": 1,
+                "available_on": 1,
+            },
+            skip=skip,
+            limit=limit,
+        )
+
+
+class TestExportService(BaseServiceTest):
+    def test_export_users(self):
+        # Mock a user document
+        user_id = ObjectId()
+        self.mongo.db.__getitem__.return_value.find.return_value = iter(
+            [
+                {
+                    "_id": user_id,
+                    "email": "user@example.com",
+                    "first_name": "John",
+                    "last_name": "Doe",
+                    "enrollment_date": datetime(2024, 9, 20, 14, 30),
+                }
+            ]
+        )
+
+        # Call the service
+        fields, records = export_service(self.mongo, "users", batch_size=200)
+
+        # Assert the collection is read in _id order from one batched cursor
+        self.mongo.db.__getitem__.assert_called_once_with("users")
+        self.mongo.db.__getitem__.return_value.find.assert_called_once_with(
+            {},
+            {field: 1 for field in fields},
+            sort=[("_id", 1)],
+            batch_size=200,
+        )
+
+        # Assert values were made serializable
+        self.assertEqual(
+            list(records),
+            [
+                {
+                    "_id": str(user_id),
+                    "email": "user@example.com",
+                    "first_name": "John",
+                    "last_name": "Doe",
+                    "enrollment_date": "2024-09-20T14:30:00",
+                }
+            ],
+        )
+
+    def test_export_since(self):
+        collection = self.mongo.db.__getitem__.return_value
+        collection.find.return_value = iter([{"_id": ObjectId(), "user_id": None}])
+        since = datetime(2024, 9, 20)
+
+        fields, records = export_service(self.mongo, "borrow_records", since=since)
+
+        # Assert only documents created since the given time are read
+        query = collection.find.call_args.args[0]
+        self.assertEqual(query, {"_id": {"$gte": ObjectId.from_datetime(since)}})
+
+        # Assert missing fields are exported as empty values
+        self.assertIsNone(next(records)["returned_on"])
+
+
+class TestSnapshotBooksService(BaseServiceTest):
+    def test_snapshot_books_service(self):
+        book_id = ObjectId()
+        self.mongo.db.books.find.return_value = iter(
+            [
+                {
+                    "_id": book_id,
+                    "title": "Emma",
+                    "added_at": datetime(2024, 9, 20),
+                    "available": False,
+                    "category": None,
+                }
+            ]
+        )
+
+        # Call the service function
+        books = list(snapshot_books_service(self.mongo, batch_size=5000))
+
+        # Assert the books are serialized without their missing fields
+        self.assertEqual(
+            books,
+            [
+                {
+                    "_id": str(book_id),
+                    "title": "Emma",
+                    "added_at": "2024-09-20T00:00:00",
+                    "available": False,
+                }
+            ],
+        )
+        query, projection = self.mongo.db.books.find.call_args[0]
+        self.assertEqual(query, {})
+        self.assertNotIn("available_on", projection)
+        self.assertEqual(self.mongo.db.books.find.call_args[1]["batch_size"], 5000)
+
+    def test_snapshot_books_service_after(self):
+        book_id = ObjectId()
+        self.mongo.db.books.find.return_value = iter([])
+
+        # Call the service function
+        list(snapshot_books_service(self.mongo, after=str(book_id)))
+
+        # Assert the snapshot resumes after the given book
+        query = self.mongo.db.books.find.call_args[0][0]
+        self.assertEqual(query, {"_id": {"$gt": book_id}})
+
+
+class TestImportBooksService(BaseServiceTest):
+    def book_row(self, title, author="Jane Austen"):
+        return {
+            "title": f" {title} ",
+            "author": author,
+            "publisher": "John Murray",
+            "category": "Classics",
+        }
+
+    def test_import_books_service(self):
+        # Mock a catalogue already holding one of the books
+        self.mongo.db.books.find.return_value = [
+            {"title": "Emma", "author": "Jane Austen", "publisher": "John Murray"}
+        ]
+        rows = [
+            (2, self.book_row("Emma")),
+            (3, self.book_row("Persuasion")),
+            (4, self.book_row("Persuasion")),
+            (5, {"title": "Untitled"}),
+            (6, "not json"),
+        ]
+        on_reject = MagicMock()
+
+        # Call the service function
+        totals = import_books_service(
+            self.mongo, self.redis, rows, chunk_size=10, on_reject=on_reject
+        )
+
+        # Assert only the new book was inserted, stripped and timestamped
+        self.assertEqual(
+            totals, {"processed": 5, "inserted": 1, "duplicates": 2, "rejected": 2}
+        )
+        documents = self.mongo.db.books.insert_many.call_args[0][0]
+        self.assertEqual([book["title"] for book in documents], ["Persuasion"])
+        self.assertIn("added_at", documents[0])
+
+        # Assert duplicates were looked up in the catalogue in one query
+        query = self.mongo.db.books.find.call_args[0][0]
+        self.assertEqual(len(query["$or"]), 2)
+
+        # Assert the invalid rows were reported with their line numbers
+        self.assertEqual([call.args[0] for call in on_reject.call_args_list], [5, 6])
+
+        # Assert the chunk was announced with one event
+        self.redis.publish.assert_called_once()
+        channel, message = self.redis.publish.call_args[0]
+        self.assertEqual(channel, "frontend_events")
+        self.assertEqual(json.loads(message)["event"], "books_added")
+
+    def test_import_books_service_in_chunks(self):
+        self.mongo.db.books.find.return_value = []
+        rows = [(line, self.book_row(f"Book {line}")) for line in range(2, 7)]
+        on_chunk = MagicMock()
+
+        # Call the service function
+        totals = import_books_service(
+            self.mongo, self.redis, iter(rows), chunk_size=2, on_chunk=on_chunk
+        )
+
+        # Assert every chunk was inserted and reported on its own
+        self.assertEqual(totals["inserted"], 5)
+        self.assertEqual(self.mongo.db.books.insert_many.call_count, 3)
+        self.assertEqual(self.redis.publish.call_count, 3)
+        self.assertEqual([call.args[0] for call in on_chunk.call_args_list], [3, 5, 6])
+        self.assertEqual(on_chunk.call_args[0][1]["processed"], 5)
+
+    def test_import_books_service_skips_known_chunk(self):
+        # Mock a chunk that was fully inserted before an interruption
+        self.mongo.db.books.find.return_value = [
+            {"title": "Emma", "author": "Jane Austen", "publisher": "John Murray"}
+        ]
+
+        # Call the service function
+        totals = import_books_service(
+            self.mongo, self.redis, [(2, self.book_row("Emma"))]
+        )
+
+        # Assert nothing was inserted nor announced
+        self.assertEqual(totals["duplicates"], 1)
+        self.mongo.db.books.insert_many.assert_not_called()
+        self.redis.publish.assert_not_called()
+
+
+class TestSyncServices(BaseServiceTest):
+    @patch("app.services.bucket_hashes")
+    def test_sync_buckets_service(self, mock_bucket_hashes):
+        mock_bucket_hashes.return_value = {"10": {"count": 1, "hash": "ab"}}
+
+        # Call the service function
+        result = sync_buckets_service(self.mongo, "users", "1", 100)
+
+        # Assert the users collection was hashed with its synchronized fields
+        self.assertEqual(
+            result, {"prefix": "1", "buckets": {"10": {"count": 1, "hash": "ab"}}}
+        )
+        mock_bucket_hashes.assert_called_once_with(
+            self.mongo.db["users"],
+            ("email", "first_name", "last_name", "enrollment_date"),
+            "1",
+            100,
+        )
+
+    @patch("app.services.bucket_records")
+    def test_sync_records_service(self, mock_bucket_records):
+        mock_bucket_records.return_value = [{"_id": "66f000000000000000000001"}]
+
+        # Call the service function
+        result = sync_records_service(self.mongo, "books", "10")
+
+        self.assertEqual(
+            result,
+            {"prefix": "10", "records": [{"_id": "66f000000000000000000001"}]},
+        )
+
+
+class TestReturnBookService(BaseServiceTest):
+    def setUp(self):
+        super().setUp()
+        self.mongo.db.borrow_records = mongomock.MongoClient().db.borrow_records
+
+    @patch("app.services.publish_event")
+    @patch("app.services.datetime")
+    def test_return_book_service(self, mock_datetime, mock_publish_event):
+        mock_datetime.utcnow.return_value = datetime(2024, 9, 20, 14, 30)
+        book_id, loan_id, user_id = ObjectId(), ObjectId(), ObjectId()
+        self.mongo.db.books.find_one.return_value = {"_id": book_id}
+        self.mongo.db.borrow_records.insert_one(
+            {"_id": loan_id, "user_id": user_id, "book_id": book_id, "overdue": True}
+        )
+
+        # Call the service function
+        loan, error, code = return_book_service(
+            self.mongo, self.redis, str(book_id), str(user_id)
+        )
+
+        # Assert the open loan was closed and the copy given back
+        self.assertEqual((error, code), (None, 200))
+        self.assertEqual(loan["returned_on"], datetime(2024, 9, 20, 14, 30))
+        record = self.mongo.db.borrow_records.find_one({"_id": loan_id})
+        self.assertEqual(record["returned_on"], datetime(2024, 9, 20, 14, 30))
+        self.assertNotIn("overdue", record)
+        self.mongo.db.books.bulk_write.assert_called_once_with(
+            release_operations({book_id: 1}), ordered=False
+        )
+
+        # Assert the due date was cleared, the book has no open loan left
+        self.mongo.db.books.update_many.assert_called_once_with(
+            {"_id": {"$in": [book_id], "$nin": []}},
+            {"$unset": {"available_on": ""}},
+        )
+
+        # Assert the frontend was told, with the borrower to free a loan slot
+        mock_publish_event.assert_called_once_with(
+            self.redis,
+            {
+                "event": "books_released",
+                "loans": [
+                    {
+                        "_id": loan_id,
+                        "user_id": user_id,
+                        "book_id": book_id,
+                        "returned_on": datetime(2024, 9, 20, 14, 30),
+                    }
+                ],
+            },
+        )
+
+    def test_return_book_service_not_borrowed(self):
+        self.mongo.db.books.find_one.return_value = {"_id": ObjectId()}
+
+        # Call the service function
+        loan, error, code = return_book_service(
+            self.mongo, self.redis, str(ObjectId()), str(ObjectId())
+        )
+
+        self.assertEqual(
+            (loan, error, code), (None, "Book is not borrowed by this user", 400)
+        )
+        self.mongo.db.books.update_many.assert_not_called()
+
+    @patch("app.services.publish_event")
+    def test_return_book_service_with_several_borrowers(self, mock_publish_event):
+        # A book lent to two users at once
+        book_id, first_user, second_user = ObjectId(), ObjectId(), ObjectId()
+        self.mongo.db.books.find_one.return_value = {"_id": book_id}
+        self.mongo.db.borrow_records.insert_many(
+            [
+                {"_id": ObjectId(), "user_id": user_id, "book_id": book_id}
+                for user_id in (first_user, second_user)
+            ]
+        )
+
+        # Call the service function for the second borrower
+        loan, error, code = return_book_service(
+            self.mongo, self.redis, str(book_id), str(second_user)
+        )
+
+        # Assert only the second borrower's loan was closed
+        self.assertEqual((loan["user_id"], error, code), (second_user, None, 200))
+        open_loans = self.mongo.db.borrow_records.find(
+            {"returned_on": {"$exists": False}}
+        )
+        self.assertEqual([loan["user_id"] for loan in open_loans], [first_user])
+
+    def test_return_book_service_unknown_book(self):
+        self.mongo.db.books.find_one.return_value = None
+
+        # Call the service function
+        loan, error, code = return_book_service(
+            self.mongo, self.redis, str(ObjectId()), str(ObjectId())
+        )
+
+        self.assertEqual((loan, error, code), (None, "Book not found", 404))
+
+
+class TestReleaseLoans(BaseServiceTest):
+    def setUp(self):
+        super().setUp()
+        self.mongo.db.borrow_records = mongomock.MongoClient().db.borrow_records
+
+    @patch("app.services.refresh_due_dates")
+    @patch("app.services.publish_event")
+    def test_release_loans_racing(self, mock_publish_event, mock_refresh_due_dates):
+        # A book held in 3 copies, 2 of them borrowed
+        book_id = ObjectId()
+        loans = [{"_id": ObjectId(), "book_id": book_id} for _ in range(2)]
+        self.mongo.db.borrow_records.insert_many([dict(loan) for loan in loans])
+
+        # Release the first loan twice, as two racing returns would, then both
+        first = release_loans(self.mongo, self.redis, loans[:1], datetime(2024, 9, 20))
+        second = release_loans(self.mongo, self.redis, loans[:1], datetime(2024, 9, 20))
+        both = release_loans(self.mongo, self.redis, loans, datetime(2024, 9, 21))
+
+        # Assert each loan gave its copy back and was announced once
+        self.assertEqual((first, second, both), (1, 0, 1))
+        self.assertEqual(
+            self.mongo.db.books.bulk_write.call_args_list,
+            [
+                call(release_operations({book_id: 1}), ordered=False),
+                call(release_operations({book_id: 1}), ordered=False),
+            ],
+        )
+        self.assertEqual(
+            [
+                [loan["_id"] for loan in call.args[1]["loans"]]
+                for call in mock_publish_event.call_args_list
+            ],
+            [[loans[0]["_id"]], [loans[1]["_id"]]],
+        )
+
+
+class TestReleaseExpiredLoansService(BaseServiceTest):
+    @patch("app.services.publish_event")
+    def test_release_expired_loans_service(self, mock_publish_event):
+        now = datetime(2024, 9, 20)
+        borrow_records = mongomock.MongoClient().db.borrow_records
+        borrow_records.insert_many(
+            [
+                {"_id": ObjectId(), "book_id": ObjectId(), "borrowed_until": due}
+                for due in (
+                    datetime(2024, 8, 1),
+                    datetime(2024, 8, 2),
+                    datetime(2024, 8, 3),
+                    datetime(2024, 9, 19),
+                )
+            ]
+        )
+        self.mongo.db.borrow_records = MagicMock(wraps=borrow_records)
+
+        # Call the service function
+        released = release_expired_loans_service(
+            self.mongo, self.redis, now=now, grace_days=14, batch_size=2
+        )
+
+        # Assert the expired open loans were read by due date, in batches
+        self.assertEqual(released, 3)
+        query, options = self.mongo.db.borrow_records.find.call_args_list[0]
+        self.assertEqual(
+            query[0],
+            {
+                "borrowed_until": {"$lt": datetime(2024, 9, 6)},
+                "returned_on": {"$exists": False},
+            },
+        )
+        self.assertEqual(options, {"sort": [("borrowed_until", 1)], "limit": 2})
+        self.assertEqual(
+            borrow_records.count_documents({"returned_on": {"$exists": False}}), 1
+        )
+
+        # Assert every batch was released in bulk with one event
+        self.assertEqual(self.mongo.db.borrow_records.update_many.call_count, 2)
+        self.assertEqual(self.mongo.db.books.bulk_write.call_count, 2)
+        self.assertEqual(mock_publish_event.call_count, 2)
+
+    @patch("app.services.publish_event")
+    def test_release_expired_loans_service_nothing_expired(self, mock_publish_event):
+        self.mongo.db.borrow_records.find.return_value = []
+
+        # Call the service function
+        released = release_expired_loans_service(self.mongo, self.redis)
+
+        self.assertEqual(released, 0)
+        self.mongo.db.books.bulk_write.assert_not_called()
+        mock_publish_event.assert_not_called()
+
+
+class TestFlagOverdueLoansService(BaseServiceTest):
+    def test_flag_overdue_loans_service(self):
+        now = datetime(2024, 9, 20)
+        self.mongo.db.job_state.find_one.return_value = {
+            "_id": "overdue_loans",
+            "checked_until": datetime(2024, 9, 19),
+        }
+        loans = [{"_id": ObjectId()} for _ in range(3)]
+        self.mongo.db.borrow_records.find.side_effect = [loans[:2], loans[2:]]
+
+        # Call the service function
+        flagged = flag_overdue_loans_service(self.mongo, now=now, batch_size=2)
+
+        # Assert only the loans due since the previous run were read
+        self.assertEqual(flagged, 3)
+        query = self.mongo.db.borrow_records.find.call_args[0][0]
+        self.assertEqual(
+            query,
+            {
+                "borrowed_until": {"$lt": now, "$gte": datetime(2024, 9, 19)},
+                "returned_on": {"$exists": False},
+                "overdue": {"$ne": True},
+            },
+        )
+
+        # Assert every page was flagged in bulk
+        self.mongo.db.borrow_records.update_many.assert_called_with(
+            {"_id": {"$in": [loans[2]["_id"]]}}, {"$set": {"overdue": True}}
+        )
+        self.assertEqual(self.mongo.db.borrow_records.update_many.call_count, 2)
+
+        # Assert the next run starts where this one stopped
+        self.mongo.db.job_state.update_one.assert_called_once_with(
+            {"_id": "overdue_loans"}, {"$set": {"checked_until": now}}, upsert=True
+        )
+
+    def test_flag_overdue_loans_service_first_run(self):
+        now = datetime(2024, 9, 20)
+        self.mongo.db.job_state.find_one.return_value = None
+        self.mongo.db.borrow_records.find.return_value = []
+
+        # Call the service function
+        flagged = flag_overdue_loans_service(self.mongo, now=now)
+
+        # Assert every open loan due before now was considered
+        self.assertEqual(flagged, 0)
+        query = self.mongo.db.borrow_records.find.call_args[0][0]
+        self.assertEqual(query["borrowed_until"], {"$lt": now})
+        self.mongo.db.borrow_records.update_many.assert_not_called()
+
+
+class TestListOverdueLoansService(BaseServiceTest):
+    def test_list_overdue_loans_service(self):
+        loan_id, user_id, book_id = ObjectId(), ObjectId(), ObjectId()
+        self.mongo.db.borrow_records.count_documents.return_value = 11
+        self.mongo.db.borrow_records.find.return_value = [
+            {
+                "_id": loan_id,
+                "user_id": user_id,
+                "book_id": book_id,
+                "borrowed_on": datetime(2024, 9, 1),
+                "borrowed_until": datetime(2024, 9, 8),
+            }
+        ]
+
+        # Call the service function
+        result = list_overdue_loans_service(
+            self.mongo, page=2, limit=10, now=datetime(2024, 9, 20)
+        )
+
+        # Assert the flagged loans were listed by due date
+        self.mongo.db.borrow_records.count_documents.assert_called_once_with(
+            {"overdue": True}
+        )
+        self.assertEqual(
+            self.mongo.db.borrow_records.find.call_args[1],
+            {"sort": [("borrowed_until", 1)], "skip": 10, "limit": 10},
+        )
+        self.assertEqual(result["total_record_count"], 11)
+        self.assertEqual(
+            result["records"],
+            [
+                {
+                    "_id": str(loan_id),
+                    "user_id": str(user_id),
+                    "book_id": str(book_id),
+                    "borrowed_on": "2024-09-01 00:00:00",
+                    "borrowed_until": "2024-09-08 00:00:00",
+                    "days_overdue": 12,
+                }
+            ],
         )
@@ -2,8 +2,10 @@ import unittest
 from datetime import datetime
 from unittest.mock import patch
 
+from app.helpers.event_dedup import RecentEvents
 from app.helpers.utils import handle_events, json_deserialize, json_serialize
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 
 
 class TestJsonSerialize(unittest.TestCase):
@@ -93,6 +95,7 @@ class TestHandleEventsBackend(unittest.TestCase):
             "user_id": ObjectId(),
             "book_id": ObjectId(),
             "borrowed_until": datetime.utcnow(),
+            "available_copies": 0,
         }
 
         # Mock message
@@ -111,13 +114,56 @@ class TestHandleEventsBackend(unittest.TestCase):
             expected_borrow_record
         )
 
-        # Assert the MongoDB update_one for books was called with the correct query
+        # Assert the copy was taken from the book counter
         mock_mongo.db.books.update_one.assert_called_once_with(
             {"_id": mock_json_loads.return_value["book_id"]},
             {
-                "$set": {
-                    "available": False,
-                    "available_on": mock_json_loads.return_value["borrowed_until"],
-                }
+                "$inc": {"available_copies": -1},
+                "$min": {
+                    "available_on": mock_json_loads.return_value["borrowed_until"]
+                },
             },
         )
+
+    @patch("app.helpers.utils.recent_events", new_callable=RecentEvents)
+    @patch("app.helpers.utils.mongo")
+    @patch("app.helpers.utils.json.loads")
+    def test_handle_redelivered_event(
+        self, mock_json_loads, mock_mongo, mock_recent_events
+    ):
+        event = {
+            "event": "book_borrowed",
+            "event_id": ObjectId(),
+            "_id": ObjectId(),
+            "user_id": ObjectId(),
+            "book_id": ObjectId(),
+            "borrowed_until": datetime.utcnow(),
+        }
+        mock_json_loads.side_effect = lambda data, object_hook: dict(event)
+        message = {"data": '{"event": "book_borrowed"}'}
+
+        handle_events(message)
+        handle_events(message)
+
+        # Assert the repeat was skipped without reaching MongoDB
+        mock_mongo.db.borrow_records.insert_one.assert_called_once()
+        mock_mongo.db.books.update_one.assert_called_once()
+        self.assertIn(event["event_id"], mock_recent_events)
+
+    @patch("app.helpers.utils.mongo")
+    @patch("app.helpers.utils.json.loads")
+    def test_handle_borrow_already_applied(self, mock_json_loads, mock_mongo):
+        # Redelivered past the dedup window
+        mock_json_loads.return_value = {
+            "event": "book_borrowed",
+            "event_id": ObjectId(),
+            "_id": ObjectId(),
+            "book_id": ObjectId(),
+            "borrowed_until": datetime.utcnow(),
+        }
+        mock_mongo.db.borrow_records.insert_one.side_effect = DuplicateKeyError("")
+
+        handle_events({"data": '{"event": "book_borrowed"}'})
+
+        # Assert the copy was not taken twice
+        mock_mongo.db.books.update_one.assert_not_called()
@@ -18,3 +18,23 @@ r = redis.Redis.from_url(app.config["REDIS_URL"])
 from app.routes import user_bp
 
 app.register_blueprint(user_bp)
+
+# Register CLI commands
+from app.commands import (
+    bootstrap_catalogue_command,
+    migrate_copies_command,
+    reconcile_command,
+    rebuild_email_filter_command,
+    reconcile_loans_command,
+)
+
+app.cli.add_command(bootstrap_catalogue_command)
+app.cli.add_command(migrate_copies_command)
+app.cli.add_command(reconcile_command)
+app.cli.add_command(reconcile_loans_command)
+app.cli.add_command(rebuild_email_filter_command)
+
+# Opt-in sampling profiler
+from app.helpers.profiler import init_profiler
+
+init_profiler(app)
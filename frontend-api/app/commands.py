@@ -0,0 +1,156 @@
+"""
+Command line jobs of the frontend API, run with `flask --app app <command>`.
+"""
+
+import io
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from app import mongo, r
+from app.helpers.email_filter import email_filter
+from app.helpers.inventory import merge_duplicate_books, migrate_copies
+from app.helpers.loan_limits import reconcile_loan_counts
+from app.helpers.reconcile import BackendClient, reconcile
+from app.helpers.snapshot import load_snapshot, read_snapshot, replay_events
+from app.helpers.sync_state import load_sync_state, save_sync_state
+
+
+def open_snapshot(source, after=None, token=None):
+    """
+    Open a snapshot served by the backend, or saved to a file.
+
+    :param source: URL of `GET /admin/snapshot/books`, or a file path
+    :param after: Last book id already loaded, to resume a download
+    :param token: Admin token of the backend
+    :return: Text stream of the snapshot lines
+    """
+    if not source.startswith(("http://", "https://")):
+        return open(source, encoding="utf-8")
+    if after:
+        source += ("&" if "?" in source else "?") + urlencode({"after": after})
+    request = Request(source, headers={"X-Admin-Token": token or ""})
+    return io.TextIOWrapper(urlopen(request), encoding="utf-8")
+
+
+@click.command("bootstrap-catalogue")
+@click.argument("source")
+@click.option("--chunk-size", default=5000, show_default=True, type=int)
+@with_appcontext
+def bootstrap_catalogue_command(source, chunk_size):
+    """
+    Load the catalogue of a fresh database from a backend snapshot, then replay
+    the events published since the snapshot was taken.
+
+    SOURCE is the URL of the backend snapshot endpoint, e.g.
+    http://backend:5001/admin/snapshot/books, or a file it was saved to.
+    """
+    state = load_sync_state(mongo)
+    if state and state["bootstrapped"]:
+        click.echo("The catalogue was already bootstrapped, catching up.")
+        position = state["position"]
+    else:
+        after = state["after"] if state else None
+        if state:
+            # Resume an interrupted load after the last fully loaded chunk
+            click.echo("Resuming the interrupted snapshot load.")
+        elif mongo.db.books.find_one({}, {"_id": 1}):
+            raise click.ClickException(
+                "The catalogue is not empty, only a fresh database can be "
+                "bootstrapped."
+            )
+
+        token = current_app.config["BACKEND_ADMIN_TOKEN"]
+        with open_snapshot(source, after, token) as lines:
+            marker, books = read_snapshot(lines)
+
+            # Replay from the oldest marker, a resumed snapshot has a newer one
+            position = state["position"] if state else marker["position"]
+            save_sync_state(mongo, position, False, after=after)
+
+            def on_chunk(count, last_book_id):
+                save_sync_state(mongo, position, False, after=str(last_book_id))
+                click.echo(f"{count} books loaded.")
+
+            loaded = load_snapshot(mongo, books, chunk_size, on_chunk=on_chunk)
+        click.echo(f"Loaded {loaded} books taken at {marker['taken_at']}.")
+
+    position, replayed = replay_events(mongo, r, position)
+    save_sync_state(mongo, position, True)
+    click.echo(f"Replayed {replayed} events, in sync up to {position}.")
+
+
+@click.command("reconcile")
+@click.argument(
+    "collections", nargs=-1, type=click.Choice(["books", "users"]), required=True
+)
+@click.option("--backend-url", help="Defaults to the BACKEND_URL setting.")
+@click.option(
+    "--leaf-size",
+    type=int,
+    help="Largest bucket repaired as a whole, defaults to SYNC_LEAF_SIZE.",
+)
+@with_appcontext
+def reconcile_command(collections, backend_url, leaf_size):
+    """Compare the COLLECTIONS with the backend and repair their drift."""
+    config = current_app.config
+    backend = BackendClient(
+        backend_url or config["BACKEND_URL"], config["BACKEND_ADMIN_TOKEN"]
+    )
+    for collection in collections:
+        report = reconcile(
+            mongo,
+            r,
+            backend,
+            collection,
+            leaf_size or config["SYNC_LEAF_SIZE"],
+            config["SYNC_BATCH_SIZE"],
+        )
+        click.echo(
+            f"{collection}: {report['buckets_differing']} of "
+            f"{report['buckets_compared']} buckets differ, "
+            f"{report['records_transferred']} records transferred, "
+            f"{report['inserted']} inserted, {report['updated']} updated, "
+            f"{report['deleted']} deleted in {report['duration_seconds']}s."
+        )
+
+
+@click.command("migrate-copies")
+@click.option(
+    "--merge-duplicates",
+    is_flag=True,
+    help="Also fold the books stored once per copy of the same title.",
+)
+@with_appcontext
+def migrate_copies_command(merge_duplicates):
+    """Convert the books stored with an `available` flag to copy counters."""
+    click.echo(f"{migrate_copies(mongo)} books converted to copy counters.")
+    if merge_duplicates:
+        click.echo(f"{merge_duplicate_books(mongo)} duplicate books merged.")
+
+
+@click.command("reconcile-loans")
+@with_appcontext
+def reconcile_loans_command():
+    """Reset the per-user open loan counters from the borrow records."""
+    report = reconcile_loan_counts(mongo, r)
+    click.echo(
+        f"{report['users']} users hold books, "
+        f"{report['corrected']} loan counters corrected."
+    )
+
+
+@click.command("rebuild-email-filter")
+@click.option("--batch-size", default=1000, show_default=True, type=int)
+@with_appcontext
+def rebuild_email_filter_command(batch_size):
+    """Rebuild the Bloom filter of the enrolled emails from the users."""
+    emails = email_filter(r)
+    added = emails.rebuild(mongo, batch_size)
+    click.echo(
+        f"{added} emails added to a filter of {emails.size} bits "
+        f"and {emails.hashes} hashes."
+    )
@@ -0,0 +1,34 @@
+"""
+Helpers for protecting operational endpoints with a shared admin token.
+"""
+
+import hmac
+from functools import wraps
+
+from flask import current_app, jsonify, request
+
+
+def is_admin_request():
+    """
+    Checks the `X-Admin-Token` header of the current request against the
+    configured `ADMIN_TOKEN`. Always False when no token is configured.
+
+    :return: Boolean value, True if the request carries the admin token
+    """
+    token = current_app.config.get("ADMIN_TOKEN")
+    supplied = request.headers.get("X-Admin-Token", "")
+    if not token:
+        return False
+    return hmac.compare_digest(supplied.encode(), token.encode())
+
+
+def admin_required(view):
+    """Reject requests to the decorated view that lack the admin token."""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not is_admin_request():
+            return jsonify({"message": "Admin token required"}), 403
+        return view(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,232 @@
+"""
+Compact in-memory replica of the book catalogue for the frontend read path.
+
+When `CATALOGUE_REPLICA_ENABLED` is set, the whole catalogue is loaded at
+startup into an array of `__slots__` records whose publisher, category and
+author strings are interned, with a secondary index of positions per field
+value. Listing, filtering and single-book lookups are then answered from memory
+without a MongoDB round trip, while `handle_events` and the borrow path keep
+the replica current.
+"""
+
+import bisect
+import sys
+import threading
+from array import array
+from itertools import islice
+
+from app.helpers.inventory import copies_available
+
+INDEXED_FIELDS = ("publisher", "category", "author")
+
+
+class BookRecord:
+    """
+    Compact representation of a book document.
+    """
+
+    __slots__ = ("book_id", "title", "author", "publisher", "category", "available")
+
+    def __init__(self, book):
+        self.book_id = str(book["_id"])
+        self.title = book["title"]
+        self.author = sys.intern(book["author"])
+        self.publisher = sys.intern(book["publisher"])
+        self.category = sys.intern(book["category"])
+        self.available = copies_available(book)
+
+    def to_dict(self):
+        return {
+            "_id": self.book_id,
+            "title": self.title,
+            "author": self.author,
+            "publisher": self.publisher,
+            "category": self.category,
+        }
+
+
+class CatalogueReplica:
+    """
+    Array-backed book store with per-field secondary indexes.
+
+    Records are appended in arrival order, mirroring the natural order of the
+    books collection. Removed records leave a hole that is reclaimed once
+    holes make up half of the array.
+    """
+
+    def __init__(self):
+        self.tracking = False  # maintain the replica from events
+        self.ready = False  # serve reads from the replica
+        self._lock = threading.Lock()
+        self._records = []  # position -> BookRecord or None
+        self._positions = {}  # book _id -> position
+        self._index = {field: {} for field in INDEXED_FIELDS}  # value -> positions
+        self._available_counts = {field: {} for field in INDEXED_FIELDS}
+        self._available_total = 0
+
+    def __len__(self):
+        return len(self._positions)
+
+    def load(self, books):
+        """
+        Start tracking events, load every book and begin serving reads.
+
+        :param books: Iterable of book documents, e.g. a MongoDB cursor
+        """
+        self.tracking = True
+        for book in books:
+            self.add_book(book)
+        self.ready = True
+
+    def add_book(self, book):
+        """
+        Store a book document, replacing any previous version of it.
+
+        :param book: Book document
+        """
+        if not self.tracking:
+            return
+
+        record = BookRecord(book)
+        with self._lock:
+            if record.book_id in self._positions:
+                self._remove(record.book_id)
+
+            position = len(self._records)
+            self._records.append(record)
+            self._positions[record.book_id] = position
+            for field in INDEXED_FIELDS:
+                value = getattr(record, field)
+                self._index[field].setdefault(value, array("L")).append(position)
+            if record.available:
+                self._count_available(record, 1)
+
+    def remove_book(self, book_id):
+        """
+        Drop a book from the replica. Unknown ids are ignored.
+
+        :param book_id: Book's _id
+        """
+        if not self.tracking:
+            return
+
+        with self._lock:
+            if str(book_id) in self._positions:
+                self._remove(str(book_id))
+                if len(self._records) > 2 * len(self._positions) + 1024:
+                    self._compact()
+
+    def set_available(self, book_id, available):
+        """
+        Update the availability of a stored book. Unknown ids are ignored.
+
+        :param book_id: Book's _id
+        :param available: Whether the book can currently be borrowed
+        """
+        if not self.tracking:
+            return
+
+        with self._lock:
+            position = self._positions.get(str(book_id))
+            if position is None:
+                return
+            record = self._records[position]
+            if record.available != available:
+                record.available = available
+                self._count_available(record, 1 if available else -1)
+
+    def get(self, book_id):
+        """
+        Look up a book by its id.
+
+        :param book_id: Book's _id
+        :return: Book dictionary including its availability, or None
+        """
+        with self._lock:
+            position = self._positions.get(str(book_id))
+            if position is None:
+                return None
+            record = self._records[position]
+            book = record.to_dict()
+            book["available"] = record.available
+            return book
+
+    def query(self, filters, skip=0, limit=10):
+        """
+        Page through the available books matching every filter.
+
+        :param filters: Mapping of indexed field to the required value
+        :param skip: Number of matching books to skip
+        :param limit: Maximum number of books to return
+        :return: Tuple of the total match count and the requested page
+        """
+        with self._lock:
+            if filters:
+                # Scan the positions of the most selective filter value
+                candidates = [
+                    self._index[field].get(value, ())
+                    for field, value in filters.items()
+                ]
+                positions = min(candidates, key=len)
+            else:
+                positions = range(len(self._records))
+
+            matches = (
+                record
+                for record in map(self._records.__getitem__, positions)
+                if record is not None
+                and record.available
+                and all(getattr(record, f) == v for f, v in filters.items())
+            )
+
+            if len(filters) > 1:
+                matches = list(matches)
+                count = len(matches)
+                page = matches[skip : skip + limit]
+            else:
+                count = self._count(filters)
+                page = list(islice(matches, skip, skip + limit))
+
+            return count, [record.to_dict() for record in page]
+
+    def _count(self, filters):
+        if not filters:
+            return self._available_total
+        ((field, value),) = filters.items()
+        return self._available_counts[field].get(value, 0)
+
+    def _count_available(self, record, delta):
+        self._available_total += delta
+        for field in INDEXED_FIELDS:
+            counts = self._available_counts[field]
+            value = getattr(record, field)
+            counts[value] = counts.get(value, 0) + delta
+            if not counts[value]:
+                del counts[value]
+
+    def _remove(self, book_id):
+        position = self._positions.pop(book_id)
+        record = self._records[position]
+        self._records[position] = None
+
+        for field in INDEXED_FIELDS:
+            value = getattr(record, field)
+            positions = self._index[field][value]
+            del positions[bisect.bisect_left(positions, position)]
+            if not positions:
+                del self._index[field][value]
+        if record.available:
+            self._count_available(record, -1)
+
+    def _compact(self):
+        records = [record for record in self._records if record is not None]
+        self._records = records
+        self._positions = {record.book_id: i for i, record in enumerate(records)}
+        self._index = {field: {} for field in INDEXED_FIELDS}
+        for position, record in enumerate(records):
+            for field in INDEXED_FIELDS:
+                value = getattr(record, field)
+                self._index[field].setdefault(value, array("L")).append(position)
+
+
+catalogue = CatalogueReplica()
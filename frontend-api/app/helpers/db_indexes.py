@@ -0,0 +1,126 @@
+"""
+MongoDB indexes backing the sorted catalogue listings and the loan counts.
+
+`GET /books?sort=` only accepts orders that a compound index can return
+directly. For every supported sort field there is one index per filter field,
+laid out equality, sort, range: the filter equality field, then the sort field
+and `_id` as a tie breaker for stable pagination, then `available_copies`,
+whose `> 0` range is checked on the index keys without fetching the borrowed
+out books. Listing queries hint the matching index, so MongoDB walks it in
+order (forwards or backwards) and never falls back to an in-memory sort of the
+matching books.
+
+Open loans are counted per user from an index on `returned_on` then
+`user_id`, when the loan limit counters are reconciled.
+
+User emails are unique, which catches the enrollments of the same email racing
+past the existence check.
+"""
+
+from app.helpers.filters import FILTER_FIELDS
+from pymongo.errors import OperationFailure
+
+SORT_FIELDS = ("title", "author", "added_at")
+OPEN_LOANS_INDEX_NAME = "open_loans_by_user"
+USER_EMAIL_INDEX_NAME = "unique_email"
+
+
+def listing_index_keys(filter_field, sort_field):
+    """
+    Return the keys of the index serving a filter field and a sort field.
+
+    :param filter_field: Equality filter field, or None for unfiltered listings
+    :param sort_field: One of the sort fields
+    :return: List of (field, direction) pairs
+    """
+    keys = []
+    if filter_field:
+        keys.append((filter_field, 1))
+    if sort_field != filter_field:
+        keys.append((sort_field, 1))
+    keys.append(("_id", 1))
+    keys.append(("available_copies", 1))
+    return keys
+
+
+def listing_index_name(filter_field, sort_field):
+    """Return the name of the index serving a filter field and a sort field."""
+    return f"listing_{filter_field or 'all'}_by_{sort_field}"
+
+
+def ensure_indexes(mongo):
+    """
+    Create the listing, open loans and user email indexes. Existing indexes are
+    left untouched, unless their keys changed, in which case they are rebuilt.
+
+    :param mongo: MongoDB instance
+    """
+    existing = mongo.db.books.index_information()
+    for sort_field in SORT_FIELDS:
+        for filter_field in (None,) + FILTER_FIELDS:
+            keys = listing_index_keys(filter_field, sort_field)
+            name = listing_index_name(filter_field, sort_field)
+            if name in existing and list(existing[name]["key"]) != keys:
+                mongo.db.books.drop_index(name)
+            mongo.db.books.create_index(keys, name=name)
+    mongo.db.borrow_records.create_index(
+        [("returned_on", 1), ("user_id", 1)], name=OPEN_LOANS_INDEX_NAME
+    )
+    try:
+        mongo.db.users.create_index(
+            [("email", 1)], name=USER_EMAIL_INDEX_NAME, unique=True
+        )
+    except OperationFailure as error:
+        print(f"Emails are not unique, enrollments may race: {error}")
+
+
+def parse_sort(sort):
+    """
+    Split a sort parameter such as `title` or `-added_at`.
+
+    :param sort: Sort field, prefixed with `-` for a descending order
+    :return: Tuple of the sort field and the direction (1 or -1)
+    """
+    if sort.startswith("-"):
+        return sort[1:], -1
+    return sort, 1
+
+
+def listing_index(query, sort_field):
+    """
+    Choose the index serving a listing query in the given order.
+
+    The index must start with a field bound to exact values: a single value
+    keeps the index order, several `$in` values are merged in order, while a
+    `$nin` range cannot be walked in order and is checked on each document.
+    Equality fields are preferred, then `$in` fields, in canonical field order.
+
+    :param query: MongoDB query of the listing
+    :param sort_field: One of the sort fields
+    :return: Name of the index to hint
+    """
+    equality_fields = [
+        field for field in FILTER_FIELDS if isinstance(query.get(field), str)
+    ]
+    in_fields = [
+        field
+        for field in FILTER_FIELDS
+        if isinstance(query.get(field), dict) and "$in" in query[field]
+    ]
+    filter_field = next(iter(equality_fields + in_fields), None)
+    return listing_index_name(filter_field, sort_field)
+
+
+def sort_options(query, sort):
+    """
+    Build the `find` options of a sorted listing.
+
+    :param query: MongoDB query of the listing
+    :param sort: Sort parameter, e.g. `title` or `-added_at`
+    :return: Dictionary with the `sort` specification and the index `hint`
+    """
+    sort_field, direction = parse_sort(sort)
+    return {
+        "sort": [(sort_field, direction), ("_id", direction)],
+        "hint": listing_index(query, sort_field),
+    }
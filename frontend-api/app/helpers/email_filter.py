@@ -0,0 +1,189 @@
+"""
+Bloom filter of the enrolled emails, kept in a Redis bitmap.
+
+Most enrollments are for new emails, so checking MongoDB for an existing user
+is almost always a wasted round trip. Each email sets `hashes` bits of the
+bitmap; when any of them is clear, the email was never enrolled and MongoDB is
+not queried. When all are set, the email may be enrolled and MongoDB decides.
+A single Lua script checks the bits and counts the outcome in one round trip.
+
+The filter is sized for `EMAIL_FILTER_CAPACITY` emails at an
+`EMAIL_FILTER_ERROR_RATE` false positive rate, and its key embeds that shape,
+so a resized filter starts empty and is ignored until rebuilt. It is built at
+startup when missing, and rebuilt from the users collection into a temporary
+key renamed over the live one. Enrollments racing a rebuild, or the filter,
+are caught by the unique email index. While the filter is missing or Redis is
+unreachable, every check goes to MongoDB.
+"""
+
+import hashlib
+import math
+from uuid import uuid4
+
+from bson import ObjectId
+from flask import current_app
+from redis.exceptions import RedisError
+
+FILTER_PREFIX = "email_filter"
+STATS_KEY = f"{FILTER_PREFIX}:stats"
+
+# Return -1 when the filter was not built, 0 when a bit is clear, 1 otherwise,
+# counting the outcome
+CHECK_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('HINCRBY', KEYS[2], 'unavailable', 1)
+    return -1
+end
+for _, offset in ipairs(ARGV) do
+    if redis.call('GETBIT', KEYS[1], offset) == 0 then
+        redis.call('HINCRBY', KEYS[2], 'negatives', 1)
+        return 0
+    end
+end
+redis.call('HINCRBY', KEYS[2], 'positives', 1)
+return 1
+"""
+
+
+def filter_shape(capacity, error_rate):
+    """
+    Size a Bloom filter.
+
+    :param capacity: Number of emails the filter is sized for
+    :param error_rate: Wanted false positive rate at that capacity
+    :return: Tuple of the number of bits and the number of hashes per email
+    """
+    size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+    hashes = max(1, round(size / capacity * math.log(2)))
+    return size, hashes
+
+
+class EmailFilter:
+    """Bloom filter of the enrolled emails."""
+
+    def __init__(self, redis, capacity, error_rate):
+        self.redis = redis
+        self.size, self.hashes = filter_shape(capacity, error_rate)
+        self.key = f"{FILTER_PREFIX}:{self.size}:{self.hashes}"
+
+    def offsets(self, email):
+        """Return the bits set by an email, by double hashing."""
+        digest = hashlib.blake2b(email.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "big")
+        second = int.from_bytes(digest[8:], "big") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def check(self, email):
+        """
+        Check whether an email may have been enrolled.
+
+        :return: 0 when the email was definitely never enrolled, 1 when it may
+            have been, -1 when the filter cannot tell
+        """
+        try:
+            return self.redis.register_script(CHECK_SCRIPT)(
+                keys=[self.key, STATS_KEY], args=self.offsets(email)
+            )
+        except RedisError:
+            return -1
+
+    def record_false_positive(self):
+        """Count an email the filter matched although it was never enrolled."""
+        try:
+            self.redis.hincrby(STATS_KEY, "false_positives")
+        except RedisError:
+            pass
+
+    def add(self, *emails):
+        """Set the bits of enrolled emails."""
+        pipeline = self.redis.pipeline(transaction=False)
+        for email in emails:
+            self._set_bits(pipeline, self.key, email)
+        try:
+            pipeline.execute()
+        except RedisError:
+            pass
+
+    def _set_bits(self, pipeline, key, email):
+        for offset in self.offsets(email):
+            pipeline.setbit(key, offset, 1)
+
+    def rebuild(self, mongo, batch_size=1000):
+        """
+        Build the filter from the users collection into a temporary key, then
+        swap it in.
+
+        :param mongo: MongoDB instance
+        :param batch_size: Number of emails written per round trip
+        :return: Number of emails added
+        """
+        started = ObjectId()
+        building = f"{self.key}:building:{uuid4().hex}"
+        # Allocate the whole bitmap, so that an empty filter exists too
+        self.redis.setbit(building, self.size - 1, 0)
+
+        added = 0
+        pipeline = self.redis.pipeline(transaction=False)
+        users = mongo.db.users.find({}, {"email": 1, "_id": 0}, batch_size=batch_size)
+        for user in users:
+            self._set_bits(pipeline, building, user["email"])
+            added += 1
+            if added % batch_size == 0:
+                pipeline.execute()
+        pipeline.execute()
+        self.redis.rename(building, self.key)
+        self.redis.delete(STATS_KEY)
+
+        # Add again the users enrolled while the filter was being built
+        recent = mongo.db.users.find({"_id": {"$gte": started}}, {"email": 1})
+        self.add(*(user["email"] for user in recent))
+        return added
+
+    def ensure(self, mongo):
+        """
+        Build the filter unless it exists.
+
+        :return: True when it was built
+        """
+        if self.redis.exists(self.key):
+            return False
+        self.rebuild(mongo)
+        return True
+
+    def stats(self):
+        """
+        Summarize the filter checks and how full the filter is.
+
+        :return: Dictionary of the check outcomes, the observed false positive
+            rate among new emails, the share of set bits and the false positive
+            rate it implies
+        """
+        stats = {
+            field.decode(): int(value)
+            for field, value in self.redis.hgetall(STATS_KEY).items()
+        }
+        negatives = stats.get("negatives", 0)
+        false_positives = stats.get("false_positives", 0)
+        new_emails = negatives + false_positives
+        fill_ratio = self.redis.bitcount(self.key) / self.size
+        return {
+            "size_bits": self.size,
+            "hashes": self.hashes,
+            "negatives": negatives,
+            "positives": stats.get("positives", 0),
+            "false_positives": false_positives,
+            "unavailable": stats.get("unavailable", 0),
+            "false_positive_rate": false_positives / new_emails if new_emails else 0.0,
+            "fill_ratio": fill_ratio,
+            "estimated_false_positive_rate": fill_ratio**self.hashes,
+        }
+
+
+def email_filter(redis, config=None):
+    """Return the email filter shaped by the app configuration."""
+    config = config if config is not None else current_app.config
+    return EmailFilter(
+        redis,
+        config.get("EMAIL_FILTER_CAPACITY", 1_000_000),
+        config.get("EMAIL_FILTER_ERROR_RATE", 0.01),
+    )
@@ -0,0 +1,75 @@
+"""
+Parsing and normalization of the book listing filters.
+
+`GET /books` accepts one or more comma separated values per filter field
+(`publisher=Wiley,Manning`) and negated filters (`category!=Poetry`). Filters
+are normalized into a canonical shape, with fields in a fixed order and values
+deduplicated and sorted, so that equivalent requests share the same page cache
+key and the same index hint. A single included value stays a plain string,
+which keeps the queries and cache keys of simple filters unchanged.
+"""
+
+from app.helpers.utils import split_list_param
+
+FILTER_FIELDS = ("publisher", "category", "author")
+
+
+def parse_filters(args):
+    """
+    Read the included and excluded values of every filter field.
+
+    :param args: Query parameters of the request
+    :return: Tuple of the included filters, mapping each field to a value or a
+        sorted list of values, and the excluded filters, mapping each field to
+        a sorted list of values
+    """
+    included = {}
+    excluded = {}
+    for field in FILTER_FIELDS:
+        values = sorted(set(split_list_param(args.get(field)) or ()))
+        if values:
+            included[field] = values[0] if len(values) == 1 else values
+        values = sorted(set(split_list_param(args.get(f"{field}!")) or ()))
+        if values:
+            excluded[field] = values
+    return included, excluded
+
+
+def filter_values(value):
+    """Return the values of an included filter as a list."""
+    return [value] if isinstance(value, str) else list(value)
+
+
+def filters_query(included, excluded=None):
+    """
+    Translate normalized filters into MongoDB query conditions.
+
+    :param included: Mapping of field to a value or a list of accepted values
+    :param excluded: Mapping of field to a list of rejected values
+    :return: Dictionary of conditions, in canonical field order
+    """
+    excluded = excluded or {}
+    query = {}
+    for field in FILTER_FIELDS:
+        condition = {}
+        if isinstance(included.get(field), str) and field not in excluded:
+            query[field] = included[field]
+            continue
+        if field in included:
+            condition["$in"] = filter_values(included[field])
+        if field in excluded:
+            condition["$nin"] = excluded[field]
+        if condition:
+            query[field] = condition
+    return query
+
+
+def cache_filters(included, excluded=None):
+    """
+    Flatten normalized filters into the mapping used by the page cache, where
+    excluded fields are marked with a trailing `!`.
+    """
+    filters = dict(included)
+    for field, values in (excluded or {}).items():
+        filters[f"{field}!"] = values
+    return filters
@@ -0,0 +1,113 @@
+"""
+Holds on borrowed out books, and the notifications of their holders.
+
+Instead of polling `GET /books/<book_id>` until a book comes back, users place
+a hold on it. The holders of a book queue in a Redis sorted set scored by the
+time of their hold, so they are served first come, first served. When loans
+are released, the first holder of the book is popped for every copy given back
+and a notification is pushed onto the holder's list, which clients wait on
+with a long-poll. Every replica receives the release events, so the replica
+that claims the event id is the only one notifying.
+
+A notification does not reserve the copy: the holder is told first and still
+borrows it as usual.
+"""
+
+import json
+import time
+from datetime import datetime
+
+from redis.exceptions import RedisError
+
+HOLD_PREFIX = "holds"
+NOTIFICATION_PREFIX = "notifications"
+CLAIM_PREFIX = f"{HOLD_PREFIX}:notified"
+
+# How long undelivered notifications, and event claims, are kept
+NOTIFICATION_TTL = 7 * 24 * 3600
+
+
+def hold_key(book_id):
+    """Return the key of the queue of holders of a book."""
+    return f"{HOLD_PREFIX}:{book_id}"
+
+
+def notification_key(user_id):
+    """Return the key of the pending notifications of a user."""
+    return f"{NOTIFICATION_PREFIX}:{user_id}"
+
+
+def place_hold(redis, book_id, user_id):
+    """
+    Queue a user for a book, keeping the place of a user already queued.
+
+    :param redis: Redis instance
+    :param book_id: Held book's _id
+    :param user_id: Holding user's _id
+    :return: Position of the user in the queue, from 1
+    """
+    pipeline = redis.pipeline()
+    pipeline.zadd(hold_key(book_id), {str(user_id): time.time()}, nx=True)
+    pipeline.zrank(hold_key(book_id), str(user_id))
+    _, rank = pipeline.execute()
+    return rank + 1
+
+
+def notify_holders(redis, released, event_id=None):
+    """
+    Pop the first holder of each book for every copy given back, and notify
+    them.
+
+    :param redis: Redis instance
+    :param released: Mapping of book id to the number of copies given back
+    :param event_id: Id of the release event, claimed so that only one replica
+        notifies
+    :return: Number of holders notified
+    """
+    if not released:
+        return 0
+    try:
+        if event_id is not None and not redis.set(
+            f"{CLAIM_PREFIX}:{event_id}", 1, nx=True, ex=NOTIFICATION_TTL
+        ):
+            return 0
+
+        pipeline = redis.pipeline()
+        for book_id, count in released.items():
+            pipeline.zpopmin(hold_key(book_id), count)
+        holders = pipeline.execute()
+
+        notified = 0
+        pipeline = redis.pipeline(transaction=False)
+        for book_id, popped in zip(released, holders):
+            for user_id, _ in popped:
+                notification = {
+                    "event": "book_available",
+                    "book_id": str(book_id),
+                    "notified_at": datetime.utcnow().isoformat(),
+                }
+                key = notification_key(user_id.decode())
+                pipeline.rpush(key, json.dumps(notification))
+                pipeline.expire(key, NOTIFICATION_TTL)
+                notified += 1
+        pipeline.execute()
+    except RedisError:
+        return 0
+    return notified
+
+
+def wait_for_notifications(redis, user_id, timeout):
+    """
+    Wait for notifications of a user, then take all of them.
+
+    :param redis: Redis instance
+    :param user_id: Notified user's _id
+    :param timeout: Seconds to wait for a first notification
+    :return: List of notifications, empty when none came in time
+    """
+    key = notification_key(user_id)
+    first = redis.blpop([key], timeout=timeout)
+    if first is None:
+        return []
+    rest = redis.lpop(key, 100) or []
+    return [json.loads(message) for message in [first[1], *rest]]
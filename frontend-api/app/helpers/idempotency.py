@@ -0,0 +1,154 @@
+"""
+`Idempotency-Key` support for the POST endpoints clients retry on timeouts.
+
+The first request carrying a key claims it with a pending marker (`SET NX`),
+runs, and stores its response in Redis for `IDEMPOTENCY_TTL` seconds. Retries
+with the same key get the stored response back without running the view
+again, so no lookup, insert or event is repeated. Duplicates arriving while
+the first request runs poll the key until its response is stored, for at most
+`IDEMPOTENCY_WAIT` seconds. A key reused with a different body is rejected.
+
+Server errors are not stored, so the request can be retried, and the feature
+fails open: when Redis is unreachable, requests run as if they had no key.
+"""
+
+import hashlib
+import json
+import time
+from functools import wraps
+
+from flask import Response, current_app, jsonify, make_response, request
+from redis.exceptions import RedisError
+
+from app import r
+
+KEY_PREFIX = "idempotency"
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+
+
+def request_fingerprint():
+    """Hash the body of the current request."""
+    return hashlib.sha1(request.get_data()).hexdigest()
+
+
+def claim_key(redis, key, fingerprint, lock_ttl):
+    """
+    Claim an idempotency key for the current request, or read what the request
+    that claimed it left there.
+
+    :return: None once claimed, else the stored state of the key
+    """
+    pending = json.dumps({"state": "pending", "fingerprint": fingerprint})
+    if redis.set(key, pending, nx=True, ex=lock_ttl):
+        return None
+    stored = redis.get(key)
+    if stored is None:
+        # Expired in between, claim it again
+        return claim_key(redis, key, fingerprint, lock_ttl)
+    return json.loads(stored)
+
+
+def wait_for_response(redis, key, timeout):
+    """
+    Poll an idempotency key until the request holding it stores its response.
+
+    :return: Stored state, or None when the key was released or the wait
+        timed out
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        stored = redis.get(key)
+        if stored is None:
+            return None
+        state = json.loads(stored)
+        if state["state"] == "done":
+            return state
+    return None
+
+
+def release_key(redis, key):
+    """Drop a claimed key so that the request can be retried."""
+    try:
+        redis.delete(key)
+    except RedisError:
+        pass
+
+
+def replay(state):
+    """Rebuild a stored response."""
+    response = Response(state["body"], state["status"], mimetype=state["mimetype"])
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def idempotent(view):
+    """Replay the stored response of requests repeating an `Idempotency-Key`."""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        idempotency_key = request.headers.get(HEADER)
+        if not idempotency_key:
+            return view(*args, **kwargs)
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            return (
+                jsonify(
+                    {"message": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters"}
+                ),
+                400,
+            )
+
+        config = current_app.config
+        key = f"{KEY_PREFIX}:{request.method}:{request.path}:{idempotency_key}"
+        fingerprint = request_fingerprint()
+        try:
+            state = claim_key(
+                r, key, fingerprint, config.get("IDEMPOTENCY_LOCK_TTL", 30)
+            )
+            if state is not None and state["fingerprint"] != fingerprint:
+                return (
+                    jsonify(
+                        {"message": f"{HEADER} was already used with another request"}
+                    ),
+                    422,
+                )
+            if state is not None and state["state"] == "pending":
+                # Wait for the duplicate in progress instead of running again
+                state = wait_for_response(r, key, config.get("IDEMPOTENCY_WAIT", 10))
+                if state is None:
+                    return (
+                        jsonify(
+                            {"message": f"A request with this {HEADER} is in progress"}
+                        ),
+                        409,
+                    )
+            if state is not None:
+                return replay(state)
+        except RedisError:
+            return view(*args, **kwargs)
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            release_key(r, key)
+            raise
+
+        if response.status_code >= 500:
+            release_key(r, key)
+            return response
+        try:
+            state = {
+                "state": "done",
+                "fingerprint": fingerprint,
+                "status": response.status_code,
+                "mimetype": response.mimetype,
+                "body": response.get_data(as_text=True),
+            }
+            r.set(key, json.dumps(state), ex=config.get("IDEMPOTENCY_TTL", 86400))
+        except RedisError:
+            pass
+        return response
+
+    return wrapper
@@ -0,0 +1,88 @@
+"""
+Wiring of the in-memory catalogue indexes served by the frontend.
+
+The search, typeahead and facet indexes, and optionally the catalogue replica,
+are warmed from MongoDB at startup and then kept current through the hooks
+below, which are called by `handle_events` and by the borrow path.
+"""
+
+from app.helpers.catalogue import catalogue
+from app.helpers.facet_index import facet_index
+from app.helpers.search_index import search_index
+from app.helpers.suggest_index import suggest_index
+
+
+def warm_indexes(mongo, replica=False):
+    """
+    Build every in-memory index from the books collection.
+
+    :param mongo: MongoDB instance
+    :param replica: Also load the catalogue replica and serve reads from it
+    """
+    search_index.load(
+        mongo.db.books.find(
+            {},
+            {
+                "title": 1,
+                "author": 1,
+                "publisher": 1,
+                "category": 1,
+                "available": 1,
+                "available_copies": 1,
+            },
+        )
+    )
+    suggest_index.load(
+        mongo.db.books.find({}, {"title": 1, "author": 1, "publisher": 1})
+    )
+    facet_index.load(
+        mongo.db.books.find(
+            {},
+            {
+                "publisher": 1,
+                "category": 1,
+                "author": 1,
+                "available": 1,
+                "available_copies": 1,
+            },
+        )
+    )
+    if replica:
+        catalogue.load(mongo.db.books.find({}))
+
+
+def index_book_added(book):
+    """
+    Add a new book to every index.
+
+    :param book: Book document as stored in MongoDB
+    """
+    search_index.add_book(book)
+    suggest_index.add_book(book)
+    facet_index.add_book(book)
+    catalogue.add_book(book)
+
+
+def index_book_removed(book_id):
+    """
+    Drop a removed book from every index.
+
+    :param book_id: Book's _id
+    """
+    search_index.remove_book(book_id)
+    suggest_index.remove_book(book_id)
+    facet_index.remove_book(book_id)
+    catalogue.remove_book(book_id)
+
+
+def index_book_availability(book_id, available):
+    """
+    Record a change of availability in the indexes that only serve available
+    books.
+
+    :param book_id: Book's _id
+    :param available: Whether the book can currently be borrowed
+    """
+    search_index.set_available(book_id, available)
+    facet_index.set_available(book_id, available)
+    catalogue.set_available(book_id, available)
@@ -0,0 +1,206 @@
+"""
+Copy counters of the catalogue books.
+
+A title held in several copies is a single book document with `total_copies`
+and `available_copies` counters, instead of one document per copy. Borrowing
+decrements `available_copies` with a conditional update that only matches
+while a copy is left, so concurrent borrows of the last copy cannot both
+succeed, and releasing loans increments it again, capped at `total_copies`.
+Events carry these deltas rather than whole documents.
+
+Every replica receives each release event, and may replay it on restart, so a
+release only gives copies back for the loans it actually closes: each borrow
+record moves from open to returned once, whichever application gets there
+first.
+
+Books stored before the counters existed have a single `available` flag, and
+are converted when the API starts, or by `flask migrate-copies`, before any
+listing or borrow relies on the counters; `copies_available` reads both shapes.
+"""
+
+from collections import Counter
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+# Fields identifying the documents that are copies of the same title
+COPY_KEY_FIELDS = ("title", "author", "publisher")
+
+
+def copies_available(book):
+    """Tell whether a book document has a copy left to borrow."""
+    if "available_copies" in book:
+        return book["available_copies"] > 0
+    return book.get("available", True)
+
+
+def stock_book(book):
+    """
+    Fill in the copy counters of a book announced without them, which is then
+    held in a single copy, borrowed out when its legacy `available` flag is off.
+
+    :param book: Book document, updated in place
+    :return: The same book document
+    """
+    available = book.pop("available", True)
+    book.setdefault("total_copies", 1)
+    book.setdefault("available_copies", book["total_copies"] if available else 0)
+    return book
+
+
+def stocked_copies(book):
+    """Return the counter of a book new to this API, with every copy available."""
+    return {"available_copies": book.get("total_copies", 1)}
+
+
+def close_loans(mongo, loans):
+    """
+    Mark released loans returned, unless they already are.
+
+    Each loan is closed by a conditional update tagged with an id unique to
+    this call, then the tagged records tell which loans this call closed. Loans
+    without a borrow record here, e.g. borrowed before this database was
+    bootstrapped, are recorded as returned.
+
+    :param mongo: MongoDB instance
+    :param loans: Released loans, with `_id`, `book_id` and `returned_on`
+    :return: The loans closed by this call
+    """
+    if not loans:
+        return []
+    release_id = ObjectId()
+    operations = [
+        UpdateOne(
+            {"_id": loan["_id"], "returned_on": {"$exists": False}},
+            {
+                "$set": {"returned_on": loan["returned_on"], "release_id": release_id},
+                "$setOnInsert": {
+                    field: loan[field]
+                    for field in ("book_id", "user_id")
+                    if loan.get(field) is not None
+                },
+            },
+            upsert=True,
+        )
+        for loan in loans
+    ]
+    try:
+        mongo.db.borrow_records.bulk_write(operations, ordered=False)
+    except BulkWriteError as error:
+        # Loans already returned fail to be inserted again
+        if any(
+            write_error["code"] != 11000 for write_error in error.details["writeErrors"]
+        ):
+            raise
+    closed = {
+        record["_id"]
+        for record in mongo.db.borrow_records.find(
+            {"_id": {"$in": [loan["_id"] for loan in loans]}, "release_id": release_id},
+            {"_id": 1},
+        )
+    }
+    return [loan for loan in loans if loan["_id"] in closed]
+
+
+def released_copies(loans):
+    """Count the released loans of each book."""
+    return Counter(loan["book_id"] for loan in loans)
+
+
+def release_operations(released):
+    """
+    Build the updates giving back the copies of released loans.
+
+    Only the loans closed by `close_loans` are given back. The counter never
+    goes above `total_copies` either, which also holds when the snapshot a
+    replica was bootstrapped from already reflects a replayed release.
+
+    :param released: Mapping of book id to the number of released copies
+    :return: List of write operations
+    """
+    return [
+        UpdateOne(
+            {"_id": book_id},
+            [
+                {
+                    "$set": {
+                        "available_copies": {
+                            "$min": [
+                                {"$add": ["$available_copies", count]},
+                                "$total_copies",
+                            ]
+                        }
+                    }
+                }
+            ],
+        )
+        for book_id, count in released.items()
+    ]
+
+
+def migrate_copies(mongo):
+    """
+    Convert the books stored with an `available` flag to copy counters.
+
+    :param mongo: MongoDB instance
+    :return: Number of converted books
+    """
+    result = mongo.db.books.update_many(
+        {"total_copies": {"$exists": False}},
+        [
+            {
+                "$set": {
+                    "total_copies": 1,
+                    "available_copies": {
+                        "$cond": [{"$eq": ["$available", False]}, 0, 1]
+                    },
+                }
+            },
+            {"$unset": "available"},
+        ],
+    )
+    return result.modified_count
+
+
+def merge_duplicate_books(mongo):
+    """
+    Fold the documents stored once per copy of the same title into the oldest
+    one, adding up their counters and moving their borrow records over.
+
+    :param mongo: MongoDB instance
+    :return: Number of deleted duplicate documents
+    """
+    groups = mongo.db.books.aggregate(
+        [
+            {"$sort": {"_id": 1}},
+            {
+                "$group": {
+                    "_id": {field: f"${field}" for field in COPY_KEY_FIELDS},
+                    "book_ids": {"$push": "$_id"},
+                    "total_copies": {"$sum": "$total_copies"},
+                    "available_copies": {"$sum": "$available_copies"},
+                }
+            },
+            {"$match": {"book_ids.1": {"$exists": True}}},
+        ],
+        allowDiskUse=True,
+    )
+    merged = 0
+    for group in groups:
+        book_id, *duplicate_ids = group["book_ids"]
+        mongo.db.books.update_one(
+            {"_id": book_id},
+            {
+                "$set": {
+                    "total_copies": group["total_copies"],
+                    "available_copies": group["available_copies"],
+                }
+            },
+        )
+        mongo.db.borrow_records.update_many(
+            {"book_id": {"$in": duplicate_ids}}, {"$set": {"book_id": book_id}}
+        )
+        mongo.db.books.delete_many({"_id": {"$in": duplicate_ids}})
+        merged += len(duplicate_ids)
+    return merged
@@ -0,0 +1,138 @@
+"""
+Per-user limit on the books held at once.
+
+The number of open loans of each user is kept in a Redis counter rather than
+counted in `borrow_records` on every borrow. A Lua script checks the counter
+against the limit and increments it in one atomic round trip, so concurrent
+borrows by the same user cannot both pass the check. Counters are decremented
+when a borrow finds no copy left and when the backend releases loans, and are
+periodically reset from the open loans stored in MongoDB, which repairs the
+drift left by lost events or Redis restarts. The limit fails open: when Redis
+is unreachable, borrows are allowed and the next reconciliation catches up.
+"""
+
+from itertools import islice
+
+from redis.exceptions import RedisError
+
+COUNTER_PREFIX = "open_loans"
+OPEN_LOAN = {"returned_on": {"$exists": False}}
+
+# Increment the counter unless it reached the limit (0 means no limit), in
+# which case -1 is returned
+ACQUIRE_SCRIPT = """
+local count = tonumber(redis.call('GET', KEYS[1]) or '0')
+local limit = tonumber(ARGV[1])
+if limit > 0 and count >= limit then
+    return -1
+end
+return redis.call('INCR', KEYS[1])
+"""
+
+# Decrement the counter, dropping it once no loan is left
+RELEASE_SCRIPT = """
+local count = redis.call('DECRBY', KEYS[1], ARGV[1])
+if count <= 0 then
+    redis.call('DEL', KEYS[1])
+    return 0
+end
+return count
+"""
+
+
+def counter_key(user_id):
+    """Return the key of the open loans counter of a user."""
+    return f"{COUNTER_PREFIX}:{user_id}"
+
+
+def acquire_loan_slot(redis, user_id, limit):
+    """
+    Count a new loan of a user, unless the user already holds `limit` books.
+
+    :param redis: Redis instance
+    :param user_id: Borrowing user's _id
+    :param limit: Most books a user may hold at once, 0 for no limit
+    :return: False when the limit is reached, True otherwise
+    """
+    try:
+        count = redis.register_script(ACQUIRE_SCRIPT)(
+            keys=[counter_key(user_id)], args=[limit]
+        )
+    except RedisError:
+        return True
+    return count != -1
+
+
+def release_loan_slots(redis, released):
+    """
+    Give back the loan slots of closed or failed loans.
+
+    :param redis: Redis instance
+    :param released: Mapping of user id to the number of closed loans
+    """
+    if not released:
+        return
+    script = redis.register_script(RELEASE_SCRIPT)
+    try:
+        pipeline = redis.pipeline(transaction=False)
+        for user_id, count in released.items():
+            script(keys=[counter_key(user_id)], args=[count], client=pipeline)
+        pipeline.execute()
+    except RedisError:
+        pass
+
+
+def reconcile_loan_counts(mongo, redis, batch_size=1000):
+    """
+    Reset the open loans counters from the borrow records.
+
+    Borrows running during the reconciliation may be counted once less until
+    the next run.
+
+    :param mongo: MongoDB instance
+    :param redis: Redis instance
+    :param batch_size: Number of counters compared per round trip
+    :return: Dictionary with the number of users holding books and the number
+        of counters corrected
+    """
+    open_loans = iter(
+        mongo.db.borrow_records.aggregate(
+            [
+                {"$match": OPEN_LOAN},
+                {"$group": {"_id": "$user_id", "count": {"$sum": 1}}},
+            ],
+            allowDiskUse=True,
+            batchSize=batch_size,
+        )
+    )
+    counted = set()
+    corrected = 0
+
+    while True:
+        batch = list(islice(open_loans, batch_size))
+        if not batch:
+            break
+        keys = [counter_key(user["_id"]) for user in batch]
+        drifted = [
+            (key, user["count"])
+            for key, value, user in zip(keys, redis.mget(keys), batch)
+            if value is None or int(value) != user["count"]
+        ]
+        if drifted:
+            pipeline = redis.pipeline(transaction=False)
+            for key, count in drifted:
+                pipeline.set(key, count)
+            pipeline.execute()
+        counted.update(keys)
+        corrected += len(drifted)
+
+    # Drop the counters of the users without open loans
+    stale = [
+        key
+        for key in redis.scan_iter(match=f"{COUNTER_PREFIX}:*", count=batch_size)
+        if key.decode() not in counted
+    ]
+    for start in range(0, len(stale), batch_size):
+        redis.delete(*stale[start : start + batch_size])
+
+    return {"users": len(counted), "corrected": corrected + len(stale)}
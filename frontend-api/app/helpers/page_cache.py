@@ -0,0 +1,139 @@
+"""
+Redis-backed page cache for `GET /books` shared by every frontend replica.
+
+Pages are keyed by their normalized filters and pagination, and every cached
+page is registered in one tag set per filter value it depends on (or in the
+`unfiltered` tag set). A change to a book only drops the pages tagged with its
+publisher, category or author, plus the unfiltered listing, instead of flushing
+the whole cache. The cache fails open: Redis errors are treated as misses.
+"""
+
+import hashlib
+import json
+
+from redis.exceptions import RedisError
+
+CACHE_PREFIX = "books_page"
+STATS_KEY = f"{CACHE_PREFIX}:stats"
+TAGGED_FIELDS = ("publisher", "category", "author")
+
+
+def page_key(filters, page, limit, fields=None, sort=None):
+    """
+    Build the cache key of a listing page.
+
+    :param filters: Mapping of filter field (suffixed with `!` when excluded)
+        to a value or a list of values
+    :param page: Page number
+    :param limit: Page size
+    :param fields: Sparse fieldset of the page, or None for every field
+    :param sort: Order of the page, or None for the natural order
+    :return: Redis key, identical for equivalent requests
+    """
+    fields = sorted(fields) if fields else None
+    normalized = json.dumps(
+        [sorted(filters.items()), page, limit, fields, sort], sort_keys=True
+    )
+    return f"{CACHE_PREFIX}:{hashlib.sha1(normalized.encode()).hexdigest()}"
+
+
+def page_tags(filters):
+    """
+    Return the tag sets a page with the given filters is registered in.
+
+    A page only shows books carrying one of its included values, so it is
+    tagged with each of them. Pages without included values can show any book
+    and are tagged as unfiltered, whatever they exclude.
+    """
+    tags = [
+        f"{CACHE_PREFIX}:tag:{field}:{value}"
+        for field, values in filters.items()
+        if not field.endswith("!")
+        for value in ([values] if isinstance(values, str) else values)
+    ]
+    return tags or [f"{CACHE_PREFIX}:tag:unfiltered"]
+
+
+def book_tags(book):
+    """Return the tag sets of every page whose content depends on the book."""
+    tags = [f"{CACHE_PREFIX}:tag:unfiltered"]
+    tags.extend(
+        f"{CACHE_PREFIX}:tag:{field}:{book[field]}"
+        for field in TAGGED_FIELDS
+        if book.get(field)
+    )
+    return tags
+
+
+def get_cached_page(redis, filters, page, limit, fields=None, sort=None):
+    """
+    Fetch a cached listing page and record the hit or miss.
+
+    :param redis: Redis instance
+    :return: The cached page, or None on a miss
+    """
+    try:
+        cached = redis.get(page_key(filters, page, limit, fields, sort))
+        redis.hincrby(STATS_KEY, "hits" if cached is not None else "misses")
+    except RedisError:
+        return None
+    return json.loads(cached) if cached is not None else None
+
+
+def cache_page(redis, filters, page, limit, data, ttl, fields=None, sort=None):
+    """
+    Store a listing page and register it in its tag sets.
+
+    :param redis: Redis instance
+    :param ttl: Lifetime of the cached page in seconds
+    """
+    key = page_key(filters, page, limit, fields, sort)
+    try:
+        pipeline = redis.pipeline()
+        pipeline.set(key, json.dumps(data), ex=ttl)
+        for tag in page_tags(filters):
+            pipeline.sadd(tag, key)
+            pipeline.expire(tag, ttl)
+        pipeline.execute()
+    except RedisError:
+        pass
+
+
+def invalidate_pages(redis, *books):
+    """
+    Drop every cached page whose content may change with the given books.
+
+    :param redis: Redis instance
+    :param books: Book documents that were added, removed or borrowed
+    """
+    tags = list(dict.fromkeys(tag for book in books for tag in book_tags(book)))
+    try:
+        keys = redis.sunion(tags)
+        pipeline = redis.pipeline()
+        if keys:
+            pipeline.delete(*keys)
+        pipeline.delete(*tags)
+        pipeline.hincrby(STATS_KEY, "invalidated_pages", len(keys))
+        pipeline.execute()
+    except RedisError:
+        pass
+
+
+def page_cache_stats(redis):
+    """
+    Summarize the shared page cache counters.
+
+    :param redis: Redis instance
+    :return: Dictionary of hits, misses, hit ratio and invalidated pages
+    """
+    stats = {
+        field.decode(): int(value) for field, value in redis.hgetall(STATS_KEY).items()
+    }
+    hits = stats.get("hits", 0)
+    misses = stats.get("misses", 0)
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": hits / (hits + misses) if hits + misses else 0.0,
+        "invalidated_pages": stats.get("invalidated_pages", 0),
+    }
@@ -0,0 +1,186 @@
+"""
+Opt-in sampling profiler for diagnosing CPU spikes in the web workers.
+
+A background thread periodically captures the stacks of the threads that are
+serving profiled requests and aggregates them per route. The result is exposed
+as a collapsed-stack dump (`route;frame;frame count` per line) that can be fed
+straight into flamegraph.pl or speedscope.
+
+Requests are profiled either by sampling a fraction of the traffic
+(`sample_rate`) or explicitly, by sending `X-Profile: 1` together with the
+admin token. Nothing is registered on the app unless `PROFILER_ENABLED` is set,
+and with a zero sample rate the per-request cost is a single comparison.
+"""
+
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+from flask import Blueprint, Response, g, jsonify, request
+
+from app.helpers.auth import admin_required, is_admin_request
+
+
+class StackSampler:
+    """
+    Statistical sampler aggregating the stacks of registered threads per route.
+    """
+
+    def __init__(self, interval=0.005, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.sample_rate = 0.0
+        self._active = {}  # thread ident -> route being served
+        self._stacks = defaultdict(Counter)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def should_sample(self):
+        """Decide whether the current request falls into the sampled fraction."""
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self, route):
+        """Start sampling the calling thread under the given route."""
+        with self._lock:
+            self._active[threading.get_ident()] = route
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="stack-sampler", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self):
+        """Stop sampling the calling thread."""
+        with self._lock:
+            self._active.pop(threading.get_ident(), None)
+
+    def _run(self):
+        # The sampler thread only lives while there are requests to sample
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                active = dict(self._active)
+
+            frames = sys._current_frames()
+            for ident, route in active.items():
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.record(route, frame)
+            del frames
+            time.sleep(self.interval)
+
+    def record(self, route, frame):
+        """Add one sample of the stack ending at `frame` to the route's counts."""
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            module = frame.f_globals.get("__name__", "?")
+            stack.append(f"{module}:{frame.f_code.co_name}")
+            frame = frame.f_back
+        stack.reverse()
+
+        with self._lock:
+            self._stacks[route][";".join(stack)] += 1
+
+    def summary(self):
+        """Return the number of samples collected per route."""
+        with self._lock:
+            return {
+                route: sum(stacks.values()) for route, stacks in self._stacks.items()
+            }
+
+    def collapsed(self, route=None):
+        """
+        Render the collected samples in the collapsed-stack format.
+
+        :param route: Only include samples for this route if given
+        :return: One `route;frame;...;frame count` line per distinct stack
+        """
+        with self._lock:
+            lines = [
+                f"{name};{stack} {count}"
+                for name, stacks in self._stacks.items()
+                if route is None or name == route
+                for stack, count in stacks.items()
+            ]
+        return "\n".join(sorted(lines))
+
+    def reset(self):
+        """Drop every sample collected so far."""
+        with self._lock:
+            self._stacks.clear()
+
+
+sampler = StackSampler()
+
+profiler_bp = Blueprint("profiler_bp", __name__, url_prefix="/admin/profiler")
+
+
+def init_profiler(app):
+    """
+    Register the profiler hooks and endpoints on the app if enabled.
+
+    :param app: Flask application
+    """
+    if not app.config.get("PROFILER_ENABLED"):
+        return
+
+    sampler.sample_rate = app.config.get("PROFILER_SAMPLE_RATE", 0.0)
+    sampler.interval = app.config.get("PROFILER_INTERVAL", sampler.interval)
+    app.before_request(start_sampling)
+    app.teardown_request(stop_sampling)
+    app.register_blueprint(profiler_bp)
+
+
+def start_sampling():
+    forced = "X-Profile" in request.headers and is_admin_request()
+    if forced or sampler.should_sample():
+        rule = request.url_rule.rule if request.url_rule else request.path
+        g.profiled = True
+        sampler.start(f"{request.method}:{rule}")
+
+
+def stop_sampling(exc=None):
+    if g.pop("profiled", False):
+        sampler.stop()
+
+
+@profiler_bp.route("", methods=["GET"])
+@admin_required
+def get_profiler():
+    return (
+        jsonify({"sample_rate": sampler.sample_rate, "routes": sampler.summary()}),
+        200,
+    )
+
+
+@profiler_bp.route("", methods=["PUT"])
+@admin_required
+def update_profiler():
+    data = request.get_json()
+    sample_rate = data.get("sample_rate") if isinstance(data, dict) else None
+
+    if not isinstance(sample_rate, (int, float)) or not 0 <= sample_rate <= 1:
+        return (
+            jsonify({"message": "sample_rate must be a number between 0 and 1."}),
+            400,
+        )
+
+    sampler.sample_rate = float(sample_rate)
+    return jsonify({"sample_rate": sampler.sample_rate}), 200
+
+
+@profiler_bp.route("/stacks", methods=["GET"])
+@admin_required
+def get_stacks():
+    return Response(sampler.collapsed(request.args.get("route")), mimetype="text/plain")
+
+
+@profiler_bp.route("/stacks", methods=["DELETE"])
+@admin_required
+def reset_stacks():
+    sampler.reset()
+    return jsonify({"message": "Profiler samples cleared"}), 200
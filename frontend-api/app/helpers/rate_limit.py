@@ -0,0 +1,147 @@
+"""
+Rate limiting and admission control of the busiest endpoints.
+
+Each limited endpoint has a token bucket per client address and a global one,
+shared by every Frontend API instance through Redis. A Lua script refills the
+buckets from the time elapsed since their last request and takes one token
+from each in a single atomic round trip, or none at all when any is empty, in
+which case the request is refused with a `429` and a `Retry-After` giving the
+seconds until a token is back.
+
+Admitted requests then need one of the `max_in_flight` slots of the endpoint in
+this process. The cap sits below the MongoDB connection pool, so excess
+requests are shed right away with a `503` instead of queueing for a connection
+and slowing every other request down.
+
+Limits are set per blueprint endpoint in `RATE_LIMITS`, e.g.
+`{"user_bp.borrow_book": {"client_rate": 1, "client_burst": 5,
+"global_rate": 200, "global_burst": 400, "max_in_flight": 32}}`, where rates
+are tokens per second and bursts the bucket sizes. A rate or cap of 0, or an
+endpoint missing from the setting, is not limited. The token buckets fail
+open when Redis is unreachable.
+"""
+
+import math
+from threading import BoundedSemaphore
+
+from flask import current_app, g, jsonify, request
+from redis.exceptions import RedisError
+
+from app import r
+
+BUCKET_PREFIX = "rate_limit"
+
+# Refill every bucket, then take a token from each, or return the milliseconds
+# until the emptiest one holds a token again. ARGV holds the rate per second and
+# the burst of each key in turn.
+BUCKET_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i - 1])
+    local burst = tonumber(ARGV[2 * i])
+    local state = redis.call('HMGET', key, 'tokens', 'updated_at')
+    local level = tonumber(state[1]) or burst
+    local updated_at = tonumber(state[2]) or now
+    level = math.min(burst, level + (now - updated_at) * rate / 1000)
+    levels[i] = level
+    if level < 1 then
+        wait = math.max(wait, math.ceil((1 - level) * 1000 / rate))
+    end
+end
+if wait > 0 then
+    return wait
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i - 1])
+    local burst = tonumber(ARGV[2 * i])
+    redis.call('HSET', key, 'tokens', levels[i] - 1, 'updated_at', now)
+    redis.call('PEXPIRE', key, math.ceil(burst * 1000 / rate) + 1000)
+end
+return 0
+"""
+
+# In-flight slots of each endpoint in this process
+in_flight_slots = {}
+
+
+def bucket_args(endpoint, client, limits):
+    """
+    Return the keys of the buckets limiting a request, and their rates and
+    bursts.
+
+    :param endpoint: Blueprint endpoint name
+    :param client: Client address
+    :param limits: Limits of the endpoint
+    :return: Tuple of the bucket keys and the script arguments
+    """
+    keys, args = [], []
+    for scope, key in (
+        ("client", f"{BUCKET_PREFIX}:{endpoint}:client:{client}"),
+        ("global", f"{BUCKET_PREFIX}:{endpoint}:global"),
+    ):
+        rate = limits.get(f"{scope}_rate", 0)
+        if rate > 0:
+            keys.append(key)
+            args.extend([rate, max(limits.get(f"{scope}_burst", rate), 1)])
+    return keys, args
+
+
+def take_token(redis, keys, args):
+    """
+    Take a token from each bucket.
+
+    :return: Milliseconds to wait before retrying, 0 when the request is
+        admitted
+    """
+    if not keys:
+        return 0
+    try:
+        return redis.register_script(BUCKET_SCRIPT)(keys=keys, args=args)
+    except RedisError:
+        return 0
+
+
+def refuse(status, message, retry_after):
+    """Build the response of a refused request."""
+    response = jsonify({"message": message})
+    response.status_code = status
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+def admit_request():
+    """Refuse the requests over the limits of their endpoint."""
+    limits = current_app.config.get("RATE_LIMITS", {}).get(request.endpoint)
+    if not limits:
+        return None
+
+    keys, args = bucket_args(request.endpoint, request.remote_addr, limits)
+    wait = take_token(r, keys, args)
+    if wait > 0:
+        return refuse(429, "Too many requests, slow down", math.ceil(wait / 1000))
+
+    max_in_flight = limits.get("max_in_flight", 0)
+    if max_in_flight > 0:
+        slots = in_flight_slots.setdefault(
+            request.endpoint, BoundedSemaphore(max_in_flight)
+        )
+        if not slots.acquire(blocking=False):
+            return refuse(503, "Server busy, try again shortly", 1)
+        g.in_flight_slots = slots
+    return None
+
+
+def release_slot(exception=None):
+    """Give back the in-flight slot of the request, if it took one."""
+    slots = g.pop("in_flight_slots", None)
+    if slots is not None:
+        slots.release()
+
+
+def init_rate_limits(blueprint):
+    """Enforce `RATE_LIMITS` on the endpoints of a blueprint."""
+    blueprint.before_request(admit_request)
+    blueprint.teardown_request(release_slot)
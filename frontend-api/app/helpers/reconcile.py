@@ -0,0 +1,178 @@
+"""
+Anti-entropy reconciliation of the frontend and backend collections.
+
+The job walks the bucket tree of a collection from the root, comparing the
+hashes computed locally with those computed by the backend, and only descends
+into the buckets that differ. Buckets of at most `leaf_size` documents are
+repaired by copying the records of the side owning the collection over the
+other one with bulk upserts: the backend owns the book catalogue and the
+frontend owns the users. Each run reports how much drift it found and fixed.
+"""
+
+import json
+import time
+from datetime import datetime
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from redis.exceptions import RedisError
+
+from app.helpers.anti_entropy import (
+    OBJECT_ID_LENGTH,
+    SYNC_FIELDS,
+    bucket_hashes,
+    bucket_records,
+    replace_bucket,
+)
+from app.helpers.inventory import stocked_copies
+from app.helpers.page_cache import invalidate_pages
+
+STATS_PREFIX = "anti_entropy"
+
+# Side whose copy of each collection is the reference
+OWNERS = {"books": "backend", "users": "frontend"}
+
+
+class BackendClient:
+    """Client of the admin sync endpoints of the backend API."""
+
+    def __init__(self, base_url, token, timeout=60):
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+
+    def _request(self, method, path, params, body=None):
+        request = Request(
+            f"{self.base_url}{path}?{urlencode(params)}",
+            data=json.dumps(body).encode() if body is not None else None,
+            method=method,
+            headers={
+                "X-Admin-Token": self.token or "",
+                "Content-Type": "application/json",
+            },
+        )
+        with urlopen(request, timeout=self.timeout) as response:
+            return json.load(response)
+
+    def buckets(self, collection, prefix):
+        """Return the hashes of the child buckets of a backend bucket."""
+        path = f"/admin/sync/{collection}/buckets"
+        return self._request("GET", path, {"prefix": prefix})["buckets"]
+
+    def records(self, collection, prefix):
+        """Return the records of a backend bucket."""
+        path = f"/admin/sync/{collection}/records"
+        return self._request("GET", path, {"prefix": prefix})["records"]
+
+    def replace(self, collection, prefix, records):
+        """Replace a backend bucket with the given records."""
+        path = f"/admin/sync/{collection}/records"
+        return self._request("PUT", path, {"prefix": prefix}, {"records": records})
+
+
+def repair_bucket(mongo, redis, backend, collection, prefix):
+    """
+    Copy a bucket from the side owning the collection to the other one.
+
+    :return: Tuple of the number of transferred records and the dictionary of
+        inserted, updated and deleted counts
+    """
+    fields = SYNC_FIELDS[collection]
+    local_records = bucket_records(mongo.db[collection], fields, prefix)
+    if OWNERS[collection] == "frontend":
+        counts = backend.replace(collection, prefix, local_records)
+        return len(local_records), counts
+
+    records = backend.records(collection, prefix)
+    counts = replace_bucket(
+        mongo.db[collection], fields, prefix, records, on_insert=stocked_copies
+    )
+    if any(counts.values()):
+        # Drop the cached pages that may show the books before or after repair
+        invalidate_pages(redis, *local_records, *records)
+    return len(records), counts
+
+
+def reconcile(mongo, redis, backend, collection, leaf_size=500, batch_size=5000):
+    """
+    Find and repair the drift of a collection between the frontend and backend.
+
+    :param mongo: MongoDB instance
+    :param redis: Redis instance
+    :param backend: BackendClient
+    :param collection: `books` or `users`
+    :param leaf_size: Largest bucket repaired as a whole rather than split
+    :param batch_size: Number of documents fetched per round trip
+    :return: Drift report of the run
+    """
+    fields = SYNC_FIELDS[collection]
+    report = {
+        "collection": collection,
+        "buckets_compared": 0,
+        "buckets_differing": 0,
+        "buckets_repaired": 0,
+        "records_transferred": 0,
+        "inserted": 0,
+        "updated": 0,
+        "deleted": 0,
+    }
+    started = time.monotonic()
+
+    pending = [""]
+    while pending:
+        prefix = pending.pop()
+        local = bucket_hashes(mongo.db[collection], fields, prefix, batch_size)
+        remote = backend.buckets(collection, prefix)
+
+        for child in sorted(set(local) | set(remote)):
+            report["buckets_compared"] += 1
+            if local.get(child) == remote.get(child):
+                continue
+            report["buckets_differing"] += 1
+
+            # Split large buckets further, down to a single document
+            size = max(
+                local.get(child, {}).get("count", 0),
+                remote.get(child, {}).get("count", 0),
+            )
+            if size > leaf_size and len(child) < OBJECT_ID_LENGTH:
+                pending.append(child)
+                continue
+
+            transferred, counts = repair_bucket(
+                mongo, redis, backend, collection, child
+            )
+            report["buckets_repaired"] += 1
+            report["records_transferred"] += transferred
+            for key, count in counts.items():
+                report[key] += count
+
+    report["duration_seconds"] = round(time.monotonic() - started, 3)
+    report["finished_at"] = datetime.utcnow().isoformat()
+    save_report(redis, report)
+    return report
+
+
+def save_report(redis, report):
+    """Keep the report of the last run for the sync stats endpoint."""
+    try:
+        redis.set(f"{STATS_PREFIX}:{report['collection']}", json.dumps(report))
+    except RedisError:
+        pass
+
+
+def sync_stats(redis):
+    """
+    Return the report of the last reconciliation of every collection.
+
+    :param redis: Redis instance
+    :return: Dictionary mapping each collection to its report, or None
+    """
+    stats = {}
+    for collection in SYNC_FIELDS:
+        try:
+            report = redis.get(f"{STATS_PREFIX}:{collection}")
+        except RedisError:
+            report = None
+        stats[collection] = json.loads(report) if report is not None else None
+    return stats
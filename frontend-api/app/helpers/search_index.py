@@ -0,0 +1,242 @@
+"""
+In-process inverted index for ranked full-text search over book titles and
+authors.
+
+The index is warmed from the books collection at startup and kept in sync by
+`handle_events` (`book_added`/`book_removed`) and the borrow path, so search
+queries never reach MongoDB. Matches are ranked with BM25. Every query term has
+to match, and the last term is treated as a prefix, so a partially typed query
+such as "pragmatic prog" still finds "The Pragmatic Programmer".
+"""
+
+import bisect
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+
+from app.helpers.inventory import copies_available
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Split text into lowercase word tokens."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class SearchIndex:
+    """
+    BM25-ranked inverted index over the book catalogue.
+
+    Books are stored in integer slots so that posting lists map small ints to
+    term frequencies rather than holding on to ObjectId strings.
+    """
+
+    # A title match counts for more than an author match
+    FIELD_WEIGHTS = {"title": 2, "author": 1}
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, max_prefix_expansions=64):
+        self.max_prefix_expansions = max_prefix_expansions
+        self._lock = threading.Lock()
+        self._postings = {}  # token -> {slot: weighted term frequency}
+        self._vocabulary = []  # sorted tokens, used for prefix expansion
+        self._slots = {}  # book _id -> slot
+        self._records = []  # slot -> (_id, title, author, publisher, category)
+        self._lengths = []  # slot -> weighted document length
+        self._available = []  # slot -> availability flag
+        self._free_slots = []
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._slots)
+
+    def load(self, books):
+        """
+        Add every book from an iterable of book documents.
+
+        :param books: Iterable of book documents, e.g. a MongoDB cursor
+        """
+        for book in books:
+            self.add_book(book)
+
+    def add_book(self, book):
+        """
+        Index a book document, replacing any previous version of it.
+
+        :param book: Book document with `_id`, `title`, `author`, `publisher`,
+            `category` and optionally `available_copies`
+        """
+        book_id = str(book["_id"])
+        terms = self._terms(book["title"], book["author"])
+        record = (
+            book_id,
+            book["title"],
+            book["author"],
+            book["publisher"],
+            book["category"],
+        )
+        length = sum(terms.values())
+
+        with self._lock:
+            if book_id in self._slots:
+                self._remove(book_id)
+
+            if self._free_slots:
+                slot = self._free_slots.pop()
+                self._records[slot] = record
+                self._lengths[slot] = length
+                self._available[slot] = copies_available(book)
+            else:
+                slot = len(self._records)
+                self._records.append(record)
+                self._lengths.append(length)
+                self._available.append(copies_available(book))
+
+            self._slots[book_id] = slot
+            self._total_length += length
+            for token, frequency in terms.items():
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = {}
+                    bisect.insort(self._vocabulary, token)
+                postings[slot] = frequency
+
+    def remove_book(self, book_id):
+        """
+        Drop a book from the index. Unknown ids are ignored.
+
+        :param book_id: Book's _id
+        """
+        with self._lock:
+            if str(book_id) in self._slots:
+                self._remove(str(book_id))
+
+    def set_available(self, book_id, available):
+        """
+        Update the availability of an indexed book. Unknown ids are ignored.
+
+        :param book_id: Book's _id
+        :param available: Whether the book can currently be borrowed
+        """
+        with self._lock:
+            slot = self._slots.get(str(book_id))
+            if slot is not None:
+                self._available[slot] = available
+
+    def search(self, query, skip=0, limit=10):
+        """
+        Find available books matching every term of the query, best first.
+
+        :param query: Free text query
+        :param skip: Number of ranked results to skip
+        :param limit: Maximum number of results to return
+        :return: Tuple of total match count and the requested page of books
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return 0, []
+
+        with self._lock:
+            # Each query term becomes a group of alternative posting lists; the
+            # last term expands to every indexed token it is a prefix of
+            groups = [[token] for token in tokens[:-1]]
+            groups.append(self._expand(tokens[-1]))
+
+            group_postings = []
+            for group in groups:
+                postings = [self._postings[t] for t in group if t in self._postings]
+                if not postings:
+                    return 0, []
+                group_postings.append(postings)
+
+            # Intersect starting from the most selective term
+            group_postings.sort(key=lambda postings: sum(map(len, postings)))
+            candidates = {
+                slot
+                for postings in group_postings[0]
+                for slot in postings
+                if self._available[slot]
+            }
+            for postings in group_postings[1:]:
+                candidates = {
+                    slot for slot in candidates if any(slot in p for p in postings)
+                }
+
+            scored = [(self._score(slot, group_postings), slot) for slot in candidates]
+            top = heapq.nlargest(skip + limit, scored)[skip:]
+            records = [self._records[slot] for _, slot in top]
+
+        return len(candidates), [
+            {
+                "_id": book_id,
+                "title": title,
+                "author": author,
+                "publisher": publisher,
+                "category": category,
+            }
+            for book_id, title, author, publisher, category in records
+        ]
+
+    def _terms(self, title, author):
+        terms = Counter()
+        for text, weight in (
+            (title, self.FIELD_WEIGHTS["title"]),
+            (author, self.FIELD_WEIGHTS["author"]),
+        ):
+            for token in tokenize(text):
+                terms[token] += weight
+        return terms
+
+    def _remove(self, book_id):
+        slot = self._slots.pop(book_id)
+        _, title, author, _, _ = self._records[slot]
+
+        for token in self._terms(title, author):
+            postings = self._postings[token]
+            del postings[slot]
+            if not postings:
+                del self._postings[token]
+                del self._vocabulary[bisect.bisect_left(self._vocabulary, token)]
+
+        self._total_length -= self._lengths[slot]
+        self._records[slot] = None
+        self._available[slot] = False
+        self._free_slots.append(slot)
+
+    def _expand(self, prefix):
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        expansions = []
+        for token in self._vocabulary[start : start + self.max_prefix_expansions]:
+            if not token.startswith(prefix):
+                break
+            expansions.append(token)
+        return expansions
+
+    def _score(self, slot, group_postings):
+        count = len(self._slots)
+        average_length = self._total_length / count
+        length_norm = self.K1 * (
+            1 - self.B + self.B * self._lengths[slot] / average_length
+        )
+
+        score = 0.0
+        for postings in group_postings:
+            # A prefix term scores as its best matching expansion
+            best = 0.0
+            for p in postings:
+                frequency = p.get(slot)
+                if frequency:
+                    idf = math.log(1 + (count - len(p) + 0.5) / (len(p) + 0.5))
+                    best = max(
+                        best,
+                        idf * frequency * (self.K1 + 1) / (frequency + length_norm),
+                    )
+            score += best
+        return score
+
+
+search_index = SearchIndex()
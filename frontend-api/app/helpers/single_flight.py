@@ -0,0 +1,96 @@
+"""
+Request coalescing for identical concurrent reads.
+
+When a popular listing page expires from every cache, many requests for it
+arrive at once. `SingleFlight` lets the first of them run the MongoDB query
+while the others wait for and share its result, so the database sees one query
+per distinct request instead of one per caller. With a positive `stale_ttl`,
+the last result of each key is kept and callers arriving while a refresh runs
+get that previous result immediately instead of waiting for the refresh.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Deduplicate concurrent calls sharing the same key.
+    """
+
+    def __init__(self, max_stale_entries=1024):
+        self.max_stale_entries = max_stale_entries
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> in-flight _Call
+        self._results = OrderedDict()  # key -> (completed at, result), LRU order
+        self._stats = {"executed": 0, "shared": 0, "stale": 0}
+
+    def do(self, key, fn, stale_ttl=0):
+        """
+        Run `fn` unless an identical call is already in flight, in which case
+        wait for that call and return its result or raise its exception.
+
+        :param key: Hashable identity of the call, e.g. a normalized query key
+        :param fn: Callable without arguments performing the query
+        :param stale_ttl: Maximum age in seconds of a previous result that may
+            be returned while a refresh is in flight; 0 always waits
+        :return: The result of `fn`
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self._stats["executed"] += 1
+                leader = True
+            else:
+                leader = False
+                previous = self._results.get(key) if stale_ttl else None
+                if previous and time.monotonic() - previous[0] <= stale_ttl:
+                    self._stats["stale"] += 1
+                    return previous[1]
+                self._stats["shared"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if stale_ttl and call.error is None:
+                    self._results[key] = (time.monotonic(), call.result)
+                    self._results.move_to_end(key)
+                    while len(self._results) > self.max_stale_entries:
+                        self._results.popitem(last=False)
+            call.done.set()
+
+        return call.result
+
+    def stats(self):
+        """
+        Summarize how many calls ran, shared a result or got a stale one.
+
+        :return: Dictionary of counters and the number of in-flight calls
+        """
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
+
+
+book_queries = SingleFlight()
@@ -0,0 +1,201 @@
+"""
+Bootstrap of a fresh frontend database from a backend catalogue snapshot.
+
+A new replica only learns about books through live events, so instead of
+replaying the whole history it bulk loads the current state of the catalogue
+from `GET /admin/snapshot/books`. The snapshot starts with a marker holding the
+position of the backend event log when it was taken. Once the books are
+loaded, the events logged after that position are replayed on top of them,
+which covers the books added or removed while the snapshot was read and
+loaded. The same replay catches a bootstrapped replica up with the log on every
+restart, from the last event it applied live. Replayed events are applied
+idempotently, as some of them may already be reflected in the database:
+released loans only give copies back when their borrow record is still open,
+as for live events, and never above the number of copies of the book.
+"""
+
+import json
+from datetime import datetime
+from itertools import islice
+
+from bson import ObjectId
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.helpers.inventory import (
+    close_loans,
+    release_operations,
+    released_copies,
+    stock_book,
+)
+from app.helpers.sync_state import load_sync_state, save_sync_state
+from app.helpers.utils import json_deserialize
+
+# Capped stream holding every event the backend publishes on `frontend_events`
+EVENT_LOG_KEY = "frontend_events:log"
+START_POSITION = "0-0"
+
+# MongoDB error code of a duplicate key
+DUPLICATE_KEY_ERROR = 11000
+
+
+class SnapshotExpired(Exception):
+    """The event log no longer holds every event logged after a snapshot."""
+
+
+def read_snapshot(lines):
+    """
+    Parse a snapshot in NDJSON form.
+
+    :param lines: Iterator of text lines, the first one being the marker
+    :return: Tuple of the marker and a lazy iterator of book documents, with
+        their copy counters filled in as for `book_added` events
+    """
+    lines = iter(lines)
+    marker = json.loads(next(lines))
+    if marker.get("snapshot") != "books":
+        raise ValueError("Not a catalogue snapshot.")
+
+    def books():
+        for line in lines:
+            if not line.strip():
+                continue
+            book = json.loads(line)
+            book["_id"] = ObjectId(book["_id"])
+            if "added_at" in book:
+                book["added_at"] = datetime.fromisoformat(book["added_at"])
+            yield stock_book(book)
+
+    return marker, books()
+
+
+def load_snapshot(mongo, books, chunk_size=5000, on_chunk=None):
+    """
+    Bulk insert the books of a snapshot chunk by chunk.
+
+    Books that are already in the database are skipped, so loading the same
+    snapshot again resumes an interrupted load.
+
+    :param mongo: MongoDB instance
+    :param books: Iterable of book documents
+    :param chunk_size: Number of books per `insert_many`
+    :param on_chunk: Called with the number of books loaded so far and the id of
+        the last one, after each chunk
+    :return: Number of books loaded
+    """
+    books = iter(books)
+    loaded = 0
+    while chunk := list(islice(books, chunk_size)):
+        try:
+            mongo.db.books.insert_many(chunk, ordered=False)
+        except BulkWriteError as error:
+            if any(
+                write_error["code"] != DUPLICATE_KEY_ERROR
+                for write_error in error.details["writeErrors"]
+            ):
+                raise
+        loaded += len(chunk)
+        if on_chunk:
+            on_chunk(loaded, chunk[-1]["_id"])
+    return loaded
+
+
+def parse_position(position):
+    """Turn a stream entry id into a comparable (milliseconds, sequence) tuple."""
+    milliseconds, sequence = position.split("-")
+    return int(milliseconds), int(sequence)
+
+
+def add_book_operation(book):
+    """
+    Insert a book unless it is already there, in which case the snapshot holds
+    a state at least as recent, e.g. with the book already borrowed.
+    """
+    fields = stock_book({key: value for key, value in book.items() if key != "_id"})
+    return UpdateOne(
+        {"_id": book["_id"]},
+        {"$setOnInsert": fields},
+        upsert=True,
+    )
+
+
+def event_operations(mongo, data):
+    """
+    Translate a catalogue event into idempotent MongoDB write operations.
+
+    Released loans are closed right away, so that only the copies of the loans
+    still open are given back.
+
+    :param mongo: MongoDB instance
+    :param data: Deserialized event
+    :return: List of write operations, empty for events that do not change
+        the catalogue
+    """
+    if data["event"] == "book_added":
+        book = {
+            key: value
+            for key, value in data.items()
+            if key not in ("event", "event_id")
+        }
+        return [add_book_operation(book)]
+    if data["event"] == "books_added":
+        return [add_book_operation(book) for book in data["books"]]
+    if data["event"] == "book_removed":
+        return [DeleteOne({"_id": data["_id"]})]
+    if data["event"] == "books_released":
+        return release_operations(released_copies(close_loans(mongo, data["loans"])))
+    return []
+
+
+def replay_events(mongo, redis, position, count=1000):
+    """
+    Apply the events logged after a position.
+
+    :param mongo: MongoDB instance
+    :param redis: Redis instance
+    :param position: Event log position to replay from, excluded
+    :param count: Number of events read and applied per round trip
+    :return: Tuple of the position of the last replayed event and the number
+        of replayed events
+    :raises SnapshotExpired: When events after the position were trimmed
+    """
+    if position != START_POSITION:
+        oldest = redis.xrange(EVENT_LOG_KEY, count=1)
+        if oldest and parse_position(oldest[0][0].decode()) > parse_position(position):
+            raise SnapshotExpired(
+                f"Events after {position} were trimmed from the event log."
+            )
+
+    replayed = 0
+    while True:
+        entries = redis.xrange(EVENT_LOG_KEY, min=f"({position}", count=count)
+        if not entries:
+            return position, replayed
+
+        operations = []
+        for entry_id, fields in entries:
+            data = json.loads(fields[b"data"], object_hook=json_deserialize)
+            operations.extend(event_operations(mongo, data))
+        if operations:
+            # Ordered, as a book may be added then removed within a batch
+            mongo.db.books.bulk_write(operations)
+
+        position = entries[-1][0].decode()
+        replayed += len(entries)
+
+
+def catch_up_events(mongo, redis):
+    """
+    Replay the events logged since a replica bootstrapped from a snapshot was
+    last in sync, e.g. while it was being bootstrapped or restarted.
+
+    :param mongo: MongoDB instance
+    :param redis: Redis instance
+    :return: Number of replayed events
+    """
+    state = load_sync_state(mongo)
+    if not state or not state["bootstrapped"]:
+        return 0
+    position, replayed = replay_events(mongo, redis, state["position"])
+    save_sync_state(mongo, position, True)
+    return replayed
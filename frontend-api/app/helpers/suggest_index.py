@@ -0,0 +1,184 @@
+"""
+In-memory prefix index backing the search box typeahead.
+
+Each suggestable field keeps the distinct values found in the catalogue in a
+sorted array of normalized keys, so a lookup is a binary search followed by a
+short slice. Values are reference counted and truncated to a maximum length,
+which bounds the sorted arrays by the number of distinct values rather than the
+number of books. The values each book contributed are remembered by book id,
+so that a book added again only counts once and a removal only needs its id.
+The index is built at startup and maintained incrementally from
+`book_added`/`book_removed` events.
+"""
+
+import bisect
+import threading
+from collections import Counter
+
+SUGGEST_FIELDS = ("title", "author", "publisher")
+
+
+def normalize(value):
+    """Case-fold a value and collapse its whitespace for prefix matching."""
+    return " ".join(value.casefold().split())
+
+
+class PrefixIndex:
+    """
+    Sorted array of the distinct values of one field with reference counts.
+    """
+
+    def __init__(self, max_value_length=128):
+        self.max_value_length = max_value_length
+        self._keys = []  # sorted normalized keys
+        self._values = []  # display value for each key, aligned with _keys
+        self._counts = {}  # display value -> number of books carrying it
+
+    def __len__(self):
+        return len(self._keys)
+
+    def extend(self, counts):
+        """
+        Add many values at once, sorting the array a single time instead of
+        inserting into it value by value.
+
+        :param counts: Mapping of value to the number of books carrying it
+        """
+        for value, count in counts.items():
+            value = self._clip(value)
+            if value:
+                self._counts[value] = self._counts.get(value, 0) + count
+
+        entries = sorted((normalize(value), value) for value in self._counts)
+        self._keys = [key for key, _ in entries]
+        self._values = [value for _, value in entries]
+
+    def add(self, value):
+        value = self._clip(value)
+        if not value:
+            return
+
+        count = self._counts.get(value, 0)
+        self._counts[value] = count + 1
+        if count:
+            return
+
+        key = normalize(value)
+        position = bisect.bisect_left(self._keys, key)
+        self._keys.insert(position, key)
+        self._values.insert(position, value)
+
+    def discard(self, value):
+        value = self._clip(value)
+        count = self._counts.get(value)
+        if not count:
+            return
+        if count > 1:
+            self._counts[value] = count - 1
+            return
+
+        del self._counts[value]
+        key = normalize(value)
+        position = bisect.bisect_left(self._keys, key)
+        while self._values[position] != value:
+            position += 1
+        del self._keys[position]
+        del self._values[position]
+
+    def lookup(self, prefix, limit=10):
+        """Return up to `limit` values starting with the prefix, in sort order."""
+        prefix = normalize(prefix)
+        position = bisect.bisect_left(self._keys, prefix)
+        matches = []
+        for key, value in zip(
+            self._keys[position : position + limit],
+            self._values[position : position + limit],
+        ):
+            if not key.startswith(prefix):
+                break
+            matches.append(value)
+        return matches
+
+    def _clip(self, value):
+        return value.strip()[: self.max_value_length]
+
+
+class SuggestIndex:
+    """
+    Prefix indexes for every suggestable book field.
+    """
+
+    def __init__(self, fields=SUGGEST_FIELDS, max_value_length=128):
+        self._lock = threading.Lock()
+        self._indexes = {field: PrefixIndex(max_value_length) for field in fields}
+        self._books = {}  # book id -> values it contributed, aligned with fields
+
+    def load(self, books):
+        """
+        Bulk-build the prefix indexes from an iterable of book documents.
+
+        :param books: Iterable of book documents, e.g. a MongoDB cursor
+        """
+        counts = {field: Counter() for field in self._indexes}
+        contributed = {}
+        for book in books:
+            values = contributed[str(book["_id"])] = self._values(book)
+            for field_counts, value in zip(counts.values(), values):
+                if value:
+                    field_counts[value] += 1
+
+        with self._lock:
+            self._books.update(contributed)
+            for field, index in self._indexes.items():
+                index.extend(counts[field])
+
+    def add_book(self, book):
+        """
+        Add the suggestable fields of a book document, replacing any previous
+        version of it.
+
+        :param book: Book document
+        """
+        values = self._values(book)
+        with self._lock:
+            self._discard(str(book["_id"]))
+            self._books[str(book["_id"])] = values
+            for index, value in zip(self._indexes.values(), values):
+                if value:
+                    index.add(value)
+
+    def remove_book(self, book_id):
+        """
+        Release the suggestable fields of a removed book. Unknown ids are
+        ignored.
+
+        :param book_id: Book's _id
+        """
+        with self._lock:
+            self._discard(str(book_id))
+
+    def _discard(self, book_id):
+        values = self._books.pop(book_id, None)
+        if values is None:
+            return
+        for index, value in zip(self._indexes.values(), values):
+            if value:
+                index.discard(value)
+
+    def _values(self, book):
+        return tuple(book.get(field) or None for field in self._indexes)
+
+    def suggest(self, field, prefix, limit=10):
+        """
+        Complete a prefix against the distinct values of a field.
+
+        :param field: One of the suggestable fields
+        :param prefix: What the user has typed so far
+        :param limit: Maximum number of suggestions
+        :return: List of matching values
+        """
+        with self._lock:
+            return self._indexes[field].lookup(prefix, limit)
+
+
+suggest_index = SuggestIndex()
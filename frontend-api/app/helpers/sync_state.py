@@ -0,0 +1,47 @@
+"""
+Event log position a replica bootstrapped from a catalogue snapshot is in sync
+with.
+
+The position is recorded while the snapshot is loaded, then advanced by the
+replay of the event log and by every logged event applied live, so that a
+restart only replays the events it missed, and never more than the log keeps.
+"""
+
+# Id of the document recording the bootstrap progress in `sync_state`
+SYNC_STATE_ID = "catalogue_snapshot"
+
+
+def load_sync_state(mongo):
+    """Return the bootstrap progress of this replica, or None."""
+    return mongo.db.sync_state.find_one({"_id": SYNC_STATE_ID})
+
+
+def save_sync_state(mongo, position, bootstrapped, after=None):
+    """
+    Record the event log position this replica is in sync with.
+
+    :param mongo: MongoDB instance
+    :param position: Event log position
+    :param bootstrapped: Whether the snapshot was fully loaded
+    :param after: Id of the last book of the last fully loaded chunk, while the
+        snapshot is being loaded
+    """
+    mongo.db.sync_state.replace_one(
+        {"_id": SYNC_STATE_ID},
+        {"position": position, "bootstrapped": bootstrapped, "after": after},
+        upsert=True,
+    )
+
+
+def save_log_position(mongo, position):
+    """
+    Advance the position of a bootstrapped replica to a logged event applied
+    live. Replicas that were not bootstrapped are left alone.
+
+    :param mongo: MongoDB instance
+    :param position: Event log position of the applied event
+    """
+    mongo.db.sync_state.update_one(
+        {"_id": SYNC_STATE_ID, "bootstrapped": True},
+        {"$set": {"position": position}},
+    )
@@ -1,10 +1,32 @@
 import json
+from collections import Counter
 from datetime import datetime
 from functools import reduce
 from validator_collection import checkers
 
-from app import mongo
+from app import mongo, r
+from app.helpers.event_dedup import RecentEvents
+from app.helpers.holds import notify_holders
+from app.helpers.indexes import (
+    index_book_added,
+    index_book_availability,
+    index_book_removed,
+)
+from app.helpers.inventory import (
+    close_loans,
+    copies_available,
+    release_operations,
+    released_copies,
+    stock_book,
+)
+from app.helpers.loan_limits import release_loan_slots
+from app.helpers.page_cache import invalidate_pages
+from app.helpers.sync_state import save_log_position
 from bson import ObjectId, errors
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+# Ids of the events applied lately, to skip redeliveries
+recent_events = RecentEvents()
 
 
 # Custom serialization function for datetime
@@ -23,27 +45,110 @@ def json_deserialize(obj):
         except (ValueError, TypeError):
             try:
                 obj[key] = ObjectId(value)
-            except errors.InvalidId:
+            except (errors.InvalidId, TypeError):
                 continue
             continue  # If it fails, keep the original value
     return obj
 
-# Handle all frontend events
+# Handle all frontend events, skipping the ones this process applied recently
 def handle_events(message):
     data = json.loads(message['data'], object_hook=json_deserialize)
+    event_id = data.pop('event_id', None)
+    position = data.pop('log_position', None)
+    if event_id is not None and event_id in recent_events:
+        return
+    apply_event(data, event_id)
+    if event_id is not None:
+        recent_events.add(event_id)
+    # Restarts only replay the logged events published after this one
+    if position is not None:
+        save_log_position(mongo, position)
+
+# The database writes of an event are idempotent, as the database is shared by
+# every replica and events may be applied again. The in-memory indexes belong
+# to this process, so they are always updated, from the stored documents when
+# another replica or a snapshot got there first.
+def apply_event(data, event_id=None):
     if data['event'] == 'book_added':
         # Process the event and update MongoDB
         book = data
         del book['event']
-        book['available'] = True
-        mongo.db.books.insert_one(book)
+        stock_book(book)
+        try:
+            mongo.db.books.insert_one(book)
+        except DuplicateKeyError:
+            # Already inserted by another replica or loaded from a snapshot
+            book = mongo.db.books.find_one({'_id': book['_id']}) or book
+        index_book_added(book)
+        invalidate_pages(r, book)
         print("book added on frontend.")
+    elif data['event'] == 'books_added':
+        # Bulk imports announce a whole chunk of books at once
+        books = data['books']
+        for book in books:
+            stock_book(book)
+        try:
+            mongo.db.books.insert_many(books, ordered=False)
+        except BulkWriteError as error:
+            # Index the books already stored as they are stored
+            skipped = {
+                write_error['index'] for write_error in error.details['writeErrors']
+            }
+            stored = mongo.db.books.find(
+                {'_id': {'$in': [books[index]['_id'] for index in skipped]}}
+            )
+            books = [
+                book for index, book in enumerate(books) if index not in skipped
+            ] + list(stored)
+        for book in books:
+            index_book_added(book)
+        invalidate_pages(r, *books)
+        print(f"{len(books)} books imported on backend.")
     elif data['event'] == 'book_removed':
         # Process the event and update MongoDB
-        book = data
-        del book['event']
-        mongo.db.books.delete_one({"_id": book['_id']})
+        book = mongo.db.books.find_one_and_delete({"_id": data['_id']})
+        index_book_removed(data['_id'])
+        if book is not None:
+            invalidate_pages(r, book)
         print("Borrow record registered on backend.")
+    elif data['event'] == 'books_released':
+        # Returned and expired loans are released in batches on backend
+        # Close the loans still open here, and only give their copies back,
+        # as every replica applies the same release
+        loans = data['loans']
+        closed = close_loans(mongo, loans)
+        released = released_copies(closed)
+        if released:
+            mongo.db.books.bulk_write(release_operations(released))
+        # Every replica refreshes its indexes from the shared counters, whichever
+        # replica closed the loans
+        books = list(mongo.db.books.find(
+            {'_id': {'$in': list({loan['book_id'] for loan in loans})}},
+            {'publisher': 1, 'category': 1, 'author': 1, 'available_copies': 1},
+        ))
+        for book in books:
+            index_book_availability(book['_id'], copies_available(book))
+        # Only the books that had no copy left come back in the listings
+        restocked = [
+            book for book in books
+            if book['_id'] in released
+            and book['available_copies'] <= released[book['_id']]
+        ]
+        invalidate_pages(r, *restocked)
+
+        # Tell the first holders of the books that copies are back
+        notify_holders(r, released, event_id)
+
+        # Free the loan slots of the borrowers, once per loan across replicas
+        release_loan_slots(r, Counter(
+            str(loan['user_id']) for loan in closed if loan.get('user_id')
+        ))
+        print(f"{len(loans)} loans released on backend.")
+    elif data['event'] == 'book_borrowed':
+        # Borrows made on other replicas only need to reach the in-memory
+        # indexes, once the last copy is taken
+        if data.get('available_copies', 0) == 0:
+            index_book_availability(data['book_id'], False)
 
 def stringify_validation_errors(errors_object):
     """
@@ -54,6 +159,31 @@ def stringify_validation_errors(errors_object):
     """
     return reduce(lambda accumulator, error: f"{accumulator}\n{error}", errors_object.values(), '')
 
+def split_list_param(val):
+    """
+    Split a comma separated query parameter into its non-empty items.
+
+    :param val: Raw query parameter value, or None when it was not provided
+    :return: List of stripped items, or None when the parameter is absent
+    """
+    if val is None:
+        return None
+    return [item.strip() for item in val.split(',') if item.strip()]
+
+def project_document(document, fields):
+    """
+    Keep only the requested fields of a document, plus its `_id` as a string.
+
+    :param document: MongoDB document or book dictionary
+    :param fields: Names of the fields to keep
+    :return: Dictionary with `_id` and the requested fields
+    """
+    record = {'_id': str(document['_id'])}
+    for field in fields:
+        if field != '_id':
+            record[field] = document[field]
+    return record
+
 def is_valid_string(val):
     return checkers.is_string(val) and val.strip()
 
@@ -1,3 +1,6 @@
+from app.helpers.db_indexes import SORT_FIELDS, parse_sort
+from app.helpers.filters import filter_values
+from app.helpers.suggest_index import SUGGEST_FIELDS
 from app.helpers.utils import (
     is_valid_email,
     is_valid_number,
@@ -59,6 +62,97 @@ class APIValidator:
 
         return APIValidator.resolve_errors(errors)
 
+    @staticmethod
+    def validate_book_hold(data):
+        """Validate parameters for book holds"""
+        errors = {}
+
+        if "user_id" not in data or not is_valid_object_id(data["user_id"]):
+            errors["user_id"] = "valid user_id is required."
+
+        return APIValidator.resolve_errors(errors)
+
+    @staticmethod
+    def validate_book_suggest(data):
+        """Validate parameters for prefix suggestions"""
+        errors = {}
+
+        if "prefix" not in data or not is_valid_string(data["prefix"]):
+            errors["prefix"] = "Prefix is required."
+        if data.get("field") not in SUGGEST_FIELDS:
+            errors["field"] = f"Field must be one of {', '.join(SUGGEST_FIELDS)}."
+        if "limit" in data and not (
+            data["limit"].isdigit() and 1 <= int(data["limit"]) <= 50
+        ):
+            errors["limit"] = "Limit must be a number between 1 and 50."
+
+        return APIValidator.resolve_errors(errors)
+
+    @staticmethod
+    def validate_book_ids(book_ids):
+        """Validate the list of book ids of a multi-get"""
+        errors = {}
+
+        if not book_ids:
+            errors["ids"] = "At least one book id is required."
+        elif len(book_ids) > 100:
+            errors["ids"] = "At most 100 book ids can be requested at once."
+        else:
+            invalid_ids = [
+                book_id for book_id in book_ids if not is_valid_object_id(book_id)
+            ]
+            if invalid_ids:
+                errors["ids"] = f"Invalid book ids: {', '.join(invalid_ids)}."
+
+        return APIValidator.resolve_errors(errors)
+
+    @staticmethod
+    def validate_filters(included, excluded, max_values=20):
+        """Validate the number of values of each listing filter"""
+        errors = {}
+
+        for field, values in list(included.items()) + list(excluded.items()):
+            if len(filter_values(values)) > max_values:
+                errors[field] = (
+                    f"At most {max_values} {field} values can be given at once."
+                )
+
+        return APIValidator.resolve_errors(errors)
+
+    @staticmethod
+    def validate_fields(fields, allowed_fields):
+        """Validate a sparse fieldset against the fields an endpoint returns"""
+        errors = {}
+
+        if fields is not None:
+            unknown_fields = [
+                field
+                for field in fields
+                if field != "_id" and field not in allowed_fields
+            ]
+            if not fields:
+                errors["fields"] = "At least one field is required."
+            elif unknown_fields:
+                errors["fields"] = (
+                    f"Unknown fields: {', '.join(unknown_fields)}. "
+                    f"Fields must be among {', '.join(allowed_fields)}."
+                )
+
+        return APIValidator.resolve_errors(errors)
+
+    @staticmethod
+    def validate_sort(sort):
+        """Validate a listing order, which must be backed by an index"""
+        errors = {}
+
+        if sort is not None and parse_sort(sort)[0] not in SORT_FIELDS:
+            errors["sort"] = (
+                f"Sort must be one of {', '.join(SORT_FIELDS)}, "
+                "prefixed with - for a descending order."
+            )
+
+        return APIValidator.resolve_errors(errors)
+
     @staticmethod
     def resolve_errors(errors):
         """Resolve the errors and determine if the data is valid."""
@@ -1,21 +1,57 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from app import mongo, r
 from app.services import (
     enroll_user_service,
     borrow_book_service,
+    hold_book_service,
+    facet_counts_service,
     is_book_existing,
     is_user_existing,
     get_book_service,
+    get_books_service,
+    get_catalogue_books_service,
     filter_books_service,
     list_books_service,
+    query_catalogue_service,
+    BOOK_DETAIL_FIELDS,
+    BOOK_FIELDS,
+    search_books_service,
+    suggest_books_service,
+)
+from app.helpers.catalogue import catalogue
+from app.helpers.auth import admin_required
+from app.helpers.email_filter import email_filter
+from app.helpers.facet_index import facet_index
+from app.helpers.filters import cache_filters, parse_filters
+from app.helpers.holds import wait_for_notifications
+from app.helpers.idempotency import idempotent
+from app.helpers.page_cache import (
+    cache_page,
+    get_cached_page,
+    page_cache_stats,
+    page_key,
+)
+from app.helpers.rate_limit import init_rate_limits
+from app.helpers.reconcile import sync_stats
+from app.helpers.search_index import search_index
+from app.helpers.single_flight import book_queries
+from app.helpers.streaming import page_size_error, stream_format, streamed_page
+from app.helpers.suggest_index import suggest_index
+from app.helpers.utils import (
+    is_valid_object_id,
+    is_valid_string,
+    split_list_param,
+    stringify_validation_errors,
 )
-from app.helpers.utils import stringify_validation_errors
 from app.helpers.validator import APIValidator
+from pymongo.errors import DuplicateKeyError
 
 user_bp = Blueprint("user_bp", __name__)
+init_rate_limits(user_bp)
 
 
 @user_bp.route("/users", methods=["POST"])
+@idempotent
 def enroll_user():
     data = request.get_json()
 
@@ -25,13 +61,19 @@ def enroll_user():
     if not is_valid:
         return jsonify({"message": stringify_validation_errors(errors)}), 400
 
-    if is_user_existing(mongo, email=data["email"]):
+    emails = email_filter(r)
+    if is_user_existing(mongo, email=data["email"], email_filter=emails):
+        return jsonify({"message": "User with this email already exists"}), 400
+    try:
+        user = enroll_user_service(mongo, r, data, email_filter=emails)
+    except DuplicateKeyError:
+        # Enrolled concurrently
         return jsonify({"message": "User with this email already exists"}), 400
-    user = enroll_user_service(mongo, r, data)
     return jsonify({"message": "User enrolled successfully!", "user": user}), 201
 
 
 @user_bp.route("/books/<book_id>/borrow", methods=["POST"])
+@idempotent
 def borrow_book(book_id):
     data = request.get_json()
 
@@ -43,7 +85,14 @@ def borrow_book(book_id):
     user_id = data["user_id"]
     days = data["days"]
 
-    borrow_record, error, code = borrow_book_service(mongo, r, book_id, user_id, days)
+    borrow_record, error, code = borrow_book_service(
+        mongo,
+        r,
+        book_id,
+        user_id,
+        days,
+        loan_limit=current_app.config.get("LOAN_LIMIT", 0),
+    )
     if error:
         return jsonify({"message": error}), code
 
@@ -52,31 +101,247 @@ def borrow_book(book_id):
     ), 200
 
 
+@user_bp.route("/books/<book_id>/hold", methods=["POST"])
+def hold_book(book_id):
+    data = request.get_json()
+
+    errors, is_valid = APIValidator.validate_book_hold(data)
+    if not is_valid:
+        return jsonify({"errors": stringify_validation_errors(errors)}), 400
+
+    position, error, code = hold_book_service(mongo, r, book_id, data["user_id"])
+    if error:
+        return jsonify({"message": error}), code
+
+    return jsonify({"message": "Book held", "position": position}), code
+
+
+@user_bp.route("/users/<user_id>/notifications", methods=["GET"])
+def get_notifications(user_id):
+    if not is_valid_object_id(user_id):
+        return jsonify({"message": "Invalid user_id."}), 400
+
+    # Long-poll: wait for a notification instead of returning right away
+    max_wait = current_app.config.get("NOTIFICATION_MAX_WAIT", 30)
+    timeout = request.args.get("timeout", str(max_wait))
+    if not timeout.isdigit() or not 1 <= int(timeout) <= max_wait:
+        return (
+            jsonify({"message": f"Timeout must be between 1 and {max_wait} seconds."}),
+            400,
+        )
+
+    notifications = wait_for_notifications(r, user_id, int(timeout))
+    if not notifications:
+        return "", 204
+    return jsonify({"notifications": notifications}), 200
+
+
+@user_bp.route("/books/search", methods=["GET"])
+def search_books():
+    query = request.args.get("q")
+    page = int(request.args.get("page", 1))  # Default to page 1 if not provided
+    limit = int(
+        request.args.get("limit", 10)
+    )  # Default to 10 items per page if not provided
+
+    if not is_valid_string(query):
+        return jsonify({"message": "Search query is required."}), 400
+
+    books_data = search_books_service(search_index, query, page, limit)
+    return jsonify(books_data), 200
+
+
+@user_bp.route("/books/suggest", methods=["GET"])
+def suggest_books():
+    data = request.args.to_dict()
+
+    # Validate the suggestion parameters
+    errors, is_valid = APIValidator.validate_book_suggest(data)
+    if not is_valid:
+        return jsonify({"message": stringify_validation_errors(errors)}), 400
+
+    limit = int(data.get("limit", 10))  # Default to 10 suggestions if not provided
+
+    suggestions = suggest_books_service(
+        suggest_index, data["field"], data["prefix"], limit
+    )
+    return jsonify(suggestions), 200
+
+
+@user_bp.route("/books/facets", methods=["GET"])
+def book_facets():
+    publisher = request.args.get("publisher")
+    category = request.args.get("category")
+    author = request.args.get("author")
+    facet_limit = int(
+        request.args.get("facet_limit", 20)
+    )  # Default to the 20 most frequent values per facet if not provided
+
+    facets_data = facet_counts_service(
+        facet_index, publisher, category, author, facet_limit
+    )
+    return jsonify(facets_data), 200
+
+
 @user_bp.route("/books/<book_id>", methods=["GET"])
 def get_book(book_id):
-    if not is_book_existing(mongo, book_id):
+    if catalogue.ready:
+        book_data = catalogue.get(book_id)
+        if book_data is None:
+            return jsonify({"message": "Book not found"}), 404
+        return jsonify(book_data), 200
+
+    def load_book():
+        if not is_book_existing(mongo, book_id):
+            return None
+        return get_book_service(mongo, book_id)
+
+    # Share one lookup between concurrent requests for the same book
+    book_data = book_queries.do(
+        f"book:{book_id}",
+        load_book,
+        stale_ttl=current_app.config.get("SINGLE_FLIGHT_STALE_TTL", 0),
+    )
+    if book_data is None:
         return jsonify({"message": "Book not found"}), 404
-    book_data = get_book_service(mongo, book_id)
     return jsonify(book_data), 200
 
 
 @user_bp.route("/books", methods=["GET"])
 def filter_books():
-    publisher = request.args.get("publisher")
-    category = request.args.get("category")
-    author = request.args.get("author")
+    if "ids" in request.args:
+        return get_books()
+
+    # e.g. publisher=Wiley,Manning&category!=Poetry
+    included, excluded = parse_filters(request.args)
+    publisher = included.get("publisher")
+    category = included.get("category")
+    author = included.get("author")
     page = int(request.args.get("page", 1))  # Default to page 1 if not provided
     limit = int(
         request.args.get("limit", 10)
     )  # Default to 10 items per page if not provided
+    fields = split_list_param(request.args.get("fields"))
+    sort = request.args.get("sort")  # e.g. title or -added_at, natural order if absent
 
-    books_data = []
+    # Validate the requested filters, fields and order
+    errors, is_valid = APIValidator.validate_filters(included, excluded)
+    if is_valid:
+        errors, is_valid = APIValidator.validate_fields(fields, BOOK_FIELDS)
+    if is_valid:
+        errors, is_valid = APIValidator.validate_sort(sort)
+    if not is_valid:
+        return jsonify({"message": stringify_validation_errors(errors)}), 400
+    fields = fields or BOOK_FIELDS  # Default to every field if not provided
+
+    # Pages beyond the size cap must be streamed
+    output_format = stream_format(request)
+    error = page_size_error(limit, streamed=output_format is not None)
+    if error:
+        return jsonify({"message": error}), 400
 
-    if publisher or category or author:
-        books_data = filter_books_service(
-            mongo, publisher, category, author, page, limit
+    # The replica only keeps the natural order and single value filters, other
+    # pages come from MongoDB. Streamed pages come from a MongoDB cursor too, as
+    # the replica builds whole pages in memory under its lock.
+    is_simple = not excluded and all(
+        isinstance(value, str) for value in included.values()
+    )
+    if catalogue.ready and not sort and is_simple and not output_format:
+        books_data = query_catalogue_service(
+            catalogue, publisher, category, author, page, limit, fields
         )
-    else:
-        books_data = list_books_service(mongo, page, limit)
+        return jsonify(books_data), 200
+
+    filters = cache_filters(included, excluded)
+
+    # Stream large pages straight from the cursor, bypassing the cache
+    if output_format:
+        batch_size = current_app.config.get("STREAM_BATCH_SIZE", 500)
+        if filters:
+            books_data = filter_books_service(
+                mongo,
+                publisher,
+                category,
+                author,
+                page,
+                limit,
+                fields,
+                sort,
+                excluded,
+                batch_size=batch_size,
+            )
+        else:
+            books_data = list_books_service(
+                mongo, page, limit, fields, sort, batch_size=batch_size
+            )
+        return streamed_page(books_data, output_format)
+
+    # Serve the page from the shared cache when possible
+    cache_ttl = current_app.config.get("PAGE_CACHE_TTL")
+    if cache_ttl:
+        books_data = get_cached_page(r, filters, page, limit, fields, sort)
+        if books_data is not None:
+            return jsonify(books_data), 200
 
+    def load_page():
+        if filters:
+            data = filter_books_service(
+                mongo, publisher, category, author, page, limit, fields, sort, excluded
+            )
+        else:
+            data = list_books_service(mongo, page, limit, fields, sort)
+
+        if cache_ttl:
+            cache_page(r, filters, page, limit, data, cache_ttl, fields, sort)
+        return data
+
+    # Share one query between concurrent requests for the same page
+    books_data = book_queries.do(
+        page_key(filters, page, limit, fields, sort),
+        load_page,
+        stale_ttl=current_app.config.get("SINGLE_FLIGHT_STALE_TTL", 0),
+    )
+    return jsonify(books_data), 200
+
+
+def get_books():
+    book_ids = split_list_param(request.args["ids"])
+    fields = split_list_param(request.args.get("fields"))
+
+    # Validate the requested ids and fields
+    errors, is_valid = APIValidator.validate_book_ids(book_ids)
+    if is_valid:
+        errors, is_valid = APIValidator.validate_fields(fields, BOOK_DETAIL_FIELDS)
+    if not is_valid:
+        return jsonify({"message": stringify_validation_errors(errors)}), 400
+    fields = fields or BOOK_DETAIL_FIELDS  # Default to every field if not provided
+
+    if catalogue.ready:
+        books_data = get_catalogue_books_service(catalogue, book_ids, fields)
+    else:
+        books_data = get_books_service(mongo, book_ids, fields)
     return jsonify(books_data), 200
+
+
+@user_bp.route("/admin/page-cache/stats", methods=["GET"])
+@admin_required
+def get_page_cache_stats():
+    return jsonify(page_cache_stats(r)), 200
+
+
+@user_bp.route("/admin/single-flight/stats", methods=["GET"])
+@admin_required
+def get_single_flight_stats():
+    return jsonify(book_queries.stats()), 200
+
+
+@user_bp.route("/admin/email-filter/stats", methods=["GET"])
+@admin_required
+def get_email_filter_stats():
+    return jsonify(email_filter(r).stats()), 200
+
+
+@user_bp.route("/admin/sync/stats", methods=["GET"])
+@admin_required
+def get_sync_stats():
+    return jsonify(sync_stats(r)), 200
@@ -2,35 +2,53 @@ import json
 from datetime import datetime, timedelta
 from flask import Blueprint
 from bson.objectid import ObjectId
-from app.helpers.utils import json_serialize
+from pymongo import ReturnDocument
+from app.helpers.db_indexes import sort_options
+from app.helpers.event_dedup import new_event_id
+from app.helpers.filters import filters_query
+from app.helpers.holds import place_hold
+from app.helpers.indexes import index_book_availability
+from app.helpers.inventory import copies_available
+from app.helpers.loan_limits import acquire_loan_slot, release_loan_slots
+from app.helpers.page_cache import invalidate_pages
+from app.helpers.utils import json_serialize, project_document
 
 user_bp = Blueprint("user_bp", __name__)
 
+# Fields returned for each book by the listings and the multi-get
+BOOK_FIELDS = ("title", "author", "publisher", "category")
+BOOK_DETAIL_FIELDS = BOOK_FIELDS + ("available",)
+
 
 # Service function to enroll a user
-def enroll_user_service(mongo, redis, user_data):
+def enroll_user_service(mongo, redis, user_data, email_filter=None):
     user = {
         "email": user_data["email"],
         "first_name": user_data["first_name"],
         "last_name": user_data["last_name"],
         "enrollment_date": datetime.utcnow(),
     }
-    # Insert user into MongoDB
+    # Insert user into MongoDB, the unique email index rejects duplicates
     mongo.db.users.insert_one(user)
+    if email_filter is not None:
+        email_filter.add(user["email"])
 
     # Publish user enrollment event
     user_event = user.copy()
     if "_id" in user:
         user["_id"] = str(user["_id"])
     user_event["event"] = "user_enrolled"
+    user_event["event_id"] = new_event_id()
     redis.publish("backend_events", json.dumps(user_event, default=json_serialize))
 
     return user
 
 
 # Service function to list all available books
-def list_books_service(mongo, page=1, limit=10):
-    query = {"available": True}
+def list_books_service(
+    mongo, page=1, limit=10, fields=BOOK_FIELDS, sort=None, batch_size=None
+):
+    query = {"available_copies": {"$gt": 0}}
 
     # Calculate how many documents to skip
     skip = (page - 1) * limit
@@ -38,23 +56,22 @@ def list_books_service(mongo, page=1, limit=10):
     # Get the total number of books matching the query (before applying skip/limit)
     count = mongo.db.books.count_documents(query)
 
-    # Retrieve paginated results from the database
-    books = mongo.db.books.find(query, skip=skip, limit=limit)
+    # Walk the index matching the requested order, if any
+    options = sort_options({}, sort) if sort else {}
+    if batch_size:
+        options["batch_size"] = batch_size
 
+    # Retrieve paginated results from the database, fetching only the needed fields
+    projection = {field: 1 for field in fields}
+    books = mongo.db.books.find(query, projection, skip=skip, limit=limit, **options)
+
+    # Streamed pages are serialized lazily, one cursor batch at a time
+    records = (project_document(book, fields) for book in books)
     return {
         "page_number": page,
         "page_size": limit,
         "total_record_count": count,
-        "records": [
-            {
-                "_id": str(book["_id"]),
-                "title": book["title"],
-                "author": book["author"],
-                "publisher": book["publisher"],
-                "category": book["category"],
-            }
-            for book in books
-        ],
+        "records": records if batch_size else list(records),
     }
 
 
@@ -67,65 +84,210 @@ def get_book_service(mongo, book_id):
         "author": book["author"],
         "publisher": book["publisher"],
         "category": book["category"],
-        "available": book["available"],
+        "available": copies_available(book),
+    }
+
+
+# Service function to get many books by their IDs with a single query
+def get_books_service(mongo, book_ids, fields=BOOK_DETAIL_FIELDS):
+    book_ids = [str(ObjectId(book_id)) for book_id in book_ids]
+    projection = {field: 1 for field in fields}
+    if "available" in fields:
+        # Availability is derived from the copy counter
+        projection["available_copies"] = 1
+    books = mongo.db.books.find(
+        {"_id": {"$in": [ObjectId(book_id) for book_id in set(book_ids)]}},
+        projection,
+    )
+    books_by_id = {}
+    for book in books:
+        if "available" in fields:
+            book["available"] = copies_available(book)
+        books_by_id[str(book["_id"])] = project_document(book, fields)
+    return order_books(book_ids, books_by_id)
+
+
+# Service function to get many books by their IDs from the in-memory replica
+def get_catalogue_books_service(catalogue, book_ids, fields=BOOK_DETAIL_FIELDS):
+    book_ids = [str(ObjectId(book_id)) for book_id in book_ids]
+    books_by_id = {}
+    for book_id in set(book_ids):
+        book = catalogue.get(book_id)
+        if book is not None:
+            books_by_id[book_id] = project_document(book, fields)
+    return order_books(book_ids, books_by_id)
+
+
+def order_books(book_ids, books_by_id):
+    """
+    Arrange fetched books in the requested order, marking the missing ones.
+
+    :param book_ids: Requested book ids, possibly repeated
+    :param books_by_id: Mapping of book id to the book found for it
+    :return: Dictionary with the number of books found and the records
+    """
+    records = [
+        books_by_id.get(book_id, {"_id": book_id, "message": "Book not found"})
+        for book_id in book_ids
+    ]
+    return {
+        "total_record_count": sum(book_id in books_by_id for book_id in book_ids),
+        "records": records,
     }
 
 
-# Service function to filter books by publisher and/or category
+# Service function to filter books by publisher, category and/or author
 def filter_books_service(
-    mongo, publisher=None, category=None, author=None, page=1, limit=10
+    mongo,
+    publisher=None,
+    category=None,
+    author=None,
+    page=1,
+    limit=10,
+    fields=BOOK_FIELDS,
+    sort=None,
+    excluded=None,
+    batch_size=None,
 ):
     # Calculate how many documents to skip
     skip = (page - 1) * limit
 
-    # Build the query based on the filter criteria
-    query = {"available": True}
+    # Build the query based on the filter criteria, each of which can be a
+    # single value or a list of accepted values
+    included = {}
     if publisher:
-        query["publisher"] = publisher
+        included["publisher"] = publisher
     if category:
-        query["category"] = category
+        included["category"] = category
     if author:
-        query["author"] = author
+        included["author"] = author
+    query = {"available_copies": {"$gt": 0}, **filters_query(included, excluded)}
 
     # Get the total number of books matching the query (before applying skip/limit)
     count = mongo.db.books.count_documents(query)
 
-    # Retrieve paginated filtered results from the database
-    books = mongo.db.books.find(query, skip=skip, limit=limit)
+    # Walk the index matching the filters and the requested order, if any
+    options = sort_options(query, sort) if sort else {}
+    if batch_size:
+        options["batch_size"] = batch_size
+
+    # Retrieve paginated filtered results, fetching only the needed fields
+    projection = {field: 1 for field in fields}
+    books = mongo.db.books.find(query, projection, skip=skip, limit=limit, **options)
+
+    # Streamed pages are serialized lazily, one cursor batch at a time
+    records = (project_document(book, fields) for book in books)
+    return {
+        "page_number": page,
+        "page_size": limit,
+        "total_record_count": count,
+        "records": records if batch_size else list(records),
+    }
+
+
+# Service function to list or filter available books from the in-memory replica
+def query_catalogue_service(
+    catalogue,
+    publisher=None,
+    category=None,
+    author=None,
+    page=1,
+    limit=10,
+    fields=BOOK_FIELDS,
+):
+    # Calculate how many documents to skip
+    skip = (page - 1) * limit
+
+    # Build the filters from the criteria that were provided
+    filters = {}
+    if publisher:
+        filters["publisher"] = publisher
+    if category:
+        filters["category"] = category
+    if author:
+        filters["author"] = author
+
+    count, books = catalogue.query(filters, skip=skip, limit=limit)
+
+    return {
+        "page_number": page,
+        "page_size": limit,
+        "total_record_count": count,
+        "records": [project_document(book, fields) for book in books],
+    }
+
+
+# Service function to rank available books against a free text query
+def search_books_service(index, query, page=1, limit=10):
+    # Calculate how many ranked results to skip
+    skip = (page - 1) * limit
+
+    count, books = index.search(query, skip=skip, limit=limit)
 
     return {
         "page_number": page,
         "page_size": limit,
         "total_record_count": count,
-        "records": [
-            {
-                "_id": str(book["_id"]),
-                "title": book["title"],
-                "author": book["author"],
-                "publisher": book["publisher"],
-                "category": book["category"],
-            }
-            for book in books
-        ],
+        "records": books,
+    }
+
+
+# Service function to complete a typed prefix against a book field
+def suggest_books_service(index, field, prefix, limit=10):
+    return {
+        "field": field,
+        "prefix": prefix,
+        "suggestions": index.suggest(field, prefix, limit),
+    }
+
+
+# Service function to count available books per facet value under the filters
+def facet_counts_service(
+    index, publisher=None, category=None, author=None, facet_limit=20
+):
+    # Build the filters from the criteria that were provided
+    filters = {}
+    if publisher:
+        filters["publisher"] = publisher
+    if category:
+        filters["category"] = category
+    if author:
+        filters["author"] = author
+
+    count, facets = index.counts(filters, limit=facet_limit)
+
+    return {
+        "filters": filters,
+        "total_record_count": count,
+        "facets": facets,
     }
 
 
 # Service function to borrow a book
-def borrow_book_service(mongo, redis, book_id, user_id, days):
+def borrow_book_service(mongo, redis, book_id, user_id, days, loan_limit=0):
     if not is_user_existing(mongo, _id=user_id):
         return None, "User not found", 404
     if not is_book_existing(mongo, book_id):
         return None, "Book not found", 404
 
-    book = mongo.db.books.find_one({"_id": ObjectId(book_id)})
+    # Count the loan against the user's limit, given back if no copy is left
+    if not acquire_loan_slot(redis, user_id, loan_limit):
+        return None, f"User already holds {loan_limit} borrowed books", 400
 
-    if not book["available"]:
+    # Take a copy only while one is left, in a single atomic update
+    book = mongo.db.books.find_one_and_update(
+        {"_id": ObjectId(book_id), "available_copies": {"$gt": 0}},
+        {"$inc": {"available_copies": -1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if book is None:
+        release_loan_slots(redis, {user_id: 1})
         return None, "Book is not available for borrowing", 400
 
-    # Mark the book as unavailable
-    mongo.db.books.update_one(
-        {"_id": ObjectId(book_id)}, {"$set": {"available": False}}
-    )
+    # The book leaves the listings with its last copy
+    if book["available_copies"] == 0:
+        index_book_availability(book_id, False)
+        invalidate_pages(redis, book)
 
     # Create a borrow record
     borrowed_until = datetime.utcnow() + timedelta(days=days)
@@ -137,24 +299,49 @@ def borrow_book_service(mongo, redis, book_id, user_id, days):
     }
     mongo.db.borrow_records.insert_one(borrow_record)
 
-    # Publish the borrow event
-    borrow_record["event"] = "book_borrowed"
-    redis.publish("backend_events", json.dumps(borrow_record, default=json_serialize))
+    # Publish the borrow event, with the copies left for the other replicas
+    borrow_event = {
+        **borrow_record,
+        "event": "book_borrowed",
+        "event_id": new_event_id(),
+        "available_copies": book["available_copies"],
+    }
+    redis.publish("backend_events", json.dumps(borrow_event, default=json_serialize))
 
     return borrow_record, None, 200
 
 
-def is_user_existing(mongo, email=None, _id=None):
+# Service function to queue for a borrowed out book
+def hold_book_service(mongo, redis, book_id, user_id):
+    if not is_user_existing(mongo, _id=user_id):
+        return None, "User not found", 404
+    book = mongo.db.books.find_one({"_id": ObjectId(book_id)}, {"available_copies": 1})
+    if book is None:
+        return None, "Book not found", 404
+    if copies_available(book):
+        return None, "Book is available for borrowing", 400
+
+    return place_hold(redis, book_id, user_id), None, 201
+
+
+def is_user_existing(mongo, email=None, _id=None, email_filter=None):
     """
     Checks if a user with the given email exists in the database.
 
     :param mongo: MongoDB instance
     :param identifier: User's email address or _id
+    :param email_filter: Bloom filter of the enrolled emails, skipping the
+        lookup of emails never enrolled
     :return: Boolean value, True if user exists, False otherwise
     """
     existing_user = None
     if email is not None:
+        matched = email_filter.check(email) if email_filter is not None else -1
+        if matched == 0:
+            return False
         existing_user = mongo.db.users.find_one({"email": email})
+        if matched == 1 and existing_user is None:
+            email_filter.record_false_positive()
     elif _id is not None:
         existing_user = mongo.db.users.find_one({"_id": ObjectId(_id)})
 
@@ -0,0 +1,106 @@
+"""
+Benchmark of the in-process search index over a synthetic catalogue.
+
+Builds a catalogue of random titles and authors, indexes it and reports the
+build time, the resident memory and the query latency percentiles for a mix of
+whole-word and partially typed queries.
+
+Usage (from the frontend-api directory):
+
+    python -m benchmarks.search_benchmark --books 1000000
+"""
+
+import argparse
+import random
+import resource
+import statistics
+import time
+
+from bson.objectid import ObjectId
+
+from app.helpers.search_index import SearchIndex
+
+SYLLABLES = [
+    "ka", "lo", "mi", "ra", "te", "su", "no", "pe", "di", "an",
+    "ver", "gon", "tal", "mor", "ish", "ent", "ure", "ble", "pro", "gram",
+]  # fmt: skip
+
+
+def make_words(count, rng):
+    words = set()
+    while len(words) < count:
+        words.add("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    return sorted(words)
+
+
+def make_books(count, rng):
+    title_words = make_words(20000, rng)
+    names = make_words(5000, rng)
+    for _ in range(count):
+        yield {
+            "_id": ObjectId(),
+            "title": " ".join(rng.choices(title_words, k=rng.randint(2, 6))),
+            "author": " ".join(rng.choices(names, k=2)),
+            "publisher": rng.choice(names),
+            "category": rng.choice(title_words[:50]),
+        }
+
+
+def make_queries(count, books, rng):
+    queries = []
+    for book in rng.sample(books, count):
+        words = book["title"].split()
+        query = " ".join(words[: rng.randint(1, min(3, len(words)))])
+        # Half of the queries simulate a partially typed last word
+        if rng.random() < 0.5:
+            query = query[: max(2, len(query) - rng.randint(1, 3))]
+        queries.append(query)
+    return queries
+
+
+def percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    books = list(make_books(args.books, rng))
+    queries = make_queries(args.queries, books, rng)
+
+    index = SearchIndex()
+    started = time.perf_counter()
+    index.load(books)
+    build_seconds = time.perf_counter() - started
+    del books
+
+    latencies = []
+    matches = []
+    for query in queries:
+        started = time.perf_counter()
+        count, _ = index.search(query, skip=0, limit=10)
+        latencies.append((time.perf_counter() - started) * 1000)
+        matches.append(count)
+    latencies.sort()
+
+    max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"books indexed:    {len(index)}")
+    print(f"vocabulary size:  {len(index._vocabulary)}")
+    print(f"build time:       {build_seconds:.1f} s")
+    print(f"peak RSS:         {max_rss_mb:.0f} MB")
+    print(f"median matches:   {statistics.median(matches):.0f}")
+    print(
+        "query latency:    "
+        f"p50 {percentile(latencies, 0.50):.2f} ms, "
+        f"p95 {percentile(latencies, 0.95):.2f} ms, "
+        f"p99 {percentile(latencies, 0.99):.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
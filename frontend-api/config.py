@@ -1,5 +1,43 @@
+import json
 import os
 
 class Config:
     MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/frontend_library')
     REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+    PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', 'false').lower() == 'true'
+    PROFILER_SAMPLE_RATE = float(os.getenv('PROFILER_SAMPLE_RATE', 0))
+    PROFILER_INTERVAL = float(os.getenv('PROFILER_INTERVAL', 0.005))
+    MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 100))
+    STREAM_BATCH_SIZE = int(os.getenv('STREAM_BATCH_SIZE', 500))
+    PAGE_CACHE_TTL = int(os.getenv('PAGE_CACHE_TTL', 60))
+    SINGLE_FLIGHT_STALE_TTL = float(os.getenv('SINGLE_FLIGHT_STALE_TTL', 0))
+    CATALOGUE_REPLICA_ENABLED = (
+        os.getenv('CATALOGUE_REPLICA_ENABLED', 'false').lower() == 'true'
+    )
+    BACKEND_URL = os.getenv('BACKEND_URL', 'http://localhost:5001')
+    BACKEND_ADMIN_TOKEN = os.getenv('BACKEND_ADMIN_TOKEN', os.getenv('ADMIN_TOKEN'))
+    SYNC_LEAF_SIZE = int(os.getenv('SYNC_LEAF_SIZE', 500))
+    SYNC_BATCH_SIZE = int(os.getenv('SYNC_BATCH_SIZE', 5000))
+    LOAN_LIMIT = int(os.getenv('LOAN_LIMIT', 5))
+    LOAN_COUNT_RECONCILE_INTERVAL = int(os.getenv('LOAN_COUNT_RECONCILE_INTERVAL', 300))
+    IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', 86400))
+    IDEMPOTENCY_LOCK_TTL = int(os.getenv('IDEMPOTENCY_LOCK_TTL', 30))
+    IDEMPOTENCY_WAIT = float(os.getenv('IDEMPOTENCY_WAIT', 10))
+    EMAIL_FILTER_CAPACITY = int(os.getenv('EMAIL_FILTER_CAPACITY', 1000000))
+    EMAIL_FILTER_ERROR_RATE = float(os.getenv('EMAIL_FILTER_ERROR_RATE', 0.01))
+    # Token buckets and in-flight caps per blueprint endpoint, see
+    # app/helpers/rate_limit.py
+    RATE_LIMITS = json.loads(os.getenv('RATE_LIMITS', json.dumps({
+        'user_bp.filter_books': {
+            'client_rate': 20, 'client_burst': 40,
+            'global_rate': 1000, 'global_burst': 2000,
+            'max_in_flight': 64,
+        },
+        'user_bp.borrow_book': {
+            'client_rate': 1, 'client_burst': 5,
+            'global_rate': 200, 'global_burst': 400,
+            'max_in_flight': 32,
+        },
+    })))
+    NOTIFICATION_MAX_WAIT = int(os.getenv('NOTIFICATION_MAX_WAIT', 30))
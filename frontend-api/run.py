@@ -1,13 +1,58 @@
-from app import app, r
+from app import app, mongo, r
+from app.helpers.db_indexes import ensure_indexes
+from app.helpers.email_filter import email_filter
+from app.helpers.indexes import warm_indexes
+from app.helpers.inventory import migrate_copies
+from app.helpers.loan_limits import reconcile_loan_counts
+from app.helpers.scheduler import schedule
+from app.helpers.snapshot import SnapshotExpired, catch_up_events
 from app.helpers.utils import handle_events
 
 
-# Subscribe to the Redis event channel
+# Convert the books stored before the copy counters existed, which the listings
+# and borrows would otherwise miss
+migrate_copies(mongo)
+
+# Subscribe to the Redis event channels. Borrow events published by other
+# replicas are consumed too, to keep the in-memory indexes in sync.
 pubsub = r.pubsub()
-pubsub.subscribe(**{'frontend_events': handle_events})
+pubsub.subscribe(
+    **{'frontend_events': handle_events, 'backend_events': handle_events}
+)
 
 # Start the listener in a separate thread
 pubsub.run_in_thread(sleep_time=0.001)
 
+# Catch up with the events missed since the replica was bootstrapped or
+# last started
+try:
+    catch_up_events(mongo, r)
+except SnapshotExpired as error:
+    print(f"Catalogue may be out of date, take a new snapshot: {error}")
+
+# Create the MongoDB indexes backing sorted listings
+ensure_indexes(mongo)
+
+# Build the Bloom filter of the enrolled emails, unless already in Redis
+email_filter(r, app.config).ensure(mongo)
+
+# Warm the in-memory catalogue indexes
+warm_indexes(mongo, replica=app.config['CATALOGUE_REPLICA_ENABLED'])
+
+
+def reconcile_loans():
+    reconcile_loan_counts(mongo, r)
+
+
+# Reset the per-user loan counters from MongoDB periodically, unless a cron job
+# runs reconcile-loans
+if app.config['LOAN_COUNT_RECONCILE_INTERVAL']:
+    schedule(
+        r,
+        'loan_counts',
+        app.config['LOAN_COUNT_RECONCILE_INTERVAL'],
+        reconcile_loans,
+    )
+
 if __name__ == "__main__":
     app.run(debug=True, port=5000)
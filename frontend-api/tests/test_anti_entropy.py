@@ -0,0 +1,155 @@
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from app.helpers.anti_entropy import (
+    SYNC_FIELDS,
+    bucket_hashes,
+    bucket_records,
+    deserialize_record,
+    prefix_query,
+    record_digest,
+    replace_bucket,
+)
+from bson.objectid import ObjectId
+from pymongo import DeleteMany, UpdateOne
+
+USER_FIELDS = SYNC_FIELDS["users"]
+
+
+def user(user_id, email="ann@example.com"):
+    return {
+        "_id": ObjectId(user_id),
+        "email": email,
+        "first_name": "Ann",
+        "last_name": "Lee",
+        "enrollment_date": datetime(2024, 9, 20),
+    }
+
+
+class TestBucketHashes(unittest.TestCase):
+    def setUp(self):
+        self.collection = MagicMock()
+
+    def test_prefix_query(self):
+        self.assertEqual(prefix_query(""), {})
+        self.assertEqual(
+            prefix_query("21"),
+            {
+                "$expr": {
+                    "$regexMatch": {"input": {"$toString": "$_id"}, "regex": "12$"}
+                }
+            },
+        )
+
+    def test_record_digest(self):
+        first = user("66f000000000000000000001")
+
+        # Assert only the synchronized fields are hashed
+        self.assertEqual(
+            record_digest(first, USER_FIELDS),
+            record_digest(dict(first, borrowed=3), USER_FIELDS),
+        )
+        self.assertNotEqual(
+            record_digest(first, USER_FIELDS),
+            record_digest(dict(first, email="bob@example.com"), USER_FIELDS),
+        )
+
+    def test_bucket_hashes(self):
+        first = user("66f000000000000000000021")
+        second = user("66f000000000000000000031")
+        third = user("66f100000000000000000031")
+        self.collection.find.return_value = [first, second, third]
+
+        buckets = bucket_hashes(self.collection, USER_FIELDS, "1")
+
+        # Assert the documents are split on their next to last digit
+        self.assertEqual(set(buckets), {"12", "13"})
+        self.assertEqual(buckets["13"]["count"], 2)
+        self.assertEqual(
+            int(buckets["13"]["hash"], 16),
+            record_digest(second, USER_FIELDS) ^ record_digest(third, USER_FIELDS),
+        )
+        self.assertEqual(self.collection.find.call_args[0][0], prefix_query("1"))
+
+    def test_bucket_hashes_same_timestamp(self):
+        self.collection.find.return_value = [
+            user(f"66f000000000000000000{count:03x}") for count in range(32)
+        ]
+
+        buckets = bucket_hashes(self.collection, USER_FIELDS)
+
+        # Assert documents created in the same second span every root bucket
+        self.assertEqual(set(buckets), set("0123456789abcdef"))
+        self.assertEqual(buckets["0"]["count"], 2)
+
+    def test_bucket_hashes_ignore_order(self):
+        first = user("66f000000000000000000001")
+        second = user("66f000000000000000000002")
+        self.collection.find.return_value = [first, second]
+        in_order = bucket_hashes(self.collection, USER_FIELDS)
+        self.collection.find.return_value = [second, first]
+
+        self.assertEqual(bucket_hashes(self.collection, USER_FIELDS), in_order)
+
+    def test_bucket_records(self):
+        self.collection.find.return_value = [user("66f000000000000000000001")]
+
+        records = bucket_records(self.collection, USER_FIELDS, "1")
+
+        self.assertEqual(
+            records,
+            [
+                {
+                    "_id": "66f000000000000000000001",
+                    "email": "ann@example.com",
+                    "first_name": "Ann",
+                    "last_name": "Lee",
+                    "enrollment_date": "2024-09-20T00:00:00",
+                }
+            ],
+        )
+        self.assertEqual(deserialize_record(records[0]), user(records[0]["_id"]))
+
+
+class TestReplaceBucket(unittest.TestCase):
+    def test_replace_bucket(self):
+        collection = MagicMock()
+        collection.bulk_write.return_value.upserted_count = 1
+        collection.bulk_write.return_value.modified_count = 0
+        collection.bulk_write.return_value.deleted_count = 2
+        record = {
+            "_id": "66f000000000000000000001",
+            "email": "ann@example.com",
+            "first_name": "Ann",
+            "last_name": None,
+            "enrollment_date": "2024-09-20T00:00:00",
+        }
+
+        counts = replace_bucket(collection, USER_FIELDS, "1", [record])
+
+        # Assert the records were upserted and the extra documents deleted
+        self.assertEqual(counts, {"inserted": 1, "updated": 0, "deleted": 2})
+        operations = collection.bulk_write.call_args[0][0]
+        self.assertEqual(
+            operations[0],
+            UpdateOne(
+                {"_id": ObjectId("66f000000000000000000001")},
+                {
+                    "$set": {
+                        "email": "ann@example.com",
+                        "first_name": "Ann",
+                        "enrollment_date": datetime(2024, 9, 20),
+                    },
+                    "$unset": {"last_name": ""},
+                },
+                upsert=True,
+            ),
+        )
+        query = prefix_query("1")
+        query["_id"] = {"$nin": [ObjectId("66f000000000000000000001")]}
+        self.assertEqual(operations[1], DeleteMany(query))
+
+
+if __name__ == "__main__":
+    unittest.main()
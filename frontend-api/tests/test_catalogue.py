@@ -0,0 +1,142 @@
+import sys
+import unittest
+
+from app.helpers.catalogue import BookRecord, CatalogueReplica
+from bson.objectid import ObjectId
+
+
+def make_book(title, publisher, category, author, **extra):
+    book = {
+        "_id": ObjectId(),
+        "title": title,
+        "publisher": publisher,
+        "category": category,
+        "author": author,
+    }
+    book.update(extra)
+    return book
+
+
+class TestBookRecord(unittest.TestCase):
+    def test_record_interns_repeated_strings(self):
+        first = BookRecord(make_book("A", "Wiley", "Fiction", "".join(["Ann", "e"])))
+        second = BookRecord(make_book("B", "Wiley", "Fiction", "".join(["An", "ne"])))
+
+        self.assertIs(first.author, second.author)
+        self.assertIs(first.author, sys.intern("Anne"))
+        self.assertFalse(hasattr(first, "__dict__"))
+
+
+class TestCatalogueReplica(unittest.TestCase):
+    def setUp(self):
+        self.catalogue = CatalogueReplica()
+        self.books = [
+            make_book("Things Fall Apart", "Heinemann", "Fiction", "Chinua Achebe"),
+            make_book("Arrow of God", "Heinemann", "Fiction", "Chinua Achebe"),
+            make_book("The Lion", "Heinemann", "Drama", "Wole Soyinka"),
+            make_book("Ake", "Rex Collings", "Memoir", "Wole Soyinka"),
+            make_book(
+                "Anthills", "Heinemann", "Fiction", "Chinua Achebe", available=False
+            ),
+        ]
+        self.catalogue.load(self.books)
+
+    def test_load_enables_serving(self):
+        self.assertTrue(self.catalogue.tracking)
+        self.assertTrue(self.catalogue.ready)
+        self.assertEqual(len(self.catalogue), 5)
+
+    def test_untracked_replica_ignores_events(self):
+        catalogue = CatalogueReplica()
+        catalogue.add_book(self.books[0])
+
+        self.assertEqual(len(catalogue), 0)
+        self.assertFalse(catalogue.ready)
+
+    def test_query_all_available(self):
+        count, records = self.catalogue.query({}, skip=0, limit=10)
+
+        self.assertEqual(count, 4)
+        self.assertEqual(
+            [record["title"] for record in records],
+            ["Things Fall Apart", "Arrow of God", "The Lion", "Ake"],
+        )
+        self.assertEqual(
+            records[0],
+            {
+                "_id": str(self.books[0]["_id"]),
+                "title": "Things Fall Apart",
+                "author": "Chinua Achebe",
+                "publisher": "Heinemann",
+                "category": "Fiction",
+            },
+        )
+
+    def test_query_single_filter_paginated(self):
+        count, records = self.catalogue.query(
+            {"publisher": "Heinemann"}, skip=1, limit=1
+        )
+
+        self.assertEqual(count, 3)
+        self.assertEqual([record["title"] for record in records], ["Arrow of God"])
+
+    def test_query_combined_filters(self):
+        count, records = self.catalogue.query(
+            {"publisher": "Heinemann", "author": "Wole Soyinka"}
+        )
+
+        self.assertEqual(count, 1)
+        self.assertEqual(records[0]["title"], "The Lion")
+
+    def test_query_unknown_value(self):
+        self.assertEqual(self.catalogue.query({"category": "Poetry"}), (0, []))
+
+    def test_get(self):
+        book = self.catalogue.get(self.books[4]["_id"])
+
+        self.assertEqual(book["title"], "Anthills")
+        self.assertFalse(book["available"])
+        self.assertIsNone(self.catalogue.get(ObjectId()))
+
+    def test_set_available(self):
+        self.catalogue.set_available(self.books[0]["_id"], False)
+        self.catalogue.set_available(self.books[4]["_id"], True)
+        # Repeated updates do not skew the counts
+        self.catalogue.set_available(self.books[4]["_id"], True)
+
+        count, records = self.catalogue.query({"author": "Chinua Achebe"})
+
+        self.assertEqual(count, 2)
+        self.assertEqual(
+            [record["title"] for record in records], ["Arrow of God", "Anthills"]
+        )
+
+    def test_remove_book(self):
+        self.catalogue.remove_book(self.books[1]["_id"])
+
+        count, records = self.catalogue.query({"category": "Fiction"})
+
+        self.assertEqual(count, 1)
+        self.assertEqual(records[0]["title"], "Things Fall Apart")
+        self.assertIsNone(self.catalogue.get(self.books[1]["_id"]))
+
+    def test_readding_book_replaces_it(self):
+        self.books[3]["publisher"] = "Heinemann"
+        self.catalogue.add_book(self.books[3])
+
+        count, _ = self.catalogue.query({"publisher": "Heinemann"})
+
+        self.assertEqual(len(self.catalogue), 5)
+        self.assertEqual(count, 4)
+        self.assertEqual(self.catalogue.query({"publisher": "Rex Collings"}), (0, []))
+
+    def test_compaction_keeps_order_and_indexes(self):
+        for book in self.books[:3]:
+            self.catalogue.remove_book(book["_id"])
+        self.catalogue._compact()
+
+        self.assertEqual(len(self.catalogue._records), 2)
+        count, records = self.catalogue.query({"author": "Wole Soyinka"})
+        self.assertEqual(count, 1)
+        self.assertEqual(records[0]["title"], "Ake")
+        self.assertEqual(self.catalogue.get(self.books[4]["_id"])["title"], "Anthills")
@@ -0,0 +1,146 @@
+import unittest
+from unittest.mock import MagicMock
+
+from app.helpers.db_indexes import (
+    OPEN_LOANS_INDEX_NAME,
+    USER_EMAIL_INDEX_NAME,
+    ensure_indexes,
+    listing_index,
+    listing_index_keys,
+    listing_index_name,
+    parse_sort,
+    sort_options,
+)
+
+
+class TestListingIndexes(unittest.TestCase):
+    def test_index_keys_follow_equality_sort_order(self):
+        # Assert equality fields come first, then the sort field and _id, then
+        # the available copies range
+        self.assertEqual(
+            listing_index_keys("publisher", "title"),
+            [("publisher", 1), ("title", 1), ("_id", 1), ("available_copies", 1)],
+        )
+        self.assertEqual(
+            listing_index_keys(None, "added_at"),
+            [("added_at", 1), ("_id", 1), ("available_copies", 1)],
+        )
+
+    def test_index_keys_when_sorting_on_the_filter_field(self):
+        # Assert the filter field is not repeated
+        self.assertEqual(
+            listing_index_keys("author", "author"),
+            [("author", 1), ("_id", 1), ("available_copies", 1)],
+        )
+
+    def test_ensure_indexes(self):
+        mongo = MagicMock()
+
+        ensure_indexes(mongo)
+
+        # Assert one index per filter field (or none) and sort field was created
+        self.assertEqual(mongo.db.books.create_index.call_count, 12)
+        mongo.db.books.create_index.assert_any_call(
+            listing_index_keys("category", "added_at"),
+            name="listing_category_by_added_at",
+        )
+        mongo.db.books.drop_index.assert_not_called()
+
+        # Assert the open loans are indexed for the loan limit counters
+        mongo.db.borrow_records.create_index.assert_called_once_with(
+            [("returned_on", 1), ("user_id", 1)], name=OPEN_LOANS_INDEX_NAME
+        )
+
+        # Assert enrollments racing past the email check are rejected
+        mongo.db.users.create_index.assert_called_once_with(
+            [("email", 1)], name=USER_EMAIL_INDEX_NAME, unique=True
+        )
+
+    def test_ensure_indexes_rebuilds_changed_indexes(self):
+        mongo = MagicMock()
+        mongo.db.books.index_information.return_value = {
+            "_id_": {"key": [("_id", 1)]},
+            "listing_all_by_title": {
+                "key": [("available", 1), ("title", 1), ("_id", 1)]
+            },
+            "listing_author_by_title": {"key": listing_index_keys("author", "title")},
+        }
+
+        ensure_indexes(mongo)
+
+        # Assert only the index laid out with the former keys was dropped
+        mongo.db.books.drop_index.assert_called_once_with("listing_all_by_title")
+        self.assertEqual(mongo.db.books.create_index.call_count, 12)
+
+
+class TestSortOptions(unittest.TestCase):
+    def test_parse_sort(self):
+        self.assertEqual(parse_sort("title"), ("title", 1))
+        self.assertEqual(parse_sort("-added_at"), ("added_at", -1))
+
+    def test_sort_options_unfiltered(self):
+        self.assertEqual(
+            sort_options({"available_copies": {"$gt": 0}}, "-added_at"),
+            {
+                "sort": [("added_at", -1), ("_id", -1)],
+                "hint": listing_index_name(None, "added_at"),
+            },
+        )
+
+    def test_sort_options_hint_matches_a_filter(self):
+        options = sort_options(
+            {"available_copies": {"$gt": 0}, "category": "Fiction", "author": "Ann"},
+            "title",
+        )
+
+        # Assert the hinted index starts with one of the filtered fields
+        self.assertEqual(options["hint"], "listing_category_by_title")
+        self.assertEqual(options["sort"], [("title", 1), ("_id", 1)])
+
+
+class TestListingIndexChoice(unittest.TestCase):
+    def test_unfiltered(self):
+        self.assertEqual(
+            listing_index({"available_copies": {"$gt": 0}}, "title"),
+            "listing_all_by_title",
+        )
+
+    def test_equality_preferred_over_in(self):
+        query = {
+            "available_copies": {"$gt": 0},
+            "publisher": {"$in": ["Apress", "Wiley"]},
+            "author": "Ann",
+        }
+
+        # Assert the single value field is used, keeping the index order
+        self.assertEqual(listing_index(query, "added_at"), "listing_author_by_added_at")
+
+    def test_in_used_when_no_equality(self):
+        query = {
+            "available_copies": {"$gt": 0},
+            "category": {"$in": ["Fiction", "Poetry"]},
+            "author": {"$in": ["Ann"], "$nin": ["Bob"]},
+        }
+
+        # Assert the first $in field in canonical order is used
+        self.assertEqual(listing_index(query, "title"), "listing_category_by_title")
+
+    def test_negated_fields_not_used(self):
+        query = {"available_copies": {"$gt": 0}, "publisher": {"$nin": ["Wiley"]}}
+
+        # Assert a $nin range falls back to the unfiltered index
+        self.assertEqual(listing_index(query, "title"), "listing_all_by_title")
+
+    def test_choice_independent_of_query_order(self):
+        first = {"available_copies": {"$gt": 0}, "author": "Ann", "category": "Fiction"}
+        second = {
+            "category": "Fiction",
+            "author": "Ann",
+            "available_copies": {"$gt": 0},
+        }
+
+        self.assertEqual(listing_index(first, "title"), listing_index(second, "title"))
+
+
+if __name__ == "__main__":
+    unittest.main()
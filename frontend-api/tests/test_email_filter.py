@@ -0,0 +1,119 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import mongomock
+from app import app
+from app.commands import rebuild_email_filter_command
+from app.helpers.email_filter import (
+    CHECK_SCRIPT,
+    STATS_KEY,
+    EmailFilter,
+    filter_shape,
+)
+from redis.exceptions import ConnectionError
+
+
+class TestEmailFilter(unittest.TestCase):
+    def setUp(self):
+        self.redis = MagicMock()
+        self.emails = EmailFilter(self.redis, 1000, 0.01)
+
+    def test_filter_shape(self):
+        # Assert the textbook sizing, about 9.6 bits and 7 hashes per email
+        self.assertEqual(filter_shape(1000, 0.01), (9586, 7))
+        self.assertEqual(self.emails.key, "email_filter:9586:7")
+
+    def test_offsets(self):
+        offsets = self.emails.offsets("user@example.com")
+
+        # Assert the same, distinct, in range bits for every check of an email
+        self.assertEqual(offsets, self.emails.offsets("user@example.com"))
+        self.assertEqual(len(set(offsets)), 7)
+        self.assertTrue(all(0 <= offset < 9586 for offset in offsets))
+        self.assertNotEqual(offsets, self.emails.offsets("other@example.com"))
+
+    def test_check(self):
+        script = self.redis.register_script.return_value
+        script.return_value = 0
+
+        # Assert the bits were checked and counted in one script call
+        self.assertEqual(self.emails.check("user@example.com"), 0)
+        self.redis.register_script.assert_called_once_with(CHECK_SCRIPT)
+        script.assert_called_once_with(
+            keys=[self.emails.key, STATS_KEY],
+            args=self.emails.offsets("user@example.com"),
+        )
+
+    def test_check_without_redis(self):
+        self.redis.register_script.return_value.side_effect = ConnectionError()
+
+        # Assert MongoDB is asked when the filter cannot tell
+        self.assertEqual(self.emails.check("user@example.com"), -1)
+
+    def test_add(self):
+        pipeline = self.redis.pipeline.return_value
+
+        self.emails.add("user@example.com")
+
+        for offset in self.emails.offsets("user@example.com"):
+            pipeline.setbit.assert_any_call(self.emails.key, offset, 1)
+        pipeline.execute.assert_called_once_with()
+
+    def test_rebuild(self):
+        mongo = MagicMock()
+        mongo.db = mongomock.MongoClient().db
+        mongo.db.users.insert_many(
+            [{"email": f"user{number}@example.com"} for number in range(3)]
+        )
+        pipeline = self.redis.pipeline.return_value
+
+        self.assertEqual(self.emails.rebuild(mongo, batch_size=2), 3)
+
+        # Assert the filter was built aside, then swapped in
+        building = self.redis.setbit.call_args[0][0]
+        self.assertTrue(building.startswith(f"{self.emails.key}:building:"))
+        pipeline.setbit.assert_any_call(
+            building, self.emails.offsets("user2@example.com")[0], 1
+        )
+        self.redis.rename.assert_called_once_with(building, self.emails.key)
+        self.redis.delete.assert_called_once_with(STATS_KEY)
+
+    def test_ensure(self):
+        self.redis.exists.return_value = 1
+
+        # Assert an existing filter is kept
+        self.assertFalse(self.emails.ensure(MagicMock()))
+        self.redis.rename.assert_not_called()
+
+    def test_stats(self):
+        self.redis.hgetall.return_value = {
+            b"negatives": b"90",
+            b"positives": b"20",
+            b"false_positives": b"10",
+        }
+        self.redis.bitcount.return_value = 4793
+
+        stats = self.emails.stats()
+
+        # Assert the observed rate counts the new emails the filter matched
+        self.assertEqual(stats["false_positive_rate"], 0.1)
+        self.assertAlmostEqual(stats["fill_ratio"], 0.5, places=3)
+        self.assertAlmostEqual(stats["estimated_false_positive_rate"], 0.5**7, 4)
+        self.assertEqual(stats["unavailable"], 0)
+
+
+@patch("app.commands.email_filter")
+class TestRebuildEmailFilterCommand(unittest.TestCase):
+    def test_rebuild_email_filter_command(self, mock_email_filter):
+        emails = mock_email_filter.return_value
+        emails.rebuild.return_value = 42
+        emails.size, emails.hashes = 9586, 7
+
+        result = app.test_cli_runner().invoke(rebuild_email_filter_command, [])
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("42 emails added to a filter of 9586 bits", result.output)
+
+
+if __name__ == "__main__":
+    unittest.main()
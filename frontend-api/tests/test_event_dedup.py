@@ -0,0 +1,24 @@
+import unittest
+
+from app.helpers.event_dedup import RecentEvents, new_event_id
+
+
+class TestRecentEvents(unittest.TestCase):
+    def test_new_event_id(self):
+        self.assertNotEqual(new_event_id(), new_event_id())
+
+    def test_recent_events(self):
+        recent_events = RecentEvents(size=2)
+        recent_events.add("first")
+        recent_events.add("second")
+
+        # Assert a lookup refreshes the id, so the oldest other one is evicted
+        self.assertIn("first", recent_events)
+        recent_events.add("third")
+        self.assertIn("first", recent_events)
+        self.assertNotIn("second", recent_events)
+        self.assertEqual(len(recent_events), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+
+from app.helpers.facet_index import FacetIndex
+from bson.objectid import ObjectId
+
+
+def make_book(publisher, category, author, **extra):
+    book = {
+        "_id": ObjectId(),
+        "title": "Untitled",
+        "publisher": publisher,
+        "category": category,
+        "author": author,
+    }
+    book.update(extra)
+    return book
+
+
+class TestFacetIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = FacetIndex(capacity=2)
+        self.books = [
+            make_book("Wiley", "Technology", "Andrew Hunt"),
+            make_book("Wiley", "Fiction", "Chinua Achebe"),
+            make_book("Manning", "Technology", "Andrew Hunt"),
+            make_book("Apress", "Technology", "Kent Beck", available=False),
+        ]
+        self.index.load(self.books)
+
+    def test_counts_without_filters(self):
+        count, facets = self.index.counts({})
+
+        # The unavailable book is not counted
+        self.assertEqual(count, 3)
+        self.assertEqual(
+            facets["publisher"],
+            [{"value": "Wiley", "count": 2}, {"value": "Manning", "count": 1}],
+        )
+        self.assertEqual(
+            facets["category"],
+            [{"value": "Technology", "count": 2}, {"value": "Fiction", "count": 1}],
+        )
+
+    def test_counts_with_combined_filters(self):
+        count, facets = self.index.counts(
+            {"publisher": "Wiley", "category": "Technology"}
+        )
+
+        self.assertEqual(count, 1)
+        self.assertEqual(facets["author"], [{"value": "Andrew Hunt", "count": 1}])
+
+    def test_counts_limit(self):
+        count, facets = self.index.counts({}, limit=1)
+
+        self.assertEqual(count, 3)
+        self.assertEqual(facets["publisher"], [{"value": "Wiley", "count": 2}])
+
+    def test_counts_with_unknown_value(self):
+        count, facets = self.index.counts({"publisher": "Penguin"})
+
+        self.assertEqual(count, 0)
+        self.assertEqual(facets["publisher"], [])
+
+    def test_set_available(self):
+        self.index.set_available(self.books[3]["_id"], True)
+        self.index.set_available(self.books[0]["_id"], False)
+
+        count, facets = self.index.counts({"category": "Technology"})
+
+        self.assertEqual(count, 2)
+        self.assertEqual(
+            facets["publisher"],
+            [{"value": "Manning", "count": 1}, {"value": "Apress", "count": 1}],
+        )
+
+    def test_remove_book_reuses_slot(self):
+        self.index.remove_book(self.books[1]["_id"])
+
+        count, facets = self.index.counts({})
+        self.assertEqual(count, 2)
+        self.assertEqual(facets["category"], [{"value": "Technology", "count": 2}])
+
+        self.index.add_book(make_book("Penguin", "Fiction", "Zadie Smith"))
+        self.assertEqual(len(self.index), 4)
+        self.assertEqual(self.index._size, 4)
+
+    def test_readding_book_replaces_it(self):
+        self.books[2]["publisher"] = "Wiley"
+        self.index.add_book(self.books[2])
+
+        count, facets = self.index.counts({"publisher": "Wiley"})
+
+        self.assertEqual(len(self.index), 4)
+        self.assertEqual(count, 3)
@@ -0,0 +1,59 @@
+import unittest
+
+from app.helpers.filters import cache_filters, filters_query, parse_filters
+from werkzeug.datastructures import MultiDict
+
+
+class TestParseFilters(unittest.TestCase):
+    def test_parse_filters_is_canonical(self):
+        args = MultiDict(
+            {
+                "author": "Ann",
+                "publisher": "Wiley, Apress,Wiley",
+                "category!": "Poetry",
+                "page": "2",
+            }
+        )
+
+        included, excluded = parse_filters(args)
+
+        # Assert fields are in canonical order and values deduplicated and sorted
+        self.assertEqual(list(included), ["publisher", "author"])
+        self.assertEqual(included["publisher"], ["Apress", "Wiley"])
+        self.assertEqual(included["author"], "Ann")
+        self.assertEqual(excluded, {"category": ["Poetry"]})
+
+    def test_parse_filters_ignores_empty_values(self):
+        self.assertEqual(parse_filters(MultiDict({"publisher": " , "})), ({}, {}))
+
+
+class TestFiltersQuery(unittest.TestCase):
+    def test_single_value_stays_an_equality(self):
+        self.assertEqual(
+            filters_query({"category": "Fiction"}), {"category": "Fiction"}
+        )
+
+    def test_multiple_and_negated_values(self):
+        query = filters_query(
+            {"publisher": ["Apress", "Wiley"], "author": "Ann"},
+            {"category": ["Poetry"], "author": ["Bob"]},
+        )
+
+        self.assertEqual(
+            query,
+            {
+                "publisher": {"$in": ["Apress", "Wiley"]},
+                "category": {"$nin": ["Poetry"]},
+                "author": {"$in": ["Ann"], "$nin": ["Bob"]},
+            },
+        )
+
+    def test_cache_filters_marks_excluded_fields(self):
+        self.assertEqual(
+            cache_filters({"author": "Ann"}, {"category": ["Poetry"]}),
+            {"author": "Ann", "category!": ["Poetry"]},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import json
+import unittest
+from unittest.mock import MagicMock
+
+from app.helpers.holds import (
+    NOTIFICATION_TTL,
+    notify_holders,
+    place_hold,
+    wait_for_notifications,
+)
+from bson import ObjectId
+from redis.exceptions import ConnectionError
+
+
+class TestHolds(unittest.TestCase):
+    def setUp(self):
+        self.redis = MagicMock()
+        self.pipeline = self.redis.pipeline.return_value
+
+    def test_place_hold(self):
+        book_id, user_id = ObjectId(), ObjectId()
+        self.pipeline.execute.return_value = [1, 2]
+
+        # Assert the user joined the queue at the back, third in line
+        self.assertEqual(place_hold(self.redis, book_id, user_id), 3)
+        queued, _ = self.pipeline.zadd.call_args
+        self.assertEqual(queued[0], f"holds:{book_id}")
+        self.assertEqual(list(queued[1]), [str(user_id)])
+        self.assertEqual(self.pipeline.zadd.call_args.kwargs, {"nx": True})
+
+    def test_notify_holders(self):
+        book_id, other_book_id = ObjectId(), ObjectId()
+        self.redis.set.return_value = True
+        self.pipeline.execute.side_effect = [
+            [[(b"first", 1.0), (b"second", 2.0)], []],
+            [],
+        ]
+
+        notified = notify_holders(self.redis, {book_id: 2, other_book_id: 1}, "e1")
+
+        # Assert a holder was popped per copy given back, and notified
+        self.assertEqual(notified, 2)
+        self.redis.set.assert_called_once_with(
+            "holds:notified:e1", 1, nx=True, ex=NOTIFICATION_TTL
+        )
+        self.pipeline.zpopmin.assert_any_call(f"holds:{book_id}", 2)
+        self.pipeline.zpopmin.assert_any_call(f"holds:{other_book_id}", 1)
+        key, message = self.pipeline.rpush.call_args_list[0].args
+        self.assertEqual(key, "notifications:first")
+        self.assertEqual(json.loads(message)["book_id"], str(book_id))
+
+    def test_notify_holders_claimed_by_another_replica(self):
+        self.redis.set.return_value = None
+
+        self.assertEqual(notify_holders(self.redis, {ObjectId(): 1}, "e1"), 0)
+        self.pipeline.zpopmin.assert_not_called()
+
+    def test_notify_holders_without_redis(self):
+        self.redis.set.side_effect = ConnectionError()
+
+        self.assertEqual(notify_holders(self.redis, {ObjectId(): 1}, "e1"), 0)
+
+    def test_wait_for_notifications(self):
+        first = json.dumps({"event": "book_available", "book_id": "1"})
+        second = json.dumps({"event": "book_available", "book_id": "2"})
+        self.redis.blpop.return_value = (b"notifications:user", first.encode())
+        self.redis.lpop.return_value = [second.encode()]
+
+        notifications = wait_for_notifications(self.redis, "user", 30)
+
+        # Assert the first notification was waited for, then the rest drained
+        self.redis.blpop.assert_called_once_with(["notifications:user"], timeout=30)
+        self.assertEqual([item["book_id"] for item in notifications], ["1", "2"])
+
+    def test_wait_for_notifications_timeout(self):
+        self.redis.blpop.return_value = None
+
+        self.assertEqual(wait_for_notifications(self.redis, "user", 1), [])
+        self.redis.lpop.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+
+from app.helpers.idempotency import idempotent, request_fingerprint
+from flask import Flask, jsonify
+from redis.exceptions import ConnectionError
+
+KEY = "idempotency:POST:/loans:retry-1"
+BODY = {"book": "Emma"}
+
+
+@patch("app.helpers.idempotency.POLL_INTERVAL", 0)
+@patch("app.helpers.idempotency.r")
+class TestIdempotent(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config["IDEMPOTENCY_WAIT"] = 0.1
+        self.view = MagicMock(side_effect=lambda: (jsonify({"loan": 1}), 201))
+
+        @self.app.route("/loans", methods=["POST"])
+        @idempotent
+        def create_loan():
+            return self.view()
+
+        self.client = self.app.test_client()
+
+    def post(self, key="retry-1", body=BODY):
+        headers = {"Idempotency-Key": key} if key else {}
+        return self.client.post("/loans", json=body, headers=headers)
+
+    def stored_state(self, state="done"):
+        with self.app.test_request_context("/loans", method="POST", json=BODY):
+            fingerprint = request_fingerprint()
+        return json.dumps(
+            {
+                "state": state,
+                "fingerprint": fingerprint,
+                "status": 201,
+                "mimetype": "application/json",
+                "body": '{"loan":1}\n',
+            }
+        )
+
+    def test_request_without_key(self, mock_redis):
+        response = self.post(key=None)
+
+        # Assert the view ran without touching Redis
+        self.assertEqual(response.status_code, 201)
+        mock_redis.set.assert_not_called()
+
+    def test_first_request_stores_response(self, mock_redis):
+        mock_redis.set.return_value = True
+
+        response = self.post()
+
+        # Assert the key was claimed, then replaced by the response
+        self.assertEqual(response.status_code, 201)
+        self.view.assert_called_once_with()
+        claim, store = mock_redis.set.call_args_list
+        self.assertEqual(claim.args[0], KEY)
+        self.assertEqual(claim.kwargs, {"nx": True, "ex": 30})
+        state = json.loads(store.args[1])
+        self.assertEqual((state["state"], state["status"]), ("done", 201))
+        self.assertEqual(json.loads(state["body"]), {"loan": 1})
+        self.assertEqual(store.kwargs, {"ex": 86400})
+
+    def test_retry_replays_response(self, mock_redis):
+        mock_redis.set.return_value = None
+        mock_redis.get.return_value = self.stored_state()
+
+        response = self.post()
+
+        # Assert the stored response came back without running the view
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json, {"loan": 1})
+        self.assertEqual(response.headers["Idempotent-Replayed"], "true")
+        self.view.assert_not_called()
+
+    def test_key_reused_with_another_body(self, mock_redis):
+        mock_redis.set.return_value = None
+        mock_redis.get.return_value = self.stored_state()
+
+        response = self.post(body={"book": "Persuasion"})
+
+        self.assertEqual(response.status_code, 422)
+        self.view.assert_not_called()
+
+    def test_duplicate_waits_for_first_request(self, mock_redis):
+        mock_redis.set.return_value = None
+        mock_redis.get.side_effect = [
+            self.stored_state(state="pending"),
+            self.stored_state(state="pending"),
+            self.stored_state(),
+        ]
+
+        response = self.post()
+
+        # Assert the duplicate got the first request's response
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(mock_redis.get.call_count, 3)
+        self.view.assert_not_called()
+
+    def test_duplicate_gives_up_waiting(self, mock_redis):
+        mock_redis.set.return_value = None
+        mock_redis.get.return_value = self.stored_state(state="pending")
+
+        response = self.post()
+
+        self.assertEqual(response.status_code, 409)
+        self.view.assert_not_called()
+
+    def test_server_error_releases_key(self, mock_redis):
+        mock_redis.set.return_value = True
+        self.view.side_effect = lambda: (jsonify({"message": "boom"}), 500)
+
+        response = self.post()
+
+        # Assert the error was not stored, so the request can be retried
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(mock_redis.set.call_count, 1)
+        mock_redis.delete.assert_called_once_with(KEY)
+
+    def test_request_without_redis(self, mock_redis):
+        mock_redis.set.side_effect = ConnectionError()
+
+        response = self.post()
+
+        # Assert the request ran as if it had no key
+        self.assertEqual(response.status_code, 201)
+        self.view.assert_called_once_with()
+
+    def test_key_too_long(self, mock_redis):
+        response = self.post(key="k" * 256)
+
+        self.assertEqual(response.status_code, 400)
+        self.view.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
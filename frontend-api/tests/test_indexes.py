@@ -0,0 +1,67 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from app.helpers.indexes import (
+    index_book_added,
+    index_book_availability,
+    index_book_removed,
+    warm_indexes,
+)
+from bson.objectid import ObjectId
+
+
+@patch("app.helpers.indexes.catalogue")
+@patch("app.helpers.indexes.facet_index")
+@patch("app.helpers.indexes.suggest_index")
+@patch("app.helpers.indexes.search_index")
+class TestIndexHooks(unittest.TestCase):
+    def test_warm_indexes(self, mock_search, mock_suggest, mock_facet, mock_catalogue):
+        mongo = MagicMock()
+
+        warm_indexes(mongo)
+
+        mock_search.load.assert_called_once()
+        mock_suggest.load.assert_called_once()
+        mock_facet.load.assert_called_once()
+        mock_catalogue.load.assert_not_called()
+        self.assertEqual(mongo.db.books.find.call_count, 3)
+
+    def test_warm_indexes_with_replica(
+        self, mock_search, mock_suggest, mock_facet, mock_catalogue
+    ):
+        mongo = MagicMock()
+
+        warm_indexes(mongo, replica=True)
+
+        mock_catalogue.load.assert_called_once_with(mongo.db.books.find.return_value)
+
+    def test_index_book_added(
+        self, mock_search, mock_suggest, mock_facet, mock_catalogue
+    ):
+        book = {"_id": ObjectId(), "title": "Ake"}
+
+        index_book_added(book)
+
+        for index in (mock_search, mock_suggest, mock_facet, mock_catalogue):
+            index.add_book.assert_called_once_with(book)
+
+    def test_index_book_removed(
+        self, mock_search, mock_suggest, mock_facet, mock_catalogue
+    ):
+        book_id = ObjectId()
+
+        index_book_removed(book_id)
+
+        for index in (mock_search, mock_suggest, mock_facet, mock_catalogue):
+            index.remove_book.assert_called_once_with(book_id)
+
+    def test_index_book_availability(
+        self, mock_search, mock_suggest, mock_facet, mock_catalogue
+    ):
+        book_id = ObjectId()
+
+        index_book_availability(book_id, False)
+
+        for index in (mock_search, mock_facet, mock_catalogue):
+            index.set_available.assert_called_once_with(book_id, False)
+        mock_suggest.set_available.assert_not_called()
@@ -0,0 +1,172 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import mongomock
+from app import app
+from app.commands import migrate_copies_command
+from app.helpers.inventory import (
+    close_loans,
+    copies_available,
+    merge_duplicate_books,
+    migrate_copies,
+    release_operations,
+    released_copies,
+    stock_book,
+    stocked_copies,
+)
+from bson import ObjectId
+from pymongo import UpdateOne
+
+
+class TestCopyCounters(unittest.TestCase):
+    def test_copies_available(self):
+        # Assert counters take precedence over the former availability flag
+        self.assertTrue(copies_available({"available_copies": 2}))
+        self.assertFalse(copies_available({"available_copies": 0, "available": True}))
+        self.assertFalse(copies_available({"available": False}))
+        self.assertTrue(copies_available({}))
+
+    def test_stock_book(self):
+        # Assert a book announced without counters is held in a single copy
+        self.assertEqual(
+            stock_book({"title": "Emma", "available": True}),
+            {"title": "Emma", "total_copies": 1, "available_copies": 1},
+        )
+        self.assertEqual(
+            stock_book({"title": "Emma", "available": False}),
+            {"title": "Emma", "total_copies": 1, "available_copies": 0},
+        )
+        self.assertEqual(
+            stock_book({"title": "Emma", "total_copies": 3}),
+            {"title": "Emma", "total_copies": 3, "available_copies": 3},
+        )
+        self.assertEqual(stocked_copies({"total_copies": 3}), {"available_copies": 3})
+
+    def test_release_operations(self):
+        book_id, other_book_id = ObjectId(), ObjectId()
+        released = released_copies(
+            [{"book_id": book_id}, {"book_id": other_book_id}, {"book_id": book_id}]
+        )
+
+        # Assert one capped increment per book
+        self.assertEqual(released, {book_id: 2, other_book_id: 1})
+        self.assertEqual(
+            release_operations({book_id: 2})[0],
+            UpdateOne(
+                {"_id": book_id},
+                [
+                    {
+                        "$set": {
+                            "available_copies": {
+                                "$min": [
+                                    {"$add": ["$available_copies", 2]},
+                                    "$total_copies",
+                                ]
+                            }
+                        }
+                    }
+                ],
+            ),
+        )
+
+
+class TestCloseLoans(unittest.TestCase):
+    def test_close_loans(self):
+        mongo = MagicMock()
+        mongo.db = mongomock.MongoClient().db
+        book_id = ObjectId()
+        open_id, returned_id, unknown_id = ObjectId(), ObjectId(), ObjectId()
+        mongo.db.borrow_records.insert_many(
+            [
+                {"_id": open_id, "book_id": book_id},
+                {"_id": returned_id, "book_id": book_id, "returned_on": "2024-09-01"},
+            ]
+        )
+        loans = [
+            {"_id": loan_id, "book_id": book_id, "returned_on": "2024-09-20"}
+            for loan_id in (open_id, returned_id, unknown_id)
+        ]
+
+        # Assert the open and unknown loans were closed, not the returned one
+        self.assertEqual(close_loans(mongo, loans), [loans[0], loans[2]])
+        self.assertEqual(
+            mongo.db.borrow_records.find_one({"_id": returned_id})["returned_on"],
+            "2024-09-01",
+        )
+        self.assertEqual(
+            mongo.db.borrow_records.find_one({"_id": unknown_id})["book_id"], book_id
+        )
+
+        # Assert applying the release again closes nothing
+        self.assertEqual(close_loans(mongo, loans), [])
+
+
+class TestMigrateCopies(unittest.TestCase):
+    def test_migrate_copies(self):
+        mongo = MagicMock()
+        mongo.db.books.update_many.return_value.modified_count = 3
+
+        # Assert only the books without counters are converted
+        self.assertEqual(migrate_copies(mongo), 3)
+        query, pipeline = mongo.db.books.update_many.call_args[0]
+        self.assertEqual(query, {"total_copies": {"$exists": False}})
+        self.assertEqual(pipeline[-1], {"$unset": "available"})
+
+    def test_merge_duplicate_books(self):
+        mongo = MagicMock()
+        mongo.db = mongomock.MongoClient().db
+        copies = [
+            {
+                "_id": ObjectId(),
+                "title": "Emma",
+                "author": "Jane Austen",
+                "publisher": "Penguin",
+                "total_copies": 1,
+                "available_copies": available,
+            }
+            for available in (1, 0, 1)
+        ]
+        other = {
+            "_id": ObjectId(),
+            "title": "Persuasion",
+            "author": "Jane Austen",
+            "publisher": "Penguin",
+            "total_copies": 1,
+            "available_copies": 1,
+        }
+        mongo.db.books.insert_many(copies + [other])
+        mongo.db.borrow_records.insert_one({"book_id": copies[1]["_id"]})
+
+        # Assert the copies were folded into the oldest document
+        self.assertEqual(merge_duplicate_books(mongo), 2)
+        self.assertEqual(mongo.db.books.count_documents({}), 2)
+        book = mongo.db.books.find_one({"_id": copies[0]["_id"]})
+        self.assertEqual((book["total_copies"], book["available_copies"]), (3, 2))
+
+        # Assert the loans now point at the remaining document
+        self.assertEqual(
+            mongo.db.borrow_records.find_one()["book_id"], copies[0]["_id"]
+        )
+
+
+@patch("app.commands.merge_duplicate_books", return_value=2)
+@patch("app.commands.migrate_copies", return_value=5)
+class TestMigrateCopiesCommand(unittest.TestCase):
+    def test_migrate_copies_command(self, mock_migrate_copies, mock_merge):
+        result = app.test_cli_runner().invoke(migrate_copies_command, [])
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("5 books converted", result.output)
+        mock_merge.assert_not_called()
+
+    def test_migrate_copies_command_merging(self, mock_migrate_copies, mock_merge):
+        result = app.test_cli_runner().invoke(
+            migrate_copies_command, ["--merge-duplicates"]
+        )
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("2 duplicate books merged", result.output)
+
+
+if __name__ == "__main__":
+    unittest.main()
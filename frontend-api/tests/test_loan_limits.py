@@ -0,0 +1,107 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import mongomock
+from app import app
+from app.commands import reconcile_loans_command
+from app.helpers.loan_limits import (
+    ACQUIRE_SCRIPT,
+    RELEASE_SCRIPT,
+    acquire_loan_slot,
+    counter_key,
+    reconcile_loan_counts,
+    release_loan_slots,
+)
+from bson import ObjectId
+from redis.exceptions import ConnectionError
+
+
+class TestLoanSlots(unittest.TestCase):
+    def setUp(self):
+        self.redis = MagicMock()
+        self.script = self.redis.register_script.return_value
+
+    def test_acquire_loan_slot(self):
+        self.script.return_value = 3
+
+        # Assert the counter was checked and incremented in one script call
+        self.assertTrue(acquire_loan_slot(self.redis, "user", 5))
+        self.redis.register_script.assert_called_once_with(ACQUIRE_SCRIPT)
+        self.script.assert_called_once_with(keys=["open_loans:user"], args=[5])
+
+    def test_acquire_loan_slot_at_the_limit(self):
+        self.script.return_value = -1
+
+        self.assertFalse(acquire_loan_slot(self.redis, "user", 5))
+
+    def test_acquire_loan_slot_without_redis(self):
+        self.script.side_effect = ConnectionError()
+
+        # Assert the limit fails open
+        self.assertTrue(acquire_loan_slot(self.redis, "user", 5))
+
+    def test_release_loan_slots(self):
+        pipeline = self.redis.pipeline.return_value
+
+        release_loan_slots(self.redis, {"first": 2, "second": 1})
+
+        # Assert every counter was decremented in one round trip
+        self.redis.register_script.assert_called_once_with(RELEASE_SCRIPT)
+        self.script.assert_any_call(
+            keys=["open_loans:first"], args=[2], client=pipeline
+        )
+        self.script.assert_any_call(
+            keys=["open_loans:second"], args=[1], client=pipeline
+        )
+        pipeline.execute.assert_called_once_with()
+
+    def test_release_no_loan_slots(self):
+        release_loan_slots(self.redis, {})
+
+        self.redis.pipeline.assert_not_called()
+
+
+class TestReconcileLoanCounts(unittest.TestCase):
+    def test_reconcile_loan_counts(self):
+        mongo = MagicMock()
+        mongo.db = mongomock.MongoClient().db
+        first_id, second_id = ObjectId(), ObjectId()
+        mongo.db.borrow_records.insert_many(
+            [
+                {"user_id": first_id},
+                {"user_id": first_id},
+                {"user_id": second_id},
+                {"user_id": second_id, "returned_on": "2024-09-20"},
+            ]
+        )
+        counters = {counter_key(first_id): b"2", counter_key(second_id): b"3"}
+        redis = MagicMock()
+        redis.mget.side_effect = lambda keys: [counters.get(key) for key in keys]
+        redis.scan_iter.return_value = [
+            counter_key(first_id).encode(),
+            counter_key(second_id).encode(),
+            b"open_loans:gone",
+        ]
+        pipeline = redis.pipeline.return_value
+
+        report = reconcile_loan_counts(mongo, redis, batch_size=1)
+
+        # Assert only the drifted counter was reset, and the stale one dropped
+        pipeline.set.assert_called_once_with(counter_key(second_id), 1)
+        redis.delete.assert_called_once_with(b"open_loans:gone")
+        self.assertEqual(report, {"users": 2, "corrected": 2})
+
+
+@patch("app.commands.reconcile_loan_counts")
+class TestReconcileLoansCommand(unittest.TestCase):
+    def test_reconcile_loans_command(self, mock_reconcile_loan_counts):
+        mock_reconcile_loan_counts.return_value = {"users": 10, "corrected": 1}
+
+        result = app.test_cli_runner().invoke(reconcile_loans_command)
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("1 loan counters corrected", result.output)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+import json
+import unittest
+from unittest.mock import MagicMock
+
+from app.helpers.page_cache import (
+    STATS_KEY,
+    book_tags,
+    cache_page,
+    get_cached_page,
+    invalidate_pages,
+    page_cache_stats,
+    page_key,
+    page_tags,
+)
+from redis.exceptions import ConnectionError
+
+
+class TestPageKeys(unittest.TestCase):
+    def test_page_key_is_normalized(self):
+        first = page_key({"publisher": "Wiley", "category": "Fiction"}, 1, 10)
+        second = page_key({"category": "Fiction", "publisher": "Wiley"}, 1, 10)
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, page_key({"category": "Fiction"}, 1, 10))
+        self.assertNotEqual(first, page_key({"category": "Fiction"}, 2, 10))
+
+    def test_page_key_includes_fields(self):
+        full = page_key({}, 1, 10)
+        sparse = page_key({}, 1, 10, ["title", "author"])
+
+        self.assertNotEqual(full, sparse)
+        self.assertEqual(sparse, page_key({}, 1, 10, ["author", "title"]))
+
+    def test_page_tags(self):
+        self.assertEqual(page_tags({}), ["books_page:tag:unfiltered"])
+        self.assertEqual(
+            page_tags({"publisher": "Wiley", "author": "Ann"}),
+            ["books_page:tag:publisher:Wiley", "books_page:tag:author:Ann"],
+        )
+
+    def test_page_tags_with_multiple_and_excluded_values(self):
+        # Assert every included value is tagged and exclusions are not
+        self.assertEqual(
+            page_tags({"publisher": ["Apress", "Wiley"], "category!": ["Poetry"]}),
+            ["books_page:tag:publisher:Apress", "books_page:tag:publisher:Wiley"],
+        )
+
+        # Assert pages only excluding values are tagged as unfiltered
+        self.assertEqual(
+            page_tags({"category!": ["Poetry"]}), ["books_page:tag:unfiltered"]
+        )
+
+    def test_book_tags_cover_every_affected_page(self):
+        book = {"publisher": "Wiley", "category": "Fiction", "author": "Ann"}
+
+        tags = book_tags(book)
+
+        # Any page the book can appear on shares at least one tag with it
+        for filters in (
+            {},
+            {"publisher": "Wiley"},
+            {"category": "Fiction", "author": "Ann"},
+        ):
+            self.assertTrue(set(page_tags(filters)) & set(tags))
+        self.assertFalse(set(page_tags({"publisher": "Manning"})) & set(tags))
+
+
+class TestPageCache(unittest.TestCase):
+    def setUp(self):
+        self.redis = MagicMock()
+        self.page = {"page_number": 1, "records": [{"title": "Ake"}]}
+
+    def test_get_cached_page_hit(self):
+        self.redis.get.return_value = json.dumps(self.page).encode()
+
+        result = get_cached_page(self.redis, {"author": "Ann"}, 1, 10)
+
+        self.assertEqual(result, self.page)
+        self.redis.get.assert_called_once_with(page_key({"author": "Ann"}, 1, 10))
+        self.redis.hincrby.assert_called_once_with(STATS_KEY, "hits")
+
+    def test_get_cached_page_miss(self):
+        self.redis.get.return_value = None
+
+        self.assertIsNone(get_cached_page(self.redis, {}, 1, 10))
+        self.redis.hincrby.assert_called_once_with(STATS_KEY, "misses")
+
+    def test_get_cached_page_fails_open(self):
+        self.redis.get.side_effect = ConnectionError()
+
+        self.assertIsNone(get_cached_page(self.redis, {}, 1, 10))
+
+    def test_cache_page_registers_tags(self):
+        pipeline = self.redis.pipeline.return_value
+        key = page_key({"author": "Ann"}, 1, 10)
+
+        cache_page(self.redis, {"author": "Ann"}, 1, 10, self.page, 60)
+
+        pipeline.set.assert_called_once_with(key, json.dumps(self.page), ex=60)
+        pipeline.sadd.assert_called_once_with("books_page:tag:author:Ann", key)
+        pipeline.execute.assert_called_once()
+
+    def test_invalidate_pages(self):
+        book = {"publisher": "Wiley", "category": "Fiction", "author": "Ann"}
+        self.redis.sunion.return_value = {b"books_page:a", b"books_page:b"}
+        pipeline = self.redis.pipeline.return_value
+
+        invalidate_pages(self.redis, book)
+
+        self.redis.sunion.assert_called_once_with(book_tags(book))
+        pipeline.delete.assert_any_call(*self.redis.sunion.return_value)
+        pipeline.delete.assert_any_call(*book_tags(book))
+        pipeline.hincrby.assert_called_once_with(STATS_KEY, "invalidated_pages", 2)
+
+    def test_invalidate_pages_of_several_books(self):
+        first = {"publisher": "Wiley", "category": "Fiction"}
+        second = {"publisher": "Wiley", "category": "Poetry"}
+        self.redis.sunion.return_value = set()
+        pipeline = self.redis.pipeline.return_value
+
+        invalidate_pages(self.redis, first, second)
+
+        # Assert the shared tags are only looked up once
+        self.redis.sunion.assert_called_once_with(
+            [
+                "books_page:tag:unfiltered",
+                "books_page:tag:publisher:Wiley",
+                "books_page:tag:category:Fiction",
+                "books_page:tag:category:Poetry",
+            ]
+        )
+        pipeline.hincrby.assert_called_once_with(STATS_KEY, "invalidated_pages", 0)
+
+    def test_page_cache_stats(self):
+        self.redis.hgetall.return_value = {b"hits": b"3", b"misses": b"1"}
+
+        stats = page_cache_stats(self.redis)
+
+        self.assertEqual(
+            stats,
+            {"hits": 3, "misses": 1, "hit_ratio": 0.75, "invalidated_pages": 0},
+        )
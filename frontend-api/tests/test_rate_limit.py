@@ -0,0 +1,112 @@
+import unittest
+from threading import BoundedSemaphore
+from unittest.mock import patch
+
+from app.helpers.rate_limit import (
+    BUCKET_SCRIPT,
+    bucket_args,
+    in_flight_slots,
+    init_rate_limits,
+)
+from flask import Blueprint, Flask
+from redis.exceptions import ConnectionError
+
+LIMITS = {
+    "client_rate": 2,
+    "client_burst": 4,
+    "global_rate": 100,
+    "global_burst": 200,
+    "max_in_flight": 1,
+}
+
+
+@patch.dict(in_flight_slots, clear=True)
+@patch("app.helpers.rate_limit.r")
+class TestRateLimits(unittest.TestCase):
+    def setUp(self):
+        blueprint = Blueprint("shop", __name__)
+        init_rate_limits(blueprint)
+
+        @blueprint.route("/orders", methods=["POST"])
+        def create_order():
+            return "", 201
+
+        @blueprint.route("/orders", methods=["GET"])
+        def list_orders():
+            return "", 200
+
+        self.app = Flask(__name__)
+        self.app.config["RATE_LIMITS"] = {"shop.create_order": LIMITS}
+        self.app.register_blueprint(blueprint)
+        self.client = self.app.test_client()
+
+    def test_bucket_args(self, mock_redis):
+        # Assert a bucket per client and a global one, skipping disabled ones
+        self.assertEqual(
+            bucket_args("shop.create_order", "10.0.0.1", LIMITS),
+            (
+                [
+                    "rate_limit:shop.create_order:client:10.0.0.1",
+                    "rate_limit:shop.create_order:global",
+                ],
+                [2, 4, 100, 200],
+            ),
+        )
+        self.assertEqual(
+            bucket_args("shop.create_order", "10.0.0.1", {"global_rate": 5}),
+            (["rate_limit:shop.create_order:global"], [5, 5]),
+        )
+
+    def test_unlimited_endpoint(self, mock_redis):
+        response = self.client.get("/orders")
+
+        self.assertEqual(response.status_code, 200)
+        mock_redis.register_script.assert_not_called()
+
+    def test_admitted_request(self, mock_redis):
+        script = mock_redis.register_script.return_value
+        script.return_value = 0
+
+        response = self.client.post("/orders")
+
+        # Assert the tokens were taken in one script call, and the in-flight
+        # slot given back
+        self.assertEqual(response.status_code, 201)
+        mock_redis.register_script.assert_called_once_with(BUCKET_SCRIPT)
+        self.assertEqual(script.call_args.kwargs["args"], [2, 4, 100, 200])
+        self.assertTrue(in_flight_slots["shop.create_order"].acquire(blocking=False))
+
+    def test_rate_limited_request(self, mock_redis):
+        mock_redis.register_script.return_value.return_value = 1200
+
+        response = self.client.post("/orders")
+
+        # Assert the client is told when a token is back
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["Retry-After"], "2")
+
+    def test_request_without_redis(self, mock_redis):
+        mock_redis.register_script.return_value.side_effect = ConnectionError()
+
+        # Assert the buckets fail open
+        self.assertEqual(self.client.post("/orders").status_code, 201)
+
+    def test_request_over_in_flight_cap(self, mock_redis):
+        mock_redis.register_script.return_value.return_value = 0
+        slots = in_flight_slots["shop.create_order"] = BoundedSemaphore(1)
+        slots.acquire()
+
+        response = self.client.post("/orders")
+
+        # Assert the request was shed without waiting for a slot
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "1")
+
+        # Assert the slot of the refused request was not given back
+        slots.release()
+        self.assertTrue(slots.acquire(blocking=False))
+        self.assertFalse(slots.acquire(blocking=False))
+
+
+if __name__ == "__main__":
+    unittest.main()
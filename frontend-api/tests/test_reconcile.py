@@ -0,0 +1,178 @@
+import json
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import mongomock
+from app import app
+from app.commands import reconcile_command
+from app.helpers.anti_entropy import (
+    SYNC_FIELDS,
+    bucket_hashes,
+    bucket_records,
+    replace_bucket,
+)
+from app.helpers.reconcile import BackendClient, reconcile, sync_stats
+from bson import ObjectId
+
+
+class FakeBackend:
+    """Backend sync endpoints served from an in-memory database."""
+
+    def __init__(self):
+        self.db = mongomock.MongoClient().db
+        self.requests = 0
+
+    def buckets(self, collection, prefix):
+        self.requests += 1
+        return bucket_hashes(self.db[collection], SYNC_FIELDS[collection], prefix)
+
+    def records(self, collection, prefix):
+        self.requests += 1
+        return bucket_records(self.db[collection], SYNC_FIELDS[collection], prefix)
+
+    def replace(self, collection, prefix, records):
+        self.requests += 1
+        return replace_bucket(
+            self.db[collection], SYNC_FIELDS[collection], prefix, records
+        )
+
+
+def book(number):
+    return {
+        "_id": ObjectId(),
+        "title": f"Book {number}",
+        "author": "Ann Lee",
+        "publisher": "Wiley",
+        "category": "Fiction",
+        "added_at": datetime(2024, 9, 20),
+        "total_copies": 2,
+    }
+
+
+class TestReconcile(unittest.TestCase):
+    def setUp(self):
+        self.mongo = MagicMock()
+        self.mongo.db = mongomock.MongoClient().db
+        self.redis = MagicMock()
+        self.backend = FakeBackend()
+
+    def test_reconcile_books(self):
+        books = [book(number) for number in range(50)]
+        self.backend.db.books.insert_many([dict(item) for item in books])
+        self.mongo.db.books.insert_many(
+            [dict(item, available_copies=0) for item in books[:48]]
+        )
+
+        # Drift: a missing book, a stale title and a book removed on the backend
+        self.mongo.db.books.update_one(
+            {"_id": books[0]["_id"]}, {"$set": {"title": "Stale"}}
+        )
+        self.mongo.db.books.insert_one(dict(book(99), available_copies=2))
+        self.backend.db.books.delete_one({"_id": books[49]["_id"]})
+
+        report = reconcile(self.mongo, self.redis, self.backend, "books", leaf_size=4)
+
+        # Assert the frontend catalogue now matches the backend
+        self.assertEqual(
+            bucket_hashes(self.mongo.db.books, SYNC_FIELDS["books"]),
+            bucket_hashes(self.backend.db.books, SYNC_FIELDS["books"]),
+        )
+        self.assertEqual(report["inserted"], 1)
+        self.assertEqual(report["updated"], 1)
+        self.assertEqual(report["deleted"], 1)
+
+        # Assert the available copies owned by the frontend were kept, and
+        # every copy of the inserted book is available
+        self.assertEqual(
+            self.mongo.db.books.find_one({"_id": books[1]["_id"]})["available_copies"],
+            0,
+        )
+        self.assertEqual(
+            self.mongo.db.books.find_one({"_id": books[48]["_id"]})["available_copies"],
+            2,
+        )
+
+        # Assert the report was kept for the stats endpoint
+        self.redis.set.assert_called_once_with("anti_entropy:books", json.dumps(report))
+
+    def test_reconcile_in_sync(self):
+        books = [book(number) for number in range(20)]
+        self.backend.db.books.insert_many([dict(item) for item in books])
+        self.mongo.db.books.insert_many([dict(item) for item in books])
+
+        report = reconcile(self.mongo, self.redis, self.backend, "books")
+
+        # Assert a single comparison of the root buckets was enough
+        self.assertEqual(self.backend.requests, 1)
+        self.assertEqual(report["buckets_differing"], 0)
+        self.assertEqual(report["records_transferred"], 0)
+
+    def test_reconcile_users(self):
+        user = {
+            "_id": ObjectId(),
+            "email": "ann@example.com",
+            "first_name": "Ann",
+            "last_name": "Lee",
+            "enrollment_date": datetime(2024, 9, 20),
+        }
+        self.mongo.db.users.insert_one(dict(user))
+
+        report = reconcile(self.mongo, self.redis, self.backend, "users")
+
+        # Assert the missing user was pushed to the backend
+        self.assertEqual(report["inserted"], 1)
+        self.assertEqual(self.backend.db.users.find_one({"_id": user["_id"]}), user)
+
+    def test_sync_stats(self):
+        self.redis.get.side_effect = [b'{"collection": "books"}', None]
+
+        self.assertEqual(
+            sync_stats(self.redis), {"books": {"collection": "books"}, "users": None}
+        )
+
+
+class TestBackendClient(unittest.TestCase):
+    @patch("app.helpers.reconcile.urlopen")
+    def test_replace(self, mock_urlopen):
+        response = mock_urlopen.return_value.__enter__.return_value
+        response.read.return_value = b'{"inserted": 1}'
+        backend = BackendClient("http://backend:5001/", "secret")
+
+        result = backend.replace("users", "66f", [{"_id": "66f000000000000000000001"}])
+
+        # Assert the bucket was sent with the admin token
+        self.assertEqual(result, {"inserted": 1})
+        request = mock_urlopen.call_args[0][0]
+        self.assertEqual(
+            request.full_url, "http://backend:5001/admin/sync/users/records?prefix=66f"
+        )
+        self.assertEqual(request.get_method(), "PUT")
+        self.assertEqual(request.get_header("X-admin-token"), "secret")
+
+
+@patch("app.commands.reconcile")
+class TestReconcileCommand(unittest.TestCase):
+    def test_reconcile_command(self, mock_reconcile):
+        mock_reconcile.return_value = {
+            "buckets_compared": 16,
+            "buckets_differing": 1,
+            "records_transferred": 3,
+            "inserted": 1,
+            "updated": 0,
+            "deleted": 0,
+            "duration_seconds": 0.2,
+        }
+
+        result = app.test_cli_runner().invoke(
+            reconcile_command, ["books", "users", "--leaf-size", "100"]
+        )
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(mock_reconcile.call_count, 2)
+        self.assertEqual(mock_reconcile.call_args[0][3:5], ("users", 100))
+        self.assertIn("books: 1 of 16 buckets differ", result.output)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,12 @@
 import unittest
 from unittest.mock import patch
 
+from app.helpers.page_cache import page_key
 from app.routes import user_bp
+from app.services import BOOK_DETAIL_FIELDS, BOOK_FIELDS
 from bson.objectid import ObjectId
 from flask import Flask
+from pymongo.errors import DuplicateKeyError
 
 
 class BaseTestCase(unittest.TestCase):
@@ -18,12 +21,18 @@ class BaseTestCase(unittest.TestCase):
 
 
 class TestEnrollUserRoute(BaseTestCase):
+    @patch("app.routes.email_filter")
     @patch("app.routes.is_user_existing")
     @patch("app.routes.enroll_user_service")
     @patch("app.routes.mongo")
     @patch("app.routes.r")
     def test_enroll_user_success(
-        self, mock_redis, mock_mongo, mock_enroll_user_service, mock_is_user_existing
+        self,
+        mock_redis,
+        mock_mongo,
+        mock_enroll_user_service,
+        mock_is_user_existing,
+        mock_email_filter,
     ):
         # Mock the is_user_existing service
         mock_is_user_existing.return_value = False
@@ -51,16 +60,47 @@ class TestEnrollUserRoute(BaseTestCase):
         self.assertEqual(response.json["user"]["email"], "user@example.com")
 
         # Check if the services were called correctly
+        emails = mock_email_filter.return_value
         mock_is_user_existing.assert_called_once_with(
-            mock_mongo, email="user@example.com"
+            mock_mongo, email="user@example.com", email_filter=emails
         )
         mock_enroll_user_service.assert_called_once_with(
-            mock_mongo, mock_redis, user_data
+            mock_mongo, mock_redis, user_data, email_filter=emails
         )
 
+    @patch("app.routes.email_filter")
     @patch("app.routes.is_user_existing")
+    @patch("app.routes.enroll_user_service")
     @patch("app.routes.mongo")
-    def test_enroll_user_existing(self, mock_mongo, mock_is_user_existing):
+    @patch("app.routes.r")
+    def test_enroll_user_racing(
+        self,
+        mock_redis,
+        mock_mongo,
+        mock_enroll_user_service,
+        mock_is_user_existing,
+        mock_email_filter,
+    ):
+        mock_is_user_existing.return_value = False
+        mock_enroll_user_service.side_effect = DuplicateKeyError("email_1 dup key")
+
+        response = self.client.post(
+            "/users",
+            json={"email": "user@example.com", "first_name": "J", "last_name": "D"},
+        )
+
+        # Assert the unique email index caught the concurrent enrollment
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json["message"], "User with this email already exists"
+        )
+
+    @patch("app.routes.email_filter")
+    @patch("app.routes.is_user_existing")
+    @patch("app.routes.mongo")
+    def test_enroll_user_existing(
+        self, mock_mongo, mock_is_user_existing, mock_email_filter
+    ):
         # Mock the is_user_existing service
         mock_is_user_existing.return_value = True
 
@@ -82,7 +122,9 @@ class TestEnrollUserRoute(BaseTestCase):
 
         # Check if the service was called correctly
         mock_is_user_existing.assert_called_once_with(
-            mock_mongo, email="user@example.com"
+            mock_mongo,
+            email="user@example.com",
+            email_filter=mock_email_filter.return_value,
         )
 
 
@@ -112,7 +154,9 @@ class TestListBooksRoute(BaseTestCase):
         self.assertEqual(response.json["records"][0]["title"], "The Great Gatsby")
 
         # Check if the service was called correctly
-        mock_list_books_service.assert_called_once_with(mock_mongo, page, limit)
+        mock_list_books_service.assert_called_once_with(
+            mock_mongo, page, limit, BOOK_FIELDS, None
+        )
 
     @patch("app.routes.list_books_service")
     @patch("app.routes.mongo")
@@ -155,7 +199,7 @@ class TestListBooksRoute(BaseTestCase):
         self.assertEqual(response.json["records"][1]["title"], "Another Book")
 
         # Check if the service was called correctly
-        mock_service.assert_called_once_with(mock_mongo, page, limit)
+        mock_service.assert_called_once_with(mock_mongo, page, limit, BOOK_FIELDS, None)
 
     @patch("app.routes.list_books_service")
     @patch("app.routes.mongo")
@@ -179,7 +223,7 @@ class TestListBooksRoute(BaseTestCase):
         self.assertEqual(len(response.json["records"]), 0)  # No books on this page
 
         # Check if the service was called correctly
-        mock_service.assert_called_once_with(mock_mongo, page, limit)
+        mock_service.assert_called_once_with(mock_mongo, page, limit, BOOK_FIELDS, None)
 
 
 class TestGetBookRoute(BaseTestCase):
@@ -228,6 +272,64 @@ class TestGetBookRoute(BaseTestCase):
         mock_is_book_existing.assert_called_once_with(mock_mongo, book_id)
 
 
+class TestGetBooksRoute(BaseTestCase):
+    @patch("app.routes.get_books_service")
+    @patch("app.routes.mongo")
+    def test_get_books(self, mock_mongo, mock_service):
+        # Mock the service data
+        first_id, second_id = str(ObjectId()), str(ObjectId())
+        mock_service.return_value = {
+            "total_record_count": 1,
+            "records": [
+                {"_id": first_id, "title": "Ake"},
+                {"_id": second_id, "message": "Book not found"},
+            ],
+        }
+
+        # Make a GET request to /books with a list of ids
+        response = self.client.get(f"/books?ids={first_id}, {second_id}")
+
+        # Assert the response
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["records"][0]["title"], "Ake")
+
+        # Check if the service was called correctly
+        mock_service.assert_called_once_with(
+            mock_mongo, [first_id, second_id], BOOK_DETAIL_FIELDS
+        )
+
+    @patch("app.routes.get_books_service")
+    def test_get_books_invalid_ids(self, mock_service):
+        # Make a GET request to /books with an invalid id
+        response = self.client.get(f"/books?ids={ObjectId()},not-an-id")
+
+        # Assert the request was rejected
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("not-an-id", response.json["message"])
+        mock_service.assert_not_called()
+
+    def test_get_books_too_many_ids(self):
+        ids = ",".join(str(ObjectId()) for _ in range(101))
+
+        response = self.client.get(f"/books?ids={ids}")
+
+        self.assertEqual(response.status_code, 400)
+
+    @patch("app.routes.get_catalogue_books_service")
+    @patch("app.routes.catalogue")
+    def test_get_books_from_replica(self, mock_catalogue, mock_service):
+        mock_catalogue.ready = True
+        mock_service.return_value = {"total_record_count": 0, "records": []}
+        book_id = str(ObjectId())
+
+        response = self.client.get(f"/books?ids={book_id}")
+
+        self.assertEqual(response.status_code, 200)
+        mock_service.assert_called_once_with(
+            mock_catalogue, [book_id], BOOK_DETAIL_FIELDS
+        )
+
+
 class TestFilterBooksRoute(BaseTestCase):
     @patch("app.routes.filter_books_service")
     @patch("app.routes.mongo")
@@ -257,7 +359,502 @@ class TestFilterBooksRoute(BaseTestCase):
 
         # Check if the service was called correctly
         mock_service.assert_called_once_with(
-            mock_mongo, None, None, "F. Scott Fitzgerald", page, limit
+            mock_mongo,
+            None,
+            None,
+            "F. Scott Fitzgerald",
+            page,
+            limit,
+            BOOK_FIELDS,
+            None,
+            {},
+        )
+
+
+class TestMultiValueFiltersRoute(BaseTestCase):
+    @patch("app.routes.filter_books_service")
+    @patch("app.routes.catalogue")
+    @patch("app.routes.mongo")
+    def test_filter_books_multiple_and_excluded_values(
+        self, mock_mongo, mock_catalogue, mock_service
+    ):
+        # Mock a ready replica, which only serves single value filters
+        mock_catalogue.ready = True
+        mock_service.return_value = {"records": []}
+
+        # Make a GET request to /books for two publishers outside a category
+        response = self.client.get("/books?publisher=Wiley,Apress&category!=Poetry")
+
+        # Assert the normalized filters were passed to the service
+        self.assertEqual(response.status_code, 200)
+        mock_service.assert_called_once_with(
+            mock_mongo,
+            ["Apress", "Wiley"],
+            None,
+            None,
+            1,
+            10,
+            BOOK_FIELDS,
+            None,
+            {"category": ["Poetry"]},
+        )
+
+    @patch("app.routes.filter_books_service")
+    def test_filter_books_too_many_values(self, mock_service):
+        publishers = ",".join(f"Publisher {i}" for i in range(21))
+
+        response = self.client.get(f"/books?publisher={publishers}")
+
+        self.assertEqual(response.status_code, 400)
+        mock_service.assert_not_called()
+
+
+class TestSparseFieldsRoutes(BaseTestCase):
+    @patch("app.routes.list_books_service")
+    @patch("app.routes.mongo")
+    def test_list_books_with_fields(self, mock_mongo, mock_service):
+        mock_service.return_value = {"records": [{"_id": "book1", "title": "Ake"}]}
+
+        # Make a GET request to /books for two fields
+        response = self.client.get("/books?fields=title, author")
+
+        # Assert the fieldset was passed to the service
+        self.assertEqual(response.status_code, 200)
+        mock_service.assert_called_once_with(
+            mock_mongo, 1, 10, ["title", "author"], None
+        )
+
+    @patch("app.routes.list_books_service")
+    def test_list_books_unknown_fields(self, mock_service):
+        # Make a GET request to /books for a field listings do not return
+        response = self.client.get("/books?fields=title,available")
+
+        # Assert the request was rejected
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Unknown fields: available", response.json["message"])
+        mock_service.assert_not_called()
+
+    @patch("app.routes.get_books_service")
+    @patch("app.routes.mongo")
+    def test_get_books_with_fields(self, mock_mongo, mock_service):
+        mock_service.return_value = {"total_record_count": 0, "records": []}
+        book_id = str(ObjectId())
+
+        response = self.client.get(f"/books?ids={book_id}&fields=available")
+
+        self.assertEqual(response.status_code, 200)
+        mock_service.assert_called_once_with(mock_mongo, [book_id], ["available"])
+
+
+class TestSortedBooksRoutes(BaseTestCase):
+    @patch("app.routes.list_books_service")
+    @patch("app.routes.catalogue")
+    @patch("app.routes.mongo")
+    def test_list_books_sorted(self, mock_mongo, mock_catalogue, mock_service):
+        # Mock a ready replica, which cannot serve sorted pages
+        mock_catalogue.ready = True
+        mock_service.return_value = {"records": []}
+
+        # Make a GET request to /books for the newest books first
+        response = self.client.get("/books?sort=-added_at")
+
+        # Assert the sorted page was read from MongoDB
+        self.assertEqual(response.status_code, 200)
+        mock_service.assert_called_once_with(
+            mock_mongo, 1, 10, BOOK_FIELDS, "-added_at"
+        )
+
+    @patch("app.routes.list_books_service")
+    def test_list_books_unsupported_sort(self, mock_service):
+        # Make a GET request to /books sorted on a field without an index
+        response = self.client.get("/books?sort=publisher")
+
+        # Assert the request was rejected
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Sort must be one of", response.json["message"])
+        mock_service.assert_not_called()
+
+
+class TestStreamedBooksRoutes(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.config["MAX_PAGE_SIZE"] = 100
+        self.app.config["STREAM_BATCH_SIZE"] = 50
+
+    @patch("app.routes.list_books_service")
+    def test_list_books_over_page_size_cap(self, mock_service):
+        # Make a GET request to /books for a page beyond the cap
+        response = self.client.get("/books?limit=100000")
+
+        # Assert the request was rejected
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("at most 100", response.json["message"])
+        mock_service.assert_not_called()
+
+    @patch("app.routes.list_books_service")
+    @patch("app.routes.mongo")
+    def test_list_books_streamed(self, mock_mongo, mock_service):
+        # Mock a service page with lazy records
+        mock_service.return_value = {
+            "page_number": 1,
+            "page_size": 100000,
+            "total_record_count": 2,
+            "records": iter([{"_id": "book1"}, {"_id": "book2"}]),
+        }
+
+        # Make a GET request to /books for a streamed page beyond the cap
+        response = self.client.get("/books?limit=100000&stream=true")
+
+        # Assert the page was streamed from a cursor with the configured batch size
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json["records"]), 2)
+        mock_service.assert_called_once_with(
+            mock_mongo, 1, 100000, BOOK_FIELDS, None, batch_size=50
+        )
+
+    @patch("app.routes.filter_books_service")
+    @patch("app.routes.mongo")
+    def test_filter_books_streamed_as_ndjson(self, mock_mongo, mock_service):
+        mock_service.return_value = {
+            "total_record_count": 1,
+            "records": iter([{"_id": "book1"}]),
+        }
+
+        response = self.client.get(
+            "/books?category=Fiction", headers={"Accept": "application/x-ndjson"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        self.assertEqual(
+            response.get_data(as_text=True).splitlines(), ['{"_id": "book1"}']
+        )
+        self.assertEqual(mock_service.call_args.kwargs, {"batch_size": 50})
+
+
+class TestPageCacheRoutes(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.config["PAGE_CACHE_TTL"] = 60
+        self.page = {
+            "page_number": 1,
+            "page_size": 10,
+            "total_record_count": 1,
+            "records": [{"title": "The Great Gatsby"}],
+        }
+
+    @patch("app.routes.filter_books_service")
+    @patch("app.routes.get_cached_page")
+    @patch("app.routes.r")
+    def test_filter_books_cache_hit(
+        self, mock_redis, mock_get_cached_page, mock_service
+    ):
+        # Mock a cached page
+        mock_get_cached_page.return_value = self.page
+
+        # Make a GET request to /books with a filter
+        response = self.client.get("/books", query_string={"category": "Fiction"})
+
+        # Assert the cached page was returned without querying MongoDB
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, self.page)
+        mock_get_cached_page.assert_called_once_with(
+            mock_redis, {"category": "Fiction"}, 1, 10, BOOK_FIELDS, None
+        )
+        mock_service.assert_not_called()
+
+    @patch("app.routes.cache_page")
+    @patch("app.routes.filter_books_service")
+    @patch("app.routes.get_cached_page")
+    @patch("app.routes.mongo")
+    @patch("app.routes.r")
+    def test_filter_books_cache_miss(
+        self,
+        mock_redis,
+        mock_mongo,
+        mock_get_cached_page,
+        mock_service,
+        mock_cache_page,
+    ):
+        # Mock a cache miss
+        mock_get_cached_page.return_value = None
+        mock_service.return_value = self.page
+
+        # Make a GET request to /books with filters
+        response = self.client.get(
+            "/books", query_string={"publisher": "Scribner", "page": 2}
+        )
+
+        # Assert the page was computed and stored
+        self.assertEqual(response.status_code, 200)
+        mock_service.assert_called_once_with(
+            mock_mongo, "Scribner", None, None, 2, 10, BOOK_FIELDS, None, {}
+        )
+        mock_cache_page.assert_called_once_with(
+            mock_redis,
+            {"publisher": "Scribner"},
+            2,
+            10,
+            self.page,
+            60,
+            BOOK_FIELDS,
+            None,
+        )
+
+    @patch("app.routes.page_cache_stats")
+    @patch("app.routes.r")
+    def test_page_cache_stats(self, mock_redis, mock_page_cache_stats):
+        self.app.config["ADMIN_TOKEN"] = "secret"
+        mock_page_cache_stats.return_value = {"hits": 3, "misses": 1}
+
+        response = self.client.get(
+            "/admin/page-cache/stats", headers={"X-Admin-Token": "secret"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["hits"], 3)
+        mock_page_cache_stats.assert_called_once_with(mock_redis)
+
+    def test_page_cache_stats_requires_admin_token(self):
+        response = self.client.get("/admin/page-cache/stats")
+
+        self.assertEqual(response.status_code, 403)
+
+
+class TestSyncStatsRoute(BaseTestCase):
+    @patch("app.routes.sync_stats")
+    @patch("app.routes.r")
+    def test_sync_stats(self, mock_redis, mock_sync_stats):
+        self.app.config["ADMIN_TOKEN"] = "secret"
+        mock_sync_stats.return_value = {"books": {"deleted": 1}, "users": None}
+
+        response = self.client.get(
+            "/admin/sync/stats", headers={"X-Admin-Token": "secret"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["books"]["deleted"], 1)
+        mock_sync_stats.assert_called_once_with(mock_redis)
+
+    def test_sync_stats_requires_admin_token(self):
+        response = self.client.get("/admin/sync/stats")
+
+        self.assertEqual(response.status_code, 403)
+
+
+class TestSingleFlightRoutes(BaseTestCase):
+    @patch("app.routes.filter_books_service")
+    @patch("app.routes.book_queries")
+    def test_filter_books_coalesced(self, mock_book_queries, mock_service):
+        self.app.config["SINGLE_FLIGHT_STALE_TTL"] = 2
+        mock_book_queries.do.return_value = {"records": []}
+
+        # Make a GET request to /books with a filter
+        response = self.client.get("/books", query_string={"author": "Ann"})
+
+        # Assert the query ran through the single-flight layer
+        self.assertEqual(response.status_code, 200)
+        key, load_page = mock_book_queries.do.call_args.args
+        self.assertEqual(key, page_key({"author": "Ann"}, 1, 10, BOOK_FIELDS))
+        self.assertEqual(mock_book_queries.do.call_args.kwargs, {"stale_ttl": 2})
+        mock_service.assert_not_called()
+
+        # Assert the coalesced callable performs the actual query
+        load_page()
+        mock_service.assert_called_once()
+
+    @patch("app.routes.book_queries")
+    def test_single_flight_stats(self, mock_book_queries):
+        self.app.config["ADMIN_TOKEN"] = "secret"
+        mock_book_queries.stats.return_value = {"executed": 4, "shared": 9}
+
+        response = self.client.get(
+            "/admin/single-flight/stats", headers={"X-Admin-Token": "secret"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["shared"], 9)
+
+
+class TestCatalogueReplicaRoutes(BaseTestCase):
+    @patch("app.routes.list_books_service")
+    @patch("app.routes.query_catalogue_service")
+    @patch("app.routes.catalogue")
+    def test_list_books_from_replica(
+        self, mock_catalogue, mock_service, mock_list_books_service
+    ):
+        # Serve reads from the replica
+        mock_catalogue.ready = True
+        mock_service.return_value = {
+            "page_number": 1,
+            "page_size": 10,
+            "total_record_count": 0,
+            "records": [],
+        }
+
+        # Make a GET request to /books with a filter
+        response = self.client.get("/books", query_string={"publisher": "Wiley"})
+
+        # Assert the response
+        self.assertEqual(response.status_code, 200)
+
+        # Check that MongoDB was bypassed
+        mock_service.assert_called_once_with(
+            mock_catalogue, "Wiley", None, None, 1, 10, BOOK_FIELDS
+        )
+        mock_list_books_service.assert_not_called()
+
+    @patch("app.routes.mongo")
+    @patch("app.routes.list_books_service")
+    @patch("app.routes.query_catalogue_service")
+    @patch("app.routes.catalogue")
+    def test_list_books_streamed_with_replica(
+        self, mock_catalogue, mock_service, mock_list_books_service, mock_mongo
+    ):
+        mock_catalogue.ready = True
+        mock_list_books_service.return_value = {
+            "page_number": 1,
+            "page_size": 100000,
+            "total_record_count": 1,
+            "records": iter([{"_id": "book1"}]),
+        }
+
+        # Make a GET request to /books for a streamed page beyond the cap
+        response = self.client.get("/books?limit=100000&stream=true")
+
+        # Assert the page was streamed from a cursor instead of the replica
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["records"], [{"_id": "book1"}])
+        mock_service.assert_not_called()
+        mock_list_books_service.assert_called_once_with(
+            mock_mongo, 1, 100000, BOOK_FIELDS, None, batch_size=500
+        )
+
+    @patch("app.routes.is_book_existing")
+    @patch("app.routes.catalogue")
+    def test_get_book_from_replica(self, mock_catalogue, mock_is_book_existing):
+        # Serve reads from the replica
+        mock_catalogue.ready = True
+        mock_catalogue.get.return_value = {"title": "Ake", "available": True}
+
+        # Make a GET request to /books/<book_id>
+        book_id = str(ObjectId())
+        response = self.client.get(f"/books/{book_id}")
+
+        # Assert the response
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["title"], "Ake")
+        mock_catalogue.get.assert_called_once_with(book_id)
+        mock_is_book_existing.assert_not_called()
+
+    @patch("app.routes.catalogue")
+    def test_get_book_from_replica_not_found(self, mock_catalogue):
+        mock_catalogue.ready = True
+        mock_catalogue.get.return_value = None
+
+        response = self.client.get(f"/books/{ObjectId()}")
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json["message"], "Book not found")
+
+
+class TestSearchBooksRoute(BaseTestCase):
+    @patch("app.routes.search_books_service")
+    @patch("app.routes.search_index")
+    def test_search_books(self, mock_search_index, mock_service):
+        # Mock the service data
+        data = [{"title": "The Pragmatic Programmer", "author": "Andrew Hunt"}]
+        mock_service.return_value = {
+            "page_number": 1,
+            "page_size": 10,
+            "total_record_count": len(data),
+            "records": data,
+        }
+
+        # Make a GET request to /books/search
+        response = self.client.get(
+            "/books/search", query_string={"q": "pragmatic prog"}
+        )
+
+        # Assert the response
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["records"][0]["author"], "Andrew Hunt")
+
+        # Check if the service was called correctly
+        mock_service.assert_called_once_with(mock_search_index, "pragmatic prog", 1, 10)
+
+    @patch("app.routes.search_books_service")
+    def test_search_books_missing_query(self, mock_service):
+        # Make a GET request to /books/search without a query
+        response = self.client.get("/books/search", query_string={"q": " "})
+
+        # Assert the response
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json["message"], "Search query is required.")
+        mock_service.assert_not_called()
+
+
+class TestSuggestBooksRoute(BaseTestCase):
+    @patch("app.routes.suggest_books_service")
+    @patch("app.routes.suggest_index")
+    def test_suggest_books(self, mock_suggest_index, mock_service):
+        # Mock the service data
+        mock_service.return_value = {
+            "field": "author",
+            "prefix": "wole",
+            "suggestions": ["Wole Soyinka"],
+        }
+
+        # Make a GET request to /books/suggest
+        response = self.client.get(
+            "/books/suggest", query_string={"prefix": "wole", "field": "author"}
+        )
+
+        # Assert the response
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["suggestions"], ["Wole Soyinka"])
+
+        # Check if the service was called correctly
+        mock_service.assert_called_once_with(mock_suggest_index, "author", "wole", 10)
+
+    @patch("app.routes.suggest_books_service")
+    def test_suggest_books_invalid_params(self, mock_service):
+        # Make a GET request to /books/suggest with an unknown field
+        response = self.client.get(
+            "/books/suggest",
+            query_string={"prefix": "wo", "field": "isbn", "limit": "500"},
+        )
+
+        # Assert the response
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Field must be one of", response.json["message"])
+        self.assertIn("Limit must be a number", response.json["message"])
+        mock_service.assert_not_called()
+
+
+class TestBookFacetsRoute(BaseTestCase):
+    @patch("app.routes.facet_counts_service")
+    @patch("app.routes.facet_index")
+    def test_book_facets(self, mock_facet_index, mock_service):
+        # Mock the service data
+        mock_service.return_value = {
+            "filters": {"category": "History"},
+            "total_record_count": 2,
+            "facets": {"publisher": [{"value": "Penthouse", "count": 2}]},
+        }
+
+        # Make a GET request to /books/facets
+        response = self.client.get(
+            "/books/facets", query_string={"category": "History"}
+        )
+
+        # Assert the response
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["total_record_count"], 2)
+
+        # Check if the service was called correctly
+        mock_service.assert_called_once_with(
+            mock_facet_index, None, "History", None, 20
         )
 
 
@@ -288,7 +885,12 @@ class TestBorrowBookRoute(BaseTestCase):
 
         # Check if the service was called correctly
         mock_borrow_book_service.assert_called_once_with(
-            mock_mongo, mock_redis, book_id, borrow_data["user_id"], borrow_data["days"]
+            mock_mongo,
+            mock_redis,
+            book_id,
+            borrow_data["user_id"],
+            borrow_data["days"],
+            loan_limit=0,
         )
 
     @patch("app.routes.borrow_book_service")
@@ -313,5 +915,66 @@ class TestBorrowBookRoute(BaseTestCase):
 
         # Check if the service was called correctly
         mock_borrow_book_service.assert_called_once_with(
-            mock_mongo, mock_redis, book_id, borrow_data["user_id"], borrow_data["days"]
+            mock_mongo,
+            mock_redis,
+            book_id,
+            borrow_data["user_id"],
+            borrow_data["days"],
+            loan_limit=0,
         )
+
+
+class TestHoldBookRoute(BaseTestCase):
+    @patch("app.routes.hold_book_service")
+    @patch("app.routes.mongo")
+    @patch("app.routes.r")
+    def test_hold_book(self, mock_redis, mock_mongo, mock_hold_book_service):
+        mock_hold_book_service.return_value = (2, None, 201)
+        user_id, book_id = str(ObjectId()), str(ObjectId())
+
+        response = self.client.post(f"/books/{book_id}/hold", json={"user_id": user_id})
+
+        # Assert the user was told their place in the queue
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json["position"], 2)
+        mock_hold_book_service.assert_called_once_with(
+            mock_mongo, mock_redis, book_id, user_id
+        )
+
+    def test_hold_book_invalid_user(self):
+        response = self.client.post(
+            f"/books/{ObjectId()}/hold", json={"user_id": "nobody"}
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+
+class TestNotificationsRoute(BaseTestCase):
+    @patch("app.routes.wait_for_notifications")
+    @patch("app.routes.r")
+    def test_get_notifications(self, mock_redis, mock_wait_for_notifications):
+        notification = {"event": "book_available", "book_id": str(ObjectId())}
+        mock_wait_for_notifications.return_value = [notification]
+        user_id = str(ObjectId())
+
+        response = self.client.get(f"/users/{user_id}/notifications?timeout=5")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["notifications"], [notification])
+        mock_wait_for_notifications.assert_called_once_with(mock_redis, user_id, 5)
+
+    @patch("app.routes.wait_for_notifications", return_value=[])
+    @patch("app.routes.r")
+    def test_get_notifications_timeout(self, mock_redis, mock_wait_for_notifications):
+        response = self.client.get(f"/users/{ObjectId()}/notifications")
+
+        # Assert the default wait was used, and nothing returned
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(mock_wait_for_notifications.call_args.args[2], 30)
+
+    @patch("app.routes.wait_for_notifications")
+    def test_get_notifications_invalid_timeout(self, mock_wait_for_notifications):
+        response = self.client.get(f"/users/{ObjectId()}/notifications?timeout=600")
+
+        self.assertEqual(response.status_code, 400)
+        mock_wait_for_notifications.assert_not_called()
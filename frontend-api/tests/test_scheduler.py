@@ -0,0 +1,56 @@
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from app.helpers.scheduler import run_exclusively, schedule
+from redis.exceptions import ConnectionError
+
+
+class TestRunExclusively(unittest.TestCase):
+    def setUp(self):
+        self.redis = MagicMock()
+        self.job = MagicMock()
+
+    def test_run_exclusively(self):
+        self.redis.set.return_value = True
+
+        self.assertTrue(run_exclusively(self.redis, "sweeper", 60, self.job))
+
+        # Assert the job was locked for the interval before running
+        self.redis.set.assert_called_once_with(
+            "scheduler:lock:sweeper", 1, nx=True, ex=60
+        )
+        self.job.assert_called_once_with()
+
+    def test_run_exclusively_locked(self):
+        self.redis.set.return_value = None
+
+        self.assertFalse(run_exclusively(self.redis, "sweeper", 60, self.job))
+        self.job.assert_not_called()
+
+    def test_run_exclusively_without_redis(self):
+        self.redis.set.side_effect = ConnectionError()
+
+        self.assertFalse(run_exclusively(self.redis, "sweeper", 60, self.job))
+        self.job.assert_not_called()
+
+
+class TestSchedule(unittest.TestCase):
+    def test_schedule(self):
+        redis = MagicMock()
+        redis.set.return_value = True
+        ran = threading.Event()
+
+        def job():
+            ran.set()
+            raise ValueError("Runs again despite errors")
+
+        stopped = schedule(redis, "sweeper", 0.01, job)
+        try:
+            self.assertTrue(ran.wait(1))
+        finally:
+            stopped.set()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import unittest
+
+from app.helpers.search_index import SearchIndex, tokenize
+from bson.objectid import ObjectId
+
+
+def make_book(title, author, **extra):
+    book = {
+        "_id": ObjectId(),
+        "title": title,
+        "author": author,
+        "publisher": "Addison-Wesley",
+        "category": "Technology",
+    }
+    book.update(extra)
+    return book
+
+
+class TestTokenize(unittest.TestCase):
+    def test_tokenize(self):
+        self.assertEqual(
+            tokenize("The Pragmatic Programmer: 20th Ed."),
+            ["the", "pragmatic", "programmer", "20th", "ed"],
+        )
+
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = SearchIndex()
+        self.pragmatic = make_book("The Pragmatic Programmer", "Andrew Hunt")
+        self.clean = make_book("Clean Code", "Robert Martin")
+        self.programming = make_book("Programming Pearls", "Jon Bentley")
+        self.index.load([self.pragmatic, self.clean, self.programming])
+
+    def test_search_prefix_of_last_term(self):
+        count, records = self.index.search("pragmatic prog")
+
+        self.assertEqual(count, 1)
+        self.assertEqual(records[0]["_id"], str(self.pragmatic["_id"]))
+        self.assertEqual(records[0]["publisher"], "Addison-Wesley")
+
+    def test_search_requires_every_term(self):
+        count, records = self.index.search("clean pearls")
+
+        self.assertEqual(count, 0)
+        self.assertEqual(records, [])
+
+    def test_search_ranks_title_above_author(self):
+        # "martin" appears in one title and one author, "martian" is no match
+        self.index.add_book(make_book("Martin Eden", "Jack London"))
+        self.index.add_book(make_book("The Martian Chronicles", "Ray Bradbury"))
+
+        count, records = self.index.search("martin")
+
+        self.assertEqual(count, 2)
+        self.assertEqual(records[0]["title"], "Martin Eden")
+
+    def test_search_matches_author(self):
+        count, records = self.index.search("bentley")
+
+        self.assertEqual(count, 1)
+        self.assertEqual(records[0]["title"], "Programming Pearls")
+
+    def test_search_excludes_unavailable_books(self):
+        self.index.set_available(self.pragmatic["_id"], False)
+
+        count, records = self.index.search("programmer")
+        self.assertEqual(count, 0)
+
+        self.index.set_available(self.pragmatic["_id"], True)
+        count, records = self.index.search("programmer")
+        self.assertEqual(count, 1)
+
+    def test_add_unavailable_book(self):
+        self.index.add_book(make_book("Refactoring", "Martin Fowler", available=False))
+
+        count, _ = self.index.search("refactoring")
+
+        self.assertEqual(count, 0)
+
+    def test_search_pagination(self):
+        count, first_page = self.index.search("pro", skip=0, limit=1)
+        _, second_page = self.index.search("pro", skip=1, limit=1)
+
+        self.assertEqual(count, 2)
+        self.assertEqual(len(first_page), 1)
+        self.assertEqual(len(second_page), 1)
+        self.assertNotEqual(first_page[0]["_id"], second_page[0]["_id"])
+
+    def test_remove_book(self):
+        self.index.remove_book(self.clean["_id"])
+
+        self.assertEqual(len(self.index), 2)
+        self.assertEqual(self.index.search("clean"), (0, []))
+        self.assertNotIn("clean", self.index._vocabulary)
+
+        # Removing an unknown book is a no-op
+        self.index.remove_book(ObjectId())
+        self.assertEqual(len(self.index), 2)
+
+    def test_readding_book_replaces_it(self):
+        self.pragmatic["title"] = "The Pragmatic Programmer 2nd Edition"
+        self.index.add_book(self.pragmatic)
+
+        self.assertEqual(len(self.index), 3)
+        count, records = self.index.search("edition")
+        self.assertEqual(count, 1)
+        self.assertEqual(records[0]["title"], "The Pragmatic Programmer 2nd Edition")
+
+    def test_removed_slot_is_reused(self):
+        self.index.remove_book(self.clean["_id"])
+        self.index.add_book(make_book("Domain-Driven Design", "Eric Evans"))
+
+        self.assertEqual(len(self.index._records), 3)
+        self.assertEqual(self.index.search("domain")[0], 1)
+
+    def test_search_empty_query(self):
+        self.assertEqual(self.index.search("  !! "), (0, []))
@@ -1,3 +1,4 @@
+import json
 import unittest
 from datetime import datetime, timedelta
 from unittest.mock import MagicMock, patch
@@ -5,13 +6,21 @@ from unittest.mock import MagicMock, patch
 from app.services import (
     borrow_book_service,
     enroll_user_service,
+    facet_counts_service,
     filter_books_service,
+    hold_book_service,
     get_book_service,
+    get_books_service,
+    get_catalogue_books_service,
     is_book_existing,
     is_user_existing,
     list_books_service,
+    query_catalogue_service,
+    search_books_service,
+    suggest_books_service,
 )
 from bson.objectid import ObjectId
+from pymongo import ReturnDocument
 
 
 class BaseServiceTest(unittest.TestCase):
@@ -71,7 +80,7 @@ class TestListBooksService(BaseServiceTest):
                 "author": "George Orwell",
                 "publisher": "Secker & Warburg",
                 "category": "Dystopian",
-                "available": True,
+                "available_copies": {"$gt": 0},
             }
         ]
         self.mongo.db.books.find.return_value = data
@@ -81,13 +90,71 @@ class TestListBooksService(BaseServiceTest):
 
         # Assert the query was made to fetch available books
         self.mongo.db.books.find.assert_called_once_with(
-            {"available": True}, skip=skip, limit=limit
+            {"available_copies": {"$gt": 0}},
+            {"title": 1, "author": 1, "publisher": 1, "category": 1},
+            skip=skip,
+            limit=limit,
         )
 
         # Verify the result
         self.assertEqual(len(result["records"]), len(data))
         self.assertEqual(result["records"][0]["title"], "1984")
 
+    def test_list_books_sparse_fields(self):
+        # Mock the projected documents returned by MongoDB
+        book_id = ObjectId()
+        self.mongo.db.books.find.return_value = [{"_id": book_id, "title": "1984"}]
+        self.mongo.db.books.count_documents.return_value = 1
+
+        # Call the service function for a single field
+        result = list_books_service(self.mongo, fields=("title",))
+
+        # Assert the projection was pushed down to MongoDB
+        self.mongo.db.books.find.assert_called_once_with(
+            {"available_copies": {"$gt": 0}}, {"title": 1}, skip=0, limit=10
+        )
+
+        # Verify only the requested field was returned
+        self.assertEqual(result["records"], [{"_id": str(book_id), "title": "1984"}])
+
+    def test_list_books_sorted(self):
+        self.mongo.db.books.find.return_value = []
+        self.mongo.db.books.count_documents.return_value = 0
+
+        # Call the service function for the newest books first
+        list_books_service(self.mongo, sort="-added_at")
+
+        # Assert the sort was served by the matching index
+        self.mongo.db.books.find.assert_called_once_with(
+            {"available_copies": {"$gt": 0}},
+            {"title": 1, "author": 1, "publisher": 1, "category": 1},
+            skip=0,
+            limit=10,
+            sort=[("added_at", -1), ("_id", -1)],
+            hint="listing_all_by_added_at",
+        )
+
+    def test_list_books_streamed(self):
+        self.mongo.db.books.find.return_value = iter(
+            [{"_id": ObjectId(), "title": "1984"}]
+        )
+        self.mongo.db.books.count_documents.return_value = 1
+
+        # Call the service function for a page streamed in batches
+        result = list_books_service(
+            self.mongo, limit=100000, fields=("title",), batch_size=500
+        )
+
+        # Assert the cursor was opened with the batch size
+        self.assertEqual(
+            self.mongo.db.books.find.call_args.kwargs,
+            {"skip": 0, "limit": 100000, "batch_size": 500},
+        )
+
+        # Assert the records are only read from the cursor when consumed
+        self.assertNotIsInstance(result["records"], list)
+        self.assertEqual(list(result["records"])[0]["title"], "1984")
+
     def test_list_books_pagination(self):
         # Setup pagination params
         page = 1
@@ -101,7 +168,7 @@ class TestListBooksService(BaseServiceTest):
                 "author": "Wole Soyinka",
                 "publisher": "Penthouse Publishers",
                 "category": "History",
-                "available": True,
+                "available_copies": {"$gt": 0},
             }
         ]
 
@@ -133,7 +200,8 @@ class TestGetBookService(BaseServiceTest):
             "author": "George Orwell",
             "publisher": "Secker & Warburg",
             "category": "Dystopian",
-            "available": True,
+            "total_copies": 2,
+            "available_copies": 1,
         }
 
         # Call the service function
@@ -149,6 +217,64 @@ class TestGetBookService(BaseServiceTest):
         self.assertEqual(result["available"], True)
 
 
+class TestGetBooksService(BaseServiceTest):
+    def test_get_books_in_request_order(self):
+        # Mock two of the three requested books
+        first_id, second_id, missing_id = ObjectId(), ObjectId(), ObjectId()
+        self.mongo.db.books.find.return_value = [
+            {
+                "_id": book_id,
+                "title": title,
+                "author": "Chinua Achebe",
+                "publisher": "Heinemann",
+                "category": "Fiction",
+                "total_copies": 1,
+                "available_copies": 1,
+            }
+            for book_id, title in (
+                (second_id, "Arrow of God"),
+                (first_id, "Things Fall Apart"),
+            )
+        ]
+
+        # Call the service function, repeating one id
+        book_ids = [str(first_id), str(missing_id), str(second_id), str(first_id)]
+        result = get_books_service(self.mongo, book_ids)
+
+        # Assert a single $in query was made for the distinct ids
+        self.mongo.db.books.find.assert_called_once()
+        query = self.mongo.db.books.find.call_args.args[0]
+        self.assertCountEqual(query["_id"]["$in"], [first_id, second_id, missing_id])
+
+        # Verify the records follow the request order with a not-found marker
+        self.assertEqual(result["total_record_count"], 3)
+        self.assertEqual(
+            [record.get("title") for record in result["records"]],
+            ["Things Fall Apart", None, "Arrow of God", "Things Fall Apart"],
+        )
+        self.assertEqual(
+            result["records"][1], {"_id": str(missing_id), "message": "Book not found"}
+        )
+
+    def test_get_catalogue_books(self):
+        # Mock the catalogue replica holding one of the books
+        book_id, missing_id = str(ObjectId()), str(ObjectId())
+        catalogue = MagicMock()
+        catalogue.get.side_effect = lambda _id: (
+            {"_id": _id, "title": "Ake"} if _id == book_id else None
+        )
+
+        # Call the service function
+        result = get_catalogue_books_service(
+            catalogue, [missing_id, book_id], fields=("title",)
+        )
+
+        # Verify the result
+        self.assertEqual(result["total_record_count"], 1)
+        self.assertEqual(result["records"][0]["message"], "Book not found")
+        self.assertEqual(result["records"][1]["title"], "Ake")
+
+
 class TestFilterBooksService(BaseServiceTest):
     def test_filter_books_by_category_and_author(self):
         # Setup default pagination params
@@ -164,7 +290,7 @@ class TestFilterBooksService(BaseServiceTest):
                 "author": "George Orwell",
                 "publisher": "Secker & Warburg",
                 "category": "Dystopian",
-                "available": True,
+                "available_copies": {"$gt": 0},
             }
         ]
         self.mongo.db.books.find.return_value = data
@@ -176,7 +302,12 @@ class TestFilterBooksService(BaseServiceTest):
 
         # Assert the correct query was made
         self.mongo.db.books.find.assert_called_once_with(
-            {"available": True, "category": "Dystopian", "author": "George Orwell"},
+            {
+                "available_copies": {"$gt": 0},
+                "category": "Dystopian",
+                "author": "George Orwell",
+            },
+            {"title": 1, "author": 1, "publisher": 1, "category": 1},
             skip=skip,
             limit=limit,
         )
@@ -185,6 +316,38 @@ class TestFilterBooksService(BaseServiceTest):
         self.assertEqual(len(result["records"]), len(data))
         self.assertEqual(result["records"][0]["title"], "1984")
 
+    def test_filter_books_sorted(self):
+        self.mongo.db.books.find.return_value = []
+        self.mongo.db.books.count_documents.return_value = 0
+
+        # Call the service function for a publisher's books from A to Z
+        filter_books_service(self.mongo, publisher="Wiley", sort="title")
+
+        # Assert the sort was served by the publisher index
+        options = self.mongo.db.books.find.call_args.kwargs
+        self.assertEqual(options["sort"], [("title", 1), ("_id", 1)])
+        self.assertEqual(options["hint"], "listing_publisher_by_title")
+
+    def test_filter_books_multiple_and_excluded_values(self):
+        self.mongo.db.books.find.return_value = []
+        self.mongo.db.books.count_documents.return_value = 0
+
+        # Call the service function with two publishers and an excluded category
+        filter_books_service(
+            self.mongo,
+            publisher=["Apress", "Wiley"],
+            excluded={"category": ["Poetry"]},
+        )
+
+        # Assert the values were translated to $in and $nin
+        self.mongo.db.books.count_documents.assert_called_once_with(
+            {
+                "available_copies": {"$gt": 0},
+                "publisher": {"$in": ["Apress", "Wiley"]},
+                "category": {"$nin": ["Poetry"]},
+            }
+        )
+
     def test_filter_books_service_pagination(self):
         # Setup pagination params
         page = 1
@@ -196,9 +359,9 @@ class TestFilterBooksService(BaseServiceTest):
                 "_id": ObjectId("66eddf68c01bc9ffd69bb433"),
                 "title": "The Sleeping Giant",
                 "author": "Wole Soyinka",
-                "publisher": "Penthouse Publishers",    
+                "publisher": "Penthouse Publishers",
                 "category": "History",
-                "available": True,
+                "available_copies": {"$gt": 0},
             }
         ]
         self.mongo.db.books.find.return_value = data
@@ -225,12 +388,109 @@ class TestFilterBooksService(BaseServiceTest):
         self.assertEqual(len(books["records"]), len(data))  # No books match the filter
 
 
+class TestQueryCatalogueService(BaseServiceTest):
+    def test_query_catalogue(self):
+        # Mock the catalogue replica
+        catalogue = MagicMock()
+        data = [{"_id": str(ObjectId()), "title": "Things Fall Apart"}]
+        catalogue.query.return_value = (21, data)
+
+        # Call the service function with a filter on the third page
+        result = query_catalogue_service(
+            catalogue, category="Fiction", page=3, limit=10, fields=("title",)
+        )
+
+        # Assert the replica was queried instead of MongoDB
+        catalogue.query.assert_called_once_with(
+            {"category": "Fiction"}, skip=20, limit=10
+        )
+
+        # Verify the result
+        self.assertEqual(result["page_number"], 3)
+        self.assertEqual(result["total_record_count"], 21)
+        self.assertEqual(result["records"], data)
+
+
+class TestSearchBooksService(BaseServiceTest):
+    def test_search_books(self):
+        # Mock the search index
+        index = MagicMock()
+        data = [{"_id": str(ObjectId()), "title": "The Pragmatic Programmer"}]
+        index.search.return_value = (11, data)
+
+        # Call the service function for the second page
+        result = search_books_service(index, "pragmatic prog", page=2, limit=5)
+
+        # Assert the index was queried with the right window
+        index.search.assert_called_once_with("pragmatic prog", skip=5, limit=5)
+
+        # Verify the result
+        self.assertEqual(result["page_number"], 2)
+        self.assertEqual(result["page_size"], 5)
+        self.assertEqual(result["total_record_count"], 11)
+        self.assertEqual(result["records"], data)
+
+
+class TestSuggestBooksService(BaseServiceTest):
+    def test_suggest_books(self):
+        # Mock the suggest index
+        index = MagicMock()
+        index.suggest.return_value = ["The Pragmatic Programmer"]
+
+        # Call the service function
+        result = suggest_books_service(index, "title", "the prag", limit=5)
+
+        # Assert the index was queried
+        index.suggest.assert_called_once_with("title", "the prag", 5)
+
+        # Verify the result
+        self.assertEqual(
+            result,
+            {
+                "field": "title",
+                "prefix": "the prag",
+                "suggestions": ["The Pragmatic Programmer"],
+            },
+        )
+
+
+class TestFacetCountsService(BaseServiceTest):
+    def test_facet_counts(self):
+        # Mock the facet index
+        index = MagicMock()
+        facets = {
+            "publisher": [{"value": "Wiley", "count": 2}],
+            "category": [{"value": "Technology", "count": 2}],
+            "author": [{"value": "Andrew Hunt", "count": 2}],
+        }
+        index.counts.return_value = (2, facets)
+
+        # Call the service function with filters
+        result = facet_counts_service(index, publisher="Wiley", author="Andrew Hunt")
+
+        # Assert only the provided filters reached the index
+        index.counts.assert_called_once_with(
+            {"publisher": "Wiley", "author": "Andrew Hunt"}, limit=20
+        )
+
+        # Verify the result
+        self.assertEqual(result["total_record_count"], 2)
+        self.assertEqual(result["facets"], facets)
+
+
 class TestBorrowBookService(BaseServiceTest):
+    @patch("app.services.invalidate_pages")
+    @patch("app.services.index_book_availability")
     @patch("app.services.datetime")
     @patch("app.services.is_user_existing")
     @patch("app.services.is_book_existing")
     def test_borrow_book_success(
-        self, mock_is_book_existing, mock_is_user_existing, mock_datetime
+        self,
+        mock_is_book_existing,
+        mock_is_user_existing,
+        mock_datetime,
+        mock_index_book_availability,
+        mock_invalidate_pages,
     ):
         # Mock the datetime
         mock_now = datetime(2024, 9, 20)
@@ -241,32 +501,154 @@ class TestBorrowBookService(BaseServiceTest):
         mock_is_user_existing.return_value = True
         mock_is_book_existing.return_value = True
 
-        # Mock the book document
+        # Mock the book document, left without copies by the borrow
         book_id = ObjectId()
         user_id = ObjectId()
-        self.mongo.db.books.find_one.return_value = {"available": True}
+        book = {"_id": book_id, "total_copies": 1, "available_copies": 0}
+        self.mongo.db.books.find_one_and_update.return_value = book
 
         # Call the service function
         result, error, code = borrow_book_service(
             self.mongo, self.redis, book_id, user_id, 7
         )
 
-        # Assert that the book is updated as unavailable
-        self.mongo.db.books.update_one.assert_called_once_with(
-            {"_id": ObjectId(book_id)}, {"$set": {"available": False}}
+        # Assert a copy was taken with a conditional update
+        self.mongo.db.books.find_one_and_update.assert_called_once_with(
+            {"_id": ObjectId(book_id), "available_copies": {"$gt": 0}},
+            {"$inc": {"available_copies": -1}},
+            return_document=ReturnDocument.AFTER,
         )
+        mock_index_book_availability.assert_called_once_with(book_id, False)
+        mock_invalidate_pages.assert_called_once_with(self.redis, book)
 
         # Assert that a borrow record is inserted
         self.mongo.db.borrow_records.insert_one.assert_called_once()
 
-        # Assert the Redis event is published
+        # Assert the Redis event is published with the copies left
         self.redis.publish.assert_called_once()
+        event = json.loads(self.redis.publish.call_args[0][1])
+        self.assertEqual(event["event"], "book_borrowed")
+        self.assertEqual(event["available_copies"], 0)
 
         # Verify the result
         self.assertEqual(code, 200)
         self.assertIsNone(error)
         self.assertEqual(result["borrowed_until"], mock_borrow_until)
 
+    @patch("app.services.invalidate_pages")
+    @patch("app.services.index_book_availability")
+    @patch("app.services.is_user_existing")
+    @patch("app.services.is_book_existing")
+    def test_borrow_book_with_copies_left(
+        self,
+        mock_is_book_existing,
+        mock_is_user_existing,
+        mock_index_book_availability,
+        mock_invalidate_pages,
+    ):
+        # Mock a book with copies left after the borrow
+        mock_is_user_existing.return_value = True
+        mock_is_book_existing.return_value = True
+        self.mongo.db.books.find_one_and_update.return_value = {
+            "_id": ObjectId(),
+            "total_copies": 3,
+            "available_copies": 2,
+        }
+
+        # Call the service function
+        _, error, code = borrow_book_service(
+            self.mongo, self.redis, ObjectId(), ObjectId(), 7
+        )
+
+        # Assert the book stays in the listings
+        self.assertEqual(code, 200)
+        self.assertIsNone(error)
+        mock_index_book_availability.assert_not_called()
+        mock_invalidate_pages.assert_not_called()
+
+    @patch("app.services.release_loan_slots")
+    @patch("app.services.acquire_loan_slot")
+    @patch("app.services.is_user_existing")
+    @patch("app.services.is_book_existing")
+    def test_borrow_book_without_copies_left(
+        self,
+        mock_is_book_existing,
+        mock_is_user_existing,
+        mock_acquire_loan_slot,
+        mock_release_loan_slots,
+    ):
+        # Mock the conditional update finding no copy left
+        mock_is_user_existing.return_value = True
+        mock_is_book_existing.return_value = True
+        self.mongo.db.books.find_one_and_update.return_value = None
+
+        # Call the service function
+        result, error, code = borrow_book_service(
+            self.mongo, self.redis, ObjectId(), ObjectId(), 7
+        )
+
+        # Assert the borrow was refused and nothing was recorded
+        self.assertIsNone(result)
+        self.assertEqual(code, 400)
+        self.assertEqual(error, "Book is not available for borrowing")
+        self.mongo.db.borrow_records.insert_one.assert_not_called()
+        self.redis.publish.assert_not_called()
+
+        # Assert the loan slot taken for the borrow was given back
+        user_id = mock_acquire_loan_slot.call_args[0][1]
+        mock_release_loan_slots.assert_called_once_with(self.redis, {user_id: 1})
+
+    @patch("app.services.acquire_loan_slot")
+    @patch("app.services.is_user_existing")
+    @patch("app.services.is_book_existing")
+    def test_borrow_book_over_the_loan_limit(
+        self, mock_is_book_existing, mock_is_user_existing, mock_acquire_loan_slot
+    ):
+        # Mock a user already holding as many books as allowed
+        mock_is_user_existing.return_value = True
+        mock_is_book_existing.return_value = True
+        mock_acquire_loan_slot.return_value = False
+        user_id = ObjectId()
+
+        # Call the service function
+        result, error, code = borrow_book_service(
+            self.mongo, self.redis, ObjectId(), user_id, 7, loan_limit=3
+        )
+
+        # Assert the borrow was refused before taking a copy
+        self.assertIsNone(result)
+        self.assertEqual(code, 400)
+        self.assertEqual(error, "User already holds 3 borrowed books")
+        mock_acquire_loan_slot.assert_called_once_with(self.redis, user_id, 3)
+        self.mongo.db.books.find_one_and_update.assert_not_called()
+
+
+class TestHoldBookService(BaseServiceTest):
+    @patch("app.services.place_hold", return_value=1)
+    @patch("app.services.is_user_existing", return_value=True)
+    def test_hold_book(self, mock_is_user_existing, mock_place_hold):
+        book_id, user_id = str(ObjectId()), str(ObjectId())
+        self.mongo.db.books.find_one.return_value = {"available_copies": 0}
+
+        # Assert the user was queued for the borrowed out book
+        self.assertEqual(
+            hold_book_service(self.mongo, self.redis, book_id, user_id),
+            (1, None, 201),
+        )
+        mock_place_hold.assert_called_once_with(self.redis, book_id, user_id)
+
+    @patch("app.services.place_hold")
+    @patch("app.services.is_user_existing", return_value=True)
+    def test_hold_available_book(self, mock_is_user_existing, mock_place_hold):
+        self.mongo.db.books.find_one.return_value = {"available_copies": 2}
+
+        # Assert copies left are borrowed rather than held
+        _, error, code = hold_book_service(
+            self.mongo, self.redis, str(ObjectId()), str(ObjectId())
+        )
+        self.assertEqual((error, code), ("Book is available for borrowing", 400))
+        mock_place_hold.assert_not_called()
+
 
 class TestIsUserExisting(BaseServiceTest):
     def test_is_user_existing_by_email(self):
@@ -284,6 +666,31 @@ class TestIsUserExisting(BaseServiceTest):
         # Verify the result
         self.assertTrue(result)
 
+    def test_is_user_existing_not_in_email_filter(self):
+        email_filter = MagicMock()
+        email_filter.check.return_value = 0
+
+        # Assert a definite negative of the filter skips MongoDB
+        self.assertFalse(
+            is_user_existing(
+                self.mongo, email="user@example.com", email_filter=email_filter
+            )
+        )
+        self.mongo.db.users.find_one.assert_not_called()
+
+    def test_is_user_existing_false_positive(self):
+        email_filter = MagicMock()
+        email_filter.check.return_value = 1
+        self.mongo.db.users.find_one.return_value = None
+
+        # Assert MongoDB decides, and the false positive is counted
+        self.assertFalse(
+            is_user_existing(
+                self.mongo, email="user@example.com", email_filter=email_filter
+            )
+        )
+        email_filter.record_false_positive.assert_called_once_with()
+
     def test_is_user_existing_by_id(self):
         # Mock the user document
         user_id = ObjectId()
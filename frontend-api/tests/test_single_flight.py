@@ -0,0 +1,122 @@
+import threading
+import time
+import unittest
+
+from app.helpers.single_flight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.flight = SingleFlight()
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def slow_query(self, result="page"):
+        def query():
+            self.calls += 1
+            self.started.set()
+            self.release.wait(5)
+            return result
+
+        return query
+
+    def followers(self):
+        stats = self.flight.stats()
+        return stats["shared"] + stats["stale"]
+
+    def run_concurrently(self, count, key, fn, stale_ttl=0):
+        results = []
+        joined = self.followers() + count - 1
+
+        def worker():
+            try:
+                results.append(self.flight.do(key, fn, stale_ttl=stale_ttl))
+            except Exception as error:
+                results.append(error)
+
+        # Start a leader, wait until it is querying, then start the followers
+        threads = [threading.Thread(target=worker)]
+        threads[0].start()
+        self.started.wait(5)
+        threads.extend(threading.Thread(target=worker) for _ in range(count - 1))
+        for thread in threads[1:]:
+            thread.start()
+
+        # Release the leader once every follower has joined its call
+        deadline = time.monotonic() + 5
+        while self.followers() < joined and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_concurrent_calls_share_one_query(self):
+        results = self.run_concurrently(5, "books", self.slow_query())
+
+        # Assert a single query ran and everyone got its result
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, ["page"] * 5)
+        self.assertEqual(
+            self.flight.stats(),
+            {"executed": 1, "shared": 4, "stale": 0, "in_flight": 0},
+        )
+
+    def test_sequential_calls_query_again(self):
+        self.release.set()
+        self.flight.do("books", self.slow_query())
+        self.flight.do("books", self.slow_query())
+
+        # Assert nothing is reused once a call has completed
+        self.assertEqual(self.calls, 2)
+
+    def test_distinct_keys_do_not_share(self):
+        self.release.set()
+        self.assertEqual(self.flight.do("a", lambda: 1), 1)
+        self.assertEqual(self.flight.do("b", lambda: 2), 2)
+
+    def test_errors_are_shared(self):
+        def failing_query():
+            self.started.set()
+            self.release.wait(5)
+            raise ValueError("database unavailable")
+
+        results = self.run_concurrently(3, "books", failing_query)
+
+        # Assert every caller saw the leader's exception
+        self.assertEqual(len(results), 3)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(self.flight.stats()["in_flight"], 0)
+
+    def test_stale_result_served_while_refreshing(self):
+        # Complete a first call so its result is retained
+        self.flight.do("books", lambda: "old page", stale_ttl=30)
+
+        results = self.run_concurrently(
+            3, "books", self.slow_query("new page"), stale_ttl=30
+        )
+
+        # Assert followers got the previous result and the leader the new one
+        self.assertEqual(sorted(results), ["new page", "old page", "old page"])
+        self.assertEqual(self.flight.stats()["stale"], 2)
+
+        # Assert the refreshed result replaced the stale one
+        self.started.clear()
+        self.release.clear()
+        results = self.run_concurrently(
+            2, "books", self.slow_query("newer page"), stale_ttl=30
+        )
+        self.assertIn("new page", results)
+
+    def test_stale_results_are_bounded(self):
+        flight = SingleFlight(max_stale_entries=2)
+        for key in ("a", "b", "c"):
+            flight.do(key, lambda: key, stale_ttl=30)
+
+        # Assert the least recently refreshed key was evicted
+        self.assertEqual(list(flight._results), ["b", "c"])
+
+
+if __name__ == "__main__":
+    unittest.main()
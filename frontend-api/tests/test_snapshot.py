@@ -0,0 +1,339 @@
+import io
+import json
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import mongomock
+from app import app
+from app.commands import bootstrap_catalogue_command, open_snapshot
+from app.helpers.inventory import release_operations
+from app.helpers.snapshot import (
+    EVENT_LOG_KEY,
+    SnapshotExpired,
+    catch_up_events,
+    event_operations,
+    load_snapshot,
+    read_snapshot,
+    replay_events,
+)
+from app.helpers.sync_state import SYNC_STATE_ID, save_log_position, save_sync_state
+from bson import ObjectId
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+MARKER = {"snapshot": "books", "position": "1726840200000-0", "taken_at": "now"}
+
+
+def snapshot_lines(*books):
+    return io.StringIO("".join(json.dumps(line) + "\n" for line in (MARKER,) + books))
+
+
+def log_entry(position, event):
+    return (position.encode(), {b"data": json.dumps(event).encode()})
+
+
+class TestReadSnapshot(unittest.TestCase):
+    def test_read_snapshot(self):
+        book_id, legacy_id = ObjectId(), ObjectId()
+
+        marker, books = read_snapshot(
+            snapshot_lines(
+                {
+                    "_id": str(book_id),
+                    "title": "Emma",
+                    "added_at": "2024-09-20T00:00:00",
+                },
+                {"_id": str(legacy_id), "title": "Persuasion", "available": False},
+            )
+        )
+
+        # Assert the marker is read first and the books are deserialized, with
+        # copy counters even when the backend has none
+        self.assertEqual(marker, MARKER)
+        self.assertEqual(
+            list(books),
+            [
+                {
+                    "_id": book_id,
+                    "title": "Emma",
+                    "added_at": datetime(2024, 9, 20),
+                    "total_copies": 1,
+                    "available_copies": 1,
+                },
+                {
+                    "_id": legacy_id,
+                    "title": "Persuasion",
+                    "total_copies": 1,
+                    "available_copies": 0,
+                },
+            ],
+        )
+
+    def test_read_snapshot_invalid(self):
+        with self.assertRaises(ValueError):
+            read_snapshot(io.StringIO('{"event": "book_added"}\n'))
+
+
+class TestLoadSnapshot(unittest.TestCase):
+    def test_load_snapshot_in_chunks(self):
+        mongo = MagicMock()
+        books = [{"_id": ObjectId()} for _ in range(5)]
+        on_chunk = MagicMock()
+
+        loaded = load_snapshot(mongo, iter(books), chunk_size=2, on_chunk=on_chunk)
+
+        self.assertEqual(loaded, 5)
+        self.assertEqual(mongo.db.books.insert_many.call_count, 3)
+        mongo.db.books.insert_many.assert_called_with(books[4:], ordered=False)
+        on_chunk.assert_called_with(5, books[4]["_id"])
+
+    def test_load_snapshot_skips_loaded_books(self):
+        mongo = MagicMock()
+        mongo.db.books.insert_many.side_effect = BulkWriteError(
+            {"writeErrors": [{"index": 0, "code": 11000}]}
+        )
+
+        # Assert already loaded books do not stop the load
+        self.assertEqual(load_snapshot(mongo, [{"_id": ObjectId()}]), 1)
+
+    def test_load_snapshot_other_errors(self):
+        mongo = MagicMock()
+        mongo.db.books.insert_many.side_effect = BulkWriteError(
+            {"writeErrors": [{"index": 0, "code": 121}]}
+        )
+
+        with self.assertRaises(BulkWriteError):
+            load_snapshot(mongo, [{"_id": ObjectId()}])
+
+
+class TestReplayEvents(unittest.TestCase):
+    def setUp(self):
+        self.mongo = MagicMock()
+        self.redis = MagicMock()
+
+    def test_event_operations(self):
+        book_id = ObjectId()
+
+        # Assert added books are only inserted when missing
+        self.assertEqual(
+            event_operations(
+                self.mongo,
+                {
+                    "event": "book_added",
+                    "event_id": ObjectId(),
+                    "_id": book_id,
+                    "title": "Emma",
+                },
+            ),
+            [
+                UpdateOne(
+                    {"_id": book_id},
+                    {
+                        "$setOnInsert": {
+                            "title": "Emma",
+                            "total_copies": 1,
+                            "available_copies": 1,
+                        }
+                    },
+                    upsert=True,
+                )
+            ],
+        )
+        self.assertEqual(
+            event_operations(self.mongo, {"event": "book_removed", "_id": book_id}),
+            [DeleteOne({"_id": book_id})],
+        )
+        self.assertEqual(event_operations(self.mongo, {"event": "user_enrolled"}), [])
+
+    def test_event_operations_released_loans(self):
+        # A book held in 3 copies, with a loan returned live and one still open
+        self.mongo.db = mongomock.MongoClient().db
+        book_id, returned_id, open_id = ObjectId(), ObjectId(), ObjectId()
+        self.mongo.db.borrow_records.insert_many(
+            [
+                {"_id": returned_id, "book_id": book_id, "returned_on": "2024-09-20"},
+                {"_id": open_id, "book_id": book_id},
+            ]
+        )
+        event = {
+            "event": "books_released",
+            "loans": [
+                {"_id": loan_id, "book_id": book_id, "returned_on": "2024-09-20"}
+                for loan_id in (returned_id, open_id)
+            ],
+        }
+
+        # Assert the release replayed on restart only gives the open loan back
+        self.assertEqual(
+            event_operations(self.mongo, event), release_operations({book_id: 1})
+        )
+        self.assertEqual(event_operations(self.mongo, event), [])
+
+    def test_replay_events(self):
+        book_id = ObjectId()
+        self.redis.xrange.side_effect = [
+            [log_entry("1726840100000-0", {})],  # Oldest logged event
+            [
+                log_entry(
+                    "1726840200000-1", {"event": "book_added", "_id": str(book_id)}
+                ),
+                log_entry(
+                    "1726840200000-2", {"event": "book_removed", "_id": str(book_id)}
+                ),
+            ],
+            [],
+        ]
+
+        position, replayed = replay_events(self.mongo, self.redis, "1726840200000-0")
+
+        # Assert the events were applied in order, from after the position
+        self.assertEqual((position, replayed), ("1726840200000-2", 2))
+        self.redis.xrange.assert_any_call(
+            EVENT_LOG_KEY, min="(1726840200000-0", count=1000
+        )
+        operations = self.mongo.db.books.bulk_write.call_args[0][0]
+        self.assertEqual(
+            [type(operation) for operation in operations], [UpdateOne, DeleteOne]
+        )
+
+    def test_replay_trimmed_events(self):
+        self.redis.xrange.return_value = [log_entry("1726840300000-0", {})]
+
+        with self.assertRaises(SnapshotExpired):
+            replay_events(self.mongo, self.redis, "1726840200000-0")
+
+    def test_catch_up_events(self):
+        self.mongo.db.sync_state.find_one.return_value = {
+            "position": "0-0",
+            "bootstrapped": True,
+        }
+        self.redis.xrange.side_effect = [
+            [log_entry("1726840200000-1", {"event": "user_enrolled"})],
+            [],
+        ]
+
+        self.assertEqual(catch_up_events(self.mongo, self.redis), 1)
+
+        # Assert the new position was recorded
+        self.mongo.db.sync_state.replace_one.assert_called_once_with(
+            {"_id": SYNC_STATE_ID},
+            {"position": "1726840200000-1", "bootstrapped": True, "after": None},
+            upsert=True,
+        )
+
+    def test_catch_up_events_without_snapshot(self):
+        self.mongo.db.sync_state.find_one.return_value = None
+
+        self.assertEqual(catch_up_events(self.mongo, self.redis), 0)
+        self.redis.xrange.assert_not_called()
+
+
+class TestSaveLogPosition(unittest.TestCase):
+    def test_save_log_position(self):
+        mongo = MagicMock()
+        mongo.db = mongomock.MongoClient().db
+
+        # Nothing is recorded until the replica was bootstrapped
+        save_log_position(mongo, "1726840200000-1")
+        self.assertIsNone(mongo.db.sync_state.find_one())
+
+        save_sync_state(mongo, "1726840200000-0", True)
+        save_log_position(mongo, "1726840200000-1")
+
+        # Assert a restart replays the events after the one applied live
+        self.assertEqual(
+            mongo.db.sync_state.find_one({"_id": SYNC_STATE_ID})["position"],
+            "1726840200000-1",
+        )
+
+
+class TestOpenSnapshot(unittest.TestCase):
+    @patch("app.commands.urlopen")
+    def test_open_snapshot_with_token(self, mock_urlopen):
+        mock_urlopen.return_value = io.BytesIO(b"{}\n")
+
+        lines = open_snapshot(
+            "http://backend:5001/admin/snapshot/books", "66f0", "secret"
+        )
+
+        # Assert the download resumed after the book and carried the admin token
+        self.assertEqual(list(lines), ["{}\n"])
+        request = mock_urlopen.call_args.args[0]
+        self.assertEqual(
+            request.full_url,
+            "http://backend:5001/admin/snapshot/books?after=66f0",
+        )
+        self.assertEqual(request.get_header("X-admin-token"), "secret")
+
+
+@patch("app.commands.r")
+@patch("app.commands.mongo")
+@patch("app.commands.open_snapshot")
+class TestBootstrapCatalogueCommand(unittest.TestCase):
+    def setUp(self):
+        self.runner = app.test_cli_runner()
+
+    def test_bootstrap_catalogue(self, mock_open_snapshot, mock_mongo, mock_redis):
+        mock_mongo.db.sync_state.find_one.return_value = None
+        mock_mongo.db.books.find_one.return_value = None
+        mock_open_snapshot.return_value = snapshot_lines(
+            {"_id": str(ObjectId()), "title": "Emma"}
+        )
+        mock_redis.xrange.return_value = []
+
+        with patch.dict(app.config, {"BACKEND_ADMIN_TOKEN": "secret"}):
+            result = self.runner.invoke(
+                bootstrap_catalogue_command,
+                ["http://backend:5001/admin/snapshot/books"],
+            )
+
+        # Assert the books were loaded, then the events replayed from the marker
+        self.assertEqual(result.exit_code, 0, result.output)
+        mock_open_snapshot.assert_called_once_with(
+            "http://backend:5001/admin/snapshot/books", None, "secret"
+        )
+        mock_mongo.db.books.insert_many.assert_called_once()
+        self.assertIn("Loaded 1 books", result.output)
+        self.assertIn("in sync up to 1726840200000-0", result.output)
+        mock_mongo.db.sync_state.replace_one.assert_called_with(
+            {"_id": SYNC_STATE_ID},
+            {"position": "1726840200000-0", "bootstrapped": True, "after": None},
+            upsert=True,
+        )
+
+    def test_resume_bootstrap(self, mock_open_snapshot, mock_mongo, mock_redis):
+        book_id = str(ObjectId())
+        mock_mongo.db.sync_state.find_one.return_value = {
+            "position": "1726840100000-0",
+            "bootstrapped": False,
+            "after": book_id,
+        }
+        mock_open_snapshot.return_value = snapshot_lines()
+        mock_redis.xrange.return_value = []
+
+        result = self.runner.invoke(bootstrap_catalogue_command, ["snapshot.ndjson"])
+
+        # Assert the load resumed, replaying from the first snapshot marker
+        self.assertEqual(result.exit_code, 0, result.output)
+        mock_open_snapshot.assert_called_once_with(
+            "snapshot.ndjson", book_id, app.config["BACKEND_ADMIN_TOKEN"]
+        )
+        self.assertIn("in sync up to 1726840100000-0", result.output)
+
+    def test_bootstrap_non_empty_catalogue(
+        self, mock_open_snapshot, mock_mongo, mock_redis
+    ):
+        mock_mongo.db.sync_state.find_one.return_value = None
+        mock_mongo.db.books.find_one.return_value = {"_id": ObjectId()}
+
+        result = self.runner.invoke(bootstrap_catalogue_command, ["snapshot.ndjson"])
+
+        # Assert a catalogue that is not empty is left untouched
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn("not empty", result.output)
+        mock_open_snapshot.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import json
+import unittest
+
+from app.helpers.streaming import page_size_error, stream_format, streamed_page
+from flask import Flask, request
+
+
+class TestStreamFormat(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+
+    def format_for(self, path, headers=None):
+        with self.app.test_request_context(path, headers=headers):
+            return stream_format(request)
+
+    def test_regular_response(self):
+        self.assertIsNone(self.format_for("/books"))
+        self.assertIsNone(self.format_for("/books", {"Accept": "*/*"}))
+
+    def test_ndjson_requested(self):
+        self.assertEqual(
+            self.format_for("/books", {"Accept": "application/x-ndjson"}), "ndjson"
+        )
+        self.assertEqual(self.format_for("/books?format=ndjson"), "ndjson")
+
+    def test_streamed_json_requested(self):
+        self.assertEqual(self.format_for("/books?stream=true"), "json")
+
+
+class TestPageSizeError(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config["MAX_PAGE_SIZE"] = 100
+
+    def test_page_size_cap(self):
+        with self.app.app_context():
+            self.assertIsNone(page_size_error(100, streamed=False))
+            self.assertIn("at most 100", page_size_error(101, streamed=False))
+
+            # Assert streamed pages are not capped
+            self.assertIsNone(page_size_error(100000, streamed=True))
+
+    def test_no_cap_configured(self):
+        with Flask(__name__).app_context():
+            self.assertIsNone(page_size_error(100000, streamed=False))
+
+
+class TestStreamedPage(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.records = [{"_id": str(i), "title": f"Book {i}"} for i in range(250)]
+
+    def page(self, records):
+        return {
+            "page_number": 1,
+            "page_size": 1000,
+            "total_record_count": 250,
+            "records": iter(records),
+        }
+
+    def test_streamed_json(self):
+        with self.app.test_request_context("/books"):
+            response = streamed_page(self.page(self.records), "json")
+            chunks = list(response.response)
+
+        # Assert the records were written in several chunks forming one document
+        self.assertGreater(len(chunks), 3)
+        body = json.loads("".join(chunks))
+        self.assertEqual(body["total_record_count"], 250)
+        self.assertEqual(body["records"], self.records)
+        self.assertEqual(response.mimetype, "application/json")
+
+    def test_streamed_json_without_records(self):
+        with self.app.test_request_context("/books"):
+            response = streamed_page(self.page([]), "json")
+            body = json.loads("".join(response.response))
+
+        self.assertEqual(body["records"], [])
+
+    def test_streamed_ndjson(self):
+        with self.app.test_request_context("/books"):
+            response = streamed_page(self.page(self.records), "ndjson")
+            lines = "".join(response.response).splitlines()
+
+        # Assert one record per line and the total count in a header
+        self.assertEqual([json.loads(line) for line in lines], self.records)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        self.assertEqual(response.headers["X-Total-Count"], "250")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+
+from app.helpers.suggest_index import PrefixIndex, SuggestIndex, normalize
+from bson.objectid import ObjectId
+
+
+class TestNormalize(unittest.TestCase):
+    def test_normalize(self):
+        self.assertEqual(
+            normalize("  The  Pragmatic\tProgrammer "), "the pragmatic programmer"
+        )
+
+
+class TestPrefixIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = PrefixIndex(max_value_length=20)
+        self.index.extend({"Wiley": 2, "Manning": 1, "Apress": 1})
+
+    def test_lookup(self):
+        self.index.add("Wrox")
+
+        self.assertEqual(self.index.lookup("w"), ["Wiley", "Wrox"])
+        self.assertEqual(self.index.lookup("WI"), ["Wiley"])
+        self.assertEqual(self.index.lookup("x"), [])
+
+    def test_lookup_limit(self):
+        self.assertEqual(self.index.lookup("", limit=2), ["Apress", "Manning"])
+
+    def test_values_are_reference_counted(self):
+        # Wiley is carried by two books
+        self.index.discard("Wiley")
+        self.assertEqual(self.index.lookup("wi"), ["Wiley"])
+
+        self.index.discard("Wiley")
+        self.assertEqual(self.index.lookup("wi"), [])
+        self.assertEqual(len(self.index), 2)
+
+        # Discarding an unknown value is a no-op
+        self.index.discard("Wiley")
+        self.assertEqual(len(self.index), 2)
+
+    def test_duplicate_values_are_stored_once(self):
+        self.index.add("Manning")
+
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual(self.index.lookup("man"), ["Manning"])
+
+    def test_values_are_truncated(self):
+        self.index.add("A" * 50)
+
+        self.assertEqual(self.index.lookup("aaa"), ["A" * 20])
+
+    def test_case_variants_are_kept_apart(self):
+        self.index.add("apress")
+        self.index.discard("Apress")
+
+        self.assertEqual(self.index.lookup("apr"), ["apress"])
+
+
+class TestSuggestIndex(unittest.TestCase):
+    def setUp(self):
+        self.book = {
+            "_id": ObjectId(),
+            "title": "The Pragmatic Programmer",
+            "author": "Andrew Hunt",
+            "publisher": "Addison-Wesley",
+            "category": "Technology",
+        }
+        self.index = SuggestIndex()
+        self.index.load([self.book])
+
+    def test_suggest_by_field(self):
+        self.assertEqual(
+            self.index.suggest("title", "the prag"), ["The Pragmatic Programmer"]
+        )
+        self.assertEqual(self.index.suggest("author", "and"), ["Andrew Hunt"])
+        self.assertEqual(self.index.suggest("publisher", "and"), [])
+
+    def test_add_and_remove_book(self):
+        other = dict(self.book, _id=ObjectId(), title="The Passionate Programmer")
+        self.index.add_book(other)
+        self.assertEqual(
+            self.index.suggest("title", "the p"),
+            ["The Passionate Programmer", "The Pragmatic Programmer"],
+        )
+
+        self.index.remove_book(self.book["_id"])
+        self.assertEqual(
+            self.index.suggest("title", "the p"), ["The Passionate Programmer"]
+        )
+        # The author is still carried by the other book
+        self.assertEqual(self.index.suggest("author", "and"), ["Andrew Hunt"])
+
+    def test_add_and_remove_book_again(self):
+        # Events applied twice, e.g. by a replay, leave a single reference
+        self.index.add_book(self.book)
+        self.index.remove_book(self.book["_id"])
+        self.index.remove_book(self.book["_id"])
+
+        self.assertEqual(self.index.suggest("title", "the prag"), [])
+        self.assertEqual(self.index.suggest("author", "and"), [])
+
+    def test_add_new_version_of_book(self):
+        self.index.add_book(dict(self.book, title="The Pragmatic Programmer, 2nd"))
+
+        self.assertEqual(
+            self.index.suggest("title", "the prag"),
+            ["The Pragmatic Programmer, 2nd"],
+        )
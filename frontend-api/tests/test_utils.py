@@ -1,9 +1,20 @@
+import json
 import unittest
 from datetime import datetime
-from unittest.mock import patch
+from unittest.mock import call, patch
 
-from app.helpers.utils import handle_events, json_deserialize, json_serialize
+import mongomock
+from app.helpers.event_dedup import RecentEvents
+from app.helpers.inventory import release_operations
+from app.helpers.utils import (
+    handle_events,
+    json_deserialize,
+    json_serialize,
+    project_document,
+    split_list_param,
+)
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 
 
 class TestJsonSerialize(unittest.TestCase):
@@ -56,10 +67,37 @@ class TestJsonDeserialize(unittest.TestCase):
         self.assertEqual(result["key"], "some_random_string")
 
 
+class TestQueryParamHelpers(unittest.TestCase):
+    def test_split_list_param(self):
+        # Assert items are stripped and empty items dropped
+        self.assertEqual(split_list_param(" title, author,,"), ["title", "author"])
+        self.assertIsNone(split_list_param(None))
+
+    def test_project_document(self):
+        book_id = ObjectId()
+        book = {"_id": book_id, "title": "Ake", "author": "Wole Soyinka"}
+
+        # Assert only the requested fields and the stringified _id are kept
+        self.assertEqual(
+            project_document(book, ["_id", "title"]),
+            {"_id": str(book_id), "title": "Ake"},
+        )
+
+
 class TestHandleEvents(unittest.TestCase):
+    @patch("app.helpers.utils.invalidate_pages")
+    @patch("app.helpers.utils.r")
+    @patch("app.helpers.utils.index_book_added")
     @patch("app.helpers.utils.mongo")
     @patch("app.helpers.utils.json.loads")
-    def test_handle_book_added_event(self, mock_json_loads, mock_mongo):
+    def test_handle_book_added_event(
+        self,
+        mock_json_loads,
+        mock_mongo,
+        mock_index_book_added,
+        mock_redis,
+        mock_invalidate_pages,
+    ):
         # Mock the incoming message
         mock_json_loads.return_value = {
             "event": "book_added",
@@ -83,13 +121,326 @@ class TestHandleEvents(unittest.TestCase):
             "author": "George Orwell",
             "publisher": "Secker & Warburg",
             "category": "Dystopian",
-            "available": True,
+            "total_copies": 1,
+            "available_copies": 1,
         }
         mock_mongo.db.books.insert_one.assert_called_once_with(expected_data)
 
+        # Assert the book was added to the in-memory indexes
+        mock_index_book_added.assert_called_once_with(expected_data)
+
+        # Assert the cached pages showing the book were dropped
+        mock_invalidate_pages.assert_called_once_with(mock_redis, expected_data)
+
+    @patch("app.helpers.utils.notify_holders")
+    @patch("app.helpers.utils.release_loan_slots")
+    @patch("app.helpers.utils.invalidate_pages")
+    @patch("app.helpers.utils.r")
+    @patch("app.helpers.utils.index_book_availability")
+    @patch("app.helpers.utils.mongo")
+    def test_handle_books_released_event(
+        self,
+        mock_mongo,
+        mock_index_book_availability,
+        mock_redis,
+        mock_invalidate_pages,
+        mock_release_loan_slots,
+        mock_notify_holders,
+    ):
+        user_id = ObjectId()
+        loan_id, other_loan_id = ObjectId(), ObjectId()
+        book_id, other_book_id = ObjectId(), ObjectId()
+        book = {"_id": book_id, "publisher": "Wiley", "available_copies": 1}
+        other_book = {"_id": other_book_id, "publisher": "Wiley", "available_copies": 3}
+        mock_mongo.db.books.find.return_value = [book, other_book]
+        mock_mongo.db.borrow_records = mongomock.MongoClient().db.borrow_records
+        mock_mongo.db.borrow_records.insert_many(
+            [{"_id": loan_id}, {"_id": other_loan_id}]
+        )
+        message = {
+            "data": json.dumps(
+                {
+                    "event": "books_released",
+                    "loans": [
+                        {
+                            "_id": str(loan_id),
+                            "user_id": str(user_id),
+                            "book_id": str(book_id),
+                            "returned_on": "2024-09-20T14:30:00",
+                        },
+                        {
+                            "_id": str(other_loan_id),
+                            "user_id": str(user_id),
+                            "book_id": str(other_book_id),
+                            "returned_on": "2024-09-20T14:30:00",
+                        },
+                    ],
+                }
+            )
+        }
+
+        # Call the function
+        handle_events(message)
+
+        # Assert the loans were closed and the copies given back in bulk
+        returned_on = datetime(2024, 9, 20, 14, 30)
+        self.assertEqual(
+            mock_mongo.db.borrow_records.count_documents({"returned_on": returned_on}),
+            2,
+        )
+        mock_mongo.db.books.bulk_write.assert_called_once_with(
+            release_operations({book_id: 1, other_book_id: 1})
+        )
+
+        # Assert the indexes follow the counters, and only the pages of the book
+        # that had no copy left were dropped
+        self.assertEqual(
+            mock_index_book_availability.call_args_list,
+            [call(book_id, True), call(other_book_id, True)],
+        )
+        mock_invalidate_pages.assert_called_once_with(mock_redis, book)
+
+        # Assert the borrower's loan slots were given back
+        mock_release_loan_slots.assert_called_once_with(mock_redis, {str(user_id): 2})
+
+        # Assert the first holders of both books were notified
+        mock_notify_holders.assert_called_once_with(
+            mock_redis, {book_id: 1, other_book_id: 1}, None
+        )
+
+    @patch("app.helpers.utils.notify_holders")
+    @patch("app.helpers.utils.release_loan_slots")
+    @patch("app.helpers.utils.invalidate_pages")
+    @patch("app.helpers.utils.index_book_availability")
+    @patch("app.helpers.utils.mongo")
+    def test_handle_books_released_event_on_every_replica(
+        self,
+        mock_mongo,
+        mock_index_book_availability,
+        mock_invalidate_pages,
+        mock_release_loan_slots,
+        mock_notify_holders,
+    ):
+        # A book held in 3 copies, 2 of them borrowed, sharing one database
+        book_id, user_id = ObjectId(), ObjectId()
+        loan_ids = [ObjectId(), ObjectId()]
+        mock_mongo.db.books.find.return_value = [
+            {"_id": book_id, "publisher": "Wiley", "available_copies": 3}
+        ]
+        mock_mongo.db.borrow_records = mongomock.MongoClient().db.borrow_records
+        mock_mongo.db.borrow_records.insert_many(
+            [{"_id": loan_id, "book_id": book_id} for loan_id in loan_ids]
+        )
+        message = {
+            "data": json.dumps(
+                {
+                    "event": "books_released",
+                    "event_id": str(ObjectId()),
+                    "loans": [
+                        {
+                            "_id": str(loan_id),
+                            "user_id": str(user_id),
+                            "book_id": str(book_id),
+                            "returned_on": "2024-09-20T14:30:00",
+                        }
+                        for loan_id in loan_ids
+                    ],
+                }
+            )
+        }
+
+        # Each replica has its own dedup window
+        for _ in range(3):
+            with patch("app.helpers.utils.recent_events", RecentEvents()):
+                handle_events(message)
+
+        # Assert the 2 copies were given back once, by a single replica
+        mock_mongo.db.books.bulk_write.assert_called_once_with(
+            release_operations({book_id: 2})
+        )
+
+        # Assert the borrower's 2 loan slots were freed once, not per replica
+        self.assertEqual(
+            [slots.args[1] for slots in mock_release_loan_slots.call_args_list],
+            [{str(user_id): 2}, {}, {}],
+        )
+
+        # Assert every replica still marked the book available in its indexes
+        self.assertEqual(
+            mock_index_book_availability.call_args_list, [call(book_id, True)] * 3
+        )
+
+    @patch("app.helpers.utils.recent_events", new_callable=RecentEvents)
+    @patch("app.helpers.utils.release_loan_slots")
+    @patch("app.helpers.utils.invalidate_pages")
+    @patch("app.helpers.utils.index_book_availability")
+    @patch("app.helpers.utils.mongo")
+    def test_handle_redelivered_books_released_event(
+        self,
+        mock_mongo,
+        mock_index_book_availability,
+        mock_invalidate_pages,
+        mock_release_loan_slots,
+        mock_recent_events,
+    ):
+        loan_id = ObjectId()
+        mock_mongo.db.books.find.return_value = []
+        mock_mongo.db.borrow_records = mongomock.MongoClient().db.borrow_records
+        mock_mongo.db.borrow_records.insert_one({"_id": loan_id})
+        message = {
+            "data": json.dumps(
+                {
+                    "event": "books_released",
+                    "event_id": str(ObjectId()),
+                    "loans": [
+                        {
+                            "_id": str(loan_id),
+                            "book_id": str(ObjectId()),
+                            "returned_on": "2024-09-20T14:30:00",
+                        }
+                    ],
+                }
+            )
+        }
+
+        handle_events(message)
+        handle_events(message)
+
+        # Assert the copies were only given back once
+        mock_mongo.db.books.bulk_write.assert_called_once()
+        mock_release_loan_slots.assert_called_once()
+        self.assertEqual(len(mock_recent_events), 1)
+
+    @patch("app.helpers.utils.invalidate_pages")
+    @patch("app.helpers.utils.index_book_added")
+    @patch("app.helpers.utils.mongo")
+    def test_handle_book_added_event_already_loaded(
+        self, mock_mongo, mock_index_book_added, mock_invalidate_pages
+    ):
+        # Mock a book already stored by another replica, and since borrowed
+        book_id = ObjectId()
+        stored = {"_id": book_id, "title": "1984", "available_copies": 0}
+        mock_mongo.db.books.insert_one.side_effect = DuplicateKeyError("_id")
+        mock_mongo.db.books.find_one.return_value = stored
+
+        # Call the function
+        handle_events(
+            {
+                "data": json.dumps(
+                    {"event": "book_added", "_id": str(book_id), "title": "1984"}
+                )
+            }
+        )
+
+        # Assert this replica's indexes still got the book, as it is stored
+        mock_mongo.db.books.find_one.assert_called_once_with({"_id": book_id})
+        mock_index_book_added.assert_called_once_with(stored)
+
+    @patch("app.helpers.utils.invalidate_pages")
+    @patch("app.helpers.utils.r")
+    @patch("app.helpers.utils.index_book_added")
+    @patch("app.helpers.utils.mongo")
+    def test_handle_books_added_event(
+        self,
+        mock_mongo,
+        mock_index_book_added,
+        mock_redis,
+        mock_invalidate_pages,
+    ):
+        first_id, second_id = ObjectId(), ObjectId()
+        message = {
+            "data": json.dumps(
+                {
+                    "event": "books_added",
+                    "books": [
+                        {"_id": str(first_id), "title": "1984"},
+                        {"_id": str(second_id), "title": "Emma"},
+                    ],
+                }
+            )
+        }
+
+        # Call the function
+        handle_events(message)
+
+        # Assert the whole chunk was inserted at once
+        expected_books = [
+            {
+                "_id": first_id,
+                "title": "1984",
+                "total_copies": 1,
+                "available_copies": 1,
+            },
+            {
+                "_id": second_id,
+                "title": "Emma",
+                "total_copies": 1,
+                "available_copies": 1,
+            },
+        ]
+        mock_mongo.db.books.insert_many.assert_called_once_with(
+            expected_books, ordered=False
+        )
+        self.assertEqual(mock_index_book_added.call_count, 2)
+
+        # Assert the cached pages were dropped in one go
+        mock_invalidate_pages.assert_called_once_with(mock_redis, *expected_books)
+
+    @patch("app.helpers.utils.invalidate_pages")
+    @patch("app.helpers.utils.index_book_added")
+    @patch("app.helpers.utils.mongo")
+    def test_handle_books_added_event_partly_stored(
+        self, mock_mongo, mock_index_book_added, mock_invalidate_pages
+    ):
+        # Mock a chunk whose first book another replica already stored
+        first_id, second_id = ObjectId(), ObjectId()
+        stored = {"_id": first_id, "title": "1984", "available_copies": 0}
+        mock_mongo.db.books = mongomock.MongoClient().db.books
+        mock_mongo.db.books.insert_one(dict(stored))
+        message = {
+            "data": json.dumps(
+                {
+                    "event": "books_added",
+                    "books": [
+                        {"_id": str(first_id), "title": "1984"},
+                        {"_id": str(second_id), "title": "Emma"},
+                    ],
+                }
+            )
+        }
+
+        # Call the function
+        handle_events(message)
+
+        # Assert every book reached this replica's indexes, as it is stored
+        self.assertEqual(
+            mock_index_book_added.call_args_list,
+            [
+                call(
+                    {
+                        "_id": second_id,
+                        "title": "Emma",
+                        "total_copies": 1,
+                        "available_copies": 1,
+                    }
+                ),
+                call(stored),
+            ],
+        )
+
+    @patch("app.helpers.utils.invalidate_pages")
+    @patch("app.helpers.utils.r")
+    @patch("app.helpers.utils.index_book_removed")
     @patch("app.helpers.utils.mongo")
     @patch("app.helpers.utils.json.loads")
-    def test_handle_book_removed_event(self, mock_json_loads, mock_mongo):
+    def test_handle_book_removed_event(
+        self,
+        mock_json_loads,
+        mock_mongo,
+        mock_index_book_removed,
+        mock_redis,
+        mock_invalidate_pages,
+    ):
         # Mock the incoming message
         mock_json_loads.return_value = {"event": "book_removed", "_id": ObjectId()}
 
@@ -99,7 +450,97 @@ class TestHandleEvents(unittest.TestCase):
         # Call the function
         handle_events(message)
 
-        # Assert the MongoDB delete_one was called with the correct query
-        mock_mongo.db.books.delete_one.assert_called_once_with(
+        # Assert the book was deleted from MongoDB with the correct query
+        mock_mongo.db.books.find_one_and_delete.assert_called_once_with(
             {"_id": mock_json_loads.return_value["_id"]}
         )
+
+        # Assert the book was dropped from the in-memory indexes
+        mock_index_book_removed.assert_called_once_with(
+            mock_json_loads.return_value["_id"]
+        )
+        mock_invalidate_pages.assert_called_once_with(
+            mock_redis, mock_mongo.db.books.find_one_and_delete.return_value
+        )
+
+    @patch("app.helpers.utils.invalidate_pages")
+    @patch("app.helpers.utils.index_book_removed")
+    @patch("app.helpers.utils.mongo")
+    @patch("app.helpers.utils.json.loads")
+    def test_handle_book_removed_event_unknown_book(
+        self,
+        mock_json_loads,
+        mock_mongo,
+        mock_index_book_removed,
+        mock_invalidate_pages,
+    ):
+        # Mock the removal of a book another replica already deleted
+        mock_json_loads.return_value = {"event": "book_removed", "_id": ObjectId()}
+        mock_mongo.db.books.find_one_and_delete.return_value = None
+
+        # Call the function
+        handle_events({"data": '{"event": "book_removed"}'})
+
+        # Assert this replica's indexes still dropped it, the cache was left alone
+        mock_index_book_removed.assert_called_once_with(
+            mock_json_loads.return_value["_id"]
+        )
+        mock_invalidate_pages.assert_not_called()
+
+    @patch("app.helpers.utils.save_log_position")
+    @patch("app.helpers.utils.index_book_removed")
+    @patch("app.helpers.utils.mongo")
+    def test_handle_logged_event(
+        self, mock_mongo, mock_index_book_removed, mock_save_log_position
+    ):
+        mock_mongo.db.books.find_one_and_delete.return_value = None
+        event = {"event": "book_removed", "_id": str(ObjectId())}
+
+        # Handle an event published with its position in the log, then one
+        # published by another frontend replica
+        handle_events(
+            {"data": json.dumps({**event, "log_position": "1726840200000-3"})}
+        )
+        handle_events({"data": json.dumps(event)})
+
+        # Assert only the logged event advanced the position replayed from
+        mock_save_log_position.assert_called_once_with(mock_mongo, "1726840200000-3")
+
+    @patch("app.helpers.utils.index_book_availability")
+    @patch("app.helpers.utils.mongo")
+    @patch("app.helpers.utils.json.loads")
+    def test_handle_book_borrowed_event(
+        self, mock_json_loads, mock_mongo, mock_index_book_availability
+    ):
+        # Mock a borrow event published by another replica
+        book_id = ObjectId()
+        mock_json_loads.return_value = {
+            "event": "book_borrowed",
+            "user_id": ObjectId(),
+            "book_id": book_id,
+        }
+
+        # Call the function
+        handle_events({"data": '{"event": "book_borrowed"}'})
+
+        # Assert only the in-memory indexes were updated
+        mock_index_book_availability.assert_called_once_with(book_id, False)
+        mock_mongo.db.books.update_one.assert_not_called()
+
+    @patch("app.helpers.utils.index_book_availability")
+    @patch("app.helpers.utils.json.loads")
+    def test_handle_book_borrowed_event_with_copies_left(
+        self, mock_json_loads, mock_index_book_availability
+    ):
+        # Mock the borrow of one of several copies on another replica
+        mock_json_loads.return_value = {
+            "event": "book_borrowed",
+            "book_id": ObjectId(),
+            "available_copies": 2,
+        }
+
+        # Call the function
+        handle_events({"data": '{"event": "book_borrowed"}'})
+
+        # Assert the book stays available in the in-memory indexes
+        mock_index_book_availability.assert_not_called()